@@ -0,0 +1,26 @@
+"""
+CSS scan helpers shared by the css_checker scripts.
+The package API (scan, Model, plan_cleanup, ...) is resolved lazily so that
+importing cssscan, or one of its small modules, stays cheap.
+"""
+
+import importlib
+
+_LAZY = {
+    "Model": "cssscan.api",
+    "scan": "cssscan.api",
+    "plan_cleanup": "cssscan.api",
+    "apply_plan": "cssscan.api",
+    "check_staged": "cssscan.precommit",
+}
+
+__all__ = sorted(_LAZY)
+
+
+def __getattr__(name):
+    module = _LAZY.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module), name)
+    globals()[name] = value
+    return value
@@ -0,0 +1,5 @@
+import sys
+
+from cssscan.cli import main
+
+sys.exit(main())
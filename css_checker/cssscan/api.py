@@ -0,0 +1,112 @@
+"""
+Importable entry points for the css_checker tooling.
+scan() parses a set of stylesheets into a Model that the report and cleanup
+passes can share; the heavier passes (shorthand expansion, the cleanup
+tool) are only imported when one of their functions is called.
+"""
+
+import hashlib
+from collections import defaultdict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from cssscan.parser import Rule, Stylesheet, iter_rules, parse_stylesheet
+
+PathLike = Union[str, Path]
+
+
+@dataclass
+class Model:
+    """Parsed stylesheets (and their source text) keyed by path, in scan order"""
+    sheets: Dict[Path, Stylesheet] = field(default_factory=dict)
+    sources: Dict[Path, str] = field(default_factory=dict)
+    digests: Dict[Path, str] = field(default_factory=dict)
+
+    def update(self, path: Path, text: str):
+        """Replace one file's text and re-parse it"""
+        self.sources[path] = text
+        self.sheets[path] = parse_stylesheet(text, path)
+        self.digests.pop(path, None)
+
+    def load(self, path: Path):
+        """Read and parse a file, keeping the digest of its bytes as read"""
+        data = path.read_bytes()
+        # the same text read_text gives (universal newlines), for any line endings
+        text = data.decode("utf-8", errors="ignore").replace("\r\n", "\n").replace("\r", "\n")
+        self.update(path, text)
+        self.digests[path] = hashlib.sha256(data).hexdigest()
+
+    def digest(self, path: Path) -> str:
+        """SHA-256 of a file: of the bytes on disk (backup.file_digest) while its text is the
+        one load() read, else of the UTF-8 text update() gave it, which is what is written"""
+        if path not in self.digests:
+            self.digests[path] = hashlib.sha256(self.sources[path].encode("utf-8")).hexdigest()
+        return self.digests[path]
+
+    def paths(self) -> List[Path]:
+        return list(self.sheets)
+
+    def rules(self) -> Iterator[Tuple[Path, Rule]]:
+        for path, sheet in self.sheets.items():
+            for rule in iter_rules(sheet.nodes):
+                yield path, rule
+
+    def body_groups(self) -> Dict[Tuple[Tuple[str, ...], Tuple[str, ...]], List[Tuple[Path, Rule]]]:
+        """Rules grouped by (at-rule context, canonical shorthand-expanded declaration body);
+        @keyframes stops are not rules that could be merged, so they are left out"""
+        from cssscan.merge import body_key, is_keyframes_context
+
+        groups: Dict[Tuple[Tuple[str, ...], Tuple[str, ...]], List[Tuple[Path, Rule]]] = defaultdict(list)
+        for path, rule in self.rules():
+            if rule.declarations and not is_keyframes_context(rule.context):
+                groups[(rule.context, body_key(rule.declarations))].append((path, rule))
+        return groups
+
+    def duplicate_groups(self) -> List[List[Tuple[Path, Rule]]]:
+        return [items for items in self.body_groups().values() if len(items) > 1]
+
+    def bundle_order(self, entry: PathLike) -> List[Path]:
+        """Paths in cascade order from an entry stylesheet, reusing the parsed sheets"""
+        from cssscan.bundle import bundle_order
+
+        return bundle_order(Path(entry), self.sheets)
+
+
+def css_paths(paths: Iterable[PathLike]) -> List[Path]:
+    """Expand directories to the .css files below them; files are kept as given"""
+    found: List[Path] = []
+    for p in map(Path, paths):
+        found.extend(sorted(p.rglob("*.css")) if p.is_dir() else [p])
+    return found
+
+
+def scan(paths: Iterable[PathLike]) -> Model:
+    """Parse stylesheets (files or directories) into a Model"""
+    model = Model()
+    for path in css_paths(paths):
+        if path not in model.sheets:
+            model.load(path)
+    return model
+
+
+def plan_cleanup(project_root: PathLike, prune_unreferenced: bool = False,
+                 reference_source_dirs: Iterable[PathLike] = (),
+                 model: Optional[Model] = None, workers: int = 1) -> Tuple[Dict, str]:
+    """Dry-run the CSSCleanupTool phases; returns (plan, unified diff) without writing.
+    With a model, the phases start from its source text instead of re-reading the files.
+    workers > 1 runs the per-file phase work in that many processes (same plan either way)."""
+    from phase1 import CSSCleanupTool  # the cleanup tool lives beside the scripts
+
+    tool = CSSCleanupTool(str(project_root))
+    tool.prune_unreferenced = prune_unreferenced
+    tool.reference_source_dirs = [Path(d) for d in reference_source_dirs]
+    tool.workers = workers
+    sources = {str(path): text for path, text in model.sources.items()} if model else None
+    return tool.plan_cleanup(sources)
+
+
+def apply_plan(project_root: PathLike, plan: Dict) -> bool:
+    from phase1 import CSSCleanupTool
+
+    return CSSCleanupTool(str(project_root)).apply_plan(plan)
@@ -0,0 +1,363 @@
+"""
+Repeated and oversized url() assets.
+Every url() in a declaration value (rules, and @font-face and the like) is
+collected with its position. Data URIs are identified by MIME type and
+decoded payload, so url("data:...%3csvg...") and url('data:...%3Csvg...')
+are one asset; other URLs by their unquoted target.
+
+Each asset gets one action:
+  externalize  a data URI of at least --externalize-bytes is decoded to
+               styles/assets/<name>.<ext>, and every use points at that file
+               (a relative path from the using stylesheet; cacheable, and no
+               longer repeated in every chunk that inlines it)
+  token        an asset used more than once becomes a custom property in
+               base/variables.css (or the one already defined for it in an
+               unconditional top-level :root rule), and every use becomes
+               var(--asset-<name>), when that saves bytes. Uses in at-rule
+               descriptors (@font-face src) keep their url(): browsers do
+               not resolve var() there
+  keep         everything else; relative URLs are never moved into a custom
+               property, since they would then resolve against another file
+
+    python -m cssscan.assets [<styles_dir>] [--externalize-bytes 2048] [--csv <assets.csv>] [--diff <assets.diff>]
+"""
+
+import argparse
+import base64
+import hashlib
+import os
+import re
+import sys
+from collections import defaultdict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+from urllib.parse import unquote_to_bytes
+
+from cssscan.parser import (AtRule, Declaration, Node, Rule, Stylesheet, apply_edits, insert_root_declarations,
+                            parse_stylesheet)
+
+EXTERNALIZE_BYTES = 2048  # data URIs at least this long move to their own file
+TOKEN_PREFIX = "--asset-"
+ASSETS_DIR = "assets"
+MIME_EXTENSIONS = {
+    "image/svg+xml": "svg", "image/png": "png", "image/gif": "gif", "image/jpeg": "jpg", "image/webp": "webp",
+    "image/avif": "avif", "font/woff2": "woff2", "font/woff": "woff", "application/font-woff": "woff",
+    "font/ttf": "ttf", "font/otf": "otf",
+}
+
+_URL_RE = re.compile(r'url\(\s*("(?:[^"\\]|\\.)*"|\'(?:[^\'\\]|\\.)*\'|[^)\s]*)\s*\)', re.IGNORECASE)
+_ESCAPE_RE = re.compile(r'\\(.)', re.DOTALL)
+_SLUG_RE = re.compile(r'[^a-z0-9]+')
+
+
+def url_target(token: str) -> str:
+    """'"data:..."' -> data:... (quotes and CSS string escapes removed)"""
+    if token[:1] in "\"'":
+        token = _ESCAPE_RE.sub(r'\1', token[1:-1])
+    return token.strip()
+
+
+def parse_data_uri(target: str) -> Optional[Tuple[str, bytes]]:
+    """data:[<mime>][;charset=...][;base64],<payload> -> (mime, payload bytes)"""
+    if not target[:5].lower() == "data:" or "," not in target:
+        return None
+    header, payload = target[5:].split(",", 1)
+    params = [p.strip() for p in header.split(";")]
+    mime = params[0].lower() or "text/plain"
+    if any(p.lower() == "base64" for p in params[1:]):
+        try:
+            return mime, base64.b64decode(payload, validate=False)
+        except ValueError:
+            return None
+    return mime, unquote_to_bytes(payload)
+
+
+def url_kind(target: str) -> str:
+    if target[:5].lower() == "data:":
+        return "data"
+    if re.match(r'[a-zA-Z][\w+.-]*:|/', target):
+        return "absolute"  # scheme, protocol-relative or root-relative
+    return "relative"
+
+
+@dataclass
+class AssetUse:
+    path: Path
+    span: Tuple[int, int]  # the url(...) token, source offsets
+    literal: str
+    property: str
+    selector: str
+    line: int
+    descriptor: bool = False  # in an at-rule such as @font-face, where var() does not work
+
+
+@dataclass
+class Asset:
+    key: str
+    kind: str  # data, absolute, relative
+    target: str
+    mime: str = ""
+    payload: bytes = b""
+    uses: List[AssetUse] = field(default_factory=list)
+    tokens: List[str] = field(default_factory=list)  # global custom properties defined as exactly this url()
+
+    @property
+    def literal(self) -> str:
+        return self.uses[0].literal if self.uses else f'url("{self.target}")'
+
+    @property
+    def bytes(self) -> int:
+        return sum(len(u.literal.encode("utf-8")) for u in self.uses)
+
+
+@dataclass
+class AssetPlan:
+    asset: Asset
+    action: str  # externalize, token, keep
+    name: str = ""  # token name or asset file (relative to styles/)
+    new_token: bool = False
+    bytes_saved: int = 0
+    reason: str = ""
+
+
+def _iter_declarations(nodes: List[Node]) -> Iterator[Tuple[Union[Rule, AtRule], Declaration]]:
+    """(rule or at-rule, declaration) for every declaration in the tree"""
+    for node in nodes:
+        if isinstance(node, Rule):
+            for d in node.declarations:
+                yield node, d
+        elif isinstance(node, AtRule):
+            for d in node.declarations or []:
+                yield node, d
+            if node.children:
+                yield from _iter_declarations(node.children)
+
+
+class AssetAnalyzer:
+    """url() uses of a tree, grouped into assets"""
+
+    def __init__(self, externalize_bytes: int = EXTERNALIZE_BYTES, styles_dir: Optional[Path] = None):
+        self.externalize_bytes = externalize_bytes
+        self.styles_dir = Path(styles_dir) if styles_dir is not None else None
+        self.assets: Dict[str, Asset] = {}
+        self.sources: Dict[Path, str] = {}
+        self.definitions: Dict[str, List[Tuple[Optional[str], bool]]] = defaultdict(list)  # (asset key, global)
+
+    @classmethod
+    def build(cls, sources: Dict[Path, str], sheets: Optional[Dict[Path, Stylesheet]] = None,
+              **options) -> "AssetAnalyzer":
+        analyzer = cls(**options)
+        for path, text in sources.items():
+            sheet = sheets[path] if sheets and path in sheets else parse_stylesheet(text, path)
+            analyzer.add(sheet, text)
+        return analyzer
+
+    def _asset(self, target: str) -> Asset:
+        kind = url_kind(target)
+        data = parse_data_uri(target) if kind == "data" else None
+        if data is not None:
+            mime, payload = data
+            key = f"{mime}:{hashlib.sha1(payload).hexdigest()}"
+        else:
+            mime, payload, key = "", b"", target
+        if key not in self.assets:
+            self.assets[key] = Asset(key, kind, target, mime, payload)
+        return self.assets[key]
+
+    def add(self, sheet: Stylesheet, text: str):
+        self.sources[sheet.path] = text
+        for node, d in _iter_declarations(sheet.nodes):
+            rule = isinstance(node, Rule)
+            start, end = d.span
+            source = text[start:end]
+            value_start = start + source.index(":") + 1 if ":" in source else end
+            matches = list(_URL_RE.finditer(text, value_start, end))
+            if d.property.startswith("--"):
+                is_root = rule and not node.context and node.selectors == [":root"]
+                if len(matches) == 1 and matches[0].group(0).strip() == d.value.strip():
+                    # A custom property that is exactly one url() may be the asset's existing token
+                    asset = self._asset(url_target(matches[0].group(1)))
+                    self.definitions[d.property].append((asset.key, is_root))
+                    continue
+                self.definitions[d.property].append((None, is_root))
+            for m in matches:
+                asset = self._asset(url_target(m.group(1)))
+                asset.uses.append(AssetUse(sheet.path, m.span(), m.group(0), d.property,
+                                           node.selector if rule else node.header, node.line, not rule))
+
+    def _collect_tokens(self):
+        """Existing tokens: url() custom properties defined once, in an unconditional top-level :root"""
+        for asset in self.assets.values():
+            asset.tokens = []
+        for name, defs in self.definitions.items():
+            if len(defs) == 1 and defs[0][0] is not None and defs[0][1]:
+                self.assets[defs[0][0]].tokens.append(name)
+
+    def _slug(self, asset: Asset) -> str:
+        """From the first class (or tag) of the first selector using the asset"""
+        selector = asset.uses[0].selector if asset.uses else ""
+        m = re.search(r'\.(-?[A-Za-z_][\w-]*)', selector) or re.search(r'([A-Za-z][\w-]*)', selector)
+        slug = _SLUG_RE.sub("-", (m.group(1) if m else "image").lower()).strip("-")
+        return slug or "image"
+
+    def _unique(self, base: str, taken: set) -> str:
+        name, suffix = base, 2
+        while name in taken:
+            name, suffix = f"{base}-{suffix}", suffix + 1
+        taken.add(name)
+        return name
+
+    def plan(self) -> List[AssetPlan]:
+        """One plan per used asset, largest first"""
+        self._collect_tokens()
+        plans = []
+        names, files = set(self.definitions), set()
+        for asset in sorted(self.assets.values(), key=lambda a: (-a.bytes, a.key)):
+            if not asset.uses:
+                continue
+            plan = AssetPlan(asset, "keep")
+            rule_uses = [u for u in asset.uses if not u.descriptor]
+            size = len(asset.target.encode("utf-8"))
+            if asset.kind == "data" and size >= self.externalize_bytes:
+                ext = MIME_EXTENSIONS.get(asset.mime, "bin")
+                plan.action = "externalize"
+                plan.name = f"{ASSETS_DIR}/{self._unique(self._slug(asset), files)}.{ext}"
+                plan.bytes_saved = sum(len(u.literal) - len(self._file_url(plan.name, u.path)) for u in asset.uses)
+                plan.reason = f"{size:,}-byte data URI"
+            elif asset.kind == "relative":
+                plan.reason = "relative URL" if len(asset.uses) > 1 else "used once"
+            elif len(rule_uses) > 1 or (asset.tokens and rule_uses):
+                token = asset.tokens[0] if asset.tokens else self._unique(TOKEN_PREFIX + self._slug(asset), names)
+                saved = sum(len(u.literal) - len(f"var({token})") for u in rule_uses)
+                if not asset.tokens:
+                    saved -= len(f"  {token}: {asset.literal};\n")
+                if saved > 0:
+                    plan.action, plan.name, plan.new_token = "token", token, not asset.tokens
+                    plan.bytes_saved = saved
+                    plan.reason = f"{len(rule_uses)} uses" + ("" if plan.new_token else ", token exists")
+                else:
+                    plan.reason = "token would not save bytes"
+            else:
+                plan.reason = "used once" if len(asset.uses) < 2 else "at-rule descriptors cannot use var()"
+            plans.append(plan)
+        return plans
+
+    def _file_url(self, name: str, used_in: Path) -> str:
+        """url() of an externalized asset, relative to the stylesheet that uses it"""
+        styles_dir = self._styles_dir()
+        rel = os.path.relpath(styles_dir / name, Path(used_in).parent).replace(os.sep, "/")
+        return f'url("{rel}")'
+
+    def _styles_dir(self) -> Path:
+        """styles/, else the common parent of the scanned stylesheets"""
+        if self.styles_dir is not None:
+            return self.styles_dir
+        paths = [str(Path(p).parent) for p in self.sources] or ["."]
+        return Path(os.path.commonpath(paths))
+
+    def rewrite(self, plans: List[AssetPlan], variables_file: Optional[Path] = None
+                ) -> Tuple[Dict[Path, str], Dict[Path, bytes]]:
+        """(new text of every stylesheet that changes, asset files to write). New tokens
+        go at the end of the top-level :root rule of variables_file; without one among the
+        sources they are not used."""
+        can_define = variables_file is not None and variables_file in self.sources
+        edits: Dict[Path, List[Tuple[int, int, str]]] = defaultdict(list)
+        files: Dict[Path, bytes] = {}
+        for plan in plans:
+            if plan.new_token and not can_define:
+                continue
+            for u in plan.asset.uses:
+                if plan.action == "token" and not u.descriptor:
+                    edits[u.path].append((u.span[0], u.span[1], f"var({plan.name})"))
+                elif plan.action == "externalize":
+                    edits[u.path].append((u.span[0], u.span[1], self._file_url(plan.name, u.path)))
+            if plan.action == "externalize":
+                files[self._styles_dir() / plan.name] = plan.asset.payload
+        changed = {path: apply_edits(self.sources[path], file_edits) for path, file_edits in edits.items()}
+        tokens = "".join(f"  {p.name}: {p.asset.literal};\n" for p in plans if p.new_token)
+        if tokens and can_define:
+            content = changed.get(variables_file, self.sources[variables_file])
+            changed[variables_file] = insert_root_declarations(content, tokens, "Assets (repeated url() values)")
+        return changed, files
+
+    def rows(self, plans: List[AssetPlan]) -> List[Dict]:
+        styles_dir = self._styles_dir()
+        return [{
+            "asset": p.asset.target if len(p.asset.target) <= 80 else p.asset.target[:77] + "...",
+            "kind": p.asset.kind,
+            "mime": p.asset.mime,
+            "literal_bytes": len(p.asset.literal),
+            "uses": len(p.asset.uses),
+            "files": " ".join(sorted({Path(u.path).relative_to(styles_dir).as_posix() for u in p.asset.uses})),
+            "action": p.action,
+            "target": p.name,
+            "bytes_saved": p.bytes_saved,
+            "reason": p.reason,
+        } for p in plans]
+
+    def write_csv(self, path: Path, plans: List[AssetPlan]) -> int:
+        import csv
+
+        rows = self.rows(plans)
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=["asset", "kind", "mime", "literal_bytes", "uses", "files",
+                                                   "action", "target", "bytes_saved", "reason"])
+            writer.writeheader()
+            writer.writerows(rows)
+        return len(rows)
+
+    def summary(self, plans: List[AssetPlan]) -> Dict:
+        return {
+            "assets": len(plans),
+            "url_uses": sum(len(p.asset.uses) for p in plans),
+            "url_bytes": sum(p.asset.bytes for p in plans),
+            "data_uri_bytes": sum(p.asset.bytes for p in plans if p.asset.kind == "data"),
+            "tokens": sum(p.action == "token" for p in plans),
+            "new_tokens": sum(p.new_token for p in plans),
+            "externalized": sum(p.action == "externalize" for p in plans),
+            "bytes_saved": sum(p.bytes_saved for p in plans),
+        }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m cssscan.assets",
+                                     description="Deduplicate url() assets into tokens or asset files")
+    parser.add_argument("styles_dir", nargs="?", default="styles")
+    parser.add_argument("--externalize-bytes", type=int, default=EXTERNALIZE_BYTES,
+                        help=f"data URIs at least this long move to asset files (default: {EXTERNALIZE_BYTES})")
+    parser.add_argument("--csv", help="write the per-asset plan to this CSV")
+    parser.add_argument("--diff", help="write the proposed rewrite to this unified diff")
+    args = parser.parse_args(argv)
+    styles_dir = Path(args.styles_dir)
+    sources = {p: p.read_text(encoding="utf-8", errors="ignore") for p in sorted(styles_dir.rglob("*.css"))}
+    analyzer = AssetAnalyzer.build(sources, externalize_bytes=args.externalize_bytes, styles_dir=styles_dir)
+    plans = analyzer.plan()
+    stats = analyzer.summary(plans)
+
+    print(f"🖼️ {stats['assets']} url() assets in {stats['url_uses']} uses ({stats['url_bytes']:,} bytes, "
+          f"{stats['data_uri_bytes']:,} in data URIs)")
+    for row in analyzer.rows(plans):
+        if row["action"] != "keep":
+            print(f"  {row['action']:<11} {row['target']:<32} {row['uses']} uses  {row['bytes_saved']:+,} bytes  "
+                  f"({row['files']})")
+    print(f"💾 {stats['tokens']} tokens ({stats['new_tokens']} new), {stats['externalized']} externalized: "
+          f"{stats['bytes_saved']:,} bytes saved")
+    if args.csv:
+        count = analyzer.write_csv(Path(args.csv), plans)
+        print(f"\nWritten {count} assets to {args.csv}")
+    if args.diff:
+        import difflib
+
+        changed, files = analyzer.rewrite(plans, styles_dir / "base" / "variables.css")
+        with open(args.diff, "w", encoding="utf-8") as f:
+            for path in sorted(changed):
+                f.writelines(difflib.unified_diff(sources[path].splitlines(True), changed[path].splitlines(True),
+                                                  f"a/{path}", f"b/{path}"))
+        print(f"Written the proposal for {len(changed)} files to {args.diff}"
+              + (f" ({len(files)} asset files not written)" if files else ""))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,153 @@
+"""
+@media / @supports consolidation.
+Groups conditional blocks by their normalized condition, folds a later block
+into an earlier one with the same condition when none of the rules in between
+could be overridden differently, and drops declarations inside a condition
+that are repeated later for the same selector.
+"""
+
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Tuple
+
+from cssscan.canonical import canonicalize_declaration
+from cssscan.merge import Footprint
+from cssscan.parser import AtRule, Comment, Node, Rule, Stylesheet, iter_rules
+from cssscan.selectors import normalize_selector
+
+CONDITIONAL_AT_RULES = {"media", "supports", "container"}
+
+
+@dataclass
+class ConsolidationStats:
+    blocks_before: int = 0
+    blocks_merged: int = 0
+    declarations_deduped: int = 0
+    rules_emptied: int = 0
+    bytes_saved: Dict[str, int] = field(default_factory=dict)
+
+    @property
+    def total_bytes_saved(self) -> int:
+        return sum(self.bytes_saved.values())
+
+
+def condition_key(at_rule: AtRule) -> Tuple[str, str]:
+    """Normalized (name, condition) so '(max-width:768px)' == '( max-width: 768px )'"""
+    prelude = re.sub(r'\s+', ' ', at_rule.prelude.strip().lower())
+    prelude = re.sub(r'\(\s*', '(', prelude)
+    prelude = re.sub(r'\s*\)', ')', prelude)
+    prelude = re.sub(r'\s*:\s*', ': ', prelude)
+    return at_rule.name, prelude
+
+
+def _footprints(node: Node) -> List[Footprint]:
+    if isinstance(node, Rule):
+        return [Footprint.of(node)]
+    if isinstance(node, AtRule) and node.children and not node.name.endswith("keyframes"):
+        return [Footprint.of(r) for r in iter_rules(node.children)]
+    return []
+
+
+def dedupe_declarations(rules: List[Rule]) -> Tuple[int, int]:
+    """Drop declarations that the same selector repeats identically later in the block.
+    The later copy still wins the cascade, so removing the earlier one is safe.
+    Returns (declarations removed, rules left empty and removed)."""
+    seen: Dict[Tuple[str, str, bool], Rule] = {}
+    removed = 0
+    for rule in reversed(rules):
+        selector = normalize_selector(rule.selector)
+        kept = []
+        for decl in reversed(rule.declarations):
+            key = (selector, canonicalize_declaration(decl.text()), decl.important)
+            if key in seen:
+                removed += 1
+                continue
+            seen[key] = rule
+            kept.append(decl)
+        rule.declarations = list(reversed(kept))
+    emptied = sum(1 for r in rules if not r.declarations)
+    return removed, emptied
+
+
+class AtRuleConsolidator:
+    """Consolidates conditional at-rule blocks per file or across a bundle"""
+
+    def __init__(self, sheets: List[Stylesheet], scope: str = "file"):
+        if scope not in ("file", "bundle"):
+            raise ValueError(f"Unknown scope: {scope}")
+        self.sheets = sheets
+        self.scope = scope
+        self.stats = ConsolidationStats()
+
+    def _consolidate(self, sequence: List[Tuple[List[Node], Node]]):
+        """Fold same-condition blocks within one ordered sequence of sibling nodes"""
+        footprints = [_footprints(node) for _, node in sequence]
+        alive = [True] * len(sequence)
+        anchors: Dict[Tuple[str, str], int] = {}
+
+        for j, (_, node) in enumerate(sequence):
+            if not (isinstance(node, AtRule) and node.name in CONDITIONAL_AT_RULES and node.children is not None):
+                continue
+            key = condition_key(node)
+            i = anchors.get(key)
+            if i is None:
+                anchors[key] = j
+                continue
+            moved = footprints[j]
+            blocked = any(
+                alive[k] and any(m.conflicts(o) for m in moved for o in footprints[k])
+                for k in range(i + 1, j)
+            )
+            if blocked:
+                anchors[key] = j
+                continue
+            anchor = sequence[i][1]
+            anchor.children.extend(node.children)
+            footprints[i].extend(moved)
+            alive[j] = False
+            self.stats.blocks_merged += 1
+
+        for j, (parent, node) in enumerate(sequence):
+            if not alive[j]:
+                index = next(k for k, n in enumerate(parent) if n is node)
+                del parent[index]
+
+    def _recurse(self, nodes: List[Node]):
+        """Consolidate blocks nested inside other containers (e.g. @media inside @supports)"""
+        for node in nodes:
+            if isinstance(node, AtRule) and node.children:
+                self._consolidate([(node.children, child) for child in node.children])
+                self._recurse(node.children)
+
+    def _dedupe(self, nodes: List[Node]):
+        for node in nodes:
+            if isinstance(node, AtRule) and node.name in CONDITIONAL_AT_RULES and node.children:
+                rules = [n for n in node.children if isinstance(n, Rule)]
+                removed, emptied = dedupe_declarations(rules)
+                self.stats.declarations_deduped += removed
+                self.stats.rules_emptied += emptied
+                if emptied:
+                    node.children = [n for n in node.children if not (isinstance(n, Rule) and not n.declarations)]
+                self._dedupe(node.children)
+
+    def run(self) -> ConsolidationStats:
+        before = {str(s.path): len(s.text().encode("utf-8")) for s in self.sheets}
+        self.stats.blocks_before = sum(
+            1 for s in self.sheets for a in s.at_rules() if a.name in CONDITIONAL_AT_RULES
+        )
+
+        if self.scope == "bundle":
+            self._consolidate([(s.nodes, n) for s in self.sheets for n in s.nodes
+                               if not isinstance(n, Comment)])
+        else:
+            for sheet in self.sheets:
+                self._consolidate([(sheet.nodes, n) for n in sheet.nodes if not isinstance(n, Comment)])
+        for sheet in self.sheets:
+            self._recurse(sheet.nodes)
+            self._dedupe(sheet.nodes)
+
+        for sheet in self.sheets:
+            saved = before[str(sheet.path)] - len(sheet.text().encode("utf-8"))
+            if saved:
+                self.stats.bytes_saved[str(sheet.path)] = saved
+        return self.stats
@@ -0,0 +1,161 @@
+"""
+Backup manifests and checksum-verified partial restore.
+A manifest records a SHA-256 digest and size for every file in a backup, so
+rolling a tree back only rewrites the files that actually differ, and every
+copy is checked against the manifest before and after it is written.
+
+    python -m cssscan.backup manifest <backup_dir> [<original_dir>]
+    python -m cssscan.backup restore <backup_dir> <target_dir> [--remove-extra]
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import sys
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+MANIFEST_NAME = "backup_manifest.json"
+SKIP_DIRS = {"__pycache__"}
+
+
+def file_digest(path: Path) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+class DigestCache:
+    """file_digest keyed by path, size and mtime, so an unchanged file is hashed once.
+    entries() is plain JSON, so the cache can be saved and handed to a later run."""
+
+    def __init__(self, entries: Optional[Dict[str, Dict]] = None):
+        self._entries: Dict[str, Dict] = dict(entries or {})
+        self.hashed = 0
+
+    def __call__(self, path: Path) -> str:
+        path = Path(path)
+        stat = path.stat()
+        key = str(path.resolve())
+        entry = self._entries.get(key)
+        if entry and entry.get("size") == stat.st_size and entry.get("mtime_ns") == stat.st_mtime_ns:
+            return entry["sha256"]
+        digest = file_digest(path)
+        self.hashed += 1
+        self._entries[key] = {"sha256": digest, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+        return digest
+
+    def entries(self) -> Dict[str, Dict]:
+        return dict(self._entries)
+
+
+def iter_files(root: Path):
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if d not in SKIP_DIRS)
+        for name in sorted(filenames):
+            if name != MANIFEST_NAME:
+                path = Path(dirpath) / name
+                yield path.relative_to(root).as_posix(), path
+
+
+def digest_tree(root: Path) -> Dict[str, Dict]:
+    """rel path -> {"sha256", "size"} for every file under root"""
+    return {rel: {"sha256": file_digest(path), "size": path.stat().st_size}
+            for rel, path in iter_files(Path(root))}
+
+
+def write_manifest(backup_dir: Path, original_dir: Optional[Path] = None) -> Dict:
+    """Write backup_manifest.json with per-file digests of backup_dir"""
+    backup_dir = Path(backup_dir)
+    manifest = {
+        "backup_date": datetime.now().isoformat(),
+        "original_structure": str(original_dir) if original_dir else None,
+        "backup_location": str(backup_dir),
+        "algorithm": "sha256",
+        "files": digest_tree(backup_dir),
+    }
+    with open(backup_dir / MANIFEST_NAME, "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def load_manifest(backup_dir: Path) -> Dict:
+    """The backup's manifest; older manifests without digests get them computed from the backup"""
+    path = Path(backup_dir) / MANIFEST_NAME
+    manifest = {}
+    if path.exists():
+        with open(path) as f:
+            manifest = json.load(f)
+    if "files" not in manifest:
+        manifest["files"] = digest_tree(Path(backup_dir))
+    return manifest
+
+
+@dataclass
+class RestoreResult:
+    restored: List[str] = field(default_factory=list)
+    unchanged: int = 0
+    extra: List[str] = field(default_factory=list)  # in the target but not the backup
+    removed: List[str] = field(default_factory=list)
+    failed: List[str] = field(default_factory=list)  # backup copy or written file failed its digest
+
+    @property
+    def ok(self) -> bool:
+        return not self.failed
+
+
+def restore(backup_dir: Path, target_dir: Path, remove_extra: bool = False,
+            manifest: Optional[Dict] = None) -> RestoreResult:
+    """Make target_dir match the backup, rewriting only files whose digest differs"""
+    backup_dir, target_dir = Path(backup_dir), Path(target_dir)
+    manifest = manifest if manifest is not None else load_manifest(backup_dir)
+    result = RestoreResult()
+
+    for rel, entry in manifest["files"].items():
+        target = target_dir / rel
+        if target.exists() and target.stat().st_size == entry["size"] and file_digest(target) == entry["sha256"]:
+            result.unchanged += 1
+            continue
+        source = backup_dir / rel
+        if not source.exists() or file_digest(source) != entry["sha256"]:
+            result.failed.append(rel)  # the backup itself no longer matches its manifest
+            continue
+        target.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copy2(source, target)
+        if file_digest(target) != entry["sha256"]:
+            result.failed.append(rel)
+        else:
+            result.restored.append(rel)
+
+    for rel, path in iter_files(target_dir):
+        if rel not in manifest["files"]:
+            result.extra.append(rel)
+            if remove_extra:
+                path.unlink()
+                result.removed.append(rel)
+    return result
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = sys.argv[1:] if argv is None else argv
+    if len(args) >= 2 and args[0] == "manifest":
+        manifest = write_manifest(Path(args[1]), Path(args[2]) if len(args) > 2 else None)
+        print(f"✅ Manifest written for {len(manifest['files'])} files in {args[1]}")
+        return 0
+    if len(args) >= 3 and args[0] == "restore":
+        result = restore(Path(args[1]), Path(args[2]), remove_extra="--remove-extra" in args[3:])
+        print(f"🔄 Restored {len(result.restored)} files, {result.unchanged} already matched")
+        for rel in result.extra:
+            print(f"  {'🗑️  removed' if rel in result.removed else '➕ not in backup'}: {rel}")
+        for rel in result.failed:
+            print(f"  ❌ digest mismatch: {rel}")
+        return 0 if result.ok else 1
+    print("Usage: python -m cssscan.backup manifest <backup_dir> [<original_dir>]")
+    print("       python -m cssscan.backup restore <backup_dir> <target_dir> [--remove-extra]")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,315 @@
+"""
+BEM-aware selector trie.
+Class names are read as block__element--modifier (.card, .card__header,
+.card--small, .card__header--active) and every rule is filed in a trie
+under block -> element -> modifier, so "every rule for the card block" is
+two dict lookups and a cached walk of that block's subtree. A rule belongs
+to the classes of its rightmost compound that has any (the subject:
+.card--small .card__body is a card__body rule, .card h3 a card rule), and
+is also filed as context under the classes to their left
+(.filter-step--disabled .filter-step-number is context for filter-step).
+
+The per-block report gives the block's rules and bytes, the files it
+spans, copies of one selector in one context (and repeated bodies), and
+the file the block should live in under the folder priorities of the
+cleanup prompt: its highest-priority file, or a new components/ file when
+the block is only defined in pages/ or features/ files and shared by
+several of them.
+
+    python -m cssscan.bem [<styles_dir>] [--block <name>] [--csv <out.csv>]
+"""
+
+import argparse
+import bisect
+import re
+import sys
+import time
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from cssscan.index import FOLDER_PRIORITY, folder_priority
+from cssscan.merge import body_key, is_keyframes_context
+from cssscan.parser import Rule, Stylesheet, iter_rules, parse_stylesheet
+from cssscan.selectorcost import route_of, split_compounds
+from cssscan.selectors import TOKEN_RE, matching_paren, normalize_selector
+
+SUBJECT = "subject"
+CONTEXT = "context"
+
+_BEM_RE = re.compile(r'(?P<block>[^_]+?)(?:__(?P<element>[^_]+?))?(?:--(?P<modifier>.+))?')
+
+
+class BemName(NamedTuple):
+    block: str
+    element: Optional[str] = None
+    modifier: Optional[str] = None
+
+    def __str__(self) -> str:
+        return self.block + (f"__{self.element}" if self.element else "") + (f"--{self.modifier}" if self.modifier else "")
+
+
+def parse_bem(class_name: str) -> BemName:
+    """'card__header--active' -> BemName('card', 'header', 'active'); other names are blocks"""
+    m = _BEM_RE.fullmatch(class_name.lstrip("."))
+    if not m:
+        return BemName(class_name.lstrip("."))
+    return BemName(m.group("block"), m.group("element"), m.group("modifier"))
+
+
+def compound_classes(compound: str) -> List[str]:
+    """Class names of one compound selector, leaving out those inside :not()/:is()/... arguments"""
+    classes = []
+    pos = 0
+    while True:
+        m = TOKEN_RE.search(compound, pos)
+        if not m:
+            return classes
+        pos = m.end()
+        if m.group("cls"):
+            classes.append(m.group("cls")[1:])
+        elif m.group("pc") and m.group("args"):
+            pos = matching_paren(compound, m.end() - 1) + 1
+
+
+@dataclass
+class BemEntry:
+    selector: str  # one normalized selector out of the rule's selector list
+    path: Path
+    priority: int
+    context: Tuple[str, ...]
+    line: int
+    rule: Rule
+    name: BemName
+    role: str  # subject or context
+
+    @property
+    def bytes(self) -> int:
+        return self.rule.span[1] - self.rule.span[0]
+
+
+class _Node:
+    __slots__ = ("children", "entries", "subtree")
+
+    def __init__(self):
+        self.children: Dict[str, "_Node"] = {}
+        self.entries: List[BemEntry] = []
+        self.subtree: Optional[List[BemEntry]] = None  # cached entries of this node and below
+
+
+class BemTrie:
+    """block -> __element -> --modifier trie of the rules that use each class"""
+
+    def __init__(self, priorities: Dict[str, int] = FOLDER_PRIORITY, styles_dir: Optional[Path] = None):
+        self.priorities = priorities
+        self.styles_dir = styles_dir
+        self.root = _Node()
+        self._blocks: List[str] = []  # sorted, for prefix queries
+
+    @classmethod
+    def build(cls, sheets: Iterable[Stylesheet], **options) -> "BemTrie":
+        trie = cls(**options)
+        for sheet in sheets:
+            trie.add(sheet)
+        return trie
+
+    def _node(self, name: BemName, create: bool = False) -> Optional[_Node]:
+        node = self.root
+        for key in (name.block, f"__{name.element}" if name.element else None,
+                    f"--{name.modifier}" if name.modifier else None):
+            if key is None:
+                continue
+            child = node.children.get(key)
+            if child is None:
+                if not create:
+                    return None
+                child = node.children[key] = _Node()
+                if node is self.root:
+                    bisect.insort(self._blocks, key)
+            node = child
+        return node
+
+    def add(self, sheet: Stylesheet):
+        priority = folder_priority(sheet.path, self.priorities)
+        for rule in iter_rules(sheet.nodes):
+            if is_keyframes_context(rule.context):
+                continue
+            for selector in rule.selectors:
+                selector = normalize_selector(selector)
+                compounds, _ = split_compounds(selector)
+                classes = [compound_classes(c) for c in compounds]
+                subject = max((i for i, names in enumerate(classes) if names), default=None)
+                if subject is None:
+                    continue
+                filed = set()
+                for i, names in enumerate(classes):
+                    role = SUBJECT if i == subject else CONTEXT
+                    for class_name in names:
+                        name = parse_bem(class_name)
+                        if (name, role) in filed or (role == CONTEXT and (name, SUBJECT) in filed):
+                            continue
+                        filed.add((name, role))
+                        node = self._node(name, create=True)
+                        node.entries.append(BemEntry(selector, sheet.path, priority, rule.context, rule.line,
+                                                     rule, name, role))
+        self._invalidate()
+
+    def _invalidate(self):
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            node.subtree = None
+            stack.extend(node.children.values())
+
+    def _subtree(self, node: _Node) -> List[BemEntry]:
+        if node.subtree is None:
+            entries = list(node.entries)
+            for child in node.children.values():
+                entries.extend(self._subtree(child))
+            # A selector that is both subject and context inside this subtree is listed once, as subject
+            subjects = {(id(e.rule), e.selector) for e in entries if e.role == SUBJECT}
+            node.subtree = [e for e in entries if e.role == SUBJECT or (id(e.rule), e.selector) not in subjects]
+        return node.subtree
+
+    def rules(self, block: str, element: Optional[str] = None, modifier: Optional[str] = None,
+              roles: Tuple[str, ...] = (SUBJECT, CONTEXT)) -> List[BemEntry]:
+        """Entries for a block, or one element/modifier of it, and everything below it in the trie"""
+        node = self._node(BemName(block, element, modifier))
+        if node is None:
+            return []
+        entries = self._subtree(node)
+        return entries if len(roles) == 2 else [e for e in entries if e.role in roles]
+
+    def lookup(self, class_name: str, roles: Tuple[str, ...] = (SUBJECT, CONTEXT)) -> List[BemEntry]:
+        """rules('card', 'header') for 'card__header'"""
+        return self.rules(*parse_bem(class_name), roles=roles)
+
+    def blocks(self, prefix: str = "") -> List[str]:
+        start = bisect.bisect_left(self._blocks, prefix)
+        end = bisect.bisect_left(self._blocks, prefix + "\U0010ffff") if prefix else len(self._blocks)
+        return self._blocks[start:end]
+
+    def members(self, block: str) -> List[str]:
+        """Elements and modifiers of a block, as class names"""
+        node = self._node(BemName(block))
+        if node is None:
+            return []
+        names = []
+        for key, child in sorted(node.children.items()):
+            element = key[2:] if key.startswith("__") else None
+            names.append(str(BemName(block, element, None if element else key[2:])))
+            if element:
+                names.extend(str(BemName(block, element, k[2:])) for k in sorted(child.children))
+        return names
+
+    def _relative(self, path: Path) -> str:
+        if self.styles_dir is not None:
+            try:
+                return Path(path).relative_to(self.styles_dir).as_posix()
+            except ValueError:
+                pass
+        return str(path)
+
+    def recommend(self, block: str, entries: List[BemEntry]) -> Tuple[str, str]:
+        """(file, reason) the block's rules belong in under the folder priorities"""
+        size: Counter = Counter()
+        for e in {id(e.rule): e for e in entries}.values():
+            size[e.path] += e.bytes
+        if not size:
+            return "", ""
+        best = min(size, key=lambda p: (folder_priority(p, self.priorities), -size[p], str(p)))
+        best_priority = folder_priority(best, self.priorities)
+        if best_priority >= self.priorities.get("features", best_priority) and len(size) > 1:
+            owners = {route_of(p, self.styles_dir) if folder_priority(p, self.priorities) == self.priorities.get("pages")
+                      else self._relative(p) for p in size}
+            if len(owners) > 1:
+                return f"components/{block}.css", f"shared by {len(owners)} page/feature owners"
+        return self._relative(best), f"highest priority ({best_priority}), most bytes"
+
+    def block_report(self, block: str) -> Dict:
+        subject = self.rules(block, roles=(SUBJECT,))
+        context = self.rules(block, roles=(CONTEXT,))
+        rules = {id(e.rule): e for e in subject}
+        copies: Dict[Tuple[str, Tuple[str, ...]], List[BemEntry]] = defaultdict(list)
+        for e in subject:
+            copies[(e.selector, e.context)].append(e)
+        duplicates = [e for group in copies.values() if len(group) > 1
+                      for e in sorted(group, key=lambda e: e.priority)[1:]]
+        bodies: Dict[Tuple, List[BemEntry]] = defaultdict(list)
+        for e in rules.values():
+            if e.rule.declarations:
+                bodies[(e.context, body_key(e.rule.declarations))].append(e)
+        canonical, reason = self.recommend(block, subject)
+        return {
+            "block": block,
+            "rules": len(rules),
+            "selectors": len({e.selector for e in subject}),
+            "bytes": sum(e.bytes for e in rules.values()),
+            "context_rules": len({id(e.rule) for e in context} - set(rules)),
+            "members": len(self.members(block)),
+            "files": sorted({self._relative(e.path) for e in rules.values()}),
+            "duplicate_rules": len({id(e.rule) for e in duplicates}),
+            "duplicate_bytes": sum({id(e.rule): e.bytes for e in duplicates}.values()),
+            "repeated_bodies": sum(len(group) - 1 for group in bodies.values()),
+            "canonical_file": canonical,
+            "reason": reason,
+        }
+
+    def report(self) -> List[Dict]:
+        rows = [self.block_report(block) for block in self._blocks]
+        rows = [r for r in rows if r["rules"]]
+        rows.sort(key=lambda r: (-r["bytes"], r["block"]))
+        return rows
+
+    def write_csv(self, path: Path, rows: Optional[List[Dict]] = None) -> int:
+        import csv
+
+        rows = self.report() if rows is None else rows
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=["block", "rules", "selectors", "bytes", "context_rules", "members",
+                                                   "files", "duplicate_rules", "duplicate_bytes", "repeated_bodies",
+                                                   "canonical_file", "reason"])
+            writer.writeheader()
+            writer.writerows({**r, "files": " ".join(r["files"])} for r in rows)
+        return len(rows)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m cssscan.bem",
+                                     description="Group selectors by BEM block and report where each belongs")
+    parser.add_argument("styles_dir", nargs="?", default="styles")
+    parser.add_argument("--block", help="list one block's selectors and its canonical file")
+    parser.add_argument("--csv", help="write the per-block report to this CSV")
+    args = parser.parse_args(argv)
+    styles_dir = Path(args.styles_dir)
+    sheets = [parse_stylesheet(p.read_text(encoding="utf-8", errors="ignore"), p)
+              for p in sorted(styles_dir.rglob("*.css"))]
+    trie = BemTrie.build(sheets, styles_dir=styles_dir)
+
+    if args.block:
+        start = time.perf_counter()
+        entries = trie.lookup(args.block)
+        elapsed = (time.perf_counter() - start) * 1000
+        print(f"🌲 {args.block}: {len(entries)} selectors in {elapsed:.3f} ms")
+        for e in entries:
+            print(f"  {'  ' if e.role == SUBJECT else '~ '}{e.selector}  {trie._relative(e.path)}:{e.line}")
+        row = trie.block_report(parse_bem(args.block).block)
+        print(f"\n📦 {row['rules']} rules, {row['bytes']:,} bytes in {len(row['files'])} files; "
+              f"{row['duplicate_rules']} duplicate rules ({row['duplicate_bytes']:,} bytes)")
+        print(f"📁 Canonical file: {row['canonical_file']} ({row['reason']})")
+        return 0
+
+    rows = trie.report()
+    print(f"🌲 {len(rows)} blocks from {len(sheets)} files")
+    for r in rows[:20]:
+        print(f"  {r['block']:<32} {r['rules']:>4} rules {r['bytes']:>8,} bytes  {len(r['files'])} files  "
+              f"{r['duplicate_rules']} dup  -> {r['canonical_file']}")
+    if args.csv:
+        count = trie.write_csv(Path(args.csv), rows)
+        print(f"\nWritten {count} blocks to {args.csv}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
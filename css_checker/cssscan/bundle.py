@@ -0,0 +1,53 @@
+"""
+Bundle order resolution.
+Follows @import chains from an entry stylesheet (styles/main.css) so passes
+that move rules between files know the real cascade order of the bundle.
+"""
+
+import re
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from cssscan.parser import Stylesheet, parse_file
+
+_IMPORT_RE = re.compile(r'^(?:url\(\s*)?["\']?([^"\')\s]+)["\']?\s*\)?')
+
+
+def import_target(prelude: str) -> Optional[str]:
+    """Path of an @import prelude, or None for remote imports"""
+    m = _IMPORT_RE.match(prelude.strip())
+    if not m or re.match(r'^(?:[a-z]+:)?//', m.group(1)):
+        return None
+    return m.group(1)
+
+
+def bundle_order(entry: Path, sheets: Optional[Dict[Path, Stylesheet]] = None,
+                 loader: Callable[[Path], Stylesheet] = parse_file) -> List[Path]:
+    """Files in cascade order, depth-first through @import from entry.
+    Stylesheets not reachable from entry are appended in sorted order."""
+    entry = Path(entry)
+    sheets = sheets if sheets is not None else {}
+    order: List[Path] = []
+    seen = set()
+
+    def visit(path: Path):
+        key = path.resolve()
+        if key in seen or not path.exists():
+            return
+        seen.add(key)
+        sheet = sheets.get(path) or loader(path)
+        sheets[path] = sheet
+        for node in sheet.nodes:
+            if getattr(node, "name", None) == "import":
+                target = import_target(node.prelude)
+                if target:
+                    visit(Path(path.parent, target))
+        order.append(path)
+
+    visit(entry)
+    if entry.parent.exists():
+        for path in sorted(entry.parent.rglob("*.css")):
+            if path.resolve() not in seen:
+                seen.add(path.resolve())
+                order.append(path)
+    return order
@@ -0,0 +1,272 @@
+"""
+Declaration canonicalisation.
+Rewrites property names and values into a single canonical spelling so that
+equivalent declarations (#FFF / #ffffff / white, 0px / 0, spaced and unspaced
+rgba(), quote style, case) hash to the same value.
+"""
+
+import re
+from functools import lru_cache
+from typing import Dict, List, Tuple
+
+from cssscan.shorthand import longhand_atoms
+
+# Length units that can be dropped from a zero value outside calc()-style functions
+LENGTH_UNITS = {
+    "px", "em", "rem", "ex", "ch", "vw", "vh", "vmin", "vmax",
+    "cm", "mm", "q", "in", "pt", "pc",
+}
+
+# Properties where a unitless 0 is not a length: in flex, "1 0" sets flex-shrink, not
+# flex-basis, and the shorthand's default basis differs, so 0px must keep its unit
+ZERO_UNIT_PROPERTIES = {
+    "flex", "flex-basis", "-webkit-flex", "-webkit-flex-basis", "-ms-flex", "-ms-flex-preferred-size",
+}
+
+# Properties whose identifiers are case-sensitive (animation and grid names, counters)
+CASE_SENSITIVE_PROPERTIES = {
+    "animation", "animation-name", "grid-area", "grid-row", "grid-row-start",
+    "grid-row-end", "grid-column", "grid-column-start", "grid-column-end",
+    "grid-template", "grid-template-areas", "grid-template-columns",
+    "grid-template-rows", "counter-reset", "counter-increment", "counter-set",
+    "list-style", "list-style-type", "font-family", "font", "content",
+}
+
+FONT_WEIGHT_KEYWORDS = {"normal": "400", "bold": "700"}
+
+NAMED_COLORS = {
+    "aliceblue": "#f0f8ff", "antiquewhite": "#faebd7", "aqua": "#00ffff",
+    "aquamarine": "#7fffd4", "azure": "#f0ffff", "beige": "#f5f5dc",
+    "bisque": "#ffe4c4", "black": "#000000", "blanchedalmond": "#ffebcd",
+    "blue": "#0000ff", "blueviolet": "#8a2be2", "brown": "#a52a2a",
+    "burlywood": "#deb887", "cadetblue": "#5f9ea0", "chartreuse": "#7fff00",
+    "chocolate": "#d2691e", "coral": "#ff7f50", "cornflowerblue": "#6495ed",
+    "cornsilk": "#fff8dc", "crimson": "#dc143c", "cyan": "#00ffff",
+    "darkblue": "#00008b", "darkcyan": "#008b8b", "darkgoldenrod": "#b8860b",
+    "darkgray": "#a9a9a9", "darkgreen": "#006400", "darkgrey": "#a9a9a9",
+    "darkkhaki": "#bdb76b", "darkmagenta": "#8b008b", "darkolivegreen": "#556b2f",
+    "darkorange": "#ff8c00", "darkorchid": "#9932cc", "darkred": "#8b0000",
+    "darksalmon": "#e9967a", "darkseagreen": "#8fbc8f", "darkslateblue": "#483d8b",
+    "darkslategray": "#2f4f4f", "darkslategrey": "#2f4f4f", "darkturquoise": "#00ced1",
+    "darkviolet": "#9400d3", "deeppink": "#ff1493", "deepskyblue": "#00bfff",
+    "dimgray": "#696969", "dimgrey": "#696969", "dodgerblue": "#1e90ff",
+    "firebrick": "#b22222", "floralwhite": "#fffaf0", "forestgreen": "#228b22",
+    "fuchsia": "#ff00ff", "gainsboro": "#dcdcdc", "ghostwhite": "#f8f8ff",
+    "gold": "#ffd700", "goldenrod": "#daa520", "gray": "#808080",
+    "green": "#008000", "greenyellow": "#adff2f", "grey": "#808080",
+    "honeydew": "#f0fff0", "hotpink": "#ff69b4", "indianred": "#cd5c5c",
+    "indigo": "#4b0082", "ivory": "#fffff0", "khaki": "#f0e68c",
+    "lavender": "#e6e6fa", "lavenderblush": "#fff0f5", "lawngreen": "#7cfc00",
+    "lemonchiffon": "#fffacd", "lightblue": "#add8e6", "lightcoral": "#f08080",
+    "lightcyan": "#e0ffff", "lightgoldenrodyellow": "#fafad2", "lightgray": "#d3d3d3",
+    "lightgreen": "#90ee90", "lightgrey": "#d3d3d3", "lightpink": "#ffb6c1",
+    "lightsalmon": "#ffa07a", "lightseagreen": "#20b2aa", "lightskyblue": "#87cefa",
+    "lightslategray": "#778899", "lightslategrey": "#778899", "lightsteelblue": "#b0c4de",
+    "lightyellow": "#ffffe0", "lime": "#00ff00", "limegreen": "#32cd32",
+    "linen": "#faf0e6", "magenta": "#ff00ff", "maroon": "#800000",
+    "mediumaquamarine": "#66cdaa", "mediumblue": "#0000cd", "mediumorchid": "#ba55d3",
+    "mediumpurple": "#9370db", "mediumseagreen": "#3cb371", "mediumslateblue": "#7b68ee",
+    "mediumspringgreen": "#00fa9a", "mediumturquoise": "#48d1cc",
+    "mediumvioletred": "#c71585", "midnightblue": "#191970", "mintcream": "#f5fffa",
+    "mistyrose": "#ffe4e1", "moccasin": "#ffe4b5", "navajowhite": "#ffdead",
+    "navy": "#000080", "oldlace": "#fdf5e6", "olive": "#808000",
+    "olivedrab": "#6b8e23", "orange": "#ffa500", "orangered": "#ff4500",
+    "orchid": "#da70d6", "palegoldenrod": "#eee8aa", "palegreen": "#98fb98",
+    "paleturquoise": "#afeeee", "palevioletred": "#db7093", "papayawhip": "#ffefd5",
+    "peachpuff": "#ffdab9", "peru": "#cd853f", "pink": "#ffc0cb",
+    "plum": "#dda0dd", "powderblue": "#b0e0e6", "purple": "#800080",
+    "rebeccapurple": "#663399", "red": "#ff0000", "rosybrown": "#bc8f8f",
+    "royalblue": "#4169e1", "saddlebrown": "#8b4513", "salmon": "#fa8072",
+    "sandybrown": "#f4a460", "seagreen": "#2e8b57", "seashell": "#fff5ee",
+    "sienna": "#a0522d", "silver": "#c0c0c0", "skyblue": "#87ceeb",
+    "slateblue": "#6a5acd", "slategray": "#708090", "slategrey": "#708090",
+    "snow": "#fffafa", "springgreen": "#00ff7f", "steelblue": "#4682b4",
+    "tan": "#d2b48c", "teal": "#008080", "thistle": "#d8bfd8",
+    "tomato": "#ff6347", "turquoise": "#40e0d0", "violet": "#ee82ee",
+    "wheat": "#f5deb3", "white": "#ffffff", "whitesmoke": "#f5f5f5",
+    "yellow": "#ffff00", "yellowgreen": "#9acd32",
+}
+
+# Strings and url() tokens are copied through untouched by the other passes
+_OPAQUE_RE = re.compile(r'"(?:[^"\\]|\\.)*"|\'(?:[^\'\\]|\\.)*\'|url\(\s*(?:"(?:[^"\\]|\\.)*"|\'(?:[^\'\\]|\\.)*\'|[^)]*)\s*\)', re.IGNORECASE)
+_IMPORTANT_RE = re.compile(r'\s*!\s*important\s*$', re.IGNORECASE)
+_SPACE_RE = re.compile(r'\s+')
+_PUNCT_SPACE_RE = re.compile(r'\s*([,/])\s*|(\()\s+|\s+(\))')
+_CUSTOM_IDENT_RE = re.compile(r'--[\w-]+')
+_HEX_RE = re.compile(r'#([0-9a-fA-F]{3,8})\b')
+_RGB_RE = re.compile(r'\brgba?\(([^()]*)\)', re.IGNORECASE)
+_NAMED_RE = re.compile(r'(?<![\w#.-])(' + '|'.join(sorted(NAMED_COLORS, key=len, reverse=True)) + r')(?![\w(-])')
+_NUMBER_RE = re.compile(r'(?<![\w#.-])([+-]?)(\d+\.?\d*|\.\d+)([a-z]+|%)?', re.IGNORECASE)
+_MATH_FUNC_RE = re.compile(r'\b(?:calc|min|max|clamp)\(', re.IGNORECASE)
+
+
+def _format_number(sign: str, digits: str) -> str:
+    if "." in digits:
+        whole, frac = digits.split(".", 1)
+        frac = frac.rstrip("0")
+    else:
+        whole, frac = digits, ""
+    whole = whole.lstrip("0")
+    if not whole and not frac:
+        return "0"
+    text = whole + ("." + frac if frac else "")
+    return ("-" if sign == "-" else "") + text
+
+
+def _canonical_alpha(alpha: str) -> str:
+    alpha = alpha.strip()
+    if alpha.endswith("%"):
+        try:
+            alpha = repr(float(alpha[:-1]) / 100)
+        except ValueError:
+            return alpha
+    return _format_number("", alpha) if re.fullmatch(r'\d*\.?\d+', alpha) else alpha
+
+
+def _hex_to_canonical(match: "re.Match") -> str:
+    digits = match.group(1).lower()
+    if len(digits) in (3, 4):
+        digits = "".join(c * 2 for c in digits)
+    if len(digits) == 6:
+        return "#" + digits
+    if len(digits) == 8:
+        if digits[6:] == "ff":
+            return "#" + digits[:6]
+        r, g, b, a = (int(digits[i:i + 2], 16) for i in range(0, 8, 2))
+        return f"rgba({r},{g},{b},{_canonical_alpha(str(round(a / 255, 3)))})"
+    return match.group(0).lower()
+
+
+def _rgb_to_canonical(match: "re.Match") -> str:
+    parts = [p for p in re.split(r'[\s,/]+', match.group(1).strip()) if p]
+    if len(parts) not in (3, 4) or not all(re.fullmatch(r'\d+', p) for p in parts[:3]):
+        return match.group(0)
+    r, g, b = (int(p) for p in parts[:3])
+    if max(r, g, b) > 255:
+        return match.group(0)
+    alpha = _canonical_alpha(parts[3]) if len(parts) == 4 else "1"
+    if alpha == "1":
+        return f"#{r:02x}{g:02x}{b:02x}"
+    return f"rgba({r},{g},{b},{alpha})"
+
+
+def _canonical_segment(segment: str, prop: str, has_math: bool) -> str:
+    """Canonicalise a value fragment that contains no strings or url() tokens"""
+    segment = _PUNCT_SPACE_RE.sub(lambda m: m.group(1) or m.group(2) or m.group(3), segment)
+
+    if prop not in CASE_SENSITIVE_PROPERTIES:
+        # Lowercase everything except custom property names inside var()
+        pieces = []
+        last = 0
+        for m in _CUSTOM_IDENT_RE.finditer(segment):
+            pieces.append(segment[last:m.start()].lower())
+            pieces.append(m.group(0))
+            last = m.end()
+        pieces.append(segment[last:].lower())
+        segment = "".join(pieces)
+        segment = _NAMED_RE.sub(lambda m: NAMED_COLORS[m.group(1)], segment)
+
+    segment = _HEX_RE.sub(_hex_to_canonical, segment)
+    segment = _RGB_RE.sub(_rgb_to_canonical, segment)
+
+    def number(m: "re.Match") -> str:
+        text = _format_number(m.group(1), m.group(2))
+        unit = (m.group(3) or "").lower()
+        if text == "0" and unit in LENGTH_UNITS and not has_math and prop not in ZERO_UNIT_PROPERTIES:
+            return "0"
+        return text + unit
+
+    return _NUMBER_RE.sub(number, segment)
+
+
+def _canonical_opaque(token: str) -> str:
+    """Normalise quoting of a string or url() token"""
+    if token[:4].lower() == "url(":
+        inner = token[4:-1].strip()
+        if len(inner) >= 2 and inner[0] == inner[-1] and inner[0] in "'\"":
+            inner = inner[1:-1]
+        if '"' in inner:
+            return token
+        return f'url("{inner}")'
+    if token[0] == "'" and '"' not in token and "\\" not in token:
+        return '"' + token[1:-1] + '"'
+    return token
+
+
+@lru_cache(maxsize=None)
+def canonicalize_property(name: str) -> str:
+    """Return the canonical spelling of a property name"""
+    name = name.strip()
+    return name if name.startswith("--") else name.lower()
+
+
+@lru_cache(maxsize=None)
+def canonicalize_value(prop: str, value: str) -> str:
+    """Return the canonical spelling of a value for the (canonical) property prop"""
+    important = bool(_IMPORTANT_RE.search(value))
+    value = _IMPORTANT_RE.sub("", value).strip()
+
+    if prop.startswith("--"):
+        # Custom property values are raw token streams; only collapse whitespace
+        value = _SPACE_RE.sub(" ", value)
+    else:
+        has_math = bool(_MATH_FUNC_RE.search(value))
+        out = []
+        last = 0
+        for m in _OPAQUE_RE.finditer(value):
+            out.append(_canonical_segment(_SPACE_RE.sub(" ", value[last:m.start()]), prop, has_math))
+            out.append(_canonical_opaque(m.group(0)))
+            last = m.end()
+        out.append(_canonical_segment(_SPACE_RE.sub(" ", value[last:]), prop, has_math))
+        value = "".join(out).strip()
+
+        if prop == "font-weight":
+            value = FONT_WEIGHT_KEYWORDS.get(value, value)
+
+    return value + (" !important" if important else "")
+
+
+@lru_cache(maxsize=None)
+def canonicalize_declaration(declaration: str) -> str:
+    """Return 'property: value' in canonical form for a single raw declaration"""
+    if ":" not in declaration:
+        return _SPACE_RE.sub(" ", declaration.strip())
+    prop, value = declaration.split(":", 1)
+    prop = canonicalize_property(prop)
+    return f"{prop}: {canonicalize_value(prop, value)}"
+
+
+def canonicalize_declarations(declarations: List[str]) -> List[str]:
+    """Canonicalise a list of declarations and order them by property name.
+    Declarations that set a common longhand (margin-top and margin, or a repeated
+    property) keep their source order, which decides the cascade: they are ordered
+    as one run, by its first property name."""
+    canonical = [canonicalize_declaration(d) for d in declarations]
+    props = [d.split(":", 1)[0] for d in canonical]
+    atoms = [longhand_atoms(p) for p in props]
+    run = list(range(len(canonical)))  # union-find over overlapping declarations
+
+    def find(i: int) -> int:
+        while run[i] != i:
+            run[i] = run[run[i]]
+            i = run[i]
+        return i
+
+    for j in range(len(canonical)):
+        for i in range(j):
+            if atoms[i] & atoms[j]:
+                run[find(j)] = find(i)
+    runs: Dict[int, List[int]] = {}
+    for i in range(len(canonical)):
+        runs.setdefault(find(i), []).append(i)
+    ordered = sorted(runs.values(), key=lambda members: min(props[i] for i in members))
+    return [canonical[i] for members in ordered for i in members]
+
+
+def cache_stats() -> Dict[str, Tuple[int, int]]:
+    """Return (hits, misses) for each memoised canonicaliser"""
+    stats = {}
+    for fn in (canonicalize_property, canonicalize_value, canonicalize_declaration):
+        info = fn.cache_info()
+        stats[fn.__name__] = (info.hits, info.misses)
+    return stats
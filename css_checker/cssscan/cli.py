@@ -0,0 +1,481 @@
+"""
+One command line for the css_checker passes.
+Every stage runs off the same parsed Model, so a chain such as
+
+    python -m cssscan scan+cleanup+report
+
+reads and parses the tree once; stages that change text (cleanup,
+consolidate) re-parse only the files they changed. Nothing is written back
+to styles/ unless --write is given.
+"""
+
+import argparse
+import json
+import sys
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Union
+
+from cssscan.api import Model, scan
+
+STAGE_ORDER = ["scan", "selectors", "bem", "selector-cost", "dead-rules", "near-dup", "shared-groups", "savings", "cleanup", "consolidate", "palette", "assets", "emit", "report"]
+
+
+@dataclass
+class Session:
+    project_root: Path
+    entry: Path
+    out_dir: Path
+    write: bool = False
+    threshold: float = 0.9
+    atrule_scope: str = "file"
+    split: str = "routes"
+    delta_e: float = 0.03
+    externalize_bytes: int = 2048
+    snapshots: List[Path] = field(default_factory=list)
+    files: Dict[Path, bytes] = field(default_factory=dict)  # non-CSS files created by earlier stages
+    model: Optional[Model] = None
+    results: Dict[str, Dict] = field(default_factory=dict)
+
+    @property
+    def styles_dir(self) -> Path:
+        return self.project_root / "styles"
+
+    def ensure_model(self) -> Model:
+        if self.model is None:
+            start = time.perf_counter()
+            self.model = scan([self.styles_dir])
+            print(f"Parsed {len(self.model.sheets)} stylesheets in {time.perf_counter() - start:.2f}s")
+        return self.model
+
+    def save(self, path: Path, text: Union[str, bytes]):
+        """Write a changed stylesheet (or a new asset file) to styles/ (--write) or under the output directory"""
+        if not self.write:
+            path = self.out_dir / "styles" / path.relative_to(self.styles_dir)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if isinstance(text, bytes):
+            path.write_bytes(text)
+        else:
+            path.write_text(text, encoding="utf-8")
+
+
+def stage_scan(session: Session):
+    model = session.ensure_model()
+    groups = model.duplicate_groups()
+    rules = sum(1 for _ in model.rules())
+    session.results["scan"] = {
+        "files": len(model.sheets),
+        "rules": rules,
+        "duplicate_groups": len(groups),
+        "duplicate_rules": sum(len(g) for g in groups),
+    }
+    print(f"Scan: {rules} rules in {len(model.sheets)} files, {len(groups)} exact duplicate groups")
+
+
+def stage_selectors(session: Session):
+    from cssscan.index import SelectorIndex
+
+    model = session.ensure_model()
+    index = SelectorIndex.build(model.sheets.values())
+    rows = index.report()
+    session.out_dir.mkdir(parents=True, exist_ok=True)
+    out = session.out_dir / "duplicate-selectors.csv"
+    index.write_report(out, rows)
+    groups = sum(1 for r in rows if r["relation"] == "canonical")
+    session.results["selectors"] = {
+        "selectors": len(index),
+        "duplicated_selectors": groups,
+        "removable_definitions": sum(1 for r in rows if r["action"] == "remove"),
+    }
+    print(f"Selectors: {len(index)} indexed, {groups} defined more than once in a context ({out})")
+
+
+def stage_bem(session: Session):
+    from cssscan.bem import BemTrie
+
+    model = session.ensure_model()
+    trie = BemTrie.build(model.sheets.values(), styles_dir=session.styles_dir)
+    rows = trie.report()
+    session.out_dir.mkdir(parents=True, exist_ok=True)
+    out = session.out_dir / "bem-blocks.csv"
+    trie.write_csv(out, rows)
+    scattered = [r for r in rows if len(r["files"]) > 1]
+    session.results["bem"] = {
+        "blocks": len(rows),
+        "scattered_blocks": len(scattered),
+        "duplicate_rules": sum(r["duplicate_rules"] for r in rows),
+        "duplicate_bytes": sum(r["duplicate_bytes"] for r in rows),
+    }
+    print(f"BEM: {len(rows)} blocks, {len(scattered)} spread over several files ({out})")
+
+
+def stage_selector_cost(session: Session):
+    from cssscan.selectorcost import SelectorProfiler
+
+    model = session.ensure_model()
+    profiler = SelectorProfiler.build(model.sheets.values(), session.styles_dir)
+    session.out_dir.mkdir(parents=True, exist_ok=True)
+    out = session.out_dir / "selector-cost.csv"
+    profiler.write_csv(out)
+    routes = profiler.by_route()
+    session.results["selector-cost"] = {
+        "selectors": len(profiler.costs),
+        "routes": routes,
+        "files": profiler.by_file(),
+    }
+    print(f"Selector cost: {len(profiler.costs)} selectors, "
+          f"{sum(1 for c in profiler.costs if c.flags)} flagged ({out})")
+    for row in routes[:5]:
+        print(f"  {row['route']:<20} {row['total_score']:>8} total, {row['score']} own")
+
+
+def stage_dead_rules(session: Session):
+    from cssscan.htmlmatch import DeadRuleFinder, load_snapshots
+    from cssscan.merge import is_keyframes_context
+
+    model = session.ensure_model()
+    documents = load_snapshots(session.snapshots)
+    finder = DeadRuleFinder(documents, session.styles_dir)
+    rows = finder.find(model.sheets.values())
+    rules = sum(1 for _, rule in model.rules() if not is_keyframes_context(rule.context))
+    stats = finder.summary(rows, rules)
+    session.out_dir.mkdir(parents=True, exist_ok=True)
+    out = session.out_dir / "dead-rules.csv"
+    finder.write_csv(out, rows)
+    session.results["dead-rules"] = {
+        **stats,
+        "snapshots": [d.name for d in documents],
+        "elements": sum(len(d.elements) for d in documents),
+    }
+    print(f"Dead rules: {stats['dead_rules']} of {rules} rules match nothing in {len(documents)} snapshots "
+          f"({stats['dead_bytes']:,} bytes), {stats['partial_rules']} with dead selectors ({out})")
+
+
+def stage_near_dup(session: Session):
+    import csv
+
+    from cssscan.neardup import INDEX_NAME, NearDupIndex, rule_entries
+
+    model = session.ensure_model()
+    # The similarity index persists in the output directory; only changed files are re-compared
+    session.out_dir.mkdir(parents=True, exist_ok=True)
+    index_path = session.out_dir / INDEX_NAME
+    index, _ = NearDupIndex.load(index_path, session.threshold)
+    paths = {path.relative_to(session.styles_dir).as_posix(): path for path in model.sheets}
+    stats = index.sync({rel: model.digest(path) for rel, path in paths.items()},
+                       lambda rel: rule_entries(rel, model.sheets[paths[rel]]))
+    index.save(index_path)
+    clusters = index.clusters()
+    out = session.out_dir / "near-duplicate-clusters.csv"
+    with open(out, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=["cluster", "rules", "medoid", "selector", "file", "similarity",
+                                               "core_declarations", "extra_declarations"])
+        writer.writeheader()
+        for number, cluster in enumerate(clusters, 1):
+            writer.writerows(cluster.rows(number))
+    session.results["near-dup"] = {
+        "threshold": session.threshold,
+        "index": stats,
+        "clusters": [{
+            "rules": len(c.members),
+            "medoid": f"{c.medoid['file']}: {c.medoid['selector']}",
+            "core": c.core,
+        } for c in clusters],
+    }
+    print(f"Near-duplicates: {len(clusters)} clusters covering {sum(len(c.members) for c in clusters)} rules "
+          f"at or above {session.threshold} ({out}); {stats['files_changed']} files re-indexed, "
+          f"{stats['comparisons']} comparisons")
+
+
+def stage_shared_groups(session: Session):
+    from cssscan.itemsets import DeclarationGroupMiner
+
+    model = session.ensure_model()
+    groups = DeclarationGroupMiner.build(model.sheets.values()).mine()
+    session.out_dir.mkdir(parents=True, exist_ok=True)
+    out = session.out_dir / "shared-declaration-groups.csv"
+    DeclarationGroupMiner.write_csv(out, groups)
+    selected = [g for g in groups if g.selected]
+    session.results["shared-groups"] = {
+        "candidates": len(groups),
+        "selected": len(selected),
+        "selected_net_bytes": sum(g.net_bytes for g in selected),
+        "top": [g.row(rank) for rank, g in enumerate(groups[:20], 1)],
+    }
+    print(f"Shared groups: {len(groups)} candidates, {len(selected)} non-overlapping ones save "
+          f"{sum(g.net_bytes for g in selected):,} bytes as selector lists ({out})")
+
+
+def stage_savings(session: Session):
+    import csv
+
+    from cssscan.compress import bundle_sizes, primary_codec, rank_candidates
+    from phase1 import CSSCleanupTool
+
+    model = session.ensure_model()
+    order = [p for p in model.bundle_order(session.entry) if p in model.sources]
+    sources = [(p, model.sources[p]) for p in order]
+    tool = CSSCleanupTool(str(session.project_root))
+    variables = {**tool.variables_to_extract, **tool.colors_to_consolidate}
+    rows = rank_candidates(sources, model.duplicate_groups(), variables)
+
+    session.out_dir.mkdir(parents=True, exist_ok=True)
+    out = session.out_dir / "savings.csv"
+    with open(out, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]) if rows else ["kind"])
+        writer.writeheader()
+        writer.writerows(rows)
+    codec = primary_codec()
+    sizes = bundle_sizes(text for _, text in sources)
+    session.results["savings"] = {"bundle": sizes, "ranked_by": codec, "top": rows[:20]}
+    print(f"Savings: bundle {sizes['raw']:,} bytes raw, {sizes[codec]:,} {codec}; "
+          f"{len(rows)} candidates ranked by {codec} saving ({out})")
+    for row in rows[:5]:
+        print(f"  {row[codec]:>5} {codec} / {row['raw']:>5} raw  {row['kind']}: {row['candidate']}")
+
+
+def stage_cleanup(session: Session):
+    from cssscan.api import apply_plan, plan_cleanup
+
+    model = session.ensure_model()
+    plan, diff = plan_cleanup(session.project_root, model=model)
+    if session.write:
+        written = apply_plan(session.project_root, plan)
+    else:
+        written = False
+        for rel, entry in plan["files"].items():
+            session.save(session.project_root / rel, entry["content"])
+        if plan["files"]:
+            session.out_dir.mkdir(parents=True, exist_ok=True)
+            (session.out_dir / "cleanup_plan.diff").write_text(diff, encoding="utf-8")
+            print(f"Cleanup diff written to {session.out_dir / 'cleanup_plan.diff'}")
+    if written or not session.write:
+        # A refused (stale) plan leaves the files, and so the model, as they were
+        for rel, entry in plan["files"].items():
+            path = session.project_root / rel
+            if path in model.sheets or path.suffix == ".css":
+                # files the plan creates (base/variables.css) join the model for later stages
+                model.update(path, entry["content"])
+    session.results["cleanup"] = {
+        "files_changed": sorted(plan["files"]),
+        "phase_byte_deltas": plan["phase_byte_deltas"],
+        "total_byte_delta": plan["total_byte_delta"],
+        "written": written,
+    }
+
+
+def stage_consolidate(session: Session):
+    from cssscan.atrules import AtRuleConsolidator
+    from cssscan.merge import SelectorListMerger
+    from cssscan.parser import TreeEdits
+
+    model = session.ensure_model()
+    paths = [p for p in model.bundle_order(session.entry) if p in model.sources]
+    sheets = [model.sheets[p] for p in paths]
+    before = {p: model.sources[p] for p in paths}
+    recorder = TreeEdits(sheets, before)
+    stats = AtRuleConsolidator(sheets, scope=session.atrule_scope).run()
+    merges = SelectorListMerger(sheets).merge()
+
+    # Only the changed spans are rewritten; comments and formatting elsewhere stay as written
+    rewritten = recorder.rewrite(sheets)
+    changed = [p for p in paths if p in rewritten]
+    for path in changed:
+        model.update(path, rewritten[path])
+        session.save(path, rewritten[path])
+    saved = sum(len(before[p].encode("utf-8")) - len(model.sources[p].encode("utf-8")) for p in changed)
+    session.results["consolidate"] = {
+        "atrule_scope": session.atrule_scope,
+        "atrule_blocks_merged": stats.blocks_merged,
+        "declarations_deduped": stats.declarations_deduped,
+        "selector_merges": [vars(m) for m in merges],
+        "files_changed": [str(p) for p in changed],
+        "bytes_saved": saved,
+        "written": session.write,
+    }
+    print(f"Consolidate: {stats.blocks_merged} at-rule blocks folded, {len(merges)} selector merges, "
+          f"{saved} bytes saved in {len(changed)} files")
+
+
+def stage_palette(session: Session):
+    from cssscan.palette import ColorAnalyzer
+    from phase1 import CSSCleanupTool
+
+    model = session.ensure_model()
+    tool = CSSCleanupTool(str(session.project_root))
+    analyzer = ColorAnalyzer.build(model.sources, model.sheets, threshold=session.delta_e,
+                                   preferred=tool.colors_to_consolidate)
+    clusters = analyzer.cluster()
+    session.out_dir.mkdir(parents=True, exist_ok=True)
+    out = session.out_dir / "color-palette.csv"
+    analyzer.write_csv(out, clusters)
+    changed = analyzer.rewrite(clusters, session.styles_dir / "base" / "variables.css")
+    for path, text in changed.items():
+        model.update(path, text)
+        session.save(path, text)
+    stats = analyzer.summary(clusters)
+    session.results["palette"] = {
+        **stats,
+        "new_tokens": {c.token: c.value for c in clusters if c.new_token},
+        "files_changed": sorted(str(p) for p in changed),
+        "written": session.write,
+    }
+    print(f"Palette: {stats['clusters']} tokens ({sum(c.new_token for c in clusters)} new) absorb "
+          f"{stats['colours_merged']} near-identical colours, {stats['distinct_literals']} -> "
+          f"{stats['distinct_literals_as_tokens']} distinct literals, {stats['bytes_saved_as_tokens']:+,} bytes ({out})")
+
+
+def stage_assets(session: Session):
+    from cssscan.assets import AssetAnalyzer
+
+    model = session.ensure_model()
+    analyzer = AssetAnalyzer.build(model.sources, model.sheets, externalize_bytes=session.externalize_bytes,
+                                   styles_dir=session.styles_dir)
+    plans = analyzer.plan()
+    session.out_dir.mkdir(parents=True, exist_ok=True)
+    out = session.out_dir / "assets.csv"
+    analyzer.write_csv(out, plans)
+    changed, files = analyzer.rewrite(plans, session.styles_dir / "base" / "variables.css")
+    for path, text in changed.items():
+        model.update(path, text)
+        session.save(path, text)
+    for path, data in files.items():
+        session.files[path] = data
+        session.save(path, data)
+    stats = analyzer.summary(plans)
+    session.results["assets"] = {
+        **stats,
+        "assets_saved": analyzer.rows([p for p in plans if p.action != "keep"]),
+        "files_changed": sorted(str(p) for p in changed),
+        "asset_files": sorted(str(p) for p in files),
+        "written": session.write,
+    }
+    print(f"Assets: {stats['assets']} url() assets in {stats['url_uses']} uses, {stats['tokens']} tokenized and "
+          f"{stats['externalized']} externalized, {stats['bytes_saved']:+,} bytes ({out})")
+
+
+def stage_emit(session: Session):
+    from cssscan.emit import BundleEmitter
+
+    model = session.ensure_model()
+    # Chunks are built from the model, so they include any cleanup/consolidate changes above
+    emitter = BundleEmitter(session.styles_dir, session.out_dir / "dist", session.entry, session.split,
+                            sheets=model.sheets, sources=model.sources, digest=model.digest, files=session.files)
+    manifest = emitter.emit()
+    chunks = emitter.emitted
+    session.results["emit"] = {
+        "split": session.split,
+        "chunks": {name: {k: v for k, v in chunk.items() if k != "sources"}
+                   for name, chunk in manifest["chunks"].items()},
+        "written": [c.file_name for c in chunks if not c.reused],
+        "kept_shared": manifest["kept_shared"],
+    }
+    print(f"Emit: {len(chunks)} chunks ({session.split}), {sum(not c.reused for c in chunks)} written, "
+          f"{sum(c.reused for c in chunks)} unchanged ({emitter.out_dir})")
+    for kept in manifest["kept_shared"]:
+        print(f"  {kept['file']} kept in the shared chunk: {kept['selector']} would override {kept['later_rule']}")
+
+
+def stage_report(session: Session):
+    from cssscan.refgraph import ReferenceGraph
+
+    model = session.ensure_model()
+    if "scan" not in session.results:
+        stage_scan(session)
+    report = {
+        "generated": datetime.now().isoformat(),
+        "project_root": str(session.project_root),
+        "stages": session.results,
+        "reference_graph": ReferenceGraph.build(model.sheets.values()).report(),
+        "duplicate_groups": [
+            [f"{path}: {rule.selector}" for path, rule in group] for group in model.duplicate_groups()
+        ],
+    }
+    session.out_dir.mkdir(parents=True, exist_ok=True)
+    out = session.out_dir / "css_report.json"
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2, default=str)
+    print(f"Report written to {out}")
+
+
+STAGES: Dict[str, Callable[[Session], None]] = {
+    "scan": stage_scan,
+    "selectors": stage_selectors,
+    "bem": stage_bem,
+    "selector-cost": stage_selector_cost,
+    "dead-rules": stage_dead_rules,
+    "near-dup": stage_near_dup,
+    "shared-groups": stage_shared_groups,
+    "savings": stage_savings,
+    "cleanup": stage_cleanup,
+    "consolidate": stage_consolidate,
+    "palette": stage_palette,
+    "assets": stage_assets,
+    "emit": stage_emit,
+    "report": stage_report,
+}
+
+
+def parse_stages(specs: List[str]) -> List[str]:
+    """'scan+cleanup' 'report' -> ['scan', 'cleanup', 'report']"""
+    stages = [name for spec in specs for name in spec.split("+") if name]
+    unknown = [name for name in stages if name not in STAGES]
+    if unknown:
+        raise ValueError(f"Unknown stage(s): {', '.join(unknown)} (choose from {', '.join(STAGE_ORDER)})")
+    return stages
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m cssscan",
+                                     description="Run css_checker stages off one shared parse")
+    parser.add_argument("stages", nargs="+", help="stage or '+'-chain of: " + ", ".join(STAGE_ORDER))
+    parser.add_argument("--root", default=".", help="project root containing styles/ (default: .)")
+    parser.add_argument("--entry", help="bundle entry stylesheet (default: <root>/styles/main.css)")
+    parser.add_argument("--out", default="css_checker_out", help="directory for reports and rewritten files")
+    parser.add_argument("--write", action="store_true", help="write cleanup/consolidation results into styles/")
+    parser.add_argument("--threshold", type=float, default=0.9, help="near-duplicate similarity threshold")
+    parser.add_argument("--atrule-scope", choices=["file", "bundle"], default="file")
+    parser.add_argument("--delta-e", type=float, default=0.03, help="palette: OKLab distance to merge colours")
+    parser.add_argument("--externalize-bytes", type=int, default=2048,
+                        help="assets: data URIs at least this long move to styles/assets/")
+    parser.add_argument("--split", choices=["routes", "bundle"], default="routes",
+                        help="emit one bundle or a shared chunk plus one chunk per route")
+    parser.add_argument("--snapshots", action="append", default=[], metavar="PATH",
+                        help="dead-rules: saved HTML page (or folder of them); repeatable")
+    args = parser.parse_args(argv)
+
+    try:
+        stages = parse_stages(args.stages)
+    except ValueError as e:
+        parser.error(str(e))
+    if "dead-rules" in stages and not args.snapshots:
+        parser.error("the dead-rules stage needs at least one --snapshots path")
+
+    root = Path(args.root)
+    session = Session(
+        project_root=root,
+        entry=Path(args.entry) if args.entry else root / "styles" / "main.css",
+        out_dir=Path(args.out),
+        write=args.write,
+        threshold=args.threshold,
+        atrule_scope=args.atrule_scope,
+        split=args.split,
+        delta_e=args.delta_e,
+        externalize_bytes=args.externalize_bytes,
+        snapshots=[Path(p) for p in args.snapshots],
+    )
+    if not session.styles_dir.exists():
+        print(f"❌ No styles/ folder under '{root}'")
+        return 1
+
+    for name in stages:
+        start = time.perf_counter()
+        STAGES[name](session)
+        print(f"  [{name}] {time.perf_counter() - start:.2f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,288 @@
+"""
+Compressed-size savings model.
+CSS ships gzip- or brotli-compressed, and a repeated rule body costs far
+fewer bytes on the wire than on disk. This module measures bundle sizes with
+zlib (and brotli when the package is installed) and estimates the marginal
+compressed saving of removing or rewriting pieces of the bundle.
+
+The estimator never recompresses the whole bundle per candidate: a piece is
+compressed against the window of text before it (deflate's 32 KB history,
+passed as a preset dictionary) together with the window of text after it,
+once with and once without the piece. Edits only change the
+compressed stream locally, so the difference tracks the real saving closely
+at a fraction of the cost.
+"""
+
+import re
+import zlib
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from cssscan.parser import Rule
+
+try:
+    import brotli
+except ImportError:  # optional; gzip figures are always available
+    brotli = None
+
+DEFLATE_WINDOW = 32 * 1024
+LOOKAHEAD = DEFLATE_WINDOW  # later text can refer back a full window; shorter is faster but rougher
+
+Span = Tuple[int, int]
+
+_DEFINITION_RE = re.compile(r'\s*--[\w-]+\s*:\s*')
+
+
+class GzipCodec:
+    name = "gzip"
+
+    def __init__(self, level: int = 9):
+        self.level = level
+
+    def size(self, data: bytes) -> int:
+        c = zlib.compressobj(self.level, zlib.DEFLATED, 31)  # gzip container, as served
+        return len(c.compress(data) + c.flush())
+
+    def compressor(self):
+        """Incremental compressor (compress(data), flush()) giving the same bytes as size()"""
+        return zlib.compressobj(self.level, zlib.DEFLATED, 31)
+
+    def size_in_context(self, context: bytes, data: bytes) -> int:
+        """Compressed bytes data adds after context (raw deflate with context as history)"""
+        if not data:
+            return 0
+        kwargs = {"zdict": context[-DEFLATE_WINDOW:]} if context else {}
+        c = zlib.compressobj(self.level, zlib.DEFLATED, -15, **kwargs)
+        return len(c.compress(data) + c.flush())
+
+
+class BrotliCodec:
+    name = "brotli"
+    context_bytes = 16 * 1024  # brotli has no preset dictionary here, so context is compressed too
+
+    def __init__(self, quality: int = 11):
+        self.quality = quality
+
+    def size(self, data: bytes) -> int:
+        return len(brotli.compress(data, quality=self.quality))
+
+    def compressor(self):
+        return _BrotliStream(brotli.Compressor(quality=self.quality))
+
+    def size_in_context(self, context: bytes, data: bytes) -> int:
+        if not data:
+            return 0
+        context = context[-self.context_bytes:]
+        return self.size(context + data) - self.size(context)
+
+
+class _BrotliStream:
+    def __init__(self, compressor):
+        self.compressor = compressor
+
+    def compress(self, data: bytes) -> bytes:
+        return self.compressor.process(data)
+
+    def flush(self) -> bytes:
+        return self.compressor.finish()
+
+
+def available_codecs() -> List:
+    codecs = [GzipCodec()]
+    if brotli is not None:
+        codecs.append(BrotliCodec())
+    return codecs
+
+
+def bundle_sizes(texts: Iterable[str]) -> Dict[str, int]:
+    """Raw and compressed size of texts concatenated as one bundle"""
+    data = "\n".join(texts).encode("utf-8")
+    sizes = {"raw": len(data)}
+    for codec in available_codecs():
+        sizes[codec.name] = codec.size(data)
+    return sizes
+
+
+def stream_sizes(pieces: Iterable[str]) -> Dict[str, int]:
+    """bundle_sizes of the concatenated pieces, compressed as they come, so the bundle is
+    never held whole. Pieces are joined as given (no newline is added between them)."""
+    codecs = available_codecs()
+    compressors = [codec.compressor() for codec in codecs]
+    sizes = dict.fromkeys(["raw"] + [codec.name for codec in codecs], 0)
+    for piece in pieces:
+        data = piece.encode("utf-8")
+        sizes["raw"] += len(data)
+        for codec, c in zip(codecs, compressors):
+            sizes[codec.name] += len(c.compress(data))
+    for codec, c in zip(codecs, compressors):
+        sizes[codec.name] += len(c.flush())
+    return sizes
+
+
+@dataclass
+class Bundle:
+    """Source files concatenated in cascade order, with per-file offsets"""
+    text: str
+    offsets: Dict[Path, int] = field(default_factory=dict)
+
+    @classmethod
+    def of(cls, sources: Sequence[Tuple[Path, str]]) -> "Bundle":
+        parts = []
+        offsets = {}
+        pos = 0
+        for path, text in sources:
+            offsets[path] = pos
+            parts.append(text)
+            pos += len(text) + 1
+        return cls("\n".join(parts), offsets)
+
+    def span(self, path: Path, span: Span) -> Span:
+        base = self.offsets[path]
+        return base + span[0], base + span[1]
+
+
+class SavingsEstimator:
+    """Marginal compressed savings of edits to one bundle, memoised per region"""
+
+    def __init__(self, text: str, codecs: Optional[List] = None, lookahead: int = LOOKAHEAD):
+        self.text = text
+        self.codecs = codecs if codecs is not None else available_codecs()
+        self.lookahead = lookahead
+        self._cache: Dict[Tuple[Tuple[int, int, str], ...], Dict[str, int]] = {}
+
+    def _region(self, edits: Tuple[Tuple[int, int, str], ...]) -> Dict[str, int]:
+        """Saving of nearby edits applied together, compressed against the text before them"""
+        if edits not in self._cache:
+            text = self.text
+            start, end = edits[0][0], edits[-1][1]
+            context = text[max(0, start - DEFLATE_WINDOW):start].encode("utf-8")
+            after = text[end:end + self.lookahead]
+            parts, last = [], start
+            for s, e, replacement in edits:
+                parts.append(text[last:s])
+                parts.append(replacement)
+                last = e
+            old = text[start:end]
+            new = "".join(parts) + text[last:end]
+            saving = {"raw": len(old.encode("utf-8")) - len(new.encode("utf-8"))}
+            for codec in self.codecs:
+                saving[codec.name] = (codec.size_in_context(context, (old + after).encode("utf-8"))
+                                      - codec.size_in_context(context, (new + after).encode("utf-8")))
+            self._cache[edits] = saving
+        return self._cache[edits]
+
+    def saving(self, edits: Iterable[Tuple[int, int, str]]) -> Dict[str, int]:
+        """Saving of (start, end, replacement) edits; edits closer together than the
+        lookahead are estimated as one region so their interaction is counted"""
+        total: Dict[str, int] = {"raw": 0, **{c.name: 0 for c in self.codecs}}
+        region: List[Tuple[int, int, str]] = []
+        for edit in sorted(edits) + [None]:
+            if region and (edit is None or edit[0] - region[-1][1] > self.lookahead):
+                for name, value in self._region(tuple(region)).items():
+                    total[name] += value
+                region = []
+            if edit is not None:
+                region.append(edit)
+        return total
+
+    def removal_saving(self, spans: Iterable[Span]) -> Dict[str, int]:
+        return self.saving((start, end, "") for start, end in spans)
+
+    def addition_cost(self, text: str, at: Optional[int] = None) -> Dict[str, int]:
+        """Bytes added by inserting text (e.g. a new custom property) at a position"""
+        at = len(self.text) if at is None else at
+        return {name: -value for name, value in self.saving([(at, at, text)]).items()}
+
+    def exact_saving(self, edits: Iterable[Tuple[int, int, str]]) -> Dict[str, int]:
+        """Reference figure: recompress the whole bundle with the edits applied"""
+        out, last = [], 0
+        for start, end, replacement in sorted(edits):
+            out.append(self.text[last:start])
+            out.append(replacement)
+            last = end
+        out.append(self.text[last:])
+        before = self.text.encode("utf-8")
+        after = "".join(out).encode("utf-8")
+        saving = {"raw": len(before) - len(after)}
+        for codec in self.codecs:
+            saving[codec.name] = codec.size(before) - codec.size(after)
+        return saving
+
+
+def primary_codec() -> str:
+    """The codec savings are ranked by: brotli when available, else gzip"""
+    return "brotli" if brotli is not None else "gzip"
+
+
+def _occurrences(text: str, value: str) -> List[Span]:
+    """Uses of value, not counting a custom property already defined as it"""
+    spans = []
+    pos = text.find(value)
+    while pos >= 0:
+        line_start = text.rfind("\n", 0, pos) + 1
+        if not _DEFINITION_RE.fullmatch(text, line_start, pos):
+            spans.append((pos, pos + len(value)))
+        pos = text.find(value, pos + len(value))
+    return spans
+
+
+def rank_candidates(sources: Sequence[Tuple[Path, str]], duplicate_groups: Iterable[List[Tuple[Path, Rule]]],
+                    variables: Dict[str, str], codecs: Optional[List] = None) -> List[Dict]:
+    """Cleanup candidates ranked by estimated compressed (transfer) saving.
+    A duplicate group keeps its highest-priority rule, removes the rest and adds
+    their selectors to the kept rule's selector list (as merge.py does); a
+    variable replaces every occurrence of its value and pays for one definition.
+    Only rules in the same at-rule context are merged, and never @keyframes stops."""
+    from cssscan.index import folder_priority
+    from cssscan.merge import is_keyframes_context
+    from cssscan.selectors import normalize_selector
+
+    bundle = Bundle.of(sources)
+    estimator = SavingsEstimator(bundle.text, codecs)
+    by_context: Dict[tuple, List[Tuple[Path, Rule]]] = {}
+    for i, group in enumerate(duplicate_groups):
+        for path, rule in group:
+            if path in bundle.offsets and not is_keyframes_context(rule.context):
+                by_context.setdefault((i, rule.context), []).append((path, rule))
+    rows = []
+    for group in by_context.values():
+        if len(group) < 2:
+            continue
+        keep_path, keep = min(group, key=lambda item: folder_priority(item[0]))
+        edits = [(*bundle.span(path, rule.span), "") for path, rule in group if rule is not keep]
+        existing = {normalize_selector(s) for s in keep.selectors}
+        added = []
+        for _, rule in group:
+            for selector in rule.selectors:
+                if normalize_selector(selector) not in existing:
+                    existing.add(normalize_selector(selector))
+                    added.append(selector)
+        if added:
+            start, end = bundle.span(keep_path, keep.span)
+            head = bundle.text[start:bundle.text.index("{", start, end)]
+            at = start + len(head.rstrip())
+            edits.append((at, at, "".join(f", {s}" for s in added)))
+        rows.append({
+            "kind": "duplicate-group",
+            "candidate": keep.selector,
+            "keep": f"{keep_path}:{keep.line}",
+            "occurrences": len(group),
+            **estimator.saving(edits),
+        })
+    for value, name in variables.items():
+        spans = _occurrences(bundle.text, value)
+        if not spans:
+            continue
+        saving = estimator.saving((start, end, f"var({name})") for start, end in spans)
+        cost = estimator.addition_cost(f"  {name}: {value};\n")
+        rows.append({
+            "kind": "variable",
+            "candidate": f"{name}: {value}",
+            "keep": "",
+            "occurrences": len(spans),
+            **{k: saving[k] - cost[k] for k in saving},
+        })
+    primary = primary_codec()
+    rows.sort(key=lambda r: (-r[primary], -r["raw"]))
+    return rows
@@ -0,0 +1,338 @@
+"""
+Content-hashed bundle emission.
+Writes the stylesheets reachable from the entry (styles/main.css) as one
+bundle, or as a shared chunk plus one chunk per route (a folder or file
+under styles/pages/), under names like shared.3f9c0a1b2d.css, and a
+manifest mapping each logical name to its hashed file. Hashed files can be
+served with a far-future cache lifetime; a deploy only changes the names of
+the chunks whose sources changed.
+
+A chunk's hash is taken over its sources' relative paths and SHA-256
+digests (the ones backup manifests and snapshot diffs use), never over the
+chunk text, so an unchanged chunk keeps its name across runs and is not
+even rebuilt. Digests are cached in the manifest by size and mtime, so a
+later run only hashes files that changed.
+
+Chunks live in other directories than their sources, so relative url()s
+are rebased onto the chunk's own location, and the files they name (such as
+the ones the assets stage externalizes) are copied alongside, keeping their
+path under styles/.
+
+Route chunks are loaded after the shared chunk, so a page file moved into
+one would follow the shared styles that came after it in main.css. A page
+file with a rule that could then override one of those later rules (same
+property, importance and specificity, as in merge.Footprint) stays in the
+shared chunk at its place in the cascade, and the manifest lists it under
+"kept_shared" with the rule that pinned it.
+
+    python -m cssscan.emit [<styles_dir>] [--out <dir>] [--split routes|bundle] [--entry <main.css>] [--prune]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import posixpath
+import re
+import sys
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+from cssscan.assets import _URL_RE, _iter_declarations, url_kind, url_target
+from cssscan.backup import DigestCache
+from cssscan.bundle import bundle_order, import_target
+from cssscan.merge import Footprint, is_keyframes_context
+from cssscan.parser import AtRule, Stylesheet, apply_edits, iter_rules, parse_stylesheet
+from cssscan.selectorcost import SHARED_ROUTE, route_of
+
+MANIFEST_NAME = "css-manifest.json"
+HASH_LENGTH = 10
+FORMAT_VERSION = 2  # bump when chunk_text changes, so old names are never reused for new text
+SHARED_CHUNK = "shared.css"
+
+
+@dataclass
+class Chunk:
+    name: str  # logical name: main.css, shared.css, routes/<route>.css
+    sources: List[Path]
+    hash: str = ""
+    bytes: int = 0
+    reused: bool = False  # the hashed file was already in the output directory
+    load: List[str] = field(default_factory=list)  # chunks a page loads, in order, ending with this one
+
+    @property
+    def file_name(self) -> str:
+        stem, _, suffix = self.name.rpartition(".")
+        return f"{stem}.{self.hash}.{suffix}"
+
+
+def chunk_hash(entries: List[tuple]) -> str:
+    """Hash of (rel path, digest) pairs in chunk order"""
+    h = hashlib.sha256(f"v{FORMAT_VERSION}\n".encode("utf-8"))
+    for rel, digest in entries:
+        h.update(f"{rel}\0{digest}\n".encode("utf-8"))
+    return h.hexdigest()[:HASH_LENGTH]
+
+
+def local_urls(rel: str, text: str, sheet: Stylesheet) -> Iterator[Tuple[Tuple[int, int], str, str, str]]:
+    """(span, quote, path under styles/, ?query/#fragment) of every relative url() in a
+    declaration; the path is normalized and starts with '../' when it leaves the tree"""
+    for _, d in _iter_declarations(sheet.nodes):
+        for m in _URL_RE.finditer(text, d.span[0], d.span[1]):
+            target = url_target(m.group(1))
+            if not target or url_kind(target) != "relative":
+                continue
+            path, suffix = re.match(r'([^?#]*)(.*)', target, re.DOTALL).groups()
+            if path:
+                quote = m.group(1)[:1] if m.group(1)[:1] in "\"'" else ""
+                yield m.span(), quote, posixpath.normpath(posixpath.join(posixpath.dirname(rel), path)), suffix
+
+
+def chunk_text(files: List[tuple], chunk_dir: str = "") -> str:
+    """(rel, text, sheet) in cascade order -> one stylesheet for a chunk in chunk_dir
+    (relative to the output directory). Local @imports are dropped (their targets
+    are inlined or in another chunk); @charset and remote @imports move to the top,
+    where CSS requires them; relative url()s are rebased onto chunk_dir."""
+    charset, remote, parts = [], [], []
+    for rel, text, sheet in files:
+        edits = []
+        for span, quote, path, suffix in local_urls(rel, text, sheet):
+            url = posixpath.relpath(path, chunk_dir or ".") + suffix
+            url = url.replace("\\", "\\\\").replace(quote, "\\" + quote) if quote else url
+            edits.append((span[0], span[1], f"url({quote}{url}{quote})"))
+        for node in sheet.nodes:
+            if not isinstance(node, AtRule) or node.name.lower() not in ("import", "charset"):
+                continue
+            if node.name.lower() == "charset":
+                charset.append(node.header + ";")
+            elif import_target(node.prelude) is None:
+                remote.append(node.header + ";")
+            edits.append((node.span[0], node.span[1], ""))
+        body = apply_edits(text, edits).strip()
+        parts.append(f"/* {rel} */\n{body}\n" if body else f"/* {rel} */\n")
+    head = list(dict.fromkeys(charset[:1] + remote))
+    return "".join(line + "\n" for line in head) + ("\n" if head else "") + "\n".join(parts)
+
+
+class BundleEmitter:
+    """Emits hashed chunks of a styles/ tree and the manifest that names them"""
+
+    def __init__(self, styles_dir: Path, out_dir: Path, entry: Optional[Path] = None, split: str = "routes",
+                 sheets: Optional[Dict[Path, Stylesheet]] = None, sources: Optional[Dict[Path, str]] = None,
+                 digest: Optional[Callable[[Path], str]] = None, files: Optional[Dict[Path, bytes]] = None):
+        if split not in ("routes", "bundle"):
+            raise ValueError(f"Unknown split '{split}' (choose from routes, bundle)")
+        self.styles_dir = Path(styles_dir)
+        self.out_dir = Path(out_dir)
+        self.entry = Path(entry) if entry else self.styles_dir / "main.css"
+        self.split = split
+        self.sheets = sheets if sheets is not None else {}
+        self.sources = sources
+        self.files = files if files is not None else {}  # url() targets not (yet) on disk, e.g. externalized assets
+        self.previous = self._load_manifest()
+        if digest is None:
+            digest = DigestCache({str((self.styles_dir / rel).resolve()): entry
+                                  for rel, entry in self.previous.get("files", {}).items()})
+        self.digest = digest
+        self.emitted: List[Chunk] = []
+        self.kept_shared: List[Dict] = []  # page files left in the shared chunk, and why
+
+    def _load_manifest(self) -> Dict:
+        path = self.out_dir / MANIFEST_NAME
+        if not path.exists():
+            return {}
+        with open(path) as f:
+            return json.load(f)
+
+    def rel(self, path: Path) -> str:
+        return Path(path).relative_to(self.styles_dir).as_posix()
+
+    def _text(self, path: Path) -> str:
+        if self.sources is not None and path in self.sources:
+            return self.sources[path]
+        return path.read_text(encoding="utf-8", errors="ignore")
+
+    def _sheet(self, path: Path) -> Stylesheet:
+        if path not in self.sheets:
+            self.sheets[path] = parse_stylesheet(self._text(path), path)
+        return self.sheets[path]
+
+    def chunks(self) -> List[Chunk]:
+        """Chunks in load order; only files reachable from the entry are emitted"""
+        order = bundle_order(self.entry, self.sheets, loader=self._sheet)
+        reachable = order[:order.index(self.entry) + 1] if self.entry in order else []
+        self.kept_shared = []
+        if self.split == "bundle":
+            chunks = [Chunk(self.entry.name, reachable)]
+        else:
+            shared = {p for p in reachable if route_of(p, self.styles_dir) == SHARED_ROUTE}
+            self.kept_shared = self._keep_cascade(reachable, shared)
+            by_route: Dict[str, List[Path]] = {}
+            for path in reachable:
+                if path not in shared:
+                    by_route.setdefault(route_of(path, self.styles_dir), []).append(path)
+            chunks = [Chunk(SHARED_CHUNK, [p for p in reachable if p in shared])]
+            chunks += [Chunk(f"routes/{route}.css", paths) for route, paths in sorted(by_route.items())]
+            self._link(chunks)
+        for chunk in chunks:
+            chunk.load = chunk.load or [chunk.name]
+            chunk.hash = chunk_hash([(self.rel(p), self.digest(p)) for p in chunk.sources])
+        return chunks
+
+    def _keep_cascade(self, reachable: List[Path], shared: Set[Path]) -> List[Dict]:
+        """Add to shared every page file with a rule that, loaded after the shared chunk,
+        could override a shared rule that came after it; returns why each was kept.
+        Walking back from the end, a file kept here is in place for the files before it."""
+        later: Dict[str, List[tuple]] = {}  # atom -> (path, rule, footprint) of later shared rules
+        kept = []
+        for path in reversed(reachable):
+            rules = [(r, Footprint.of(r)) for r in iter_rules(self._sheet(path).nodes)
+                     if r.declarations and not is_keyframes_context(r.context)]
+            if path not in shared:
+                hit = next(((rule, other) for rule, fp in rules
+                            for atom in (list(later) if "all" in fp.atoms else list(fp.atoms) + ["all"])
+                            for other in later.get(atom, ()) if fp.conflicts(other[2])), None)
+                if hit is None:
+                    continue
+                (rule, (other_path, other, _)) = hit
+                shared.add(path)
+                kept.append({"file": self.rel(path), "line": rule.line, "selector": rule.selector,
+                             "later_rule": f"{self.rel(other_path)}:{other.line} {other.selector}"})
+            for rule, fp in rules:
+                for atom in fp.atoms:
+                    later.setdefault(atom, []).append((path, rule, fp))
+        return kept[::-1]
+
+    def _link(self, chunks: List[Chunk]):
+        """Load order per route chunk: shared, any route chunk it @imports from, itself"""
+        owner = {p.resolve(): c.name for c in chunks for p in c.sources}
+        for chunk in chunks[1:]:
+            needs = []
+            for path in chunk.sources:
+                for node in self._sheet(path).nodes:
+                    target = import_target(node.prelude) if getattr(node, "name", None) == "import" else None
+                    name = owner.get(Path(path.parent, target).resolve()) if target else None
+                    if name and name not in (SHARED_CHUNK, chunk.name) and name not in needs:
+                        needs.append(name)
+            chunk.load = [SHARED_CHUNK] + needs + [chunk.name]
+
+    def emit(self, prune: bool = False) -> Dict:
+        """Write changed chunks and the manifest; returns the manifest"""
+        chunks = self.chunks()
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        for chunk in chunks:
+            target = self.out_dir / chunk.file_name
+            if target.exists():
+                chunk.reused = True
+                chunk.bytes = target.stat().st_size
+                continue
+            text = chunk_text([(self.rel(p), self._text(p), self._sheet(p)) for p in chunk.sources],
+                              posixpath.dirname(chunk.name))
+            data = text.encode("utf-8")
+            target.parent.mkdir(parents=True, exist_ok=True)
+            tmp = target.with_name(target.name + ".tmp")
+            tmp.write_bytes(data)
+            os.replace(tmp, target)
+            chunk.bytes = len(data)
+        assets = self._copy_assets(chunks)
+
+        # Size and mtime go with each digest when there are any, so the next run can skip hashing
+        cached = self.digest.entries() if isinstance(self.digest, DigestCache) else {}
+        files = {self.rel(p): cached.get(str(p.resolve()), {"sha256": self.digest(p)})
+                 for c in chunks for p in c.sources}
+        file_names = {c.name: c.file_name for c in chunks}
+        manifest = {
+            "generated": datetime.now().isoformat(),
+            "algorithm": "sha256",
+            "format": FORMAT_VERSION,
+            "split": self.split,
+            "entry": self.rel(self.entry),
+            "chunks": {c.name: {
+                "file": c.file_name,
+                "hash": c.hash,
+                "bytes": c.bytes,
+                "load": [file_names[n] for n in c.load],
+                "sources": [self.rel(p) for p in c.sources],
+            } for c in chunks},
+            "files": files,
+            "assets": assets,
+            "kept_shared": self.kept_shared,
+        }
+        if prune:
+            manifest["pruned"] = self._prune(manifest)
+        with open(self.out_dir / MANIFEST_NAME, "w") as f:
+            json.dump(manifest, f, indent=2)
+        self.emitted = chunks
+        return manifest
+
+    def _copy_assets(self, chunks: List[Chunk]) -> List[str]:
+        """Copy the files relative url()s name into the output directory, at their path
+        under styles/, so rebased urls resolve; returns those paths"""
+        copied = []
+        for chunk in chunks:
+            for source in chunk.sources:
+                rel = self.rel(source)
+                for _, _, path, _ in local_urls(rel, self._text(source), self._sheet(source)):
+                    if path.startswith("../") or path in copied:
+                        continue
+                    src = self.styles_dir / path
+                    if src in self.files:
+                        data = self.files[src]
+                    elif src.is_file():
+                        data = src.read_bytes()
+                    else:
+                        continue
+                    target = self.out_dir / path
+                    if not target.exists() or target.read_bytes() != data:
+                        target.parent.mkdir(parents=True, exist_ok=True)
+                        target.write_bytes(data)
+                    copied.append(path)
+        return sorted(copied)
+
+    def _prune(self, manifest: Dict) -> List[str]:
+        """Remove hashed files the previous manifest named and this one does not"""
+        current = {c["file"] for c in manifest["chunks"].values()}
+        removed = []
+        for chunk in self.previous.get("chunks", {}).values():
+            path = self.out_dir / chunk["file"]
+            if chunk["file"] not in current and path.exists():
+                path.unlink()
+                removed.append(chunk["file"])
+        return removed
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m cssscan.emit",
+                                     description="Emit content-hashed bundle chunks and a manifest")
+    parser.add_argument("styles_dir", nargs="?", default="styles")
+    parser.add_argument("--out", default="dist", help="output directory (default: dist)")
+    parser.add_argument("--split", choices=["routes", "bundle"], default="routes")
+    parser.add_argument("--entry", help="entry stylesheet (default: <styles_dir>/main.css)")
+    parser.add_argument("--prune", action="store_true", help="delete chunks the new manifest no longer lists")
+    args = parser.parse_args(argv)
+    split = args.split
+    styles_dir = Path(args.styles_dir)
+    emitter = BundleEmitter(styles_dir, Path(args.out), Path(args.entry) if args.entry else None, split)
+    if not emitter.entry.exists():
+        print(f"❌ Entry stylesheet '{emitter.entry}' does not exist")
+        return 1
+    manifest = emitter.emit(args.prune)
+
+    chunks = emitter.emitted
+    print(f"📦 {len(chunks)} chunks ({split}), {sum(not c.reused for c in chunks)} written, "
+          f"{sum(c.reused for c in chunks)} unchanged; {emitter.digest.hashed} files hashed")
+    for c in chunks:
+        print(f"  {'=' if c.reused else '+'} {c.name:<32} {c.file_name}  {c.bytes:,} bytes")
+    for kept in manifest["kept_shared"]:
+        print(f"  📌 {kept['file']} kept in {SHARED_CHUNK}: {kept['selector']} (line {kept['line']}) "
+              f"would override {kept['later_rule']}")
+    for name in manifest.get("pruned", []):
+        print(f"  🗑️ {name}")
+    print(f"📋 Manifest saved: {emitter.out_dir / MANIFEST_NAME}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,444 @@
+"""
+Dead-rule detection against saved HTML snapshots.
+Rendered pages (save the DOM of the meetings, reports, year-summary ...
+views as .html files) are loaded into a lightweight DOM, indexed by id,
+class and tag. Every selector is matched right to left: the candidates for
+its rightmost compound come from the most selective index (an id, the
+rarest of its classes, its tag), and only those are tested and walked up
+through the combinators, with the results memoised per selector, so a
+selector never costs a walk of the whole tree.
+
+Matching is conservative: a snapshot is one state of a page, so pseudo-
+classes that depend on state or interaction (:hover, :focus, :checked,
+:has(), unknown ones ...) are taken to match, as are @media conditions. A
+rule is reported dead only when none of its selectors can match any
+element of any snapshot; rules where only some selectors are dead are
+reported as partial, with the bytes those selectors take.
+
+    python -m cssscan.htmlmatch <snapshot_dir_or_html>... [--styles <styles_dir>] [--csv <dead-rules.csv>]
+"""
+
+import argparse
+import re
+import sys
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from html.parser import HTMLParser
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from cssscan.merge import is_keyframes_context
+from cssscan.parser import Stylesheet, iter_rules, parse_stylesheet, split_selector_list
+from cssscan.selectorcost import split_compounds
+from cssscan.selectors import TOKEN_RE, matching_paren, normalize_selector
+
+VOID_ELEMENTS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "param", "source",
+                 "track", "wbr"}
+STRUCTURAL = {"first-child", "last-child", "only-child", "first-of-type", "last-of-type", "only-of-type",
+              "empty", "root"}
+NTH = {"nth-child", "nth-last-child", "nth-of-type", "nth-last-of-type"}
+LOGICAL = {"not", "is", "where", "matches", "-webkit-any", "-moz-any"}
+
+_ATTR_RE = re.compile(r'\[\s*([^\s~|^$*=\]]+)\s*(?:([~|^$*]?=)\s*("(?:[^"\\]|\\.)*"|\'(?:[^\'\\]|\\.)*\'|[^\s\]]+)'
+                      r'\s*([iIsS])?)?\s*\]')
+_NTH_RE = re.compile(r'^([+-]?\d*)n\s*(?:([+-])\s*(\d+))?$')
+
+
+class Element:
+    __slots__ = ("tag", "id", "classes", "attrs", "parent", "children", "position", "type_position",
+                 "siblings", "type_siblings", "prev", "has_text")
+
+    def __init__(self, tag: str, attrs: Dict[str, str], parent: Optional["Element"]):
+        self.tag = tag
+        self.attrs = attrs
+        self.id = attrs.get("id", "")
+        self.classes = frozenset(attrs.get("class", "").split())
+        self.parent = parent
+        self.children: List[Element] = []
+        self.prev: Optional[Element] = None  # previous element sibling
+        self.position = self.type_position = 1  # 1-based among element siblings / of the same tag
+        self.siblings = self.type_siblings = 1
+        self.has_text = False
+
+
+class Document(HTMLParser):
+    """A parsed snapshot with id, class and tag indexes"""
+
+    def __init__(self, name: str = ""):
+        super().__init__(convert_charrefs=True)
+        self.name = name
+        self.root = Element("#document", {}, None)
+        self._stack = [self.root]
+        self.elements: List[Element] = []
+        self.by_id: Dict[str, List[Element]] = defaultdict(list)
+        self.by_class: Dict[str, List[Element]] = defaultdict(list)
+        self.by_tag: Dict[str, List[Element]] = defaultdict(list)
+
+    @classmethod
+    def load(cls, path: Path) -> "Document":
+        doc = cls(str(path))
+        doc.feed(Path(path).read_text(encoding="utf-8", errors="ignore"))
+        doc.close()
+        return doc
+
+    def handle_starttag(self, tag, attrs):
+        parent = self._stack[-1]
+        el = Element(tag, {k.lower(): v or "" for k, v in attrs}, parent)
+        parent.children.append(el)
+        self.elements.append(el)
+        if el.id:
+            self.by_id[el.id].append(el)
+        for name in el.classes:
+            self.by_class[name].append(el)
+        self.by_tag[tag].append(el)
+        if tag not in VOID_ELEMENTS:
+            self._stack.append(el)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_ELEMENTS:
+            self._stack.pop()
+
+    def handle_data(self, data):
+        if data.strip():
+            self._stack[-1].has_text = True
+
+    def handle_endtag(self, tag):
+        # Close up to the matching open element; a stray end tag is ignored
+        for i in range(len(self._stack) - 1, 0, -1):
+            if self._stack[i].tag == tag:
+                del self._stack[i:]
+                return
+
+    def close(self):
+        super().close()
+        self._stack = [self.root]
+        stack = [self.root]
+        while stack:
+            el = stack.pop()
+            counts: Dict[str, int] = defaultdict(int)
+            prev = None
+            for i, child in enumerate(el.children, 1):
+                counts[child.tag] += 1
+                child.position, child.type_position, child.prev = i, counts[child.tag], prev
+                prev = child
+            for child in el.children:
+                child.siblings, child.type_siblings = len(el.children), counts[child.tag]
+            stack.extend(el.children)
+
+
+@dataclass
+class _Compound:
+    tag: str = ""  # "" = any
+    ids: List[str] = field(default_factory=list)
+    classes: List[str] = field(default_factory=list)
+    attrs: List[Tuple[str, str, str, bool]] = field(default_factory=list)  # name, op, value, ignore case
+    pseudos: List[Tuple[str, str]] = field(default_factory=list)  # static pseudo-classes (name, args)
+
+
+def _unquote(value: str) -> str:
+    return value[1:-1] if value[:1] in "\"'" else value
+
+
+def _parse_compound(text: str) -> _Compound:
+    compound = _Compound()
+    pos = 0
+    while True:
+        m = TOKEN_RE.search(text, pos)
+        if not m:
+            return compound
+        pos = m.end()
+        if m.group("id"):
+            compound.ids.append(m.group("id")[1:])
+        elif m.group("cls"):
+            compound.classes.append(m.group("cls")[1:])
+        elif m.group("attr"):
+            a = _ATTR_RE.fullmatch(m.group("attr"))
+            if a:
+                compound.attrs.append((a.group(1).lower(), a.group(2) or "", _unquote(a.group(3) or ""),
+                                       (a.group(4) or "").lower() == "i"))
+        elif m.group("pc"):
+            name = m.group("pc")[1:].lower()
+            args = ""
+            if m.group("args"):
+                close = matching_paren(text, m.end() - 1)
+                args, pos = text[m.end():close].strip(), close + 1
+            if name in STRUCTURAL or name in NTH or name in LOGICAL:
+                compound.pseudos.append((name, args))
+            # anything else depends on state or is unknown: assumed to match
+        elif m.group("type") and m.group("type") != "*":
+            compound.tag = m.group("type").lower()
+
+
+def _nth(formula: str, position: int) -> bool:
+    """Does a 1-based position satisfy an+b (odd, even, 3, 2n+1, -n+3 ...)?"""
+    formula = formula.strip().lower().replace(" ", "")
+    if formula == "odd":
+        formula = "2n+1"
+    elif formula == "even":
+        formula = "2n"
+    if "n" not in formula:
+        return formula.lstrip("+-").isdigit() and position == int(formula)
+    m = _NTH_RE.match(formula)
+    if not m:
+        return True  # unparsed: assume it matches
+    a = {"": 1, "+": 1, "-": -1}.get(m.group(1), None)
+    a = int(m.group(1)) if a is None else a
+    b = int(m.group(3) or 0) * (-1 if m.group(2) == "-" else 1)
+    if a == 0:
+        return position == b
+    return (position - b) % a == 0 and (position - b) // a >= 0
+
+
+class SelectorMatcher:
+    """Does a selector match any element of any snapshot?"""
+
+    def __init__(self, documents: Iterable[Document]):
+        self.documents = list(documents)
+        self._compounds: Dict[str, _Compound] = {}
+        self._results: Dict[str, bool] = {}
+        self.tested = 0  # elements tested against a key compound
+
+    def _compound(self, text: str) -> _Compound:
+        if text not in self._compounds:
+            self._compounds[text] = _parse_compound(text)
+        return self._compounds[text]
+
+    def matches(self, selector: str) -> bool:
+        selector = normalize_selector(selector)
+        if selector not in self._results:
+            compounds, combinators = split_compounds(selector)
+            parsed = [self._compound(c) for c in compounds]
+            self._results[selector] = bool(parsed) and any(self._any(doc, parsed, combinators)
+                                                           for doc in self.documents)
+        return self._results[selector]
+
+    def _candidates(self, doc: Document, key: _Compound) -> List[Element]:
+        if key.ids:
+            return doc.by_id.get(key.ids[0], [])
+        if key.classes:
+            return min((doc.by_class.get(c, []) for c in key.classes), key=len)
+        if key.tag:
+            return doc.by_tag.get(key.tag, [])
+        return doc.elements
+
+    def _any(self, doc: Document, compounds: List[_Compound], combinators: List[str]) -> bool:
+        memo: Dict[Tuple[int, int], bool] = {}
+        for el in self._candidates(doc, compounds[-1]):
+            self.tested += 1
+            if self._match(el, compounds, combinators, len(compounds) - 1, memo):
+                return True
+        return False
+
+    def _match(self, el: Element, compounds: List[_Compound], combinators: List[str], i: int,
+               memo: Dict[Tuple[int, int], bool]) -> bool:
+        key = (i, id(el))
+        if key not in memo:
+            memo[key] = self._test(el, compounds[i]) and (i == 0 or self._combine(el, compounds, combinators, i, memo))
+        return memo[key]
+
+    def _combine(self, el: Element, compounds, combinators, i, memo) -> bool:
+        combinator = combinators[i - 1]
+        if combinator == ">":
+            return el.parent is not None and el.parent.tag != "#document" and \
+                self._match(el.parent, compounds, combinators, i - 1, memo)
+        if combinator == "+":
+            return el.prev is not None and self._match(el.prev, compounds, combinators, i - 1, memo)
+        if combinator == "~":
+            sibling = el.prev
+            while sibling is not None:
+                if self._match(sibling, compounds, combinators, i - 1, memo):
+                    return True
+                sibling = sibling.prev
+            return False
+        ancestor = el.parent
+        while ancestor is not None and ancestor.tag != "#document":
+            if self._match(ancestor, compounds, combinators, i - 1, memo):
+                return True
+            ancestor = ancestor.parent
+        return False
+
+    def _matches_element(self, el: Element, selector: str) -> bool:
+        """Complex selector with el as its subject (for :not() / :is())"""
+        compounds, combinators = split_compounds(normalize_selector(selector))
+        parsed = [self._compound(c) for c in compounds]
+        return bool(parsed) and self._match(el, parsed, combinators, len(parsed) - 1, {})
+
+    def _test(self, el: Element, c: _Compound) -> bool:
+        if c.tag and el.tag != c.tag:
+            return False
+        if any(el.id != i for i in c.ids):
+            return False
+        if any(name not in el.classes for name in c.classes):
+            return False
+        for name, op, value, fold in c.attrs:
+            if name not in el.attrs:
+                return False
+            if op and not self._attr(el.attrs[name], op, value, fold):
+                return False
+        return all(self._pseudo(el, name, args) for name, args in c.pseudos)
+
+    @staticmethod
+    def _attr(actual: str, op: str, value: str, fold: bool) -> bool:
+        if fold:
+            actual, value = actual.lower(), value.lower()
+        if op == "=":
+            return actual == value
+        if op == "~=":
+            return value in actual.split()
+        if op == "|=":
+            return actual == value or actual.startswith(value + "-")
+        if op == "^=":
+            return bool(value) and actual.startswith(value)
+        if op == "$=":
+            return bool(value) and actual.endswith(value)
+        return bool(value) and value in actual
+
+    def _pseudo(self, el: Element, name: str, args: str) -> bool:
+        if name == "root":
+            return el.parent is not None and el.parent.tag == "#document"
+        if name == "empty":
+            return not el.children and not el.has_text
+        if name.endswith("-child") and name not in NTH:
+            first, last = el.position == 1, el.position == el.siblings
+            return {"first-child": first, "last-child": last, "only-child": first and last}[name]
+        if name.endswith("-of-type") and name not in NTH:
+            first, last = el.type_position == 1, el.type_position == el.type_siblings
+            return {"first-of-type": first, "last-of-type": last, "only-of-type": first and last}[name]
+        if name in NTH:
+            if " of " in args:
+                return True  # :nth-child(An+B of S) is not worth an index here; assume it matches
+            position = {"nth-child": el.position, "nth-last-child": el.siblings - el.position + 1,
+                        "nth-of-type": el.type_position,
+                        "nth-last-of-type": el.type_siblings - el.type_position + 1}[name]
+            return _nth(args, position)
+        selectors = split_selector_list(args)
+        if name == "not":
+            # Only a fully static argument can rule an element out
+            if any(_is_dynamic(s) for s in selectors):
+                return True
+            return not any(self._matches_element(el, s) for s in selectors)
+        return any(self._matches_element(el, s) for s in selectors)  # :is() and friends
+
+
+def _is_dynamic(selector: str) -> bool:
+    """Does the selector use a pseudo-class whose result a snapshot cannot tell?"""
+    for m in re.finditer(r'(?<!:):([\w-]+)', selector):
+        name = m.group(1).lower()
+        if name not in STRUCTURAL and name not in NTH and name not in LOGICAL:
+            return True
+    return False
+
+
+def load_snapshots(paths: Iterable[Path]) -> List[Document]:
+    """HTML files, and the .html/.htm files below directories"""
+    files: List[Path] = []
+    for p in map(Path, paths):
+        files.extend(sorted(f for f in p.rglob("*") if f.suffix.lower() in (".html", ".htm"))
+                     if p.is_dir() else [p])
+    return [Document.load(f) for f in files]
+
+
+class DeadRuleFinder:
+    """Rules whose selectors match nothing in the snapshots, with their byte cost"""
+
+    def __init__(self, documents: Iterable[Document], styles_dir: Optional[Path] = None):
+        self.matcher = SelectorMatcher(documents)
+        self.styles_dir = styles_dir
+
+    def _relative(self, path: Path) -> str:
+        if self.styles_dir is not None:
+            try:
+                return Path(path).relative_to(self.styles_dir).as_posix()
+            except ValueError:
+                pass
+        return str(path)
+
+    def find(self, sheets: Iterable[Stylesheet]) -> List[Dict]:
+        """One row per rule with at least one dead selector, in file order"""
+        rows = []
+        for sheet in sheets:
+            for rule in iter_rules(sheet.nodes):
+                if is_keyframes_context(rule.context):
+                    continue
+                selectors = rule.selectors
+                dead = [s for s in selectors if not self.matcher.matches(s)]
+                if not dead:
+                    continue
+                whole = len(dead) == len(selectors)
+                rows.append({
+                    "file": self._relative(sheet.path),
+                    "line": rule.line,
+                    "selector": rule.selector,
+                    "context": " ".join(rule.context),
+                    "status": "dead" if whole else "partial",
+                    "dead_selectors": " | ".join(dead),
+                    # a partial rule only loses its dead selectors and their separators
+                    "bytes": rule.span[1] - rule.span[0] if whole else sum(len(s) + 2 for s in dead),
+                })
+        return rows
+
+    @staticmethod
+    def summary(rows: List[Dict], rules: int) -> Dict:
+        dead = [r for r in rows if r["status"] == "dead"]
+        by_file: Dict[str, int] = defaultdict(int)
+        for r in rows:
+            by_file[r["file"]] += r["bytes"]
+        return {
+            "rules": rules,
+            "dead_rules": len(dead),
+            "dead_bytes": sum(r["bytes"] for r in dead),
+            "partial_rules": len(rows) - len(dead),
+            "partial_bytes": sum(r["bytes"] for r in rows if r["status"] == "partial"),
+            "by_file": dict(sorted(by_file.items(), key=lambda kv: -kv[1])),
+        }
+
+    @staticmethod
+    def write_csv(path: Path, rows: List[Dict]) -> int:
+        import csv
+
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=["file", "line", "selector", "context", "status",
+                                                   "dead_selectors", "bytes"])
+            writer.writeheader()
+            writer.writerows(rows)
+        return len(rows)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m cssscan.htmlmatch",
+                                     description="Find rules that match nothing in saved HTML pages")
+    parser.add_argument("snapshots", nargs="+", metavar="SNAPSHOT", help="saved HTML page or folder of them")
+    parser.add_argument("--styles", default="styles", help="styles directory (default: styles)")
+    parser.add_argument("--csv", help="write dead and partly dead rules to this CSV")
+    args = parser.parse_args(argv)
+    documents = load_snapshots(args.snapshots)
+    if not documents:
+        print("❌ No HTML snapshots found")
+        return 1
+    styles_dir = Path(args.styles)
+    sheets = [parse_stylesheet(p.read_text(encoding="utf-8", errors="ignore"), p)
+              for p in sorted(styles_dir.rglob("*.css"))]
+
+    start = time.perf_counter()
+    finder = DeadRuleFinder(documents, styles_dir)
+    rows = finder.find(sheets)
+    elapsed = time.perf_counter() - start
+    rules = sum(1 for s in sheets for r in iter_rules(s.nodes) if not is_keyframes_context(r.context))
+    stats = finder.summary(rows, rules)
+    print(f"📄 {len(documents)} snapshots, {sum(len(d.elements) for d in documents):,} elements; "
+          f"{len(finder.matcher._results):,} selectors matched in {elapsed:.2f}s "
+          f"({finder.matcher.tested:,} candidate elements tested)")
+    print(f"💀 {stats['dead_rules']} of {rules} rules match nothing ({stats['dead_bytes']:,} bytes); "
+          f"{stats['partial_rules']} more have dead selectors ({stats['partial_bytes']:,} bytes)")
+    for file, size in list(stats["by_file"].items())[:10]:
+        print(f"  {file:<48} {size:>8,} bytes")
+    if args.csv:
+        count = finder.write_csv(Path(args.csv), rows)
+        print(f"\nWritten {count} rules to {args.csv}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,168 @@
+"""
+Selector-keyed definition index.
+Splits selector lists ('.a, .b') into individual normalized selectors and maps
+each one to every place it is defined (file, folder priority, at-rule context,
+declarations), so "where is .btn defined, and with what" is a dict lookup.
+The duplicated-selector report applies the cleanup rules from
+ai_css_cleanup_prompt.txt to every selector defined more than once in the
+same context.
+"""
+
+from collections import defaultdict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, FrozenSet, Iterable, Iterator, List, Optional, Tuple
+
+from cssscan.canonical import canonicalize_declaration
+from cssscan.merge import is_keyframes_context
+from cssscan.parser import Declaration, Rule, Stylesheet, iter_rules
+from cssscan.selectors import normalize_selector
+
+# Folder priorities from the cleanup prompt (1 = highest)
+FOLDER_PRIORITY = {
+    "base": 1,
+    "components": 2,
+    "utilities": 3,
+    "layout": 4,
+    "features": 5,
+    "pages": 6,
+}
+UNRANKED_PRIORITY = 99
+
+
+def folder_priority(path: Path, priorities: Dict[str, int] = FOLDER_PRIORITY) -> int:
+    """Priority of the first priority folder in path, or UNRANKED_PRIORITY"""
+    for part in Path(path).parts:
+        if part in priorities:
+            return priorities[part]
+    return UNRANKED_PRIORITY
+
+
+@dataclass
+class Definition:
+    selector: str  # one normalized selector out of the rule's selector list
+    path: Path
+    priority: int
+    context: Tuple[str, ...]
+    line: int
+    rule: Rule
+
+    @property
+    def declarations(self) -> List[Declaration]:
+        return self.rule.declarations
+
+    @property
+    def body(self) -> FrozenSet[str]:
+        return frozenset(canonicalize_declaration(d.text()) for d in self.rule.declarations)
+
+
+def relation(canonical: Definition, other: Definition) -> str:
+    """How other's declarations compare to the canonical definition's"""
+    kept, dropped = canonical.body, other.body
+    if dropped == kept:
+        return "exact"
+    if dropped < kept:
+        return "subset"
+    if dropped > kept:
+        return "superset"
+    return "overlap" if dropped & kept else "disjoint"
+
+
+def suggested_action(canonical: Definition, other: Definition) -> str:
+    """Cleanup prompt rules 1-5 applied to a non-canonical definition"""
+    rel = relation(canonical, other)
+    if rel == "disjoint":
+        return "keep (no shared declarations)"
+    if other.priority == canonical.priority:
+        # Rule 4: within one priority only a copy that adds nothing goes
+        return "remove" if rel in ("exact", "subset") else "keep (same priority)"
+    if rel in ("exact", "subset") or other.priority == FOLDER_PRIORITY["pages"]:
+        return "remove"  # Rules 1 and 5
+    return "trim shared declarations"  # Rules 2 and 6
+
+
+class SelectorIndex:
+    """normalized selector -> definitions, in file/source order"""
+
+    def __init__(self, priorities: Dict[str, int] = FOLDER_PRIORITY):
+        self.priorities = priorities
+        self._defs: Dict[str, List[Definition]] = defaultdict(list)
+
+    @classmethod
+    def build(cls, sheets: Iterable[Stylesheet], priorities: Dict[str, int] = FOLDER_PRIORITY) -> "SelectorIndex":
+        index = cls(priorities)
+        for sheet in sheets:
+            index.add(sheet)
+        return index
+
+    def add(self, sheet: Stylesheet):
+        priority = folder_priority(sheet.path, self.priorities)
+        for rule in iter_rules(sheet.nodes):
+            if is_keyframes_context(rule.context):
+                continue  # keyframe stops are not selectors
+            for selector in rule.selectors:
+                key = normalize_selector(selector)
+                self._defs[key].append(Definition(key, sheet.path, priority, rule.context, rule.line, rule))
+
+    def lookup(self, selector: str) -> List[Definition]:
+        return self._defs.get(normalize_selector(selector), [])
+
+    def __getitem__(self, selector: str) -> List[Definition]:
+        return self.lookup(selector)
+
+    def __contains__(self, selector: str) -> bool:
+        return normalize_selector(selector) in self._defs
+
+    def __len__(self) -> int:
+        return len(self._defs)
+
+    def selectors(self) -> Iterator[str]:
+        return iter(self._defs)
+
+    def duplicated(self) -> Dict[Tuple[str, Tuple[str, ...]], List[Definition]]:
+        """(selector, context) -> definitions, for selectors defined more than once in a context"""
+        groups: Dict[Tuple[str, Tuple[str, ...]], List[Definition]] = {}
+        for selector, defs in self._defs.items():
+            if len(defs) < 2:
+                continue
+            by_context: Dict[Tuple[str, ...], List[Definition]] = defaultdict(list)
+            for d in defs:
+                by_context[d.context].append(d)
+            for context, group in by_context.items():
+                if len(group) > 1:
+                    groups[(selector, context)] = group
+        return groups
+
+    @staticmethod
+    def canonical(group: List[Definition]) -> Definition:
+        """Rule 3: the highest-priority definition; the earliest wins a tie"""
+        return min(group, key=lambda d: d.priority)
+
+    def report(self) -> List[Dict]:
+        rows = []
+        for (selector, context), group in sorted(self.duplicated().items()):
+            keep = self.canonical(group)
+            for d in group:
+                rows.append({
+                    "selector": selector,
+                    "context": " ".join(context),
+                    "file": str(d.path),
+                    "priority": d.priority,
+                    "line": d.line,
+                    "relation": "canonical" if d is keep else relation(keep, d),
+                    "action": "keep (canonical)" if d is keep else suggested_action(keep, d),
+                    "declarations": "; ".join(x.text() for x in d.declarations),
+                })
+        return rows
+
+    def write_report(self, path: Path, rows: Optional[List[Dict]] = None) -> int:
+        """Write the duplicated-selector report as CSV; returns the number of rows"""
+        import csv
+
+        rows = self.report() if rows is None else rows
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=["selector", "context", "file", "priority", "line",
+                                                   "relation", "action", "declarations"])
+            writer.writeheader()
+            writer.writerows(rows)
+        return len(rows)
@@ -0,0 +1,291 @@
+"""
+Shared declaration groups by frequent-itemset mining.
+Every rule is a transaction of canonical declarations; FP-growth finds the
+declaration sets that recur across rules (display: flex; align-items:
+center; ... inside otherwise different rules), and each set is scored by
+the bytes saved if it moved out into one rule with a merged selector list,
+or into a shared class.
+
+The FP-tree stores each distinct path once, with a count and the selector
+bytes of the rules through it, so the net saving of an itemset is known
+while mining without keeping rule ids. Only the best `top` itemsets are
+held (a heap), branches whose best possible saving cannot enter the heap
+are pruned, and itemsets are capped at `max_items` declarations, which
+bounds memory and time on large trees. Supporting rules are looked up for
+the final candidates only.
+
+Proposals do not check the cascade: moving declarations into a new rule
+changes their source order, so review them before applying.
+"""
+
+import heapq
+import itertools
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from cssscan.canonical import canonicalize_declaration
+from cssscan.merge import is_keyframes_context
+from cssscan.parser import Stylesheet, iter_rules
+from cssscan.selectors import is_vendor_specific
+
+DECLARATION_OVERHEAD = 4  # indent, ';' and newline around each declaration
+RULE_OVERHEAD = 4  # ' {', '}' and a newline
+LIST_SEPARATOR = 2  # ',\n' between selectors in a merged list
+SHARED_CLASS_BYTES = len(".shared-000")  # named like main.py's shared classes
+
+
+def net_saving(count: int, selector_bytes: int, body_bytes: int) -> int:
+    """Bytes saved moving a body out of count rules into one rule listing their selectors"""
+    return (count - 1) * body_bytes - selector_bytes - LIST_SEPARATOR * (count - 1) - RULE_OVERHEAD
+
+
+def class_saving(count: int, body_bytes: int) -> int:
+    """Bytes saved moving a body into one shared class (the markup has to add the class)"""
+    return (count - 1) * body_bytes - SHARED_CLASS_BYTES - RULE_OVERHEAD
+
+
+def frequent_items(paths: List[Tuple[List[int], int, int]], min_support: int) -> Dict[int, int]:
+    support: Counter = Counter()
+    for items, count, _ in paths:
+        for item in items:
+            support[item] += count
+    return {item: n for item, n in support.items() if n >= min_support}
+
+
+class _Node:
+    __slots__ = ("item", "count", "weight", "parent", "children", "link")
+
+    def __init__(self, item: int, parent: Optional["_Node"]):
+        self.item = item
+        self.count = 0
+        self.weight = 0
+        self.parent = parent
+        self.children: Dict[int, "_Node"] = {}
+        self.link: Optional["_Node"] = None
+
+
+class FPTree:
+    """Prefix tree of transactions in descending item frequency, with per-item node links"""
+
+    def __init__(self, paths: Iterable[Tuple[List[int], int, int]], min_support: int,
+                 support: Optional[Dict[int, int]] = None):
+        paths = list(paths)
+        if support is None:
+            support = frequent_items(paths, min_support)
+        self.support = support
+        self.weight: Dict[int, int] = defaultdict(int)
+        self.heads: Dict[int, _Node] = {}
+        self.root = _Node(-1, None)
+        rank = {item: (-n, item) for item, n in self.support.items()}
+        for items, count, weight in paths:
+            node = self.root
+            for item in sorted((i for i in items if i in rank), key=rank.__getitem__):
+                child = node.children.get(item)
+                if child is None:
+                    child = node.children[item] = _Node(item, node)
+                    child.link, self.heads[item] = self.heads.get(item), child
+                child.count += count
+                child.weight += weight
+                self.weight[item] += weight
+                node = child
+
+    def conditional_paths(self, item: int) -> List[Tuple[List[int], int, int]]:
+        """Prefix paths ending just above each node of item, with that node's count and weight"""
+        paths = []
+        node = self.heads.get(item)
+        while node is not None:
+            prefix = []
+            parent = node.parent
+            while parent.item != -1:
+                prefix.append(parent.item)
+                parent = parent.parent
+            if prefix:
+                paths.append((prefix, node.count, node.weight))
+            node = node.link
+        return paths
+
+
+@dataclass
+class SharedGroup:
+    context: Tuple[str, ...]
+    declarations: List[str]
+    rules: List[Tuple[Path, str, int]] = field(default_factory=list)  # file, selector, line
+    net_bytes: int = 0  # as a merged selector list
+    class_bytes: int = 0  # as a shared class
+    emptied_rules: int = 0  # rules left with no declarations (their selector and braces go too)
+    selected: bool = False
+
+    def row(self, rank: int) -> Dict:
+        return {
+            "rank": rank,
+            "context": " ".join(self.context),
+            "declarations": "; ".join(self.declarations),
+            "rules": len(self.rules),
+            "net_bytes": self.net_bytes,
+            "class_bytes": self.class_bytes,
+            "emptied_rules": self.emptied_rules,
+            "selected": "yes" if self.selected else "",
+            "selectors": self.selector_list().replace(",\n", ", "),
+            "files": " ".join(sorted({str(path) for path, _, _ in self.rules})),
+        }
+
+    def selector_list(self) -> str:
+        return ",\n".join(dict.fromkeys(selector for _, selector, _ in self.rules))
+
+    def as_rule(self) -> str:
+        """The group as one rule with a merged selector list"""
+        return self.selector_list() + " {\n" + "".join(f"  {d};\n" for d in self.declarations) + "}\n"
+
+
+class DeclarationGroupMiner:
+    """Frequent declaration sets across rules, ranked by net bytes saved"""
+
+    def __init__(self, min_support: int = 3, min_items: int = 2, max_items: int = 8, top: int = 200):
+        self.min_support = min_support
+        self.min_items = min_items
+        self.max_items = max_items
+        self.top = top
+        self._items: List[str] = []
+        self._item_ids: Dict[str, int] = {}
+        # context -> (item ids, selector, path, line, every declaration is an item) per rule
+        self._rules: Dict[Tuple[str, ...], List[Tuple[Tuple[int, ...], str, Path, int, bool]]] = defaultdict(list)
+
+    def _item(self, declaration: str) -> int:
+        if declaration not in self._item_ids:
+            self._item_ids[declaration] = len(self._items)
+            self._items.append(declaration)
+        return self._item_ids[declaration]
+
+    def add(self, sheet: Stylesheet):
+        for rule in iter_rules(sheet.nodes):
+            if is_keyframes_context(rule.context) or is_vendor_specific(rule.selector):
+                continue  # keyframe stops and vendor selectors cannot join a selector list
+            counts = Counter(d.property.lower() for d in rule.declarations)
+            # a repeated property is a fallback chain whose order matters; leave it in place
+            items = {self._item(canonicalize_declaration(d.text()))
+                     for d in rule.declarations if counts[d.property.lower()] == 1}
+            if len(items) >= self.min_items:
+                self._rules[rule.context].append((tuple(sorted(items)), rule.selector, sheet.path, rule.line,
+                                                  len(items) == len(rule.declarations)))
+
+    @classmethod
+    def build(cls, sheets: Iterable[Stylesheet], **options) -> "DeclarationGroupMiner":
+        miner = cls(**options)
+        for sheet in sheets:
+            miner.add(sheet)
+        return miner
+
+    def _bytes(self, item: int) -> int:
+        return len(self._items[item].encode("utf-8")) + DECLARATION_OVERHEAD
+
+    def _bound(self, support: Dict[int, int], body: int, room: int) -> int:
+        """Most any extension can save: s - 1 copies of the body plus the `room` largest
+        declarations present in at least s rules, for every support s"""
+        best, largest = 0, []
+        for item in sorted(support, key=support.__getitem__, reverse=True):
+            heapq.heappush(largest, self._bytes(item))
+            if len(largest) > room:
+                heapq.heappop(largest)
+            best = max(best, (support[item] - 1) * (body + sum(largest)))
+        return best
+
+    def _mine(self, tree: FPTree, suffix: Tuple[int, ...], suffix_bytes: int, context: Tuple[str, ...],
+              heap: List, counter):
+        # Any order enumerates every itemset once; the most promising first fills the heap early
+        order = sorted(tree.support, key=lambda i: (-(tree.support[i] - 1) * self._bytes(i), i))
+        for item in order:
+            count, weight = tree.support[item], tree.weight[item]
+            itemset = suffix + (item,)
+            body = suffix_bytes + self._bytes(item)
+            saving = net_saving(count, weight, body)
+            if len(itemset) >= self.min_items and saving > 0:
+                entry = (saving, next(counter), context, itemset)
+                if len(heap) < self.top:
+                    heapq.heappush(heap, entry)
+                elif saving > heap[0][0]:
+                    heapq.heapreplace(heap, entry)
+            if len(itemset) >= self.max_items:
+                continue
+            paths = tree.conditional_paths(item)
+            support = frequent_items(paths, self.min_support)
+            if not support:
+                continue
+            if len(heap) >= self.top and self._bound(support, body, self.max_items - len(itemset)) <= heap[0][0]:
+                continue  # no extension can enter the heap
+            self._mine(FPTree(paths, self.min_support, support), itemset, body, context, heap, counter)
+
+    def mine(self) -> List[SharedGroup]:
+        """The best groups, highest net saving first, with a non-overlapping selection marked"""
+        heap: List = []
+        counter = itertools.count()
+        for context, rules in self._rules.items():
+            paths = [(list(items), 1, len(selector.encode("utf-8"))) for items, selector, _, _, _ in rules]
+            tree = FPTree(paths, self.min_support)
+            self._mine(tree, (), 0, context, heap, counter)
+
+        # Supporting rules for the finalists only, via an inverted index per context
+        postings: Dict[Tuple[str, ...], Dict[int, Set[int]]] = {}
+        groups = []
+        for _, _, context, itemset in sorted(heap, reverse=True):
+            if context not in postings:
+                index: Dict[int, Set[int]] = defaultdict(set)
+                for n, (items, *_) in enumerate(self._rules[context]):
+                    for item in items:
+                        index[item].add(n)
+                postings[context] = index
+            index = postings[context]
+            rule_ids = set.intersection(*(index[i] for i in itemset))
+            rules = [self._rules[context][n] for n in sorted(rule_ids)]
+            body = sum(self._bytes(i) for i in itemset)
+            emptied = [r for r in rules if r[4] and len(r[0]) == len(itemset)]
+            group = SharedGroup(
+                context=context,
+                declarations=sorted(self._items[i] for i in itemset),
+                rules=[(path, selector, line) for _, selector, path, line, _ in rules],
+                class_bytes=class_saving(len(rules), body),
+                emptied_rules=len(emptied),
+            )
+            # Exact figure now the rules are known: a selector repeated across rules is listed once
+            group.net_bytes = ((len(rules) - 1) * body - len(group.selector_list().encode("utf-8")) - RULE_OVERHEAD
+                               + sum(len(r[1].encode("utf-8")) + RULE_OVERHEAD for r in emptied))
+            groups.append(group)
+        groups = self._drop_non_closed(groups)
+        groups.sort(key=lambda g: (-g.net_bytes, -len(g.declarations)))
+        self._select(groups)
+        return groups
+
+    @staticmethod
+    def _drop_non_closed(groups: List[SharedGroup]) -> List[SharedGroup]:
+        """Drop a group when a larger group covers exactly the same rules"""
+        by_rules: Dict[Tuple, List[SharedGroup]] = defaultdict(list)
+        for g in groups:
+            by_rules[(g.context, tuple((str(p), s, l) for p, s, l in g.rules))].append(g)
+        kept = []
+        for same in by_rules.values():
+            sets = [set(g.declarations) for g in same]
+            kept.extend(g for g, s in zip(same, sets) if not any(s < other for other in sets))
+        return kept
+
+    @staticmethod
+    def _select(groups: List[SharedGroup]):
+        """Greedy pick of groups that never claim the same declaration of the same rule twice"""
+        claimed: Set[Tuple] = set()
+        for g in groups:
+            cells = {(g.context, str(p), s, l, d) for p, s, l in g.rules for d in g.declarations}
+            if g.net_bytes > 0 and not (cells & claimed):
+                g.selected = True
+                claimed |= cells
+
+    @staticmethod
+    def write_csv(path: Path, groups: List[SharedGroup]) -> int:
+        import csv
+
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=["rank", "context", "declarations", "rules", "net_bytes",
+                                                   "class_bytes", "emptied_rules", "selected", "selectors",
+                                                   "files"])
+            writer.writeheader()
+            writer.writerows(g.row(rank) for rank, g in enumerate(groups, 1))
+        return len(groups)
@@ -0,0 +1,165 @@
+"""
+Selector-list merging.
+Rules whose normalized bodies are identical are folded into one rule with a
+comma-separated selector list, in place, so no markup changes are needed.
+A rule is only moved up to an earlier rule when no rule in between could
+change the outcome: one that sets an overlapping property with the same
+importance and the same specificity as the moved selector.
+"""
+
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Dict, List, Set, Tuple
+
+from cssscan.canonical import canonicalize_declaration
+from cssscan.parser import AtRule, Declaration, Node, Rule, Stylesheet, parse_declaration, serialize
+from cssscan.selectors import is_vendor_specific, normalize_selector, specificity
+from cssscan.shorthand import expand_declarations, longhand_atoms
+
+
+@dataclass
+class SelectorMerge:
+    target_file: str
+    target_selector: str
+    source_file: str
+    source_selector: str
+    bytes_saved: int
+
+
+def body_key(declarations: List[Declaration]) -> Tuple[str, ...]:
+    """Key of a rule body after canonicalisation and shorthand expansion; independent of the
+    order of different properties, but a repeated property keeps its order
+    (display: -webkit-box; display: flex is not display: flex; display: -webkit-box)"""
+    decls = [parse_declaration(canonicalize_declaration(d.text())) for d in declarations]
+    expanded = expand_declarations([d for d in decls if d is not None])
+    return tuple(sorted((d.text() for d in expanded), key=lambda t: t.split(":", 1)[0]))
+
+
+def is_keyframes_context(context: Tuple[str, ...]) -> bool:
+    return any(c.lower().startswith(("@keyframes", "@-webkit-keyframes")) for c in context)
+
+
+@dataclass
+class Footprint:
+    """What a rule can affect: longhand atoms (with importances) and selector specificities"""
+    atoms: Dict[str, Set[bool]]
+    specs: Set[Tuple[int, int, int]]
+
+    @classmethod
+    def of(cls, rule: Rule) -> "Footprint":
+        atoms: Dict[str, Set[bool]] = defaultdict(set)
+        for d in rule.declarations:
+            for atom in longhand_atoms(d.property):
+                atoms[atom].add(d.important)
+        return cls(dict(atoms), {specificity(s) for s in rule.selectors})
+
+    def conflicts(self, other: "Footprint") -> bool:
+        """True if swapping the order of the two rules could change the cascade"""
+        if "all" in self.atoms or "all" in other.atoms:
+            return True
+        if not (self.specs & other.specs):
+            return False
+        return any(importances & other.atoms.get(atom, set()) for atom, importances in self.atoms.items())
+
+
+@dataclass
+class _Entry:
+    sheet: Stylesheet
+    parent: List[Node]
+    rule: Rule
+    footprint: Footprint
+    active: bool = True
+
+
+class SelectorListMerger:
+    """Merges identical rule bodies across stylesheets given in cascade order"""
+
+    def __init__(self, sheets: List[Stylesheet]):
+        self.sheets = sheets
+        self.entries: List[_Entry] = []
+        for sheet in sheets:
+            self._collect(sheet, sheet.nodes)
+        # atom -> sorted positions of rules declaring it
+        self.positions: Dict[str, List[int]] = defaultdict(list)
+        for i, entry in enumerate(self.entries):
+            for atom in entry.footprint.atoms:
+                self.positions[atom].append(i)
+
+    def _collect(self, sheet: Stylesheet, nodes: List[Node]):
+        for node in nodes:
+            if isinstance(node, Rule):
+                if is_keyframes_context(node.context):
+                    continue
+                self.entries.append(_Entry(sheet, nodes, node, Footprint.of(node)))
+            elif isinstance(node, AtRule) and node.children:
+                self._collect(sheet, node.children)
+
+    def _conflicts(self, moved: _Entry, lo: int, hi: int) -> bool:
+        """True if a rule strictly between lo and hi could be overridden differently"""
+        candidates = set()
+        for atom in list(moved.footprint.atoms) + ["all"]:
+            positions = self.positions.get(atom, [])
+            for k in positions[bisect_right(positions, lo):bisect_left(positions, hi)]:
+                candidates.add(k)
+        return any(self.entries[k].active and moved.footprint.conflicts(self.entries[k].footprint)
+                   for k in candidates)
+
+    def merge(self) -> List[SelectorMerge]:
+        """Fold later identical rules into earlier ones in place; returns the merges made"""
+        groups: Dict[tuple, List[int]] = defaultdict(list)
+        for i, entry in enumerate(self.entries):
+            rule = entry.rule
+            if not rule.declarations or any(is_vendor_specific(s) for s in rule.selectors):
+                continue
+            groups[(rule.context, body_key(rule.declarations))].append(i)
+
+        merges: List[SelectorMerge] = []
+        for members in groups.values():
+            if len(members) < 2:
+                continue
+            anchor = members[0]
+            for j in members[1:]:
+                target, moved = self.entries[anchor], self.entries[j]
+                if self._conflicts(moved, anchor, j):
+                    # Can't move past the rules in between; start a new merge point here
+                    anchor = j
+                    continue
+                merges.append(self._fold(target, moved))
+        self._prune_empty()
+        return merges
+
+    def _fold(self, target: _Entry, moved: _Entry) -> SelectorMerge:
+        existing = {normalize_selector(s) for s in target.rule.selectors}
+        added = [s for s in moved.rule.selectors if normalize_selector(s) not in existing]
+        before_selector = target.rule.selector
+        removed_bytes = len(serialize([moved.rule]).encode("utf-8")) + 1  # plus separating blank line
+        added_bytes = sum(len(s.encode("utf-8")) + 2 for s in added)
+        if added:
+            target.rule.selector = ", ".join([target.rule.selector] + added)
+        target.footprint.specs |= moved.footprint.specs
+        for atom, importances in moved.footprint.atoms.items():
+            target.footprint.atoms.setdefault(atom, set()).update(importances)
+
+        moved.active = False
+        index = next(i for i, node in enumerate(moved.parent) if node is moved.rule)
+        del moved.parent[index]
+        return SelectorMerge(
+            str(target.sheet.path), before_selector,
+            str(moved.sheet.path), moved.rule.selector,
+            removed_bytes - added_bytes,
+        )
+
+    def _prune_empty(self):
+        def prune(nodes: List[Node]) -> List[Node]:
+            kept = []
+            for node in nodes:
+                if isinstance(node, AtRule) and node.children is not None:
+                    node.children = prune(node.children)
+                    if not node.children:
+                        continue
+                kept.append(node)
+            return kept
+
+        for sheet in self.sheets:
+            sheet.nodes = prune(sheet.nodes)
@@ -0,0 +1,538 @@
+"""
+Near-duplicate rule clustering.
+Rules whose normalized bodies are at least threshold similar (difflib ratio)
+form a similarity graph, which is cut into clusters around centres: the body
+with the most unclustered neighbours takes them all, then the next, and so
+on. Every member is within the threshold of its cluster's centre (the
+medoid), so a chain of small steps (A ~ B ~ C ~ ...) cannot pull unrelated
+rules into one cluster the way connected components do, and a centre only
+takes members while they still share at least one declaration. The result is
+a list of clusters, each with its medoid rule and the declarations every
+member shares, rather than a list of every similar pair.
+
+Candidate pairs come from an inverted index over property names with prefix
+filtering (each body is indexed under its rarest properties only). Two bodies
+are only compared when they share at least PROPERTY_OVERLAP of the larger
+one's properties, and length and character-count bounds prune pairs that
+cannot reach the threshold. difflib is only imported when a scan runs.
+
+NearDupIndex keeps the same comparison graph on disk, keyed by file digest, so
+a rescan only compares the bodies of changed files against the index, and
+answers "what is similar to this rule?" from the stored edges.
+
+    python -m cssscan.neardup [<styles_dir>] [--index <near-dup-index.json>] [--threshold 0.9] [--similar <selector>]
+"""
+
+import heapq
+import math
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Hashable, Iterator, List, Optional, Sequence, Set, Tuple
+
+# Two bodies are compared only when they share at least this fraction of the larger one's properties
+PROPERTY_OVERLAP = 0.5
+INDEX_NAME = "near-dup-index.json"
+
+
+def centre_groups(neighbours: Dict[Hashable, Set], ordered: Sequence[Hashable],
+                  declarations: Dict[Hashable, Set[str]]) -> List[List]:
+    """Greedy centre-based cut of a similarity graph: the node with the most unassigned
+    neighbours (earliest in ordered on a tie) becomes a centre and takes them, in order,
+    as long as the declarations they all share stay non-empty. Each group is
+    [centre, members in order...], every member adjacent to its centre."""
+    rank = {node: r for r, node in enumerate(ordered)}
+    free = {node for node in ordered if neighbours.get(node)}
+    heap = [(-len(neighbours[node]), rank[node]) for node in free]
+    heapq.heapify(heap)
+    groups = []
+    while heap:
+        degree, r = heapq.heappop(heap)
+        node = ordered[r]
+        if node not in free:
+            continue
+        members = [m for m in neighbours[node] if m in free]
+        if len(members) != -degree:
+            # Stale entry: degrees only fall, so re-queue with the current one
+            if members:
+                heapq.heappush(heap, (-len(members), r))
+            continue
+        core = set(declarations[node])
+        taken = []
+        for m in sorted(members, key=rank.get):
+            if core & declarations[m]:
+                core &= declarations[m]
+                taken.append(m)
+        if not taken:
+            continue  # similar text, nothing to share (padding: 4px vs padding: 8px); may still join another
+        free.discard(node)
+        free.difference_update(taken)
+        groups.append([node] + taken)
+    return groups
+
+
+@dataclass
+class Cluster:
+    members: List[Dict]  # entries, exact copies of one body included
+    medoid: Dict
+    core: List[str]  # declarations present in every member
+    similarity: Dict[int, float] = field(default_factory=dict)  # id(entry) -> ratio to the medoid
+
+    def rows(self, number: int) -> List[Dict]:
+        core = set(self.core)
+        rows = []
+        for e in self.members:
+            is_medoid = e is self.medoid
+            rows.append({
+                "cluster": number,
+                "rules": len(self.members),
+                "medoid": "yes" if is_medoid else "",
+                "selector": e["selector"],
+                "file": str(e["file"]),
+                "similarity": self.similarity.get(id(e), 1.0),
+                "core_declarations": "; ".join(self.core) if is_medoid else "",
+                "extra_declarations": "; ".join(d for d in _declarations(e["normalized"]) if d not in core),
+            })
+        return rows
+
+
+def _declarations(normalized: str) -> List[str]:
+    return [d for d in normalized.rstrip(";").split(";\n  ") if d]
+
+
+def cluster_near_duplicates(entries: List[Dict], threshold: float) -> List[Cluster]:
+    """Clusters of rules whose bodies are at least threshold similar to the cluster's medoid,
+    largest first. Entries need selector, file, hash and normalized; a cluster holds at least
+    two distinct bodies."""
+    from difflib import SequenceMatcher
+
+    # One representative per distinct body; exact copies ride along with it
+    reps: List[Dict] = []
+    copies: List[List[Dict]] = []
+    by_hash: Dict[str, int] = {}
+    for e in entries:
+        if e["hash"] in by_hash:
+            copies[by_hash[e["hash"]]].append(e)
+        elif e["normalized"]:
+            by_hash[e["hash"]] = len(reps)
+            reps.append(e)
+            copies.append([e])
+
+    decls = [_declarations(e["normalized"]) for e in reps]
+    prop_sets = [{d.split(":", 1)[0] for d in ds} for ds in decls]
+    props = [sorted(ps) for ps in prop_sets]
+    frequency = Counter(p for ps in props for p in ps)
+    # Character counts over a shared alphabet give difflib's quick_ratio bound without rescanning text
+    alphabet = sorted({ch for e in reps for ch in e["normalized"]})
+    char_counts = []
+    for e in reps:
+        counts = Counter(e["normalized"])
+        char_counts.append([counts.get(ch, 0) for ch in alphabet])
+
+    neighbours: Dict[int, Set[int]] = defaultdict(set)
+    index: Dict[str, List[int]] = defaultdict(list)
+    matcher = SequenceMatcher()
+    for i, rep in enumerate(reps):
+        rarest = sorted(props[i], key=lambda p: (frequency[p], p))
+        prefix = rarest[:len(rarest) - math.ceil(PROPERTY_OVERLAP * len(rarest)) + 1]
+        matcher.set_seq2(rep["normalized"])
+        seen = set()
+        for prop in prefix:
+            for j in index[prop]:
+                if j in seen:
+                    continue
+                seen.add(j)
+                if len(prop_sets[i] & prop_sets[j]) < math.ceil(PROPERTY_OVERLAP * max(len(props[i]), len(props[j]))):
+                    continue
+                la, lb = len(reps[j]["normalized"]), len(rep["normalized"])
+                if 2 * min(la, lb) / (la + lb) < threshold:
+                    continue  # ratio can never reach the threshold
+                if 2 * sum(map(min, char_counts[i], char_counts[j])) / (la + lb) < threshold:
+                    continue  # nor with too few characters in common
+                matcher.set_seq1(reps[j]["normalized"])
+                if matcher.ratio() >= threshold:
+                    neighbours[i].add(j)
+                    neighbours[j].add(i)
+            index[prop].append(i)
+
+    clusters = [_make_cluster([reps[i] for i in group], [copies[i] for i in group], [decls[i] for i in group], matcher)
+                for group in centre_groups(neighbours, range(len(reps)), dict(enumerate(map(set, decls))))]
+    clusters.sort(key=lambda c: (-len(c.members), c.medoid["selector"]))
+    return clusters
+
+
+def _make_cluster(reps: List[Dict], copies: List[List[Dict]], decls: List[List[str]], matcher) -> Cluster:
+    """A cluster from its distinct bodies, centre first, each with its exact copies"""
+    counts = Counter(d for ds in decls for d in set(ds))
+    medoid = 0
+    core = [d for d in decls[medoid] if counts[d] == len(reps)]
+    matcher.set_seq2(reps[medoid]["normalized"])
+    similarity = {}
+    for i, rep in enumerate(reps):
+        matcher.set_seq1(rep["normalized"])
+        ratio = 1.0 if i == medoid else round(matcher.ratio(), 3)
+        for e in copies[i]:
+            similarity[id(e)] = ratio
+    return Cluster([e for group in copies for e in group], reps[medoid], core, similarity)
+
+
+def rule_entries(path, sheet) -> List[Dict]:
+    """Near-duplicate entries for one parsed stylesheet: the shorthand-expanded body is
+    the exact-copy hash, the canonical body is what gets compared (as main.py does)"""
+    from cssscan.canonical import canonicalize_declarations
+    from cssscan.merge import body_key
+    from cssscan.parser import iter_rules
+
+    return [{
+        "selector": rule.selector,
+        "file": path,
+        "line": rule.line,
+        "hash": body_key(rule.declarations),
+        "normalized": ";\n  ".join(canonicalize_declarations([d.text() for d in rule.declarations])) + ";",
+    } for rule in iter_rules(sheet.nodes) if rule.declarations]
+
+
+def body_id(normalized: str) -> str:
+    import hashlib
+
+    return hashlib.sha1(normalized.encode("utf-8")).hexdigest()[:16]
+
+
+class _Body:
+    __slots__ = ("normalized", "decls", "props", "chars", "neighbours", "uses")
+
+    def __init__(self, normalized: str):
+        self.normalized = normalized
+        self.decls = _declarations(normalized)
+        self.props = frozenset(d.split(":", 1)[0] for d in self.decls)
+        self.chars = Counter(normalized)
+        self.neighbours: Dict[str, float] = {}  # body id -> ratio, for ratios at or above the threshold
+        self.uses: List[Tuple[str, str, int]] = []  # (file, selector, line)
+
+
+class NearDupIndex:
+    """Persisted similarity graph over distinct rule bodies.
+    Files are keyed by digest: sync() drops the bodies of changed and removed files
+    and compares the bodies they add against the index only, so the difflib work is
+    proportional to the change. Every edge at or above the threshold is kept (not
+    just enough to join a cluster), which is what lets a body be taken out again."""
+
+    FORMAT = 1
+
+    def __init__(self, threshold: float = 0.9):
+        self.threshold = threshold
+        self.bodies: Dict[str, _Body] = {}
+        self.postings: Dict[str, Set[str]] = defaultdict(set)  # property -> body ids
+        self.files: Dict[str, Dict] = {}  # file key -> {"digest", "rules": [[selector, line, body id]]}
+        self.comparisons = 0  # difflib ratios computed since load
+
+    def __len__(self) -> int:
+        return len(self.bodies)
+
+    def _candidates(self, body: _Body, threshold: float) -> Iterator[Tuple[str, _Body]]:
+        """Indexed bodies that pass the property-overlap, length and character-count bounds"""
+        rarest = sorted(body.props, key=lambda p: (len(self.postings.get(p, ())), p))
+        prefix = rarest[:len(rarest) - math.ceil(PROPERTY_OVERLAP * len(rarest)) + 1]
+        seen = set()
+        for prop in prefix:
+            for other_id in self.postings.get(prop, ()):
+                if other_id in seen:
+                    continue
+                seen.add(other_id)
+                other = self.bodies[other_id]
+                if other is body:
+                    continue
+                if len(body.props & other.props) < math.ceil(PROPERTY_OVERLAP * max(len(body.props), len(other.props))):
+                    continue
+                la, lb = len(other.normalized), len(body.normalized)
+                if 2 * min(la, lb) / (la + lb) < threshold:
+                    continue
+                if 2 * sum((body.chars & other.chars).values()) / (la + lb) < threshold:
+                    continue
+                yield other_id, other
+
+    def _ratios(self, key: str, body: _Body, threshold: float) -> Dict[str, float]:
+        """Candidates at or above threshold. Each pair is always compared in body id order,
+        so a ratio does not depend on which of the two bodies arrived first."""
+        from difflib import SequenceMatcher
+
+        found = {}
+        matcher = SequenceMatcher()
+        matcher.set_seq2(body.normalized)
+        later = []
+        for other_id, other in self._candidates(body, threshold):
+            if other_id > key:
+                later.append((other_id, other))
+                continue
+            matcher.set_seq1(other.normalized)
+            self.comparisons += 1
+            ratio = matcher.ratio()
+            if ratio >= threshold:
+                found[other_id] = round(ratio, 3)
+        matcher.set_seq1(body.normalized)
+        for other_id, other in later:
+            matcher.set_seq2(other.normalized)
+            self.comparisons += 1
+            ratio = matcher.ratio()
+            if ratio >= threshold:
+                found[other_id] = round(ratio, 3)
+        return found
+
+    def _add_use(self, key: str, normalized: str, use: Tuple[str, str, int],
+                 ratios: Optional[Dict[str, float]] = None) -> bool:
+        """Count a use of a body, indexing the body if it is new; ratios, when given, are its
+        edges as delta() worked them out (to bodies that may since have gone)"""
+        body = self.bodies.get(key)
+        added = body is None
+        if added:
+            body = _Body(normalized)
+            if ratios is None:
+                body.neighbours = self._ratios(key, body, self.threshold)
+            else:
+                body.neighbours = {k: r for k, r in ratios.items() if k in self.bodies}
+            for other_id, ratio in body.neighbours.items():
+                self.bodies[other_id].neighbours[key] = ratio
+            self.bodies[key] = body
+            for prop in body.props:
+                self.postings[prop].add(key)
+        body.uses.append(use)
+        return added
+
+    def _drop_body(self, key: str):
+        body = self.bodies.pop(key)
+        for other_id in body.neighbours:
+            self.bodies[other_id].neighbours.pop(key, None)
+        for prop in body.props:
+            self.postings[prop].discard(key)
+            if not self.postings[prop]:
+                del self.postings[prop]
+
+    def _strip(self, file_key: str, keep: Set[str]) -> int:
+        """Take a file's uses out of its bodies and drop the bodies left unused, except
+        those in keep; returns how many were dropped"""
+        entry = self.files.pop(file_key, None)
+        if entry is None:
+            return 0
+        dropped = 0
+        for key in {key for _, _, key in entry["rules"]}:
+            body = self.bodies[key]
+            body.uses = [u for u in body.uses if u[0] != file_key]
+            if not body.uses and key not in keep:
+                self._drop_body(key)
+                dropped += 1
+        return dropped
+
+    def remove_file(self, file_key: str) -> int:
+        """Forget a file's rules; returns how many bodies left the index with it"""
+        return self._strip(file_key, set())
+
+    def add_file(self, file_key: str, digest: str, entries: List[Dict]) -> Tuple[int, int]:
+        """(Re-)index a file's entries (see rule_entries); returns (bodies added, bodies dropped).
+        Bodies the file had before and still has are kept with their edges, so editing one
+        rule compares only that rule's new body."""
+        keyed = [(body_id(e["normalized"]), e) for e in entries if e["normalized"]]
+        dropped = self._strip(file_key, {key for key, _ in keyed})
+        rules, added = [], 0
+        for key, e in keyed:
+            added += self._add_use(key, e["normalized"], (file_key, e["selector"], e.get("line", 0)))
+            rules.append([e["selector"], e.get("line", 0), key])
+        self.files[file_key] = {"digest": digest, "rules": rules}
+        return added, dropped
+
+    def delta(self, digests: Dict[str, str], entries_for: Callable[[str], List[Dict]]) -> Dict:
+        """What sync() would change, worked out without changing this index: the files to
+        drop and to (re-)index, and the edges of the bodies new to the index. All the
+        difflib work happens here, so it can run while the index keeps answering queries;
+        apply() then only updates dictionaries."""
+        removed = [k for k in self.files if k not in digests]
+        changed = {k: (d, entries_for(k)) for k, d in digests.items()
+                   if self.files.get(k, {}).get("digest") != d}
+        live = NearDupIndex.__new__(NearDupIndex)  # reads this index, counts its own comparisons
+        live.threshold, live.bodies, live.postings, live.comparisons = self.threshold, self.bodies, self.postings, 0
+        fresh = NearDupIndex(self.threshold)  # the new bodies, compared with each other
+        for _, entries in changed.values():
+            for e in entries:
+                key = body_id(e["normalized"]) if e["normalized"] else None
+                if key is None or key in self.bodies or key in fresh.bodies:
+                    continue
+                body = _Body(e["normalized"])
+                body.neighbours = live._ratios(key, body, self.threshold)
+                for other_id, ratio in fresh._ratios(key, body, self.threshold).items():
+                    body.neighbours[other_id] = ratio
+                    fresh.bodies[other_id].neighbours[key] = ratio
+                fresh.bodies[key] = body
+                for prop in body.props:
+                    fresh.postings[prop].add(key)
+        return {"removed": removed, "changed": changed,
+                "edges": {key: body.neighbours for key, body in fresh.bodies.items()},
+                "comparisons": live.comparisons + fresh.comparisons}
+
+    def apply(self, delta: Dict) -> Dict[str, int]:
+        """Bring the index to the state a delta() of it describes"""
+        stats = {"files_changed": 0, "files_removed": 0, "bodies_added": 0, "bodies_removed": 0}
+        keyed = {file_key: [(body_id(e["normalized"]), e) for e in entries if e["normalized"]]
+                 for file_key, (_, entries) in delta["changed"].items()}
+        # bodies any changed file still has keep their edges, whichever file they move to
+        keep = {key for pairs in keyed.values() for key, _ in pairs}
+        for file_key in delta["removed"]:
+            stats["bodies_removed"] += self._strip(file_key, keep)
+            stats["files_removed"] += 1
+        for file_key in keyed:
+            stats["bodies_removed"] += self._strip(file_key, keep)
+        for file_key, pairs in keyed.items():
+            rules = []
+            for key, e in pairs:
+                stats["bodies_added"] += self._add_use(key, e["normalized"], (file_key, e["selector"], e.get("line", 0)),
+                                                       delta["edges"].get(key, {}))
+                rules.append([e["selector"], e.get("line", 0), key])
+            self.files[file_key] = {"digest": delta["changed"][file_key][0], "rules": rules}
+            stats["files_changed"] += 1
+        self.comparisons += delta["comparisons"]
+        stats["comparisons"] = delta["comparisons"]
+        return stats
+
+    def sync(self, digests: Dict[str, str], entries_for: Callable[[str], List[Dict]]) -> Dict[str, int]:
+        """Bring the index up to date with {file key: digest}; entries_for(key) is only
+        called for files that are new or whose digest changed"""
+        return self.apply(self.delta(digests, entries_for))
+
+    def _use_entry(self, key: str, use: Tuple[str, str, int]) -> Dict:
+        return {"selector": use[1], "file": use[0], "line": use[2], "hash": key,
+                "normalized": self.bodies[key].normalized}
+
+    def similar(self, normalized: str, limit: int = 10, threshold: Optional[float] = None) -> List[Dict]:
+        """Indexed rules whose bodies are most similar to a canonical body, best first.
+        A body already in the index at the index threshold is answered from its stored
+        edges; anything else is compared against the index candidates only."""
+        threshold = self.threshold if threshold is None else threshold
+        key = body_id(normalized)
+        if key in self.bodies and threshold >= self.threshold:
+            ratios = {k: r for k, r in self.bodies[key].neighbours.items() if r >= threshold}
+        else:
+            ratios = self._ratios(key, self.bodies.get(key) or _Body(normalized), threshold)
+        ranked = sorted(ratios.items(), key=lambda kv: (-kv[1], kv[0]))[:limit]
+        return [{**self._use_entry(k, use), "similarity": ratio} for k, ratio in ranked for use in self.bodies[k].uses]
+
+    def rules_for(self, selector: str) -> List[Dict]:
+        """Indexed rules written with this selector"""
+        return [self._use_entry(key, (file_key, sel, line)) for file_key, entry in self.files.items()
+                for sel, line, key in entry["rules"] if sel == selector]
+
+    def clusters(self) -> List[Cluster]:
+        """The stored graph cut around centres, as cluster_near_duplicates does"""
+        from difflib import SequenceMatcher
+
+        first_use = {key: min(body.uses) for key, body in self.bodies.items()}
+        ordered = sorted(self.bodies, key=lambda key: (first_use[key], key))
+        neighbours = {key: set(body.neighbours) for key, body in self.bodies.items()}
+        clusters = []
+        matcher = SequenceMatcher()
+        declarations = {key: set(body.decls) for key, body in self.bodies.items()}
+        for group in centre_groups(neighbours, ordered, declarations):
+            copies = [[self._use_entry(key, use) for use in sorted(self.bodies[key].uses)] for key in group]
+            clusters.append(_make_cluster([c[0] for c in copies], copies,
+                                          [self.bodies[key].decls for key in group], matcher))
+        clusters.sort(key=lambda c: (-len(c.members), c.medoid["selector"]))
+        return clusters
+
+    def save(self, path, digests: Optional[Dict[str, Dict]] = None):
+        """Write the index as JSON; digests (DigestCache entries) ride along for the next load"""
+        import json
+        import os
+
+        data = {
+            "format": self.FORMAT,
+            "threshold": self.threshold,
+            "files": self.files,
+            "bodies": {key: {"normalized": body.normalized, "neighbours": body.neighbours}
+                       for key, body in sorted(self.bodies.items())},
+            "digests": digests or {},
+        }
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path, threshold: float = 0.9) -> Tuple["NearDupIndex", Dict[str, Dict]]:
+        """(index, saved digests); an empty index when the file is missing or was built
+        with another threshold or format"""
+        import json
+        import os
+
+        index = cls(threshold)
+        if not os.path.exists(path):
+            return index, {}
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("format") != cls.FORMAT or data.get("threshold") != threshold:
+            return index, {}
+        for key, saved in data["bodies"].items():
+            body = index.bodies[key] = _Body(saved["normalized"])
+            body.neighbours = saved["neighbours"]
+            for prop in body.props:
+                index.postings[prop].add(key)
+        index.files = data["files"]
+        for file_key, entry in index.files.items():
+            for selector, line, key in entry["rules"]:
+                index.bodies[key].uses.append((file_key, selector, line))
+        return index, data.get("digests", {})
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    import argparse
+    import time
+    from pathlib import Path
+
+    from cssscan.backup import DigestCache
+    from cssscan.parser import parse_file
+
+    parser = argparse.ArgumentParser(prog="python -m cssscan.neardup",
+                                     description="Sync the near-duplicate index and report clusters")
+    parser.add_argument("styles_dir", nargs="?", default="styles")
+    parser.add_argument("--index", default=INDEX_NAME, help=f"index file (default: {INDEX_NAME})")
+    parser.add_argument("--threshold", type=float, default=0.9, help="similarity threshold")
+    parser.add_argument("--similar", metavar="SELECTOR", help="list the rules most similar to this one")
+    args = parser.parse_args(argv)
+    styles_dir = Path(args.styles_dir)
+    index_path = Path(args.index)
+    threshold = args.threshold
+
+    start = time.perf_counter()
+    index, saved = NearDupIndex.load(index_path, threshold)
+    # Unchanged files are recognised by size and mtime and never read or parsed
+    digest = DigestCache({str((styles_dir / rel).resolve()): entry for rel, entry in saved.items()})
+    paths = {p.relative_to(styles_dir).as_posix(): p for p in sorted(styles_dir.rglob("*.css"))}
+    stats = index.sync({rel: digest(p) for rel, p in paths.items()},
+                       lambda rel: rule_entries(rel, parse_file(paths[rel])))
+    cached = digest.entries()
+    index.save(index_path, {rel: cached[str(p.resolve())] for rel, p in paths.items()})
+    print(f"🔁 {stats['files_changed']} files changed, {stats['files_removed']} removed: "
+          f"+{stats['bodies_added']}/-{stats['bodies_removed']} bodies, {stats['comparisons']} comparisons "
+          f"({len(index)} bodies indexed, {time.perf_counter() - start:.2f}s)")
+
+    if args.similar:
+        rules = index.rules_for(args.similar)
+        if not rules:
+            print(f"❌ No rule with selector '{args.similar}'")
+            return 1
+        for rule in rules:
+            start = time.perf_counter()
+            found = index.similar(rule["normalized"])
+            elapsed = (time.perf_counter() - start) * 1000
+            print(f"\n🔎 {rule['selector']}  {rule['file']}:{rule['line']} ({elapsed:.2f} ms)")
+            for e in found:
+                print(f"  {e['similarity']:.3f}  {e['selector']}  {e['file']}:{e['line']}")
+            if not found:
+                print("  (nothing at or above the threshold)")
+        return 0
+
+    clusters = index.clusters()
+    print(f"📊 {len(clusters)} clusters covering {sum(len(c.members) for c in clusters)} rules "
+          f"at or above {threshold}")
+    return 0
+
+
+if __name__ == "__main__":
+    import sys
+
+    sys.exit(main())
@@ -0,0 +1,500 @@
+"""
+Perceptual colour clustering.
+Every colour literal in a declaration value (hex, rgb()/rgba(), hsl()/hsla(),
+named colours) is collected with its position, and custom properties whose
+value is a single colour are taken as the existing tokens when they are
+global: defined once, in an unconditional top-level :root rule (a token
+scoped to a selector, or redefined in @media, means something else
+elsewhere). Colours are
+compared in OKLab as they look over a white and over a black background, so
+rgba(52, 152, 219, 0.02) and rgba(52, 152, 219, 0.05) are close while the
+same hue at 0.1 and 0.3 is not; the distance is the RMS of the two OKLab
+distances (about 0.02 is a just-noticeable difference).
+
+Clustering is greedy: existing tokens first, then colours by use count, each
+takes every unclaimed colour within the threshold, so a colour is never
+rewritten to one further than the threshold away. Neighbours come from
+blocked NumPy distance matrices when NumPy is installed, else a k-d tree.
+The result is a rewrite map (literal -> token), the new tokens to add to
+base/variables.css, and how many distinct literals and bytes that removes.
+
+    python -m cssscan.palette [<styles_dir>] [--delta-e <0.03>] [--csv <map.csv>] [--diff <palette.diff>]
+"""
+
+import argparse
+import math
+import re
+import sys
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from cssscan.canonical import _OPAQUE_RE, CASE_SENSITIVE_PROPERTIES, NAMED_COLORS
+from cssscan.parser import Stylesheet, apply_edits, insert_root_declarations, iter_rules, parse_stylesheet
+
+try:
+    import numpy
+except ImportError:  # optional; the k-d tree gives the same neighbours without it
+    numpy = None
+
+DEFAULT_DELTA_E = 0.03
+TOKEN_PREFIX = "--color-"
+DISTANCE_BLOCK = 1 << 22  # distance-matrix entries computed at once
+
+RGBA = Tuple[int, int, int, float]
+
+_COLOR_RE = re.compile(
+    r'(?<![\w#-])#[0-9a-fA-F]{3,8}(?![\w-])'
+    r'|\b(?:rgba?|hsla?)\([^()]*\)'
+    r'|(?<![\w#.-])(?:' + '|'.join(sorted(NAMED_COLORS, key=len, reverse=True)) + r')(?![\w(-])',
+    re.IGNORECASE)
+_VAR_RE = re.compile(r'var\(\s*(--[\w-]+)')
+
+
+def _channel(text: str, scale: float) -> Optional[float]:
+    text = text.strip()
+    try:
+        return float(text[:-1]) / 100 * scale if text.endswith("%") else float(text)
+    except ValueError:
+        return None
+
+
+def _hsl_to_rgb(h: float, s: float, lightness: float) -> Tuple[float, float, float]:
+    def f(n: int) -> float:
+        k = (n + h / 30) % 12
+        return lightness - s * min(lightness, 1 - lightness) * max(-1, min(k - 3, 9 - k, 1))
+    return f(0) * 255, f(8) * 255, f(4) * 255
+
+
+def parse_color(text: str) -> Optional[RGBA]:
+    """'#3498db', 'rgba(52, 152, 219, .1)', 'hsl(204 70% 53%)', 'white' -> (r, g, b, alpha)"""
+    text = text.strip().lower()
+    if text in NAMED_COLORS:
+        text = NAMED_COLORS[text]
+    if text.startswith("#"):
+        digits = text[1:]
+        if len(digits) in (3, 4):
+            digits = "".join(c * 2 for c in digits)
+        if len(digits) not in (6, 8):
+            return None
+        r, g, b = (int(digits[i:i + 2], 16) for i in (0, 2, 4))
+        return r, g, b, round(int(digits[6:], 16) / 255, 3) if len(digits) == 8 else 1.0
+    m = re.fullmatch(r'(rgba?|hsla?)\((.*)\)', text)
+    if not m:
+        return None
+    parts = [p for p in re.split(r'[\s,/]+', m.group(2).strip()) if p]
+    if len(parts) not in (3, 4):
+        return None
+    alpha = _channel(parts[3], 1) if len(parts) == 4 else 1.0
+    if m.group(1).startswith("rgb"):
+        channels = [_channel(p, 255) for p in parts[:3]]
+    else:
+        hue = _channel(parts[0].replace("deg", ""), 1)
+        s, lightness = _channel(parts[1], 1), _channel(parts[2], 1)
+        if None in (hue, s, lightness) or not (parts[1].endswith("%") and parts[2].endswith("%")):
+            return None
+        channels = list(_hsl_to_rgb(hue % 360, min(max(s, 0), 1), min(max(lightness, 0), 1)))
+    if alpha is None or None in channels:
+        return None
+    r, g, b = (int(round(min(max(c, 0), 255))) for c in channels)
+    return r, g, b, round(min(max(alpha, 0.0), 1.0), 3)
+
+
+def format_color(rgba: RGBA) -> str:
+    """Shortest usual spelling: #abc / #aabbcc when opaque, rgba(r, g, b, a) otherwise"""
+    r, g, b, a = rgba
+    if a >= 1:
+        text = f"#{r:02x}{g:02x}{b:02x}"
+        return "#" + text[1::2] if text[1::2] == text[2::2] else text
+    return f"rgba({r}, {g}, {b}, {a:g})"
+
+
+def _linear(c: float) -> float:
+    c /= 255
+    return c / 12.92 if c <= 0.04045 else ((c + 0.055) / 1.055) ** 2.4
+
+
+def oklab(r: float, g: float, b: float) -> Tuple[float, float, float]:
+    r, g, b = _linear(r), _linear(g), _linear(b)
+    lms = (0.4122214708 * r + 0.5363325363 * g + 0.0514459929 * b,
+           0.2119034982 * r + 0.6806995451 * g + 0.1073969566 * b,
+           0.0883024619 * r + 0.2817188376 * g + 0.6299787005 * b)
+    l_, m_, s_ = (math.copysign(abs(x) ** (1 / 3), x) for x in lms)
+    return (0.2104542553 * l_ + 0.7936177850 * m_ - 0.0040720453 * s_,
+            1.9779984951 * l_ - 2.4285922050 * m_ + 0.4505937099 * s_,
+            0.0259040371 * l_ + 0.7827717662 * m_ - 0.8086757660 * s_)
+
+
+def color_vector(rgba: RGBA) -> Tuple[float, ...]:
+    """OKLab over white and over black, scaled so Euclidean distance is the RMS delta E"""
+    r, g, b, a = rgba
+    over_white = oklab(*(a * c + (1 - a) * 255 for c in (r, g, b)))
+    over_black = oklab(*(a * c for c in (r, g, b)))
+    return tuple(x / math.sqrt(2) for x in over_white + over_black)
+
+
+def delta_e(a: RGBA, b: RGBA) -> float:
+    return math.dist(color_vector(a), color_vector(b))
+
+
+class KDTree:
+    """Static k-d tree over points, for radius queries without NumPy"""
+
+    def __init__(self, points: Sequence[Sequence[float]]):
+        self.points = points
+        self.k = len(points[0]) if points else 0
+        self.root = self._build(list(range(len(points))), 0)
+
+    def _build(self, ids: List[int], depth: int):
+        if not ids:
+            return None
+        axis = depth % self.k
+        ids.sort(key=lambda i: self.points[i][axis])
+        mid = len(ids) // 2
+        return ids[mid], axis, self._build(ids[:mid], depth + 1), self._build(ids[mid + 1:], depth + 1)
+
+    def within(self, point: Sequence[float], radius: float) -> List[int]:
+        found, stack = [], [self.root]
+        while stack:
+            node = stack.pop()
+            if node is None:
+                continue
+            i, axis, left, right = node
+            if math.dist(point, self.points[i]) <= radius:
+                found.append(i)
+            diff = point[axis] - self.points[i][axis]
+            if diff <= radius:
+                stack.append(left)
+            if diff >= -radius:
+                stack.append(right)
+        return found
+
+
+class NeighbourIndex:
+    """Indices of the vectors within radius of vectors[i]. With NumPy, rows come from a
+    blocked distance matrix computed a block at a time as i advances; else a k-d tree."""
+
+    def __init__(self, vectors: List[Tuple[float, ...]], radius: float):
+        self.vectors = vectors
+        self.radius = radius
+        if numpy is not None:
+            self.points = numpy.asarray(vectors, dtype=float).reshape(len(vectors), -1)
+            self.norms = (self.points ** 2).sum(axis=1)
+            self.block = max(1, DISTANCE_BLOCK // max(1, len(vectors)))
+            self._rows, self._start = None, -1
+        else:
+            self.tree = KDTree(vectors)
+
+    def within(self, i: int) -> List[int]:
+        if numpy is None:
+            return sorted(self.tree.within(self.vectors[i], self.radius))
+        start = i - i % self.block
+        if start != self._start:
+            rows = self.points[start:start + self.block]
+            d2 = self.norms[start:start + self.block, None] + self.norms[None, :] - 2 * rows @ self.points.T
+            self._rows, self._start = d2 <= self.radius * self.radius + 1e-12, start
+        return numpy.flatnonzero(self._rows[i - start]).tolist()
+
+
+@dataclass
+class ColorUse:
+    path: Path
+    line: int
+    property: str
+    literal: str
+    span: Tuple[int, int]  # source offsets of the literal
+
+
+@dataclass
+class Swatch:
+    rgba: RGBA
+    uses: List[ColorUse] = field(default_factory=list)
+    tokens: List[str] = field(default_factory=list)  # custom properties defined as exactly this colour
+
+    def spelling(self) -> str:
+        counts = Counter(u.literal for u in self.uses)
+        return counts.most_common(1)[0][0] if counts else format_color(self.rgba)
+
+
+@dataclass
+class PaletteCluster:
+    centre: Swatch
+    members: List[Swatch]  # centre first
+    token: str
+    new_token: bool  # the token is proposed, not already defined
+    deltas: Dict[RGBA, float] = field(default_factory=dict)
+
+    @property
+    def value(self) -> str:
+        return format_color(self.centre.rgba)
+
+
+class ColorAnalyzer:
+    """Colour literals and tokens of a tree, clustered into a reduced palette"""
+
+    def __init__(self, threshold: float = DEFAULT_DELTA_E, preferred: Iterable[str] = ()):
+        self.threshold = threshold
+        self.preferred = {c for c in map(parse_color, preferred) if c}  # e.g. phase1's colors_to_consolidate
+        self.swatches: Dict[RGBA, Swatch] = {}
+        self.token_values: Dict[str, RGBA] = {}
+        self.definitions: Dict[str, List[Tuple[Optional[RGBA], bool]]] = defaultdict(list)  # (colour, global)
+        self.var_uses: Counter = Counter()
+        self.contrasts: Dict[RGBA, set] = defaultdict(set)  # colours used together in one value
+        self.contrast_vars: Dict[RGBA, set] = defaultdict(set)  # ... and var()s used with them
+        self.sources: Dict[Path, str] = {}
+
+    def _swatch(self, rgba: RGBA) -> Swatch:
+        if rgba not in self.swatches:
+            self.swatches[rgba] = Swatch(rgba)
+        return self.swatches[rgba]
+
+    def add(self, sheet: Stylesheet, text: str):
+        self.sources[sheet.path] = text
+        for rule in iter_rules(sheet.nodes):
+            is_root = not rule.context and rule.selectors == [":root"]
+            for d in rule.declarations:
+                start, end = d.span
+                source = text[start:end]
+                value_start = start + source.index(":") + 1 if ":" in source else end
+                value = text[value_start:end]
+                names = _VAR_RE.findall(value)
+                self.var_uses.update(names)
+                prop = d.property.lower()
+                if prop.startswith("--"):
+                    rgba = parse_color(d.value)
+                    self.definitions[d.property].append((rgba, is_root))
+                    if rgba is not None:
+                        continue  # a colour custom property's own definition is never rewritten
+                opaque = [m.span() for m in _OPAQUE_RE.finditer(value)]
+                found = set()
+                for m in _COLOR_RE.finditer(value):
+                    if any(a <= m.start() < b for a, b in opaque):
+                        continue
+                    if m.group(0)[0].isalpha() and prop in CASE_SENSITIVE_PROPERTIES:
+                        continue  # an animation or font name, not a colour
+                    rgba = parse_color(m.group(0))
+                    if rgba is not None:
+                        found.add(rgba)
+                        self._swatch(rgba).uses.append(ColorUse(
+                            sheet.path, rule.line, d.property, m.group(0),
+                            (value_start + m.start(), value_start + m.end())))
+                for rgba in found:
+                    self.contrasts[rgba] |= found - {rgba}
+                    self.contrast_vars[rgba].update(names)
+
+    @classmethod
+    def build(cls, sources: Dict[Path, str], sheets: Optional[Dict[Path, Stylesheet]] = None,
+              **options) -> "ColorAnalyzer":
+        analyzer = cls(**options)
+        for path, text in sources.items():
+            sheet = sheets[path] if sheets and path in sheets else parse_stylesheet(text, path)
+            analyzer.add(sheet, text)
+        return analyzer
+
+    def _collect_tokens(self):
+        """Existing tokens: colour custom properties defined once, in an unconditional top-level :root"""
+        self.token_values = {}
+        for swatch in self.swatches.values():
+            swatch.tokens = []
+        for name, defs in self.definitions.items():
+            if len(defs) != 1:
+                continue  # redefined somewhere, so its value depends on where it is used
+            rgba, is_root = defs[0]
+            if rgba is not None and is_root:
+                self.token_values[name] = rgba
+                self._swatch(rgba).tokens.append(name)
+
+    def _apart(self, rgba: RGBA) -> set:
+        """Colours that must not merge with rgba: used beside it, directly or through a token"""
+        return self.contrasts[rgba] | {self.token_values[n] for n in self.contrast_vars[rgba]
+                                       if n in self.token_values}
+
+    def _token_name(self, swatch: Swatch) -> str:
+        """The existing token most referenced through var(), else the first defined"""
+        return max(swatch.tokens, key=lambda t: (self.var_uses[t], -swatch.tokens.index(t)))
+
+    def _new_token_name(self, rgba: RGBA) -> str:
+        r, g, b, a = rgba
+        name = f"{TOKEN_PREFIX}{r:02x}{g:02x}{b:02x}" + (f"-a{round(a * 100)}" if a < 1 else "")
+        taken = set(self.definitions)
+        suffix = 2
+        base = name
+        while name in taken:
+            name, suffix = f"{base}-{suffix}", suffix + 1
+        return name
+
+    def cluster(self) -> List[PaletteCluster]:
+        """Token colours first, then preferred colours, then by use count; each claims every
+        unclaimed colour within the threshold, except colours used together in one value
+        (gradient stops, layered shadows), which stay apart. Clusters that change nothing are dropped."""
+        self._collect_tokens()
+        swatches = sorted(self.swatches.values(), key=lambda s: (
+            not s.tokens, s.rgba not in self.preferred, -len(s.uses), s.rgba))
+        vectors = [color_vector(s.rgba) for s in swatches]
+        index = NeighbourIndex(vectors, self.threshold)
+        claimed = set()
+        clusters = []
+        for i, centre in enumerate(swatches):
+            if i in claimed:
+                continue
+            claimed.add(i)
+            members = [centre]
+            apart = self._apart(centre.rgba)
+            for j in index.within(i):
+                candidate = swatches[j]
+                if j in claimed or candidate.tokens or candidate.rgba in apart:
+                    continue
+                candidate_apart = self._apart(candidate.rgba)
+                if any(s.rgba in candidate_apart for s in members):
+                    continue
+                claimed.add(j)
+                members.append(candidate)
+                apart |= candidate_apart
+            uses = sum(len(s.uses) for s in members)
+            if centre.tokens:
+                if not uses:
+                    continue
+                token, new = self._token_name(centre), False
+            elif len(members) > 1:
+                token, new = self._new_token_name(centre.rgba), True
+            else:
+                continue
+            deltas = {s.rgba: round(math.dist(vectors[i], color_vector(s.rgba)), 4) for s in members}
+            clusters.append(PaletteCluster(centre, members, token, new, deltas))
+        clusters.sort(key=lambda c: (-sum(len(s.uses) for s in c.members), c.token))
+        return clusters
+
+    def summary(self, clusters: List[PaletteCluster]) -> Dict:
+        """Distinct literals and bytes removed, rewriting to var(token) or to the centre's literal"""
+        literals_before = {u.literal.lower() for s in self.swatches.values() for u in s.uses}
+        rewritten = {u.literal.lower() for c in clusters for s in c.members for u in s.uses}
+        merged = {u.literal.lower() for c in clusters for s in c.members[1:] for u in s.uses}
+        centres = {c.centre.spelling().lower() for c in clusters if len(c.members) > 1}
+        token_bytes = literal_bytes = 0
+        for c in clusters:
+            target = c.centre.spelling() if c.centre.uses else c.value
+            for s in c.members:
+                for u in s.uses:
+                    token_bytes += len(u.literal) - len(f"var({c.token})")
+                    if s is not c.centre:
+                        literal_bytes += len(u.literal) - len(target)
+            if c.new_token:
+                token_bytes -= len(f"  {c.token}: {c.value};\n")
+        return {
+            "backend": "numpy" if numpy is not None else "kd-tree",
+            "threshold": self.threshold,
+            "colours": len([s for s in self.swatches.values() if s.uses]),
+            "existing_tokens": len(self.token_values),
+            "literal_uses": sum(len(s.uses) for s in self.swatches.values()),
+            "distinct_literals": len(literals_before),
+            "clusters": len(clusters),
+            "new_tokens": sum(c.new_token for c in clusters),
+            "colours_merged": sum(len(c.members) - 1 for c in clusters),
+            # as var(token): every literal in a cluster goes, less the new token definitions
+            "distinct_literals_as_tokens": len(literals_before - rewritten),
+            "bytes_saved_as_tokens": token_bytes,
+            # as literals: merged colours take the centre's spelling
+            "distinct_literals_as_literals": len((literals_before - merged) | centres),
+            "bytes_saved_as_literals": literal_bytes,
+        }
+
+    def rows(self, clusters: List[PaletteCluster]) -> List[Dict]:
+        rows = []
+        for c in clusters:
+            for s in c.members:
+                literals = Counter(u.literal for u in s.uses)
+                for literal, count in literals.most_common():
+                    rows.append({
+                        "literal": literal,
+                        "uses": count,
+                        "token": c.token,
+                        "token_value": c.value,
+                        "new_token": "yes" if c.new_token else "",
+                        "delta_e": c.deltas[s.rgba],
+                        "files": " ".join(sorted({str(u.path) for u in s.uses if u.literal == literal})),
+                    })
+        return rows
+
+    def write_csv(self, path: Path, clusters: List[PaletteCluster]) -> int:
+        import csv
+
+        rows = self.rows(clusters)
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=["literal", "uses", "token", "token_value", "new_token",
+                                                   "delta_e", "files"])
+            writer.writeheader()
+            writer.writerows(rows)
+        return len(rows)
+
+    def palette_css(self, clusters: List[PaletteCluster]) -> str:
+        return "".join(f"  {c.token}: {c.value};\n" for c in clusters if c.new_token)
+
+    def rewrite(self, clusters: List[PaletteCluster], variables_file: Optional[Path] = None) -> Dict[Path, str]:
+        """New text of every file that changes: literals become var(token), and the new tokens
+        go at the end of the top-level :root rule of variables_file. Without variables_file
+        (or when it is not among the sources) there is nowhere to define new tokens, so only
+        literals of existing tokens are rewritten."""
+        can_define = variables_file is not None and variables_file in self.sources
+        edits: Dict[Path, List[Tuple[int, int, str]]] = defaultdict(list)
+        for c in clusters:
+            if c.new_token and not can_define:
+                continue
+            for s in c.members:
+                for u in s.uses:
+                    edits[u.path].append((u.span[0], u.span[1], f"var({c.token})"))
+        changed = {path: apply_edits(self.sources[path], file_edits) for path, file_edits in edits.items()}
+        palette = self.palette_css(clusters)
+        if palette and can_define:
+            content = changed.get(variables_file, self.sources[variables_file])
+            changed[variables_file] = insert_root_declarations(
+                content, palette, "Colour palette (merged near-identical colours)")
+        return changed
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m cssscan.palette",
+                                     description="Cluster near-identical colours into palette tokens")
+    parser.add_argument("styles_dir", nargs="?", default="styles")
+    parser.add_argument("--delta-e", type=float, default=DEFAULT_DELTA_E,
+                        help=f"OKLab distance to merge colours (default: {DEFAULT_DELTA_E})")
+    parser.add_argument("--csv", help="write the rewrite map to this CSV")
+    parser.add_argument("--diff", help="write the proposed rewrite to this unified diff")
+    args = parser.parse_args(argv)
+    threshold = args.delta_e
+    if threshold < 0:
+        parser.error("--delta-e must not be negative")
+    styles_dir = Path(args.styles_dir)
+    sources = {p: p.read_text(encoding="utf-8", errors="ignore") for p in sorted(styles_dir.rglob("*.css"))}
+    analyzer = ColorAnalyzer.build(sources, threshold=threshold)
+    clusters = analyzer.cluster()
+    stats = analyzer.summary(clusters)
+
+    print(f"🎨 {stats['literal_uses']} colour literals ({stats['distinct_literals']} distinct spellings, "
+          f"{stats['colours']} colours), {stats['existing_tokens']} existing tokens [{stats['backend']}]")
+    print(f"  {stats['clusters']} clusters at delta E {threshold}: {stats['colours_merged']} colours merged, "
+          f"{stats['new_tokens']} new tokens")
+    print(f"  as var(): {stats['distinct_literals']} -> {stats['distinct_literals_as_tokens']} distinct literals, "
+          f"{stats['bytes_saved_as_tokens']:+,} bytes")
+    print(f"  as literals: {stats['distinct_literals']} -> {stats['distinct_literals_as_literals']} distinct "
+          f"literals, {stats['bytes_saved_as_literals']:+,} bytes")
+    for c in clusters[:15]:
+        merged = ", ".join(f"{s.spelling()} ({c.deltas[s.rgba]})" for s in c.members[1:])
+        print(f"  {c.token}: {c.value}" + ("  [new]" if c.new_token else "") + (f"  <- {merged}" if merged else ""))
+    if args.csv:
+        count = analyzer.write_csv(Path(args.csv), clusters)
+        print(f"\nWritten {count} rewrite-map rows to {args.csv}")
+    if args.diff:
+        import difflib
+
+        changed = analyzer.rewrite(clusters, styles_dir / "base" / "variables.css")
+        with open(args.diff, "w", encoding="utf-8") as f:
+            for path in sorted(changed):
+                f.writelines(difflib.unified_diff(sources[path].splitlines(True), changed[path].splitlines(True),
+                                                  f"a/{path}", f"b/{path}"))
+        print(f"Written the proposal for {len(changed)} files to {args.diff}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
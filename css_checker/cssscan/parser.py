@@ -0,0 +1,414 @@
+"""
+Small CSS parser and serializer.
+Produces a nested model (rules, at-rules, comments) that understands @media /
+@supports / @keyframes containers, strings, url() tokens and comments, and can
+write the model back out in the tree's house style (2-space indent).
+"""
+
+import re
+from bisect import bisect_right
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+
+# At-rules whose block holds declarations rather than nested rules
+DECLARATION_AT_RULES = {"font-face", "page", "property", "counter-style", "viewport"}
+
+# Comments, strings and single structural characters, in scan order
+_SCAN_RE = re.compile(r'/\*.*?(?:\*/|\Z)|"(?:[^"\\\n]|\\.)*"?|\'(?:[^\'\\\n]|\\.)*\'?|[(){};]', re.DOTALL)
+_COMMENT_RE = re.compile(r'/\*.*?(?:\*/|\Z)', re.DOTALL)
+_IMPORTANT_RE = re.compile(r'\s*!\s*important\s*$', re.IGNORECASE)
+_SPACE_RE = re.compile(r'\s+')
+_WS_RE = re.compile(r'\s*')
+_WS_COMMENT_RE = re.compile(r'(?:\s+|/\*.*?\*/)*', re.DOTALL)
+
+
+@dataclass
+class Declaration:
+    property: str
+    value: str
+    important: bool = False
+    span: Tuple[int, int] = field(default=(0, 0), compare=False)  # source offsets
+
+    def text(self) -> str:
+        return f"{self.property}: {self.value}" + (" !important" if self.important else "")
+
+
+@dataclass
+class Rule:
+    selector: str
+    declarations: List[Declaration]
+    context: Tuple[str, ...] = ()  # enclosing at-rule headers, outermost first
+    line: int = 0
+    span: Tuple[int, int] = field(default=(0, 0), compare=False)
+
+    @property
+    def selectors(self) -> List[str]:
+        return split_selector_list(self.selector)
+
+
+@dataclass
+class AtRule:
+    name: str
+    prelude: str
+    children: Optional[List["Node"]] = None  # nested rules; None for statement at-rules
+    declarations: Optional[List[Declaration]] = None  # @font-face, @page, ...
+    context: Tuple[str, ...] = ()
+    line: int = 0
+    span: Tuple[int, int] = field(default=(0, 0), compare=False)
+
+    @property
+    def header(self) -> str:
+        return f"@{self.name} {self.prelude}".rstrip()
+
+
+@dataclass
+class Comment:
+    text: str
+    line: int = 0
+    span: Tuple[int, int] = field(default=(0, 0), compare=False)
+
+
+Node = Union[Rule, AtRule, Comment]
+
+
+@dataclass
+class Stylesheet:
+    path: Optional[Path]
+    nodes: List[Node] = field(default_factory=list)
+
+    def rules(self) -> Iterator[Rule]:
+        """Yield every style rule, including those nested in at-rules"""
+        yield from iter_rules(self.nodes)
+
+    def at_rules(self) -> Iterator[AtRule]:
+        """Yield every at-rule, outermost first"""
+        stack = list(reversed(self.nodes))
+        while stack:
+            node = stack.pop()
+            if isinstance(node, AtRule):
+                yield node
+                if node.children:
+                    stack.extend(reversed(node.children))
+
+    def text(self) -> str:
+        return serialize(self.nodes)
+
+
+def iter_rules(nodes: List[Node]) -> Iterator[Rule]:
+    for node in nodes:
+        if isinstance(node, Rule):
+            yield node
+        elif isinstance(node, AtRule) and node.children:
+            yield from iter_rules(node.children)
+
+
+def split_top_level(text: str, sep: str) -> List[str]:
+    """Split text on sep outside strings, comments, parentheses and brackets"""
+    parts = []
+    depth = 0
+    last = 0
+    quote = None
+    i = 0
+    n = len(text)
+    while i < n:
+        c = text[i]
+        if quote:
+            if c == "\\":
+                i += 1
+            elif c == quote:
+                quote = None
+        elif c in "\"'":
+            quote = c
+        elif c in "([":
+            depth += 1
+        elif c in ")]":
+            depth = max(depth - 1, 0)
+        elif c == sep and depth == 0:
+            parts.append(text[last:i])
+            last = i + 1
+        i += 1
+    parts.append(text[last:])
+    return parts
+
+
+def split_selector_list(selector: str) -> List[str]:
+    """Split '.a, .b' into ['.a', '.b'] without breaking :is(.x, .y)"""
+    return [s.strip() for s in split_top_level(selector, ",") if s.strip()]
+
+
+def parse_declaration(text: str) -> Optional[Declaration]:
+    """Parse 'prop: value [!important]'; returns None for junk"""
+    text = _COMMENT_RE.sub("", text).strip()
+    prop, sep, value = text.partition(":")
+    prop = prop.strip()
+    if not sep or not prop:
+        return None
+    important = bool(_IMPORTANT_RE.search(value))
+    if important:
+        value = _IMPORTANT_RE.sub("", value)
+    return Declaration(prop, value.strip(), important)
+
+
+class _Parser:
+    def __init__(self, text: str):
+        self.text = text
+        self.newlines = [m.start() for m in re.finditer("\n", text)]
+
+    def line(self, pos: int) -> int:
+        return bisect_right(self.newlines, pos - 1) + 1
+
+    def scan_until(self, pos: int, stops: str) -> int:
+        """Index of the first stop character at paren depth 0, or len(text)"""
+        depth = 0
+        for m in _SCAN_RE.finditer(self.text, pos):
+            tok = m.group(0)
+            if len(tok) != 1:
+                continue
+            if tok == "(":
+                depth += 1
+            elif tok == ")":
+                depth = max(depth - 1, 0)
+            elif tok in stops and depth == 0:
+                return m.start()
+        return len(self.text)
+
+    def parse_rules(self, pos: int, context: Tuple[str, ...]) -> Tuple[List[Node], int]:
+        text = self.text
+        n = len(text)
+        nodes: List[Node] = []
+        while True:
+            pos = _WS_RE.match(text, pos).end()
+            if pos >= n:
+                return nodes, pos
+            c = text[pos]
+            if c == "}":
+                return nodes, pos + 1
+            if text.startswith("/*", pos):
+                end = text.find("*/", pos + 2)
+                end = n if end < 0 else end + 2
+                nodes.append(Comment(text[pos:end], self.line(pos), (pos, end)))
+                pos = end
+                continue
+
+            stop = self.scan_until(pos, "{;}")
+            head = _SPACE_RE.sub(" ", _COMMENT_RE.sub("", text[pos:stop])).strip()
+            end_char = text[stop] if stop < n else ""
+
+            if c == "@":
+                name, _, prelude = head[1:].partition(" ")
+                name = name.lower()
+                start = pos
+                at = AtRule(name, prelude.strip(), context=context, line=self.line(pos))
+                if end_char == "{":
+                    if name in DECLARATION_AT_RULES:
+                        at.declarations, pos = self.parse_declarations(stop + 1)
+                    else:
+                        at.children, pos = self.parse_rules(stop + 1, context + (at.header,))
+                else:
+                    pos = stop + 1 if end_char == ";" else stop
+                at.span = (start, pos)
+                nodes.append(at)
+            elif end_char == "{":
+                decls, end = self.parse_declarations(stop + 1)
+                nodes.append(Rule(head, decls, context, self.line(pos), (pos, end)))
+                pos = end
+            else:
+                # Stray text without a block; drop it
+                pos = stop + 1 if end_char == ";" else stop
+
+    def parse_declarations(self, pos: int) -> Tuple[List[Declaration], int]:
+        text = self.text
+        n = len(text)
+        decls: List[Declaration] = []
+        while pos < n:
+            stop = self.scan_until(pos, ";{}")
+            decl = parse_declaration(text[pos:stop])
+            if decl is not None:
+                start = _WS_COMMENT_RE.match(text, pos).end()
+                decl.span = (start, stop + 1 if stop < n and text[stop] == ";" else stop)
+                decls.append(decl)
+            if stop >= n:
+                return decls, n
+            if text[stop] == "}":
+                return decls, stop + 1
+            if text[stop] == "{":
+                # Nested rule (CSS nesting) - not supported, skip its block
+                _, pos = self.parse_rules(stop + 1, ())
+                continue
+            pos = stop + 1
+        return decls, pos
+
+
+def parse_stylesheet(text: str, path: Optional[Path] = None) -> Stylesheet:
+    """Parse CSS source into a Stylesheet model"""
+    parser = _Parser(text)
+    nodes, pos = parser.parse_rules(0, ())
+    while pos < len(text):
+        # A stray top-level '}' ends parse_rules early; carry on after it
+        more, pos = parser.parse_rules(pos, ())
+        nodes.extend(more)
+    return Stylesheet(path, nodes)
+
+
+def parse_file(path: Path) -> Stylesheet:
+    text = Path(path).read_text(encoding="utf-8", errors="ignore")
+    return parse_stylesheet(text, Path(path))
+
+
+def apply_edits(text: str, edits: List[Tuple[int, int, str]]) -> str:
+    """Apply (start, end, replacement) edits to source text.
+    Deletions that leave a line blank remove the whole line."""
+    out = []
+    last = 0
+    for start, end, replacement in sorted(edits):
+        if start < last:
+            continue  # overlapping edit; the enclosing one already covers it
+        if not replacement:
+            line_start = text.rfind("\n", 0, start) + 1
+            line_end = text.find("\n", end)
+            line_end = len(text) if line_end < 0 else line_end
+            trailing = _COMMENT_RE.sub("", text[end:line_end])  # a trailing comment goes with the line
+            if not text[line_start:start].strip() and not trailing.strip() and line_start >= last:
+                start, end = line_start, min(line_end + 1, len(text))
+                if text[max(start - 2, 0):start] == "\n\n" and text[end:end + 1] == "\n":
+                    end += 1  # don't leave two blank lines behind
+                elif text[max(start - 2, 0):start] == "\n\n" and end == len(text) and start - 1 >= last:
+                    start -= 1  # nor a blank line at the end
+        out.append(text[last:start])
+        out.append(replacement)
+        last = end
+    out.append(text[last:])
+    return "".join(out)
+
+
+class TreeEdits:
+    """Records the node trees of parsed stylesheets so that, once passes have changed
+    them in place (removed, moved or renamed nodes, dropped declarations), each
+    source can be rewritten with apply_edits and untouched text kept as it was"""
+
+    def __init__(self, sheets: List[Stylesheet], texts: Dict[Path, str]):
+        self.texts = texts
+        # id(node) -> (node, path, id(owner), selector, declarations) as parsed
+        self.origin: Dict[int, tuple] = {}
+        self.edits: Dict[Path, List[tuple]] = {}
+        for sheet in sheets:
+            self._record(sheet.path, sheet, sheet.nodes)
+
+    def _record(self, path: Path, owner, nodes: List[Node]):
+        for node in nodes:
+            self.origin[id(node)] = (node, path, id(owner), getattr(node, "selector", None),
+                                     list(getattr(node, "declarations", None) or []))
+            if isinstance(node, AtRule) and node.children:
+                self._record(path, node, node.children)
+
+    def _place(self, owner, nodes: List[Node], placed: Dict[int, int]):
+        for node in nodes:
+            placed[id(node)] = id(owner)
+            if isinstance(node, AtRule) and node.children:
+                self._place(node, node.children, placed)
+
+    def rewrite(self, sheets: List[Stylesheet]) -> Dict[Path, str]:
+        """New text of every sheet whose tree changed"""
+        placed: Dict[int, int] = {}
+        for sheet in sheets:
+            self._place(sheet, sheet.nodes, placed)
+        self.edits = {path: [] for path in self.texts}
+        for node, path, owner, selector, declarations in self.origin.values():
+            text = self.texts[path]
+            if placed.get(id(node)) != owner:
+                self.edits[path].append((node.span[0], node.span[1], ""))
+            if id(node) in placed and isinstance(node, Rule):
+                if node.selector != selector:
+                    brace = text.index("{", node.span[0])
+                    end = node.span[0] + len(text[node.span[0]:brace].rstrip())
+                    self.edits[path].append((node.span[0], end, node.selector))
+                kept = {id(d) for d in node.declarations}
+                self.edits[path].extend((d.span[0], d.span[1], "") for d in declarations if id(d) not in kept)
+        for sheet in sheets:
+            self._inserts(sheet.path, sheet, sheet.nodes, 0)
+        changed = {}
+        for sheet in sheets:
+            text = self.texts[sheet.path]
+            new = self._render(sheet.path, 0, len(text))
+            if new != text:
+                changed[sheet.path] = new
+        return changed
+
+    def _inserts(self, path: Path, owner, nodes: List[Node], open_end: int):
+        """Queue nodes that another container gave this one, after their nearest original sibling"""
+        text = self.texts[path]
+        mine = [n for n in nodes if id(n) in self.origin and self.origin[id(n)][2] == id(owner)]
+        ids = {id(n) for n in mine}
+        pos, moved = open_end, []
+        for node in nodes + [None]:
+            if node is not None and id(node) not in ids:
+                moved.append(node)
+                continue
+            if moved:
+                self.edits[path].append((pos, pos, moved))
+                moved = []
+            if node is not None:
+                pos = node.span[1]
+        for node in mine:
+            if isinstance(node, AtRule) and node.children:
+                self._inserts(path, node, node.children, text.index("{", node.span[0]) + 1)
+
+    def _render(self, path: Path, start: int, end: int, moved: bool = False) -> str:
+        text = self.texts[path]
+        edits = []
+        for s, e, replacement in self.edits[path]:
+            if start <= s and e <= end and not (moved and (s, e) == (start, end)):
+                if isinstance(replacement, list):
+                    replacement = self._moved_text(replacement)
+                edits.append((s - start, e - start, replacement))
+        return apply_edits(text[start:end], edits)
+
+    def _moved_text(self, nodes: List[Node]) -> str:
+        """Nodes from elsewhere, each on its own line at the indent of the line it came
+        from; neighbours in their source keep the whitespace that was between them"""
+        out = []
+        prev = None
+        for node in nodes:
+            _, source, _, _, _ = self.origin[id(node)]
+            src = self.texts[source]
+            gap = src[prev[1].span[1]:node.span[0]] if prev and prev[0] == source else None
+            if gap is None or gap.strip():
+                indent = src[src.rfind("\n", 0, node.span[0]) + 1:node.span[0]]
+                gap = "\n\n" + (indent if not indent.strip() else "")
+            out.append(gap + self._render(source, node.span[0], node.span[1], moved=True))
+            prev = (source, node)
+        return "".join(out)
+
+
+def insert_root_declarations(text: str, declarations: str, comment: str = "") -> str:
+    """Add declaration lines to the end of the first top-level (unconditional) :root
+    rule, or to a new :root rule at the end of the text"""
+    block = (f"\n  /* {comment} */\n" if comment else "") + declarations
+    sheet = parse_stylesheet(text)
+    for node in sheet.nodes:
+        if isinstance(node, Rule) and node.selectors == [":root"]:
+            close = node.span[1] - 1
+            if text[close:close + 1] == "}":
+                return text[:close] + block + text[close:]
+    return text.rstrip("\n") + "\n\n:root {" + block + "}\n"
+
+
+def serialize(nodes: List[Node], indent: str = "") -> str:
+    """Write nodes back out as CSS"""
+    blocks = []
+    inner = indent + "  "
+    for node in nodes:
+        if isinstance(node, Comment):
+            blocks.append(f"{indent}{node.text}\n")
+        elif isinstance(node, Rule):
+            body = "".join(f"{inner}{d.text()};\n" for d in node.declarations)
+            blocks.append(f"{indent}{node.selector} {{\n{body}{indent}}}\n")
+        elif node.children is not None:
+            blocks.append(f"{indent}{node.header} {{\n{serialize(node.children, inner)}{indent}}}\n")
+        elif node.declarations is not None:
+            body = "".join(f"{inner}{d.text()};\n" for d in node.declarations)
+            blocks.append(f"{indent}{node.header} {{\n{body}{indent}}}\n")
+        else:
+            blocks.append(f"{indent}{node.header};\n")
+    return "\n".join(blocks)
@@ -0,0 +1,67 @@
+"""
+Pre-commit check for staged stylesheets.
+Run from css_checker/ (or with it on PYTHONPATH):
+
+    python -m cssscan.precommit [files...]
+
+Without arguments the staged .css files are taken from git. A file fails the
+check when it repeats a rule outright (same context, selector and canonical
+body), which is always safe to delete. Only the parser and canonicaliser are
+loaded so the hook stays well inside a 150 ms budget.
+"""
+
+import subprocess
+import sys
+from pathlib import Path
+from typing import List, Optional
+
+from cssscan.canonical import canonicalize_declaration
+from cssscan.parser import iter_rules, parse_file
+from cssscan.selectors import normalize_selector
+
+
+def staged_css_files() -> List[Path]:
+    """Added/copied/modified/renamed .css files in the index, as working tree paths"""
+    top = subprocess.run(["git", "rev-parse", "--show-toplevel"],
+                         capture_output=True, text=True, check=True).stdout.strip()
+    names = subprocess.run(["git", "diff", "--cached", "--name-only", "--diff-filter=ACMR", "-z"],
+                           capture_output=True, text=True, check=True).stdout
+    return [Path(top, name) for name in names.split("\0") if name.endswith(".css")]
+
+
+def check_file(path: Path) -> List[str]:
+    problems = []
+    seen = {}
+    for rule in iter_rules(parse_file(path).nodes):
+        if not rule.declarations:
+            continue
+        # Different properties may come in any order; a repeated one (display: -webkit-box;
+        # display: flex) keeps its order, which decides the value
+        body = tuple(sorted((canonicalize_declaration(d.text()) for d in rule.declarations),
+                            key=lambda t: t.split(":", 1)[0]))
+        key = (rule.context, normalize_selector(rule.selector), body)
+        if key in seen:
+            problems.append(f"{path}:{rule.line}: '{rule.selector}' repeats the rule at line {seen[key]}")
+        else:
+            seen[key] = rule.line
+    return problems
+
+
+def check_staged(paths: Optional[List[Path]] = None) -> List[str]:
+    """Problems found in the given (default: staged) stylesheets"""
+    paths = staged_css_files() if paths is None else paths
+    return [problem for path in paths if path.exists() for problem in check_file(path)]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = sys.argv[1:] if argv is None else argv
+    problems = check_staged([Path(a) for a in args] if args else None)
+    for problem in problems:
+        print(problem)
+    if problems:
+        print(f"{len(problems)} repeated rules; delete the earlier copies before committing")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,296 @@
+"""
+Reference graph for custom properties and @keyframes.
+One pass over the parsed tree records every custom-property definition,
+every var() use (including fallbacks and var-to-var chains), every @keyframes
+definition and every animation reference. Liveness is reachability from
+ordinary declarations (and optional external sources such as JSX), which
+lets us report and prune unreferenced variables and keyframes and collapse
+keyframes with identical bodies.
+"""
+
+import re
+from collections import defaultdict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from cssscan.canonical import canonicalize_declaration
+from cssscan.parser import AtRule, Declaration, Node, Rule, Stylesheet, apply_edits, serialize
+
+ANIMATION_PROPERTIES = {"animation", "animation-name", "-webkit-animation", "-webkit-animation-name"}
+ANIMATION_KEYWORDS = {
+    "none", "infinite", "normal", "reverse", "alternate", "alternate-reverse",
+    "forwards", "backwards", "both", "running", "paused", "linear", "ease",
+    "ease-in", "ease-out", "ease-in-out", "step-start", "step-end",
+    "initial", "inherit", "unset", "revert",
+}
+KEYFRAME_SELECTOR_ALIASES = {"from": "0%", "to": "100%"}
+
+_VAR_RE = re.compile(r'var\(\s*(--[\w-]+)')
+_IDENT_RE = re.compile(r'(?<![\w-])(-?[A-Za-z_][\w-]*)(?![\w(-])')
+_CUSTOM_PROPERTY_RE = re.compile(r'(?<![\w-])--[\w-]+')  # not BEM modifiers like btn--primary
+
+GraphNode = Tuple[str, str]  # ("var", "--x") or ("keyframes", "spin")
+# (at-rule name, keyframes name, enclosing at-rule headers): only definitions with the same key
+# replace each other; @-webkit-keyframes spin and @keyframes spin in @media both sit beside @keyframes spin
+KeyframesKey = Tuple[str, str, Tuple[str, ...]]
+
+
+@dataclass
+class VariableDef:
+    name: str
+    path: str
+    rule: Rule
+    declaration: Declaration
+
+    @property
+    def bytes(self) -> int:
+        return len(self.declaration.text().encode("utf-8")) + 4  # indent + ";\n"
+
+
+@dataclass
+class KeyframesDef:
+    name: str
+    path: str
+    at_rule: AtRule
+    body_key: Tuple[str, ...]
+
+    @property
+    def key(self) -> KeyframesKey:
+        return self.at_rule.name, self.name, self.at_rule.context
+
+    @property
+    def bytes(self) -> int:
+        return len(serialize([self.at_rule]).encode("utf-8")) + 1
+
+
+@dataclass
+class _AnimationUse:
+    path: str
+    declaration: Declaration
+    names: List[str]
+
+
+def animation_names(value: str) -> List[str]:
+    """Identifiers in an animation value that can only be keyframe names"""
+    names = []
+    for ident in _IDENT_RE.findall(re.sub(r'[\w-]+\([^)]*\)', ' ', value)):
+        if ident.lower() not in ANIMATION_KEYWORDS and not ident.startswith("--"):
+            names.append(ident)
+    return names
+
+
+def keyframes_body_key(at_rule: AtRule) -> Tuple[str, ...]:
+    parts = []
+    for child in at_rule.children or []:
+        if isinstance(child, Rule):
+            stops = ",".join(KEYFRAME_SELECTOR_ALIASES.get(s.lower(), s) for s in child.selectors)
+            body = ";".join(sorted(canonicalize_declaration(d.text()) for d in child.declarations))
+            parts.append(f"{stops}{{{body}}}")
+    return tuple(parts)
+
+
+@dataclass
+class ReferenceGraph:
+    variables: Dict[str, List[VariableDef]] = field(default_factory=lambda: defaultdict(list))
+    keyframes: Dict[KeyframesKey, List[KeyframesDef]] = field(default_factory=lambda: defaultdict(list))
+    edges: Dict[GraphNode, Set[GraphNode]] = field(default_factory=lambda: defaultdict(set))
+    roots: Set[GraphNode] = field(default_factory=set)
+    external_roots: Set[GraphNode] = field(default_factory=set)
+    external_texts: List[str] = field(default_factory=list)
+    uses: Dict[str, List[_AnimationUse]] = field(default_factory=lambda: defaultdict(list))
+    # identifiers seen in custom property values, resolved to keyframes once all names are known
+    _candidate_idents: Dict[GraphNode, Set[str]] = field(default_factory=lambda: defaultdict(set))
+
+    @classmethod
+    def build(cls, sheets: Iterable[Stylesheet], external_sources: Iterable[str] = ()) -> "ReferenceGraph":
+        graph = cls()
+        for sheet in sheets:
+            graph._visit(str(sheet.path), sheet.nodes)
+        for text in external_sources:
+            # Inline styles / JS may set or read variables and animations by name
+            graph.external_roots.update(("var", name) for name in _CUSTOM_PROPERTY_RE.findall(text))
+            graph.external_texts.append(text)
+        graph._resolve_keyframe_candidates()
+        return graph
+
+    def _visit(self, path: str, nodes: List[Node]):
+        for node in nodes:
+            if isinstance(node, Rule):
+                for decl in node.declarations:
+                    self._declaration(path, node, decl)
+            elif isinstance(node, AtRule):
+                if node.name.endswith("keyframes") and node.children is not None:
+                    definition = KeyframesDef(node.prelude, path, node, keyframes_body_key(node))
+                    self.keyframes[definition.key].append(definition)
+                    for child in node.children:
+                        if isinstance(child, Rule):
+                            for decl in child.declarations:
+                                self._declaration(path, None, decl, owner=("keyframes", node.prelude))
+                elif node.children:
+                    self._visit(path, node.children)
+                for decl in node.declarations or []:
+                    self._declaration(path, None, decl)
+
+    def _declaration(self, path: str, rule: Optional[Rule], decl: Declaration, owner: Optional[GraphNode] = None):
+        prop = decl.property.strip()
+        used_vars = _VAR_RE.findall(decl.value)
+        if prop.startswith("--") and rule is not None:
+            source: GraphNode = ("var", prop)
+            self.variables[prop].append(VariableDef(prop, path, rule, decl))
+            self._candidate_idents[source].update(_IDENT_RE.findall(decl.value))
+        else:
+            source = owner
+        for name in used_vars:
+            if source is None:
+                self.roots.add(("var", name))
+            else:
+                self.edges[source].add(("var", name))
+        if prop.lower() in ANIMATION_PROPERTIES:
+            names = animation_names(decl.value)
+            self.uses["animation"].append(_AnimationUse(path, decl, names))
+            for name in names:
+                if source is None:
+                    self.roots.add(("keyframes", name))
+                else:
+                    self.edges[source].add(("keyframes", name))
+
+    def keyframe_names(self) -> Set[str]:
+        return {name for _, name, _ in self.keyframes}
+
+    def _resolve_keyframe_candidates(self):
+        texts = self.external_texts
+        names = self.keyframe_names()
+        for source, idents in self._candidate_idents.items():
+            for name in idents & names:
+                self.edges[source].add(("keyframes", name))
+        for name in names:
+            if any(re.search(rf'(?<![\w-]){re.escape(name)}(?![\w-])', t) for t in texts):
+                self.external_roots.add(("keyframes", name))
+        self._candidate_idents.clear()
+
+    def live(self) -> Set[GraphNode]:
+        """Everything reachable from ordinary declarations and external sources"""
+        seen = self.roots | self.external_roots
+        stack = list(seen)
+        while stack:
+            node = stack.pop()
+            for target in self.edges.get(node, ()):
+                if target not in seen:
+                    seen.add(target)
+                    stack.append(target)
+        return seen
+
+    def unused_variables(self) -> List[VariableDef]:
+        live = self.live()
+        return [d for name, defs in self.variables.items() if ("var", name) not in live for d in defs]
+
+    def undefined_variables(self) -> Set[str]:
+        """Variables used via var() but never defined (fallback or bug)"""
+        used = {target[1] for targets in self.edges.values() for target in targets if target[0] == "var"}
+        used |= {root[1] for root in self.roots if root[0] == "var"}
+        return used - set(self.variables)
+
+    def unused_keyframes(self) -> List[KeyframesDef]:
+        live = self.live()
+        return [d for (_, name, _), defs in self.keyframes.items() if ("keyframes", name) not in live for d in defs]
+
+    def shadowed_keyframes(self) -> List[KeyframesDef]:
+        """Earlier definitions that a later one with the same at-rule, name and context replaces"""
+        return [d for defs in self.keyframes.values() for d in defs[:-1]]
+
+    def duplicate_keyframes(self) -> Dict[str, str]:
+        """Map of keyframe name -> earlier name whose effective definitions (every vendor
+        spelling and context) have identical bodies. Names that external sources may set
+        are never renamed."""
+        live = self.live()
+        variants: Dict[str, List[Tuple]] = defaultdict(list)
+        for (at_name, name, context), defs in self.keyframes.items():
+            variants[name].append((at_name, context, defs[-1].body_key))
+        first_by_body: Dict[Tuple, str] = {}
+        renames = {}
+        for name, bodies in variants.items():
+            if ("keyframes", name) not in live:
+                continue
+            canonical = first_by_body.setdefault(tuple(sorted(bodies)), name)
+            if canonical != name and ("keyframes", name) not in self.external_roots:
+                renames[name] = canonical
+        return renames
+
+    def report(self) -> Dict:
+        unused_vars = self.unused_variables()
+        unused_kf = self.unused_keyframes()
+        shadowed = [d for d in self.shadowed_keyframes() if d not in unused_kf]
+        renames = self.duplicate_keyframes()
+        duplicate_bytes = sum(defs[-1].bytes for (_, name, _), defs in self.keyframes.items() if name in renames)
+        return {
+            "variables_defined": len(self.variables),
+            "keyframes_defined": len(self.keyframe_names()),
+            "unused_variables": sorted({d.name for d in unused_vars}),
+            "unused_variable_bytes": sum(d.bytes for d in unused_vars),
+            "undefined_variables": sorted(self.undefined_variables()),
+            "unused_keyframes": sorted({d.name for d in unused_kf}),
+            "unused_keyframe_bytes": sum(d.bytes for d in unused_kf),
+            "shadowed_keyframes": [f"{d.name} ({d.path})" for d in shadowed],
+            "shadowed_keyframe_bytes": sum(d.bytes for d in shadowed),
+            "duplicate_keyframes": renames,
+            "duplicate_keyframe_bytes": duplicate_bytes,
+        }
+
+    def prune_edits(self) -> Dict[str, List[Tuple[int, int, str]]]:
+        """Source edits (per file) that remove dead definitions and collapse duplicate keyframes"""
+        edits: Dict[str, List[Tuple[int, int, str]]] = defaultdict(list)
+        dead_by_rule: Dict[int, List[VariableDef]] = defaultdict(list)
+        for d in self.unused_variables():
+            dead_by_rule[id(d.rule)].append(d)
+        for dead in dead_by_rule.values():
+            rule = dead[0].rule
+            if len(dead) == len(rule.declarations):
+                edits[dead[0].path].append((*rule.span, ""))  # nothing left; drop the whole rule
+            else:
+                edits[dead[0].path].extend((*d.declaration.span, "") for d in dead)
+
+        removed = {id(d.at_rule) for d in self.unused_keyframes()}
+        removed |= {id(d.at_rule) for d in self.shadowed_keyframes()}
+        renames = self.duplicate_keyframes()
+        for (_, name, _), defs in self.keyframes.items():
+            for d in defs:
+                if id(d.at_rule) in removed or name in renames:
+                    edits[d.path].append((*d.at_rule.span, ""))
+
+        if renames:
+            for use in self.uses["animation"]:
+                names = [renames.get(n, n) for n in use.names]
+                if names != use.names:
+                    value = use.declaration.value
+                    for old, new in renames.items():
+                        value = re.sub(rf'(?<![\w-]){re.escape(old)}(?![\w-])', new, value)
+                    text = Declaration(use.declaration.property, value, use.declaration.important).text()
+                    edits[use.path].append((*use.declaration.span, text + ";"))
+            for name, defs in self.variables.items():
+                for d in defs:
+                    value = d.declaration.value
+                    for old, new in renames.items():
+                        value = re.sub(rf'(?<![\w-]){re.escape(old)}(?![\w-])', new, value)
+                    if value != d.declaration.value:
+                        text = Declaration(d.name, value, d.declaration.important).text()
+                        edits[d.path].append((*d.declaration.span, text + ";"))
+        return edits
+
+    def prune(self, sources: Dict[str, str]) -> Dict[str, str]:
+        """Return rewritten text for every file in sources that has edits"""
+        return {path: apply_edits(sources[path], file_edits)
+                for path, file_edits in self.prune_edits().items() if path in sources}
+
+
+EXTERNAL_PATTERNS = ("*.jsx", "*.js", "*.tsx", "*.ts", "*.html")
+
+
+def external_source_paths(dirs: Iterable[Path], patterns=EXTERNAL_PATTERNS) -> List[Path]:
+    """Source files (JSX/JS/HTML) below dirs that may reference names, skipping node_modules"""
+    return [p for d in dirs for pattern in patterns for p in Path(d).rglob(pattern)
+            if "node_modules" not in p.parts]
+
+
+def read_external_sources(dirs: Iterable[Path], patterns=EXTERNAL_PATTERNS) -> List[str]:
+    return [p.read_text(encoding="utf-8", errors="ignore") for p in external_source_paths(dirs, patterns)]
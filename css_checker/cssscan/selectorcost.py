@@ -0,0 +1,315 @@
+"""
+Selector cost profiler for browser style recalculation.
+Browsers match selectors right to left: the rightmost compound (the key)
+decides how many elements a selector is tried against, and every combinator
+to its left is another walk over ancestors or siblings. Each selector gets
+its specificity, complexity metrics, flags for costly patterns and a
+cost score, reported per selector, per file and per route (a folder or file
+under styles/pages/; everything else is shared by every route).
+
+    python -m cssscan.selectorcost [<styles_dir>] [--csv <out.csv>] [--sort score|specificity|compounds]
+"""
+
+import argparse
+import sys
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from cssscan.merge import is_keyframes_context
+from cssscan.parser import Stylesheet, iter_rules, parse_stylesheet
+from cssscan.selectors import TOKEN_RE, matching_paren, normalize_selector, specificity
+
+# How many elements the key compound is tried against, relative to an id/class key
+KEY_WEIGHT = {"id": 1, "class": 1, "tag": 4, "attribute": 6, "pseudo": 8, "universal": 10}
+# Ancestor/sibling walk per combinator; descendant and general sibling may walk the whole chain
+COMBINATOR_COST = {" ": 3, ">": 1, "~": 3, "+": 1}
+# Tags common enough that a tag key is tried against most of the page
+BROAD_TAGS = {"a", "button", "div", "i", "img", "input", "label", "li", "p", "path", "span", "svg",
+              "td", "th", "tr", "ul"}
+
+DEEP_CHAIN = 4  # compounds
+DESCENDANT_HEAVY = 3  # descendant combinators
+SHARED_ROUTE = "(shared)"
+
+
+def split_compounds(selector: str) -> Tuple[List[str], List[str]]:
+    """'.a > .b .c' -> (['.a', '.b', '.c'], ['>', ' '])"""
+    compounds, combinators = [], []
+    current, depth, quote = [], 0, None
+    pending = None
+    for ch in selector.strip():
+        if quote:
+            current.append(ch)
+            if ch == quote:
+                quote = None
+            continue
+        if ch in "\"'":
+            quote = ch
+        elif ch in "([":
+            depth += 1
+        elif ch in ")]":
+            depth -= 1
+        elif depth == 0 and (ch.isspace() or ch in ">+~"):
+            if ch in ">+~":
+                pending = ch
+            elif pending is None:
+                pending = " "
+            continue
+        if pending is not None and current:
+            compounds.append("".join(current))
+            combinators.append(pending)
+            current = []
+        pending = None
+        current.append(ch)
+    if current:
+        compounds.append("".join(current))
+    return compounds, combinators
+
+
+@dataclass
+class Compound:
+    ids: int = 0
+    classes: int = 0
+    tags: List[str] = field(default_factory=list)
+    attributes: List[str] = field(default_factory=list)
+    pseudo_classes: List[str] = field(default_factory=list)
+    universal: bool = False
+
+    @classmethod
+    def parse(cls, text: str) -> "Compound":
+        compound = cls()
+        pos = 0
+        while True:
+            m = TOKEN_RE.search(text, pos)
+            if not m:
+                break
+            pos = m.end()
+            if m.group("id"):
+                compound.ids += 1
+            elif m.group("cls"):
+                compound.classes += 1
+            elif m.group("attr"):
+                compound.attributes.append(m.group("attr"))
+            elif m.group("pc"):
+                compound.pseudo_classes.append(m.group("pc")[1:].lower())
+                if m.group("args"):
+                    pos = matching_paren(text, m.end() - 1) + 1
+            elif m.group("type") == "*":
+                compound.universal = True
+            elif m.group("type"):
+                compound.tags.append(m.group("type").lower())
+        return compound
+
+    @property
+    def kind(self) -> str:
+        """What a browser buckets this compound by when it is the key"""
+        if self.ids:
+            return "id"
+        if self.classes:
+            return "class"
+        if self.tags:
+            return "tag"
+        if self.attributes:
+            return "attribute"
+        if self.pseudo_classes and not self.universal:
+            return "pseudo"
+        return "universal"
+
+
+@dataclass
+class SelectorCost:
+    selector: str
+    path: Path
+    route: str
+    line: int
+    context: Tuple[str, ...]
+    specificity: Tuple[int, int, int]
+    compounds: int
+    descendants: int
+    key: str
+    flags: List[str]
+    score: float
+
+    def row(self) -> Dict:
+        return {
+            "score": self.score,
+            "selector": self.selector,
+            "file": str(self.path),
+            "route": self.route,
+            "line": self.line,
+            "context": " ".join(self.context),
+            "specificity": ",".join(map(str, self.specificity)),
+            "compounds": self.compounds,
+            "descendants": self.descendants,
+            "key": self.key,
+            "flags": " ".join(self.flags),
+        }
+
+
+def profile_selector(selector: str) -> Dict:
+    """Specificity, complexity, key kind, costly-pattern flags and score of one complex selector"""
+    compounds, combinators = split_compounds(selector)
+    key = Compound.parse(compounds[-1]) if compounds else Compound(universal=True)
+    kind = key.kind
+    descendants = combinators.count(" ")
+    flags = []
+    if kind == "universal":
+        flags.append("universal-key")
+    if kind == "tag" and (set(key.tags) & BROAD_TAGS):
+        flags.append("broad-tag-key")
+    if descendants >= DESCENDANT_HEAVY:
+        flags.append("descendant-heavy")
+    if len(compounds) >= DEEP_CHAIN:
+        flags.append("deep-chain")
+    if kind in ("attribute", "pseudo", "universal") and key.attributes:
+        flags.append("attribute-key")
+    substring_attrs = sum(1 for a in key.attributes if any(op in a for op in ("*=", "^=", "$=", "~=", "|=")))
+    if substring_attrs:
+        flags.append("substring-attribute")
+    nots = key.pseudo_classes.count("not")
+    if nots:
+        flags.append("not-key")
+    if ":has(" in selector:
+        flags.append("has")  # any DOM change under the subject can invalidate it
+
+    walk = sum(COMBINATOR_COST[c] for c in combinators)
+    score = KEY_WEIGHT[kind] * (1 + walk / 2)
+    score += 2 * nots + substring_attrs + (2 if "broad-tag-key" in flags else 0)
+    score += 5 * ("has" in flags)
+    return {
+        "specificity": specificity(selector),
+        "compounds": len(compounds),
+        "descendants": descendants,
+        "key": kind,
+        "flags": flags,
+        "score": round(score, 1),
+    }
+
+
+def route_of(path: Path, styles_dir: Optional[Path] = None) -> str:
+    """pages/meetings/x.css -> 'meetings', pages/auth.css -> 'auth'; other files are shared"""
+    parts = Path(path).parts
+    if styles_dir is not None:
+        try:
+            parts = Path(path).relative_to(styles_dir).parts
+        except ValueError:
+            pass
+    if "pages" not in parts:
+        return SHARED_ROUTE
+    rest = parts[parts.index("pages") + 1:]
+    if len(rest) > 1:
+        return rest[0]
+    if rest and rest[0] != "index.css":
+        return Path(rest[0]).stem
+    return SHARED_ROUTE
+
+
+class SelectorProfiler:
+    def __init__(self, styles_dir: Optional[Path] = None):
+        self.styles_dir = styles_dir
+        self.costs: List[SelectorCost] = []
+
+    def add(self, sheet: Stylesheet):
+        route = route_of(sheet.path, self.styles_dir)
+        for rule in iter_rules(sheet.nodes):
+            if is_keyframes_context(rule.context):
+                continue
+            for selector in rule.selectors:
+                selector = normalize_selector(selector)
+                self.costs.append(SelectorCost(selector, sheet.path, route, rule.line, rule.context,
+                                               **profile_selector(selector)))
+
+    @classmethod
+    def build(cls, sheets: Iterable[Stylesheet], styles_dir: Optional[Path] = None) -> "SelectorProfiler":
+        profiler = cls(styles_dir)
+        for sheet in sheets:
+            profiler.add(sheet)
+        return profiler
+
+    def ranked(self, sort: str = "score") -> List[SelectorCost]:
+        keys = {
+            "score": lambda c: (-c.score, str(c.path), c.line),
+            "specificity": lambda c: (tuple(-n for n in c.specificity), -c.score),
+            "compounds": lambda c: (-c.compounds, -c.score),
+        }
+        return sorted(self.costs, key=keys[sort])
+
+    @staticmethod
+    def _summary(costs: List[SelectorCost]) -> Dict:
+        flags = Counter(flag for c in costs for flag in c.flags)
+        worst = max(costs, key=lambda c: c.score, default=None)
+        return {
+            "selectors": len(costs),
+            "score": round(sum(c.score for c in costs), 1),
+            "flagged": sum(1 for c in costs if c.flags),
+            "flags": dict(flags.most_common()),
+            "max_specificity": ",".join(map(str, max((c.specificity for c in costs), default=(0, 0, 0)))),
+            "worst": f"{worst.selector} ({worst.score})" if worst else "",
+        }
+
+    def by_file(self) -> List[Dict]:
+        groups: Dict[Path, List[SelectorCost]] = defaultdict(list)
+        for c in self.costs:
+            groups[c.path].append(c)
+        rows = [{"file": str(path), "route": costs[0].route, **self._summary(costs)}
+                for path, costs in groups.items()]
+        return sorted(rows, key=lambda r: -r["score"])
+
+    def by_route(self) -> List[Dict]:
+        """Every route pays for the shared selectors as well as its own"""
+        groups: Dict[str, List[SelectorCost]] = defaultdict(list)
+        for c in self.costs:
+            groups[c.route].append(c)
+        shared = self._summary(groups.pop(SHARED_ROUTE, []))
+        rows = []
+        for route, costs in groups.items():
+            own = self._summary(costs)
+            rows.append({"route": route, **own, "shared_score": shared["score"],
+                         "total_score": round(own["score"] + shared["score"], 1)})
+        rows.sort(key=lambda r: -r["score"])
+        rows.append({"route": SHARED_ROUTE, **shared, "shared_score": 0, "total_score": shared["score"]})
+        return rows
+
+    def write_csv(self, path: Path, sort: str = "score") -> int:
+        import csv
+
+        rows = [c.row() for c in self.ranked(sort)]
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=["score", "selector", "file", "route", "line", "context",
+                                                   "specificity", "compounds", "descendants", "key", "flags"])
+            writer.writeheader()
+            writer.writerows(rows)
+        return len(rows)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m cssscan.selectorcost",
+                                     description="Rank selectors by matching cost, per route")
+    parser.add_argument("styles_dir", nargs="?", default="styles")
+    parser.add_argument("--csv", help="write every selector's cost to this CSV")
+    parser.add_argument("--sort", choices=["score", "specificity", "compounds"], default="score")
+    args = parser.parse_args(argv)
+    sort = args.sort
+    styles_dir = Path(args.styles_dir)
+    sheets = [parse_stylesheet(p.read_text(encoding="utf-8", errors="ignore"), p)
+              for p in sorted(styles_dir.rglob("*.css"))]
+    profiler = SelectorProfiler.build(sheets, styles_dir)
+
+    print(f"🐢 {len(profiler.costs)} selectors profiled in {len(sheets)} files")
+    print("\nPer route (own score + shared score):")
+    for row in profiler.by_route():
+        print(f"  {row['route']:<20} {row['score']:>8} + {row['shared_score']:>8} = {row['total_score']:>8}"
+              f"  {row['flagged']} flagged")
+    print("\nCostliest selectors:")
+    for c in profiler.ranked(sort)[:15]:
+        print(f"  {c.score:>6}  {c.selector}  [{' '.join(c.flags)}]  {c.path}:{c.line}")
+    if args.csv:
+        count = profiler.write_csv(Path(args.csv), sort)
+        print(f"\nWritten {count} selectors to {args.csv}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,93 @@
+"""
+Selector helpers: specificity and normalisation.
+"""
+
+import re
+from functools import lru_cache
+from typing import Tuple
+
+from cssscan.parser import split_selector_list
+
+Specificity = Tuple[int, int, int]
+
+# Legacy single-colon pseudo-elements count as type selectors
+LEGACY_PSEUDO_ELEMENTS = {"before", "after", "first-line", "first-letter"}
+
+# Simple-selector tokens of a compound; pc with args is a functional pseudo-class
+TOKEN_RE = re.compile(
+    r'(?P<id>#[\w-]+)'
+    r'|(?P<cls>\.[\w-]+)'
+    r'|(?P<attr>\[[^\]]*\])'
+    r'|(?P<pe>::[\w-]+(?:\([^)]*\))?)'
+    r'|(?P<pc>:[\w-]+)(?P<args>\()?'
+    r'|(?P<type>(?<![\w-])[a-zA-Z][\w-]*|\*)'
+)
+
+
+def matching_paren(text: str, start: int) -> int:
+    """Index of the ')' closing the '(' at start, or len(text) if it is never closed"""
+    depth = 0
+    for i in range(start, len(text)):
+        if text[i] == "(":
+            depth += 1
+        elif text[i] == ")":
+            depth -= 1
+            if depth == 0:
+                return i
+    return len(text)
+
+
+@lru_cache(maxsize=None)
+def specificity(selector: str) -> Specificity:
+    """(ids, classes/attributes/pseudo-classes, types/pseudo-elements) of a complex selector"""
+    a = b = c = 0
+    pos = 0
+    while True:
+        m = TOKEN_RE.search(selector, pos)
+        if not m:
+            break
+        pos = m.end()
+        if m.group("id"):
+            a += 1
+        elif m.group("cls") or m.group("attr"):
+            b += 1
+        elif m.group("pe"):
+            c += 1
+        elif m.group("pc"):
+            name = m.group("pc")[1:].lower()
+            if m.group("args"):
+                close = matching_paren(selector, m.end() - 1)
+                inner = selector[m.end():close]
+                pos = close + 1
+                if name in ("not", "is", "has", "matches", "-webkit-any", "-moz-any"):
+                    args = [specificity(s) for s in split_selector_list(inner)]
+                    if args:
+                        sa, sb, sc = max(args)
+                        a, b, c = a + sa, b + sb, c + sc
+                elif name == "where":
+                    pass
+                elif name in ("nth-child", "nth-last-child") and " of " in inner:
+                    sa, sb, sc = max(specificity(s) for s in split_selector_list(inner.split(" of ", 1)[1]))
+                    a, b, c = a + sa, b + sb + 1, c + sc
+                else:
+                    b += 1
+            elif name in LEGACY_PSEUDO_ELEMENTS:
+                c += 1
+            else:
+                b += 1
+        elif m.group("type") and m.group("type") != "*":
+            c += 1
+    return (a, b, c)
+
+
+@lru_cache(maxsize=None)
+def normalize_selector(selector: str) -> str:
+    """Collapse whitespace and combinator spacing so equal selectors compare equal"""
+    selector = re.sub(r'\s+', ' ', selector.strip())
+    selector = re.sub(r'\s*([>+~])\s*', r' \1 ', selector)
+    return re.sub(r'\(\s+|\s+\)', lambda m: m.group(0).strip(), selector)
+
+
+def is_vendor_specific(selector: str) -> bool:
+    """Vendor pseudo selectors invalidate a whole selector list in other engines"""
+    return bool(re.search(r'::?-(?:webkit|moz|ms|o)-', selector))
@@ -0,0 +1,382 @@
+"""
+Local analysis server for editor integrations.
+Holds the parsed styles/ tree in memory and answers "is this already defined
+somewhere?" over HTTP/JSON on localhost:
+
+    GET /selector?q=.card__title           definitions of a selector, in every file and context
+    GET /declarations?q=display:flex;gap:8px  rules with the same body (canonical, shorthands expanded)
+    GET /declarations?selector=.card        ... the same, for the body of an existing rule
+    GET /similar?q=...|selector=...&limit=10  near-duplicate bodies (NearDupIndex)
+    GET /variable?name=--color-primary      definitions and var() uses of a custom property
+    GET /variable?value=#3b82f6             custom properties defined with that (canonical) value
+    GET /status, POST /refresh
+
+A poll thread stats the tree every --poll seconds; a changed file is re-read
+and re-parsed on its own, and only its entries in the lookup tables (and its
+bodies in the similarity index) are replaced. Requests are served by a
+thread each and read the tables under the same lock the refresh writes them
+under, so an answer never mixes two versions of a file.
+
+    python -m cssscan.server [<styles_dir>] [--port 8765] [--poll 1.0] [--threshold 0.9] [--index <near-dup-index.json>]
+"""
+
+import argparse
+import json
+import sys
+import threading
+import time
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+from cssscan.api import Model
+from cssscan.canonical import canonicalize_declarations, canonicalize_value
+from cssscan.index import folder_priority
+from cssscan.merge import body_key, is_keyframes_context
+from cssscan.neardup import NearDupIndex, rule_entries
+from cssscan.parser import Rule, Stylesheet, iter_rules, parse_stylesheet
+from cssscan.refgraph import _VAR_RE
+from cssscan.selectors import normalize_selector
+
+DEFAULT_PORT = 8765
+
+
+class _FileKeyed:
+    """key -> entries, rebuilt one file at a time"""
+
+    def __init__(self):
+        self.entries: Dict[object, List[Dict]] = defaultdict(list)
+        self._keys: Dict[str, set] = {}  # file -> keys it contributed
+
+    def replace(self, file: str, items: List[Tuple[object, Dict]]):
+        for key in self._keys.pop(file, ()):
+            kept = [e for e in self.entries[key] if e["file"] != file]
+            if kept:
+                self.entries[key] = kept
+            else:
+                del self.entries[key]
+        keys = set()
+        for key, entry in items:
+            self.entries[key].append(entry)
+            keys.add(key)
+        if keys:
+            self._keys[file] = keys
+
+    def get(self, key) -> List[Dict]:
+        return self.entries.get(key, [])
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+
+def _rule_entry(file: str, rule: Rule, selector: Optional[str] = None) -> Dict:
+    return {
+        "file": file,
+        "line": rule.line,
+        "selector": selector or rule.selector,
+        "context": list(rule.context),
+        "declarations": [d.text() for d in rule.declarations],
+    }
+
+
+def _value_key(value: str) -> str:
+    """Custom property values compared as an ordinary property would spell them (#FFF == #ffffff)"""
+    return canonicalize_value("color", value)
+
+
+def _declaration_rule(text: str) -> Optional[Rule]:
+    """'display: flex; gap: 8px' (braces optional) -> a Rule holding those declarations"""
+    text = text.strip()
+    if not text.startswith("{"):
+        text = "{" + text + "}"
+    rules = list(iter_rules(parse_stylesheet("x" + text).nodes))
+    return rules[0] if rules and rules[0].declarations else None
+
+
+class AnalysisState:
+    """The parsed tree and the lookup tables the server answers from"""
+
+    def __init__(self, styles_dir: Path, threshold: float = 0.9, index_path: Optional[Path] = None):
+        self.styles_dir = Path(styles_dir)
+        self.index_path = index_path
+        self.lock = threading.RLock()  # held while tables change and while a query reads them
+        self._refreshing = threading.Lock()  # one refresh at a time (poll thread or POST /refresh)
+        self.model = Model()
+        self.stamps: Dict[Path, Tuple[int, int]] = {}  # size, mtime_ns
+        self.selectors = _FileKeyed()  # normalized selector
+        self.bodies = _FileKeyed()  # body_key
+        self.variables = _FileKeyed()  # custom property name
+        self.values = _FileKeyed()  # canonical custom property value
+        self.var_uses = _FileKeyed()  # custom property name, for var() uses
+        self.near = NearDupIndex(threshold)
+        if index_path is not None:
+            self.near, _ = NearDupIndex.load(index_path, threshold)
+        self.refreshed = None
+        self.last_refresh: Dict = {}
+
+    def rel(self, path: Path) -> str:
+        return path.relative_to(self.styles_dir).as_posix()
+
+    def _tables(self, rel: str, sheet: Stylesheet) -> Dict[str, List]:
+        """Entries one file contributes to each lookup table"""
+        tables = {"selectors": [], "bodies": [], "variables": [], "values": [], "var_uses": []}
+        priority = folder_priority(sheet.path)
+        for rule in iter_rules(sheet.nodes):
+            keyframes = is_keyframes_context(rule.context)
+            if not keyframes:
+                for selector in rule.selectors:
+                    key = normalize_selector(selector)
+                    tables["selectors"].append((key, {**_rule_entry(rel, rule, key), "priority": priority}))
+                if rule.declarations:
+                    tables["bodies"].append((body_key(rule.declarations), _rule_entry(rel, rule)))
+            for decl in rule.declarations:
+                if decl.property.startswith("--") and not keyframes:
+                    entry = {"file": rel, "line": rule.line, "name": decl.property, "value": decl.value,
+                             "selector": rule.selector, "context": list(rule.context)}
+                    tables["variables"].append((decl.property, entry))
+                    tables["values"].append((_value_key(decl.value), entry))
+                for name in _VAR_RE.findall(decl.value):
+                    tables["var_uses"].append((name, {"file": rel, "line": rule.line, "selector": rule.selector,
+                                                      "declaration": decl.text()}))
+        return tables
+
+    def refresh(self) -> Dict:
+        """Re-read files whose size or mtime changed; returns what changed"""
+        with self._refreshing:
+            return self._refresh()
+
+    def _refresh(self) -> Dict:
+        start = time.perf_counter()
+        current = {}
+        for path in sorted(self.styles_dir.rglob("*.css")):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue  # removed while we walked
+            current[path] = (stat.st_size, stat.st_mtime_ns)
+        changed = [p for p, stamp in current.items() if self.stamps.get(p) != stamp]
+        removed = [p for p in self.stamps if p not in current]
+
+        # Read and parse outside the lock; queries keep answering from the previous version
+        parsed, read = {}, []
+        for path in changed:
+            try:
+                text = path.read_text(encoding="utf-8", errors="ignore")
+            except OSError:
+                continue  # retried on the next refresh
+            read.append(path)
+            if self.model.sources.get(path) != text:
+                parsed[path] = (text, parse_stylesheet(text, path))
+
+        with self.lock:
+            for path in removed:
+                rel = self.rel(path)
+                for table in ("selectors", "bodies", "variables", "values", "var_uses"):
+                    getattr(self, table).replace(rel, [])
+                self.model.sheets.pop(path, None)
+                self.model.sources.pop(path, None)
+                self.model.digests.pop(path, None)
+                del self.stamps[path]
+            for path, (text, sheet) in parsed.items():
+                rel = self.rel(path)
+                self.model.sources[path] = text
+                self.model.sheets[path] = sheet
+                self.model.digests.pop(path, None)
+                for table, items in self._tables(rel, sheet).items():
+                    getattr(self, table).replace(rel, items)
+            for path in read:
+                self.stamps[path] = current[path]
+            synced = bool(parsed or removed or not self.refreshed)
+            if synced:
+                sheets = {self.rel(p): sheet for p, sheet in self.model.sheets.items()}
+                digests = {self.rel(p): self.model.digest(p) for p in self.model.sheets}
+
+        # The similarity work (the delta) runs outside the lock; applying it is a few dict updates
+        delta = None
+        if synced:
+            delta = self.near.delta(digests, lambda rel: rule_entries(rel, sheets[rel]))
+
+        with self.lock:
+            near_stats = self.near.apply(delta) if delta else {"comparisons": 0}
+            self.refreshed = time.time()
+            self.last_refresh = {
+                "files_changed": len(parsed),
+                "files_removed": len(removed),
+                "similarity_comparisons": near_stats["comparisons"],
+                "elapsed_ms": round((time.perf_counter() - start) * 1000, 2),
+            }
+            stats = self.last_refresh
+        if delta and self.index_path is not None:
+            self.near.save(self.index_path)  # only refresh changes the index, and refreshes take turns
+        return stats
+
+    def rule_for(self, selector: str) -> Optional[Dict]:
+        """First definition (highest folder priority) of a selector"""
+        defs = self.selectors.get(normalize_selector(selector))
+        return min(defs, key=lambda d: (d["priority"], d["file"], d["line"])) if defs else None
+
+    def _body(self, params: Dict[str, str]) -> Tuple[Optional[Rule], Optional[str]]:
+        """The declarations a query is about: ?q=<declarations> or ?selector=<existing rule>"""
+        if "selector" in params:
+            entry = self.rule_for(params["selector"])
+            if entry is None:
+                return None, f"no rule with selector '{params['selector']}'"
+            return _declaration_rule("; ".join(entry["declarations"])), None
+        rule = _declaration_rule(params.get("q", ""))
+        return rule, None if rule else "give declarations as q=, or an existing rule as selector="
+
+    # Queries; each returns (status, payload)
+
+    def query_selector(self, params: Dict[str, str]) -> Tuple[int, Dict]:
+        if not params.get("q"):
+            return 400, {"error": "missing q=<selector>"}
+        key = normalize_selector(params["q"])
+        defs = self.selectors.get(key)
+        contexts = defaultdict(int)
+        for d in defs:
+            contexts[tuple(d["context"])] += 1
+        return 200, {"selector": key, "definitions": defs, "duplicated": any(n > 1 for n in contexts.values())}
+
+    def query_declarations(self, params: Dict[str, str]) -> Tuple[int, Dict]:
+        rule, error = self._body(params)
+        if error:
+            return 400, {"error": error}
+        key = body_key(rule.declarations)
+        return 200, {"body": list(key), "rules": self.bodies.get(key)}
+
+    def query_similar(self, params: Dict[str, str]) -> Tuple[int, Dict]:
+        rule, error = self._body(params)
+        if error:
+            return 400, {"error": error}
+        try:
+            limit = int(params.get("limit", 10))
+            threshold = float(params["threshold"]) if "threshold" in params else None
+        except ValueError:
+            return 400, {"error": "limit and threshold must be numbers"}
+        normalized = ";\n  ".join(canonicalize_declarations([d.text() for d in rule.declarations])) + ";"
+        found = self.near.similar(normalized, limit, threshold)
+        for e in found:
+            e.pop("hash", None)
+        return 200, {"threshold": threshold or self.near.threshold, "rules": found}
+
+    def query_variable(self, params: Dict[str, str]) -> Tuple[int, Dict]:
+        if params.get("name"):
+            name = params["name"] if params["name"].startswith("--") else "--" + params["name"]
+            return 200, {"name": name, "definitions": self.variables.get(name), "uses": self.var_uses.get(name)}
+        if params.get("value"):
+            value = _value_key(params["value"])
+            return 200, {"value": value, "variables": self.values.get(value)}
+        return 400, {"error": "missing name=<--property> or value=<value>"}
+
+    def status(self) -> Dict:
+        return {
+            "styles_dir": str(self.styles_dir),
+            "files": len(self.model.sheets),
+            "selectors": len(self.selectors),
+            "bodies": len(self.bodies),
+            "variables": len(self.variables),
+            "similarity_bodies": len(self.near),
+            "threshold": self.near.threshold,
+            "refreshed": self.refreshed,
+            "last_refresh": self.last_refresh,
+        }
+
+
+class AnalysisHandler(BaseHTTPRequestHandler):
+    state: AnalysisState = None  # set on the subclass make_server builds
+    routes = {
+        "/selector": "query_selector",
+        "/declarations": "query_declarations",
+        "/similar": "query_similar",
+        "/variable": "query_variable",
+    }
+
+    def _send(self, status: int, payload: Dict):
+        data = json.dumps(payload, default=str).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        start = time.perf_counter()
+        if url.path == "/status":
+            with self.state.lock:
+                status, payload = 200, self.state.status()
+        elif url.path in self.routes:
+            with self.state.lock:
+                status, payload = getattr(self.state, self.routes[url.path])(params)
+        else:
+            status, payload = 404, {"error": f"unknown path {url.path}", "paths": sorted(self.routes) + ["/status"]}
+        payload["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 3)
+        self._send(status, payload)
+
+    def do_POST(self):
+        if urlparse(self.path).path != "/refresh":
+            self._send(404, {"error": "POST /refresh only"})
+            return
+        self._send(200, self.state.refresh())
+
+    def log_message(self, format, *args):
+        pass  # keep the console for the refresh lines
+
+
+def make_server(state: AnalysisState, host: str = "127.0.0.1", port: int = DEFAULT_PORT) -> ThreadingHTTPServer:
+    handler = type("BoundAnalysisHandler", (AnalysisHandler,), {"state": state})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def poll(state: AnalysisState, interval: float, stop: threading.Event):
+    while not stop.wait(interval):
+        try:
+            stats = state.refresh()
+        except Exception as e:  # keep serving the last good state
+            print(f"⚠️ Refresh failed: {e}")
+            continue
+        if stats["files_changed"] or stats["files_removed"]:
+            print(f"🔄 {stats['files_changed']} changed, {stats['files_removed']} removed "
+                  f"({stats['similarity_comparisons']} comparisons, {stats['elapsed_ms']} ms)")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m cssscan.server",
+                                     description="Answer selector, declaration and variable lookups over HTTP")
+    parser.add_argument("styles_dir", nargs="?", default="styles")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--poll", type=float, default=1.0, help="seconds between checks for changed files")
+    parser.add_argument("--threshold", type=float, default=0.9, help="near-duplicate similarity threshold")
+    parser.add_argument("--index", help="near-duplicate index file to load and keep saved")
+    args = parser.parse_args(argv)
+    styles_dir = Path(args.styles_dir)
+    if not styles_dir.is_dir():
+        print(f"❌ Styles directory '{styles_dir}' does not exist")
+        return 1
+
+    state = AnalysisState(styles_dir, args.threshold, Path(args.index) if args.index else None)
+    stats = state.refresh()
+    print(f"📚 Loaded {len(state.model.sheets)} files in {stats['elapsed_ms']:.0f} ms")
+    server = make_server(state, args.host, args.port)
+    stop = threading.Event()
+    threading.Thread(target=poll, args=(state, args.poll, stop), daemon=True).start()
+    host, port = server.server_address[:2]
+    print(f"🌐 Serving on http://{host}:{port} (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n👋 Stopped")
+    finally:
+        stop.set()
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,404 @@
+"""
+Shorthand / longhand optimiser.
+Merges complete longhand sets (margin-*, padding-*, border-*, border-radius,
+font-*) into their shorthand when that cannot change the cascade, and expands
+shorthands back into longhands so equivalent rule bodies compare equal.
+longhand_atoms maps any shorthand (background, overflow, flex, grid, transition
+...) to the longhands it sets, for the cascade checks of the merging passes.
+"""
+
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+from cssscan.parser import Declaration, Rule, Stylesheet, split_top_level
+
+SIDES = ("top", "right", "bottom", "left")
+CORNERS = ("top-left", "top-right", "bottom-right", "bottom-left")
+CSS_WIDE_KEYWORDS = {"inherit", "initial", "unset", "revert", "revert-layer"}
+
+BORDER_STYLES = {"none", "hidden", "dotted", "dashed", "solid", "double", "groove", "ridge", "inset", "outset"}
+BORDER_WIDTHS = {"thin", "medium", "thick"}
+BORDER_DEFAULTS = {"width": "medium", "style": "none", "color": "currentcolor"}
+
+FONT_STYLES = {"italic", "oblique"}
+FONT_VARIANTS = {"small-caps"}
+FONT_WEIGHTS = {"bold", "bolder", "lighter", "100", "200", "300", "400", "500", "600", "700", "800", "900"}
+SYSTEM_FONTS = {"caption", "icon", "menu", "message-box", "small-caption", "status-bar"}
+FONT_LONGHANDS = ("font-style", "font-variant", "font-weight", "font-size", "line-height", "font-family")
+
+VENDOR_PREFIXES = ("-webkit-", "-moz-", "-ms-", "-o-")
+
+# Properties a shorthand silently resets; merging is only safe when nothing in the
+# bundle sets them, otherwise the new shorthand would override those rules
+RESET_ONLY = {
+    "border": {"border-image", "border-image-source", "border-image-slice", "border-image-width",
+               "border-image-outset", "border-image-repeat"},
+    "font": {"font-stretch", "font-size-adjust", "font-kerning", "font-variant-caps",
+             "font-variant-ligatures", "font-variant-numeric", "font-variant-east-asian",
+             "font-variant-alternates", "font-variant-position", "font-language-override",
+             "font-optical-sizing", "font-feature-settings", "font-variation-settings"},
+}
+
+_LENGTH_RE = re.compile(r'^[+-]?(\d+\.?\d*|\.\d+)([a-z]+|%)?$', re.IGNORECASE)
+
+
+@dataclass
+class Merge:
+    selector: str
+    shorthand: str
+    longhands: List[str]
+    bytes_saved: int
+
+
+def split_value(value: str) -> List[str]:
+    """Split a value into whitespace-separated components, keeping functions whole"""
+    return [p for p in split_top_level(re.sub(r'\s+', ' ', value.strip()), " ") if p]
+
+
+def box_shorthand(values: List[str]) -> str:
+    """Shortest 1-4 value form of top/right/bottom/left"""
+    t, r, b, l = values
+    if r == l:
+        if t == b:
+            return t if t == r else f"{t} {r}"
+        return f"{t} {r} {b}"
+    return f"{t} {r} {b} {l}"
+
+
+def expand_box(value: str) -> Optional[List[str]]:
+    parts = split_value(value)
+    if not 1 <= len(parts) <= 4 or "/" in parts:
+        return None
+    if len(parts) == 1:
+        return parts * 4
+    if len(parts) == 2:
+        return [parts[0], parts[1], parts[0], parts[1]]
+    if len(parts) == 3:
+        return [parts[0], parts[1], parts[2], parts[1]]
+    return parts
+
+
+def longhand_atoms(prop: str) -> Set[str]:
+    """The individual longhands a (possibly shorthand) property sets. Vendor-prefixed
+    and legacy names count as their standard property, and logical properties
+    (margin-inline-start, inset-block ...) as every physical side they may map to."""
+    prop = prop.lower()
+    if prop.startswith(VENDOR_PREFIXES):
+        prop = prop.split("-", 2)[2]
+    return set(_atoms(prop))
+
+
+def _box(family: str, sides=SIDES) -> Tuple[str, ...]:
+    return tuple(f"{family}-{side}" if family != "inset" else side for side in sides)
+
+
+# Shorthand -> the properties it sets; longhand_atoms expands them down to longhands.
+# A shorthand also resets the longhands it has no value for, so they are all listed.
+SHORTHANDS: Dict[str, Tuple[str, ...]] = {
+    "margin": _box("margin"),
+    "padding": _box("padding"),
+    "inset": _box("inset"),
+    "scroll-margin": _box("scroll-margin"),
+    "scroll-padding": _box("scroll-padding"),
+    "border": _box("border") + ("border-image",),
+    **{f"border-{side}": tuple(f"border-{side}-{kind}" for kind in BORDER_DEFAULTS) for side in SIDES},
+    **{f"border-{kind}": tuple(f"border-{side}-{kind}" for side in SIDES) for kind in BORDER_DEFAULTS},
+    "border-radius": tuple(f"border-{corner}-radius" for corner in CORNERS),
+    "border-image": tuple(sorted(RESET_ONLY["border"] - {"border-image"})),
+    "outline": ("outline-color", "outline-style", "outline-width"),
+    "background": ("background-color", "background-image", "background-position", "background-size",
+                   "background-repeat", "background-attachment", "background-origin", "background-clip"),
+    "background-position": ("background-position-x", "background-position-y"),
+    "font": FONT_LONGHANDS + tuple(sorted(RESET_ONLY["font"])),
+    "font-variant": ("font-variant-caps", "font-variant-ligatures", "font-variant-numeric",
+                     "font-variant-east-asian", "font-variant-alternates", "font-variant-position",
+                     "font-variant-emoji"),
+    "list-style": ("list-style-type", "list-style-position", "list-style-image"),
+    "overflow": ("overflow-x", "overflow-y"),
+    "flex": ("flex-grow", "flex-shrink", "flex-basis"),
+    "flex-flow": ("flex-direction", "flex-wrap"),
+    "grid": ("grid-template", "grid-auto-rows", "grid-auto-columns", "grid-auto-flow"),
+    "grid-template": ("grid-template-rows", "grid-template-columns", "grid-template-areas"),
+    "grid-area": ("grid-row", "grid-column"),
+    "grid-row": ("grid-row-start", "grid-row-end"),
+    "grid-column": ("grid-column-start", "grid-column-end"),
+    "gap": ("row-gap", "column-gap"),
+    "place-items": ("align-items", "justify-items"),
+    "place-content": ("align-content", "justify-content"),
+    "place-self": ("align-self", "justify-self"),
+    "transition": ("transition-property", "transition-duration", "transition-timing-function",
+                   "transition-delay", "transition-behavior"),
+    "animation": ("animation-name", "animation-duration", "animation-timing-function", "animation-delay",
+                  "animation-iteration-count", "animation-direction", "animation-fill-mode",
+                  "animation-play-state", "animation-timeline"),
+    "text-decoration": ("text-decoration-line", "text-decoration-style", "text-decoration-color",
+                        "text-decoration-thickness"),
+    "text-emphasis": ("text-emphasis-style", "text-emphasis-color"),
+    "columns": ("column-width", "column-count"),
+    "column-rule": ("column-rule-width", "column-rule-style", "column-rule-color"),
+    "mask": ("mask-image", "mask-mode", "mask-repeat", "mask-position", "mask-clip", "mask-origin",
+             "mask-size", "mask-composite"),
+    "offset": ("offset-position", "offset-path", "offset-distance", "offset-rotate", "offset-anchor"),
+    "container": ("container-name", "container-type"),
+    "contain-intrinsic-size": ("contain-intrinsic-width", "contain-intrinsic-height"),
+    "overscroll-behavior": ("overscroll-behavior-x", "overscroll-behavior-y"),
+}
+
+# Old names that browsers treat as another property
+ALIASES = {
+    "grid-gap": "gap", "grid-row-gap": "row-gap", "grid-column-gap": "column-gap",
+    "word-wrap": "overflow-wrap", "box-flex": "flex-grow",
+}
+
+# margin-block, padding-inline-start, border-inline-end-color, inset-block, overflow-inline ...
+_LOGICAL_RE = re.compile(r'^(margin|padding|inset|scroll-margin|scroll-padding|border|overflow'
+                         r'|overscroll-behavior)-(block|inline)(?:-(start|end))?(?:-(width|style|color))?$')
+_LOGICAL_CORNER_RE = re.compile(r'^border-(start|end)-(start|end)-radius$')
+
+
+@lru_cache(maxsize=None)
+def _atoms(prop: str) -> FrozenSet[str]:
+    prop = ALIASES.get(prop, prop)
+    logical = _LOGICAL_RE.match(prop)
+    if logical:
+        family, _, _, kind = logical.groups()
+        if family in ("overflow", "overscroll-behavior"):
+            return frozenset({prop, f"{family}-x", f"{family}-y"})
+        # which physical sides these are depends on the writing mode, so take all four
+        sides = _box(family) if family != "border" else tuple(f"border-{side}" for side in SIDES)
+        if family == "border":
+            sides = tuple(f"{side}-{kind}" for side in sides) if kind else sides
+        return frozenset({prop}).union(*(_atoms(side) for side in sides))
+    if _LOGICAL_CORNER_RE.match(prop):
+        return frozenset({prop}) | _atoms("border-radius")
+    parts = SHORTHANDS.get(prop)
+    if parts is None:
+        return frozenset({prop})
+    return frozenset().union(*(_atoms(p) for p in parts))
+
+
+def _border_part(token: str) -> str:
+    low = token.lower()
+    if low in BORDER_STYLES:
+        return "style"
+    if low in BORDER_WIDTHS or _LENGTH_RE.match(token) or low.startswith(("calc(", "min(", "max(", "clamp(")):
+        return "width"
+    return "color"
+
+
+def expand_border_value(value: str) -> Optional[Dict[str, str]]:
+    """Split 'border: 1px solid red' into width/style/color (defaults filled in)"""
+    parts = split_value(value)
+    if not 1 <= len(parts) <= 3:
+        return None
+    if len(parts) == 1 and parts[0].lower() in CSS_WIDE_KEYWORDS:
+        return {k: parts[0] for k in BORDER_DEFAULTS}
+    out: Dict[str, str] = {}
+    for token in parts:
+        kind = _border_part(token)
+        if kind in out:
+            return None
+        out[kind] = token
+    return {k: out.get(k, default) for k, default in BORDER_DEFAULTS.items()}
+
+
+def expand_font_value(value: str) -> Optional[Dict[str, str]]:
+    parts = split_value(value)
+    if len(parts) < 2 or parts[0].lower() in SYSTEM_FONTS:
+        return None
+    out = {"font-style": "normal", "font-variant": "normal", "font-weight": "normal"}
+    seen = set()
+    i = 0
+    while i < len(parts):
+        low = parts[i].lower()
+        if low in FONT_STYLES and "font-style" not in seen:
+            out["font-style"] = parts[i]
+            seen.add("font-style")
+        elif low in FONT_VARIANTS and "font-variant" not in seen:
+            out["font-variant"] = parts[i]
+            seen.add("font-variant")
+        elif low in FONT_WEIGHTS and "font-weight" not in seen:
+            out["font-weight"] = parts[i]
+            seen.add("font-weight")
+        elif low != "normal":
+            break
+        i += 1
+    if i >= len(parts) - 1:
+        return None
+    size, _, line_height = parts[i].partition("/")
+    rest = parts[i + 1:]
+    if not line_height and rest and rest[0].startswith("/"):
+        line_height = rest[0][1:] or (rest[1] if len(rest) > 1 else "")
+        rest = rest[1:] if rest[0] != "/" else rest[2:]
+    if not rest:
+        return None
+    out["font-size"] = size
+    out["line-height"] = line_height or "normal"
+    out["font-family"] = " ".join(rest)
+    return out
+
+
+def expand_declaration(decl: Declaration) -> List[Declaration]:
+    """Expand a shorthand into longhands; other declarations are returned as-is"""
+    prop = decl.property.lower()
+
+    def make(pairs: Iterable) -> List[Declaration]:
+        return [Declaration(p, v, decl.important) for p, v in pairs]
+
+    if prop in ("margin", "padding"):
+        values = expand_box(decl.value)
+        if values:
+            return make((f"{prop}-{side}", v) for side, v in zip(SIDES, values))
+    elif prop == "border-radius":
+        values = expand_box(decl.value)
+        if values:
+            return make((f"border-{corner}-radius", v) for corner, v in zip(CORNERS, values))
+    elif prop in ("border-width", "border-style", "border-color"):
+        kind = prop.split("-")[1]
+        values = expand_box(decl.value)
+        if values:
+            return make((f"border-{side}-{kind}", v) for side, v in zip(SIDES, values))
+    elif prop == "border" or prop in (f"border-{side}" for side in SIDES):
+        parts = expand_border_value(decl.value)
+        if parts:
+            sides = SIDES if prop == "border" else (prop.split("-")[1],)
+            expanded = make((f"border-{side}-{kind}", parts[kind]) for side in sides for kind in BORDER_DEFAULTS)
+            if prop == "border":
+                expanded.append(Declaration("border-image", "none", decl.important))
+            return expanded
+    elif prop == "font":
+        parts = expand_font_value(decl.value)
+        if parts:
+            return make(parts.items())
+    return [decl]
+
+
+def expand_declarations(decls: List[Declaration]) -> List[Declaration]:
+    """Expand shorthands and resolve overridden longhands (last wins, !important sticks).
+    Declarations stay in source order, so a kept vendor fallback stays before or after
+    the value that follows or precedes it."""
+    resolved: Dict[str, Declaration] = {}
+    out: List[Declaration] = []
+    for decl in decls:
+        for d in expand_declaration(decl):
+            prop = d.property
+            if d.value.lower().startswith(VENDOR_PREFIXES):
+                # Vendor fallback values (display: -webkit-box) are meaningful even when overridden;
+                # a negative value (margin-top: -4px) is not one
+                out.append(d)
+                continue
+            prev = resolved.get(prop)
+            if prev is not None and prev.important and not d.important:
+                continue
+            if prev is not None:
+                out = [o for o in out if o is not prev]
+            resolved[prop] = d
+            out.append(d)
+    return out
+
+
+class ShorthandOptimizer:
+    """Merges longhand sets into shorthands across one or more stylesheets"""
+
+    def __init__(self, sheets: List[Stylesheet]):
+        self.sheets = sheets
+        # Every property set anywhere in the bundle; used for reset-safety checks
+        self.used_properties: Set[str] = {
+            d.property.lower() for s in sheets for r in s.rules() for d in r.declarations
+        }
+
+    def _reset_safe(self, shorthand: str) -> bool:
+        return not (RESET_ONLY.get(shorthand, set()) & self.used_properties)
+
+    def _try_merge(self, rule: Rule, shorthand: str, longhands: List[str], build) -> Optional[Merge]:
+        """Replace the complete longhand set with shorthand if the rule is unambiguous"""
+        positions = {}
+        for i, d in enumerate(rule.declarations):
+            prop = d.property.lower()
+            if prop in longhands:
+                if prop in positions:
+                    return None  # repeated longhand (fallback values) - leave alone
+                positions[prop] = i
+        if len(positions) != len(longhands):
+            return None
+
+        # Anything else touching the same longhands between them would change the result
+        target = set().union(*(longhand_atoms(p) for p in longhands))
+        lo, hi = min(positions.values()), max(positions.values())
+        for i in range(lo + 1, hi):
+            prop = rule.declarations[i].property.lower()
+            if prop not in positions and longhand_atoms(prop) & target:
+                return None
+
+        decls = [rule.declarations[positions[p]] for p in longhands]
+        if len({d.important for d in decls}) != 1:
+            return None
+        values = [d.value for d in decls]
+        wide = [v for v in values if v.lower() in CSS_WIDE_KEYWORDS]
+        if wide and (len(wide) != len(values) or len(set(values)) != 1):
+            return None
+        value = values[0] if wide else build(values)
+        if value is None:
+            return None
+
+        merged = Declaration(shorthand, value, decls[0].important)
+        before = sum(len(d.text()) + 4 for d in decls)
+        drop = set(positions.values())
+        rule.declarations = [merged if i == lo else d for i, d in enumerate(rule.declarations)
+                             if i == lo or i not in drop]
+        return Merge(rule.selector, shorthand, longhands, before - (len(merged.text()) + 4))
+
+    def optimize_rule(self, rule: Rule) -> List[Merge]:
+        merges: List[Merge] = []
+        candidates = []
+        for prop in ("margin", "padding"):
+            candidates.append((prop, [f"{prop}-{s}" for s in SIDES], box_shorthand))
+        candidates.append(("border-radius", [f"border-{c}-radius" for c in CORNERS], box_shorthand))
+        for side in SIDES:
+            candidates.append((f"border-{side}", [f"border-{side}-{k}" for k in BORDER_DEFAULTS],
+                               lambda v: " ".join(v)))
+        for kind in BORDER_DEFAULTS:
+            candidates.append((f"border-{kind}", [f"border-{s}-{kind}" for s in SIDES], box_shorthand))
+
+        def border_from_sides(values: List[str]) -> Optional[str]:
+            return values[0] if len(set(values)) == 1 else None
+
+        def border_from_kinds(values: List[str]) -> Optional[str]:
+            if any(len(split_value(v)) != 1 for v in values):
+                return None
+            return " ".join(values)
+
+        def font_from_longhands(values: List[str]) -> Optional[str]:
+            style, variant, weight, size, line_height, family = values
+            if variant.lower() not in ("normal", "small-caps") or "var(" in " ".join(values):
+                return None
+            head = [v for v in (style, variant, weight) if v.lower() != "normal"]
+            size_part = size if line_height.lower() == "normal" else f"{size}/{line_height}"
+            return " ".join(head + [size_part, family])
+
+        if self._reset_safe("border"):
+            candidates.append(("border", [f"border-{s}" for s in SIDES], border_from_sides))
+            candidates.append(("border", [f"border-{k}" for k in BORDER_DEFAULTS], border_from_kinds))
+        if self._reset_safe("font"):
+            candidates.append(("font", list(FONT_LONGHANDS), font_from_longhands))
+
+        # Later candidates build on earlier merges (sides -> border-top -> border)
+        for shorthand, longhands, build in candidates:
+            merge = self._try_merge(rule, shorthand, longhands, build)
+            if merge:
+                merges.append(merge)
+        return merges
+
+    def optimize(self) -> Dict[str, List[Merge]]:
+        """Merge longhands in place; returns merges keyed by file path"""
+        report: Dict[str, List[Merge]] = {}
+        for sheet in self.sheets:
+            merges: List[Merge] = []
+            for rule in sheet.rules():
+                if rule.context and rule.context[0].lower().startswith("@keyframes"):
+                    continue
+                merges.extend(self.optimize_rule(rule))
+            report[str(sheet.path)] = merges
+        return report
@@ -0,0 +1,234 @@
+"""
+Rule-level diff between two stylesheet snapshots (styles/, css_backup/,
+css_backup_phase2/, ...).
+Rules are hash-indexed by (file, selector, at-rule context) and compared by
+canonical body, so a diff is linear in the number of rules (rules sharing a
+selector within one file and context are matched against each other). A rule that
+turns up unchanged in another file or context, or out of order with the other rules
+of its file, is reported as moved rather than removed and added. Files whose
+digest is identical in both snapshots are skipped without parsing, and
+parses are cached by digest so a snapshot compared twice, or a file shared
+by several snapshots, is parsed once.
+
+    python -m cssscan.snapdiff <old_dir> <new_dir> [--csv <out.csv>]
+"""
+
+import sys
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from cssscan.backup import DigestCache
+from cssscan.canonical import canonicalize_declaration
+from cssscan.merge import is_keyframes_context
+from cssscan.parser import Rule, Stylesheet, iter_rules, parse_stylesheet
+from cssscan.selectors import normalize_selector
+
+GroupKey = Tuple[str, str, Tuple[str, ...]]  # file, normalized selector, at-rule context
+
+
+@dataclass
+class RuleChange:
+    kind: str  # added, removed, moved, changed
+    file: str
+    selector: str
+    context: Tuple[str, ...]
+    old_line: Optional[int] = None
+    new_line: Optional[int] = None
+    moved_from: Optional[str] = None
+    added_declarations: List[str] = field(default_factory=list)
+    removed_declarations: List[str] = field(default_factory=list)
+
+    def row(self) -> Dict:
+        return {
+            "kind": self.kind,
+            "file": self.file,
+            "selector": self.selector,
+            "context": " ".join(self.context),
+            "old_line": self.old_line,
+            "new_line": self.new_line,
+            "moved_from": self.moved_from or "",
+            "added_declarations": "; ".join(self.added_declarations),
+            "removed_declarations": "; ".join(self.removed_declarations),
+        }
+
+
+@dataclass
+class SnapshotDiff:
+    old_root: Path
+    new_root: Path
+    changes: List[RuleChange] = field(default_factory=list)
+    files_unchanged: int = 0
+    files_compared: int = 0
+
+    def counts(self) -> Dict[str, int]:
+        counts = Counter(c.kind for c in self.changes)
+        return {kind: counts.get(kind, 0) for kind in ("added", "removed", "moved", "changed")}
+
+    def summary(self) -> Dict:
+        return {
+            "old": str(self.old_root),
+            "new": str(self.new_root),
+            "files_unchanged": self.files_unchanged,
+            "files_compared": self.files_compared,
+            **self.counts(),
+        }
+
+    def write_csv(self, path: Path):
+        import csv
+
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=list(RuleChange("", "", "", ()).row()))
+            writer.writeheader()
+            writer.writerows(c.row() for c in self.changes)
+
+
+def _body(rule: Rule) -> Tuple[str, ...]:
+    return tuple(sorted(canonicalize_declaration(d.text()) for d in rule.declarations))
+
+
+def _reordered(pairs: List[Tuple[GroupKey, Rule, Rule]]) -> List[Tuple[GroupKey, Rule, Rule]]:
+    """(key, old rule, new rule) pairs outside the longest run that kept its relative order"""
+    pairs = sorted(pairs, key=lambda p: p[2].span[0])
+    tails: List[int] = []  # tails[k]: the pair with the smallest old offset ending a run of length k + 1
+    offsets: List[int] = []  # that offset
+    previous: List[Optional[int]] = []
+    for i, (_, before, _) in enumerate(pairs):
+        k = bisect_left(offsets, before.span[0])
+        previous.append(tails[k - 1] if k else None)
+        if k == len(tails):
+            tails.append(i)
+            offsets.append(before.span[0])
+        else:
+            tails[k], offsets[k] = i, before.span[0]
+    in_order = set()
+    i = tails[-1] if tails else None
+    while i is not None:
+        in_order.add(i)
+        i = previous[i]
+    return [p for i, p in enumerate(pairs) if i not in in_order]
+
+
+class SnapshotDiffer:
+    """Diffs snapshots, sharing one digest-keyed parse cache across every diff it runs"""
+
+    def __init__(self):
+        self._parsed: Dict[str, Stylesheet] = {}
+        self.digest = DigestCache()
+        self.parses = 0
+
+    def sheet(self, path: Path) -> Stylesheet:
+        digest = self.digest(path)
+        if digest not in self._parsed:
+            self._parsed[digest] = parse_stylesheet(path.read_text(encoding="utf-8", errors="ignore"), path)
+            self.parses += 1
+        return self._parsed[digest]
+
+    def _index(self, rel: str, path: Path, index: Dict[GroupKey, List[Rule]]):
+        for rule in iter_rules(self.sheet(path).nodes):
+            if not is_keyframes_context(rule.context):
+                index[(rel, normalize_selector(rule.selector), rule.context)].append(rule)
+
+    def diff(self, old_root: Path, new_root: Path) -> SnapshotDiff:
+        old_root, new_root = Path(old_root), Path(new_root)
+        result = SnapshotDiff(old_root, new_root)
+        old_files = {p.relative_to(old_root).as_posix(): p for p in old_root.rglob("*.css")}
+        new_files = {p.relative_to(new_root).as_posix(): p for p in new_root.rglob("*.css")}
+
+        old_rules: Dict[GroupKey, List[Rule]] = defaultdict(list)
+        new_rules: Dict[GroupKey, List[Rule]] = defaultdict(list)
+        for rel in sorted(old_files.keys() | new_files.keys()):
+            old, new = old_files.get(rel), new_files.get(rel)
+            if old and new and self.digest(old) == self.digest(new):
+                result.files_unchanged += 1
+                continue
+            result.files_compared += 1
+            if old:
+                self._index(rel, old, old_rules)
+            if new:
+                self._index(rel, new, new_rules)
+
+        # Within one (file, selector, context): identical bodies match first, then leftovers pair up in order
+        removed: Dict[Tuple[str, Tuple[str, ...], Tuple[str, ...]], List[Tuple[str, Rule]]] = defaultdict(list)
+        added: List[Tuple[GroupKey, Rule]] = []
+        kept: Dict[str, List[Tuple[GroupKey, Rule, Rule]]] = defaultdict(list)  # file -> identical pairs
+        for key in sorted(old_rules.keys() | new_rules.keys()):
+            rel, selector, context = key
+            olds, news = list(old_rules.get(key, ())), list(new_rules.get(key, ()))
+            unmatched_new = []
+            bodies = defaultdict(list)
+            for rule in olds:
+                bodies[_body(rule)].append(rule)
+            for rule in news:
+                same = bodies.get(_body(rule))
+                if same:
+                    before = same.pop(0)
+                    olds.remove(before)
+                    kept[rel].append((key, before, rule))
+                else:
+                    unmatched_new.append(rule)
+            for before, after in zip(olds, unmatched_new):
+                b, a = _body(before), _body(after)
+                result.changes.append(RuleChange(
+                    "changed", rel, selector, context, before.line, after.line,
+                    added_declarations=sorted(set(a) - set(b)),
+                    removed_declarations=sorted(set(b) - set(a)),
+                ))
+            for rule in olds[len(unmatched_new):]:
+                removed[(selector, context, _body(rule))].append((rel, rule))
+            added.extend((key, rule) for rule in unmatched_new[len(olds):])
+
+        # An unchanged rule whose order among the others in its file changed has moved
+        for rel, pairs in kept.items():
+            for (_, selector, context), before, after in _reordered(pairs):
+                result.changes.append(RuleChange("moved", rel, selector, context, before.line, after.line,
+                                                 moved_from=rel))
+
+        # So has a rule that disappeared from one file (or at-rule context) and appeared
+        # unchanged in another; the same context is preferred, then the same file
+        elsewhere: Dict[Tuple[str, Tuple[str, ...]], List[Tuple[str, Tuple[str, ...], Tuple[str, ...]]]] = defaultdict(list)
+        for key in removed:
+            elsewhere[(key[0], key[2])].append(key)
+        for (rel, selector, context), rule in added:
+            body = _body(rule)
+            candidates = removed.get((selector, context, body))
+            if not candidates:
+                left = [removed[k] for k in elsewhere.get((selector, body), ()) if removed[k]]
+                left.sort(key=lambda rules: all(r != rel for r, _ in rules))
+                candidates = left[0] if left else None
+            if candidates:
+                index = next((i for i, (r, _) in enumerate(candidates) if r == rel), 0)
+                source_rel, source = candidates.pop(index)
+                result.changes.append(RuleChange("moved", rel, selector, context, source.line, rule.line,
+                                                 moved_from=source_rel))
+            else:
+                result.changes.append(RuleChange("added", rel, selector, context, new_line=rule.line))
+        for (selector, context, _), rules in removed.items():
+            for rel, rule in rules:
+                result.changes.append(RuleChange("removed", rel, selector, context, rule.line))
+
+        result.changes.sort(key=lambda c: (c.file, c.new_line or c.old_line or 0, c.kind))
+        return result
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = sys.argv[1:] if argv is None else argv
+    if len(args) not in (2, 4) or (len(args) == 4 and args[2] != "--csv"):
+        print("Usage: python -m cssscan.snapdiff <old_dir> <new_dir> [--csv <out.csv>]")
+        return 1
+    diff = SnapshotDiffer().diff(Path(args[0]), Path(args[1]))
+    summary = diff.summary()
+    print(f"📊 {args[0]} -> {args[1]}: {summary['files_compared']} files differ, "
+          f"{summary['files_unchanged']} identical")
+    print(f"  ➕ {summary['added']} added  ➖ {summary['removed']} removed  "
+          f"🔀 {summary['moved']} moved  ✏️  {summary['changed']} changed")
+    if len(args) == 4:
+        diff.write_csv(Path(args[3]))
+        print(f"  Written {len(diff.changes)} rule changes to {args[3]}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
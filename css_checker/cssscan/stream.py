@@ -0,0 +1,89 @@
+"""
+Bounded-memory streaming over very large stylesheets.
+Files are read in blocks and handed on in chunks that end on a safe
+boundary, so peak memory stays near the configured budget whatever the file
+size. Each helper is written so that processing the chunks gives exactly the
+same result as processing the whole file at once; the only case that can
+exceed the budget is a single rule larger than the budget, which is kept
+whole.
+"""
+
+import re
+from pathlib import Path
+from typing import Iterator, Pattern, Set, TextIO
+
+DEFAULT_BUDGET = 8 * 1024 * 1024  # characters held in memory at once
+READ_SIZE = 1024 * 1024
+
+_NAME_RE = re.compile(r'[\w-]+')
+
+
+def open_text(path: Path) -> TextIO:
+    """Open a stylesheet the same way the whole-file readers decode it"""
+    return open(path, "r", encoding="utf-8", errors="ignore")
+
+
+def read_blocks(f: TextIO, budget: int) -> Iterator[str]:
+    size = max(1, min(READ_SIZE, budget // 4))
+    while True:
+        block = f.read(size)
+        if not block:
+            return
+        yield block
+
+
+def iter_chunks(f: TextIO, budget: int = DEFAULT_BUDGET) -> Iterator[str]:
+    """Consecutive pieces of f that each end just after a '}' (the last piece excepted).
+    Safe for substitutions whose matches cannot contain a '}' except as their last character."""
+    buf = ""
+    for block in read_blocks(f, budget):
+        buf += block
+        if len(buf) >= budget:
+            cut = buf.rfind("}") + 1
+            if cut:
+                yield buf[:cut]
+                buf = buf[cut:]
+    if buf:
+        yield buf
+
+
+def iter_matches(f: TextIO, pattern: Pattern, budget: int = DEFAULT_BUDGET) -> Iterator["re.Match"]:
+    """pattern.finditer over the whole stream, holding only the text after the last match.
+    Valid for patterns whose matches are prefix-stable, such as the selector { body } pattern
+    in main.py: a match found in a prefix is the same match the whole text would give."""
+    buf = ""
+    for block in read_blocks(f, budget):
+        buf += block
+        last = 0
+        for m in pattern.finditer(buf):
+            yield m
+            last = m.end()
+        buf = buf[last:]
+
+
+def iter_file_chunks(path: Path, budget: int = DEFAULT_BUDGET) -> Iterator[str]:
+    """iter_chunks over a file"""
+    with open_text(path) as f:
+        yield from iter_chunks(f, budget)
+
+
+def read_prelude(path: Path, budget: int = DEFAULT_BUDGET) -> str:
+    """The statements before the first block ('{') of a file: its @charset and @imports,
+    which CSS only honours at the top. Reads no further than the first block."""
+    buf = ""
+    with open_text(path) as f:
+        for block in read_blocks(f, budget):
+            buf += block
+            brace = buf.find("{")
+            if brace >= 0:
+                return buf[:buf.rfind(";", 0, brace) + 1]
+    return buf
+
+
+def scan_names(path: Path, budget: int = DEFAULT_BUDGET) -> Set[str]:
+    """Every distinct name-like token ([\\w-]+) of a file; memory follows the vocabulary,
+    not the file size. No token contains a '}', so none straddles two chunks."""
+    names: Set[str] = set()
+    for chunk in iter_file_chunks(path, budget):
+        names.update(_NAME_RE.findall(chunk))
+    return names
@@ -2,17 +2,54 @@
 import os
 import re
 import hashlib
-import csv
+import time
 from pathlib import Path
 from collections import defaultdict
 from functools import cmp_to_key
-from difflib import SequenceMatcher
+
+from cssscan.atrules import AtRuleConsolidator
+from cssscan.bundle import bundle_order
+from cssscan.canonical import canonicalize_declarations, cache_stats
+from cssscan.index import SelectorIndex
+from cssscan.itemsets import DeclarationGroupMiner
+from cssscan.merge import SelectorListMerger
+from cssscan.neardup import cluster_near_duplicates
+from cssscan.parser import parse_declaration, parse_file, parse_stylesheet
+from cssscan.shorthand import ShorthandOptimizer, expand_declarations
+from cssscan.stream import iter_matches, open_text, read_prelude
 
 # === CONFIG ===
 CSS_ROOT = Path(".")
 OUTPUT_SHARED = Path("shared.css")
 OUTPUT_CSV = Path("refactor-suggestions.csv")
-OUTPUT_NEAR = Path("near-duplicates.csv")
+OUTPUT_NEAR = Path("near-duplicate-clusters.csv")
+OUTPUT_SHORTHAND = Path("shorthand-merges.csv")
+OUTPUT_MERGES = Path("selector-merges.csv")
+OUTPUT_MERGED_DIR = Path("merged")
+OUTPUT_SELECTORS = Path("duplicate-selectors.csv")
+OUTPUT_GROUPS = Path("shared-declaration-groups.csv")
+
+# "shared-classes": emit .shared-N classes into shared.css (needs markup changes)
+# "selector-lists": fold identical rules into comma-separated selector lists in place
+OUTPUT_MODE = "shared-classes"
+BUNDLE_ENTRY = CSS_ROOT / "main.css"
+
+# "file": merge same-condition @media/@supports blocks within each file; "bundle": across the import order
+ATRULE_SCOPE = "file"
+
+# canonicalise property names and values (colours, lengths, numbers, case, quotes) before hashing
+CANONICALIZE = True
+
+# expand shorthands (margin, padding, border, border-radius, font) when comparing rule bodies
+EXPAND_SHORTHANDS = True
+
+# files larger than this are read in rule-aligned chunks instead of all at once, and left out of
+# the passes that need a parsed model or pairwise comparisons (selector index, declaration groups,
+# shorthands, selector lists, at-rules, near-duplicates). Only the text read at once is bounded:
+# the exact-duplicate pass still keeps one entry (about 1 KB) per rule
+STREAM_THRESHOLD = 32 * 1024 * 1024
+# characters of a streamed file held in memory at once
+MEMORY_BUDGET = 8 * 1024 * 1024
 
 # similarity threshold for near-duplicates (0.9 = 90%)
 NEAR_DUP_THRESHOLD = 0.9
@@ -29,17 +66,27 @@ PATH_PRIORITY = {
 
 # === HELPERS ===
 
-def normalize_declarations(decl_block: str) -> str:
+def normalize_declarations(decl_block: str, canonical: bool = True) -> str:
     # remove comments
     decl_block = re.sub(r'/\*.*?\*/', '', decl_block, flags=re.DOTALL)
     # split into properties
     props = [p.strip() for p in decl_block.strip().strip('{}').split(';') if p.strip()]
-    props = sorted(props)
+    if canonical:
+        props = canonicalize_declarations(props)
+    else:
+        props = sorted(props)
     return ";\n  ".join(props) + (';' if props else '')
 
 def hash_declarations(norm: str) -> str:
     return hashlib.sha256(norm.encode('utf-8')).hexdigest()
 
+def comparison_key(norm: str) -> str:
+    # expand shorthands so `margin: 0` and the four margin-* longhands compare equal
+    decls = [parse_declaration(p) for p in norm.rstrip(';').split(";\n  ") if p]
+    decls = expand_declarations([d for d in decls if d is not None])
+    props = sorted((d.text() for d in decls), key=lambda t: t.split(':', 1)[0])
+    return ";\n  ".join(props) + (';' if props else '')
+
 def score_path(p: Path):
     # returns tuple to compare: (priority, depth, path string)
     s = 99
@@ -54,60 +101,197 @@ def score_path(p: Path):
 def compare_score(a: tuple, b: tuple):
     return -1 if a < b else (1 if a > b else 0)
 
+# naive rule capture: selector { ... }
+RULE_PATTERN = re.compile(r'([^{]+)\{([^}]+)\}', flags=re.MULTILINE)
+
+def is_streamed(path: Path):
+    return path.stat().st_size > STREAM_THRESHOLD
+
+def iter_rule_matches(path: Path):
+    # big files are streamed; the matches are the same as over the whole text
+    if not is_streamed(path):
+        yield from RULE_PATTERN.finditer(path.read_text(encoding="utf-8", errors="ignore"))
+        return
+    with open_text(path) as f:
+        yield from iter_matches(f, RULE_PATTERN, MEMORY_BUDGET)
+
 def parse_css_file(path: Path):
-    text = path.read_text(encoding="utf-8", errors="ignore")
-    # naive rule capture: selector { ... }
-    pattern = re.compile(r'([^{]+)\{([^}]+)\}', flags=re.MULTILINE)
     entries = []
-    for match in pattern.finditer(text):
+    for match in iter_rule_matches(path):
         selector = match.group(1).strip()
         decl = match.group(2).strip()
-        norm = normalize_declarations(decl)
-        h = hash_declarations(norm)
+        raw_norm = normalize_declarations(decl, canonical=False)
+        start = time.perf_counter()
+        norm = normalize_declarations(decl, canonical=CANONICALIZE)
+        cost = time.perf_counter() - start
+        h = hash_declarations(comparison_key(norm) if EXPAND_SHORTHANDS else norm)
         entries.append({
             "selector": selector,
             "normalized": norm,
             "hash": h,
+            "raw_hash": hash_declarations(raw_norm),
+            "canon_hash": hash_declarations(norm),
+            "canon_cost": cost,
             "file": path,
         })
     return entries
 
-def find_near_duplicates(entries):
-    # Compare all normalized declarations pairwise (could be heavy, but dataset is modest)
-    near_pairs = []
-    seen = set()
-    for i in range(len(entries)):
-        for j in range(i+1, len(entries)):
-            a = entries[i]
-            b = entries[j]
-            if a["hash"] == b["hash"]:
-                continue  # exact duplicate already handled
-            key = tuple(sorted([(a["selector"], str(a["file"])), (b["selector"], str(b["file"]))]))
-            if key in seen:
-                continue
-            seen.add(key)
-            sm = SequenceMatcher(a=a["normalized"], b=b["normalized"])
-            ratio = sm.ratio()
-            if ratio >= NEAR_DUP_THRESHOLD:
-                near_pairs.append({
-                    "selector_a": a["selector"],
-                    "file_a": str(a["file"]),
-                    "selector_b": b["selector"],
-                    "file_b": str(b["file"]),
-                    "similarity": round(ratio, 3),
-                    "common_subsequence": sm.get_matching_blocks(),  # for deeper inspection
-                })
-    return near_pairs
+def canonicalization_stats(entries, groups):
+    # How many duplicate groups only exist because of canonical values or shorthand expansion
+    raw_groups = defaultdict(int)
+    for e in entries:
+        raw_groups[e["raw_hash"]] += 1
+    raw_dup_groups = sum(1 for n in raw_groups.values() if n > 1)
+    dup_groups = [items for items in groups.values() if len(items) > 1]
+    # a group whose canonical bodies still differ was only merged by expanding shorthands
+    by_shorthands = sum(1 for items in dup_groups if len({it["canon_hash"] for it in items}) > 1)
+    by_values = sum(1 for items in dup_groups
+                    if len({it["raw_hash"] for it in items}) > 1 and len({it["canon_hash"] for it in items}) == 1)
+    costs = [e["canon_cost"] for e in entries]
+    return {
+        "raw_duplicate_groups": raw_dup_groups,
+        "canonical_duplicate_groups": len(dup_groups),
+        "uncovered_groups": by_values,
+        "shorthand_groups": by_shorthands,
+        "rules": len(entries),
+        "mean_cost_us": (sum(costs) / len(costs) * 1e6) if costs else 0.0,
+        "max_cost_us": max(costs) * 1e6 if costs else 0.0,
+    }
+
+def parse_small_files(paths, what):
+    # Parsed models take many times their text, so big files are left out (and said so)
+    big = [p for p in paths if is_streamed(p)]
+    if big:
+        print(f"  Skipping {len(big)} files over {STREAM_THRESHOLD:,} bytes for {what}")
+    return [parse_file(p) for p in paths if p not in big]
+
+def load_bundle_sheet(path: Path):
+    # a big file is only read up to its first rule, for the @imports that place it in the bundle
+    if is_streamed(path):
+        return parse_stylesheet(read_prelude(path, MEMORY_BUDGET), path)
+    return parse_file(path)
+
+def parse_bundle(what, per_file=False):
+    # Stylesheets in cascade order. Passes that move rules across files cannot leave a file out
+    # and stay cascade-safe, so they get None when the bundle has a big file
+    sheets = {}
+    order = bundle_order(BUNDLE_ENTRY, sheets, loader=load_bundle_sheet)
+    big = [p for p in order if is_streamed(p)]
+    if big and not per_file:
+        print(f"  Skipping {what}: {len(big)} files over {STREAM_THRESHOLD:,} bytes in the bundle")
+        return None
+    if big:
+        print(f"  Skipping {len(big)} files over {STREAM_THRESHOLD:,} bytes for {what}")
+    return [sheets.get(p) or parse_file(p) for p in order if p not in big]
+
+def find_shorthand_merges(paths):
+    # Merge complete longhand sets in memory and measure the serialized size change per file
+    sheets = parse_small_files(paths, "shorthand merges")
+    before = {str(s.path): len(s.text().encode('utf-8')) for s in sheets}
+    merges = ShorthandOptimizer(sheets).optimize()
+    savings = {}
+    for sheet in sheets:
+        key = str(sheet.path)
+        if merges[key]:
+            savings[key] = before[key] - len(sheet.text().encode('utf-8'))
+    return merges, savings
+
+def write_duplicate_selectors(paths):
+    # Selectors defined more than once in the same context, with a cleanup action per definition
+    index = SelectorIndex.build(parse_small_files(paths, "the selector index"))
+    rows = index.report()
+    if not rows:
+        print("No selector is defined twice.")
+        return
+    index.write_report(OUTPUT_SELECTORS, rows)
+    groups = sum(1 for r in rows if r["relation"] == "canonical")
+    removable = sum(1 for r in rows if r["action"] == "remove")
+    print(f"Written {groups} duplicated selectors ({removable} removable definitions) to {OUTPUT_SELECTORS}")
+
+def write_shared_groups(paths):
+    # Declaration subsets repeated across otherwise different rules, ranked by net bytes saved
+    groups = DeclarationGroupMiner.build(parse_small_files(paths, "declaration groups")).mine()
+    if not groups:
+        print("No shared declaration groups found.")
+        return
+    DeclarationGroupMiner.write_csv(OUTPUT_GROUPS, groups)
+    selected = [g for g in groups if g.selected]
+    for g in selected[:5]:
+        print(f"  {g.net_bytes} bytes: {'; '.join(g.declarations)} ({len(g.rules)} rules)")
+    print(f"Written {len(groups)} shared declaration groups to {OUTPUT_GROUPS} "
+          f"({len(selected)} non-overlapping, {sum(g.net_bytes for g in selected)} bytes)")
+
+def merge_selector_lists():
+    # Fold identical rule bodies into selector lists, respecting bundle cascade order
+    sheets = parse_bundle("selector-list merges")
+    if sheets is None:
+        return [], 0
+    before = {str(s.path): len(s.text().encode('utf-8')) for s in sheets}
+    merges = SelectorListMerger(sheets).merge()
+    for sheet in sheets:
+        out = OUTPUT_MERGED_DIR / sheet.path.relative_to(BUNDLE_ENTRY.parent)
+        out.parent.mkdir(parents=True, exist_ok=True)
+        out.write_text(sheet.text(), encoding="utf-8")
+    saved = sum(before.values()) - sum(len(s.text().encode('utf-8')) for s in sheets)
+    return merges, saved
+
+def consolidate_at_rules():
+    # Same-condition @media/@supports blocks folded together in memory
+    sheets = parse_bundle("at-rule consolidation", per_file=ATRULE_SCOPE == "file")
+    if sheets is None:
+        return None
+    return AtRuleConsolidator(sheets, scope=ATRULE_SCOPE).run()
+
+def write_selector_merges():
+    import csv
+    print("Merging identical rules into selector lists...")
+    merges, saved = merge_selector_lists()
+    if not merges:
+        print("No rules could be merged; skipping selector merges")
+        return
+    with open(OUTPUT_MERGES, "w", newline="", encoding="utf-8") as mf:
+        fieldnames = ["target_file", "target_selector", "source_file", "source_selector", "bytes_saved"]
+        writer = csv.DictWriter(mf, fieldnames=fieldnames)
+        writer.writeheader()
+        for m in merges:
+            writer.writerow(vars(m))
+    print(f"Written {len(merges)} selector merges to {OUTPUT_MERGES}, merged stylesheets to {OUTPUT_MERGED_DIR}/")
+    print(f"  {saved} bytes saved in total")
+
+def write_shared_classes(shared_lines, csv_rows):
+    import csv
+    # Write shared.css
+    if shared_lines:
+        with open(OUTPUT_SHARED, "w", encoding="utf-8") as f:
+            f.writelines(shared_lines)
+        print(f"Written shared classes to {OUTPUT_SHARED}")
+    else:
+        print("No exact duplicates found; skipping shared.css")
+
+    # Write refactor-suggestions.csv
+    if csv_rows:
+        headers = ["shared_class", "canonical_selector", "canonical_file", "other_selector", "other_file", "action"]
+        with open(OUTPUT_CSV, "w", newline="", encoding="utf-8") as cf:
+            writer = csv.DictWriter(cf, fieldnames=headers)
+            writer.writeheader()
+            for row in csv_rows:
+                writer.writerow(row)
+        print(f"Written refactor plan to {OUTPUT_CSV}")
+    else:
+        print("No refactor suggestions (no duplicates).")
 
 # === MAIN ===
 
 def main():
+    import csv
     print("Scanning CSS files...")
     all_entries = []
+    css_paths = []
     for root, _, files in os.walk(CSS_ROOT):
         for f in files:
             if f.endswith(".css"):
                 p = Path(root) / f
+                css_paths.append(p)
                 all_entries.extend(parse_css_file(p))
 
     # Group by exact normalized declaration (hash)
@@ -115,6 +299,15 @@ def main():
     for e in all_entries:
         groups[e["hash"]].append(e)
 
+    if CANONICALIZE:
+        stats = canonicalization_stats(all_entries, groups)
+        hits, misses = cache_stats()["canonicalize_declaration"]
+        print(f"Canonicalisation: {stats['raw_duplicate_groups']} -> {stats['canonical_duplicate_groups']} "
+              f"duplicate groups ({stats['uncovered_groups']} uncovered by canonical values, "
+              f"{stats['shorthand_groups']} by shorthand expansion)")
+        print(f"  per-rule cost: mean {stats['mean_cost_us']:.1f}us, max {stats['max_cost_us']:.1f}us "
+              f"over {stats['rules']} rules (declaration cache {hits} hits / {misses} misses)")
+
     shared_lines = []
     csv_rows = []
     shared_count = 0
@@ -149,43 +342,64 @@ def main():
                 "action": action,
             })
 
-    # Write shared.css
-    if shared_lines:
-        with open(OUTPUT_SHARED, "w", encoding="utf-8") as f:
-            f.writelines(shared_lines)
-        print(f"Written shared classes to {OUTPUT_SHARED}")
+    if OUTPUT_MODE == "selector-lists":
+        write_selector_merges()
     else:
-        print("No exact duplicates found; skipping shared.css")
+        write_shared_classes(shared_lines, csv_rows)
 
-    # Write refactor-suggestions.csv
-    if csv_rows:
-        headers = ["shared_class", "canonical_selector", "canonical_file", "other_selector", "other_file", "action"]
-        with open(OUTPUT_CSV, "w", newline="", encoding="utf-8") as cf:
-            writer = csv.DictWriter(cf, fieldnames=headers)
+    print("Indexing selector definitions...")
+    write_duplicate_selectors(css_paths)
+
+    print("Mining shared declaration groups...")
+    write_shared_groups(css_paths)
+
+    # Shorthand merges
+    print("Scanning for mergeable longhands...")
+    merges, savings = find_shorthand_merges(css_paths)
+    if savings:
+        with open(OUTPUT_SHORTHAND, "w", newline="", encoding="utf-8") as sf:
+            fieldnames = ["file", "selector", "shorthand", "longhands", "bytes_saved"]
+            writer = csv.DictWriter(sf, fieldnames=fieldnames)
             writer.writeheader()
-            for row in csv_rows:
-                writer.writerow(row)
-        print(f"Written refactor plan to {OUTPUT_CSV}")
+            for file, file_merges in merges.items():
+                for m in file_merges:
+                    writer.writerow({
+                        "file": file,
+                        "selector": m.selector,
+                        "shorthand": m.shorthand,
+                        "longhands": " ".join(m.longhands),
+                        "bytes_saved": m.bytes_saved,
+                    })
+        for file, saved in sorted(savings.items(), key=lambda kv: -kv[1]):
+            print(f"  {file}: {len(merges[file])} merges, {saved} bytes saved")
+        print(f"Written shorthand merges to {OUTPUT_SHORTHAND} ({sum(savings.values())} bytes total)")
     else:
-        print("No refactor suggestions (no duplicates).")
+        print("No mergeable longhand sets found.")
+
+    # @media / @supports consolidation
+    print(f"Consolidating conditional at-rule blocks (scope: {ATRULE_SCOPE})...")
+    stats = consolidate_at_rules()
+    if stats is not None:
+        for file, saved in sorted(stats.bytes_saved.items(), key=lambda kv: -kv[1]):
+            print(f"  {file}: {saved} bytes saved")
+        print(f"  {stats.blocks_merged} of {stats.blocks_before} at-rule blocks removed, "
+              f"{stats.declarations_deduped} repeated declarations dropped, {stats.total_bytes_saved} bytes saved")
 
-    # Near-duplicates
-    print("Scanning for near-duplicates...")
-    near = find_near_duplicates(all_entries)
-    if near:
+    # Near-duplicates, collapsed into clusters
+    print("Clustering near-duplicates...")
+    big = {p for p in css_paths if is_streamed(p)}
+    if big:
+        print(f"  Skipping {len(big)} files over {STREAM_THRESHOLD:,} bytes for near-duplicate clustering")
+    clusters = cluster_near_duplicates([e for e in all_entries if e["file"] not in big], NEAR_DUP_THRESHOLD)
+    if clusters:
         with open(OUTPUT_NEAR, "w", newline="", encoding="utf-8") as nf:
-            fieldnames = ["selector_a", "file_a", "selector_b", "file_b", "similarity"]
+            fieldnames = ["cluster", "rules", "medoid", "selector", "file", "similarity",
+                          "core_declarations", "extra_declarations"]
             writer = csv.DictWriter(nf, fieldnames=fieldnames)
             writer.writeheader()
-            for pair in near:
-                writer.writerow({
-                    "selector_a": pair["selector_a"],
-                    "file_a": pair["file_a"],
-                    "selector_b": pair["selector_b"],
-                    "file_b": pair["file_b"],
-                    "similarity": pair["similarity"],
-                })
-        print(f"Written near-duplicates to {OUTPUT_NEAR} (threshold {NEAR_DUP_THRESHOLD})")
+            for number, cluster in enumerate(clusters, 1):
+                writer.writerows(cluster.rows(number))
+        print(f"Written {len(clusters)} near-duplicate clusters to {OUTPUT_NEAR} (threshold {NEAR_DUP_THRESHOLD})")
     else:
         print("No near-duplicates above threshold.")
 
@@ -4,13 +4,40 @@ CSS Duplicate Cleanup Script
 Automatically cleans CSS duplicates based on priority structure and analysis results.
 """
 
+import hashlib
+import io
 import os
 import re
 import json
-import shutil
 from pathlib import Path
-from typing import Dict, List, Set, Tuple
-from datetime import datetime
+from typing import Dict, List, Optional, Set, Tuple
+from datetime import datetime, timezone
+
+from cssscan.backup import file_digest, restore, write_manifest
+from cssscan.bundle import bundle_order
+from cssscan.compress import stream_sizes
+from cssscan.parser import Stylesheet, apply_edits, iter_rules, parse_stylesheet
+from cssscan.refgraph import ReferenceGraph, external_source_paths
+from cssscan.stream import DEFAULT_BUDGET, iter_chunks, iter_file_chunks, open_text, read_prelude, scan_names
+
+BLANK_RUN_RE = re.compile(r'\n\s*\n\s*\n')
+
+# Settings a worker process copies from the tool that started it
+WORKER_SETTINGS = ("variables_to_extract", "colors_to_consolidate", "safe_removal_classes",
+                   "plan_mode", "stream_threshold", "memory_budget")
+_WORKER_TOOL = None
+
+
+def _init_worker(project_root: str, settings: Dict):
+    global _WORKER_TOOL
+    _WORKER_TOOL = CSSCleanupTool(project_root)
+    for name, value in settings.items():
+        setattr(_WORKER_TOOL, name, value)
+
+
+def _run_worker_job(job):
+    return _WORKER_TOOL._run_file_job(*job)
+
 
 class CSSCleanupTool:
     def __init__(self, project_root: str):
@@ -58,26 +85,189 @@ class CSSCleanupTool:
             ".text-center", ".text-left", ".text-right",  # Text alignment
             ".justify-center", ".justify-start", ".justify-between"  # Flexbox utilities
         ]
+        
+        # Phase 2 consolidation (phase2.sh): component files that replace page-specific patterns
+        self.phase2_components = [
+            "page-header/base.css",
+            "avatars/base.css",
+            "forms/enhanced-inputs.css",
+            "tables/enhanced-headers.css",
+            "cards/decorative.css",
+            "modals/enhanced.css",
+            "buttons/utility.css",
+            "states/empty.css",
+        ]
+        
+        # (group, old selector, component classes, description); the old selector becomes the
+        # compound of the component classes, e.g. .ai-analysis__header -> .page-header.page-header--wrapped
+        self.component_replacements = [
+            ("page_headers", ".ai-analysis__header", "page-header page-header--wrapped", "AI analysis header"),
+            ("page_headers", ".meeting-records__header", "page-header page-header--large-gap", "Meeting records header"),
+            ("page_headers", ".meeting-form__header", "page-header page-header--large-gap", "Meeting form header"),
+            ("page_headers", ".year-summary__header", "page-header page-header--center", "Year summary header"),
+            ("avatars", ".selected-student-avatar", "avatar avatar--lg avatar--gradient avatar--circular avatar--special", "Selected student avatar"),
+            ("avatars", ".page-header__icon", "avatar avatar--lg avatar--gradient avatar--square", "Page header icon"),
+            ("avatars", ".ai-analysis__header-icon", "avatar avatar--lg avatar--gradient avatar--square", "AI analysis header icon"),
+            ("avatars", ".year-summary__icon", "avatar avatar--lg avatar--gradient avatar--square", "Year summary icon"),
+            ("avatars", ".header__user-avatar-large", "avatar avatar--md avatar--primary avatar--circular", "Header user avatar large"),
+            ("avatars", ".sidebar__user-avatar", "avatar avatar--md avatar--primary avatar--rounded", "Sidebar user avatar"),
+            ("forms", ".ai-analysis__select", "form-select--enhanced", "AI analysis select"),
+            ("forms", ".create-school-form .form-input", "form-input--enhanced", "Create school form input"),
+            ("forms", ".create-student-form .form-input", "form-input--enhanced", "Create student form input"),
+            ("tables", ".ai-analysis__table th", "table-header--enhanced table-header--base", "AI analysis table header"),
+            ("tables", ".students-table th", "table-header--enhanced table-header--sm", "Students table header"),
+            ("buttons", ".search-bar__clear", "btn-utility--clear", "Search bar clear button"),
+            ("buttons", ".password-toggle", "btn-utility--toggle", "Password toggle button"),
+            ("modals", ".modal-overlay", "modal-overlay--enhanced", "Modal overlay"),
+            ("modals", ".modal-close", "modal-close--enhanced", "Modal close button"),
+            ("cards", ".quick-action-card", "action-card--base card--left-accent", "Quick action card"),
+            ("cards", ".meeting-type-card", "action-card--base action-card--column card--left-accent", "Meeting type card"),
+            ("empty_states", ".students-management__loading", "empty-state--base", "Students management loading"),
+            ("empty_states", ".students-management__error", "empty-state--base empty-state--error", "Students management error"),
+            ("empty_states", ".students-management__empty", "empty-state--base empty-state--dashed", "Students management empty"),
+            ("empty_states", ".students-management__no-selection", "empty-state--base", "Students management no selection"),
+            ("empty_states", ".meeting-records__empty", "empty-state--base empty-state--dashed", "Meeting records empty"),
+            ("empty_states", ".integration-error", "empty-state--base empty-state--error", "Integration error"),
+        ]
+        
+        # Blocks the components now provide: (selector, file glob relative to styles/, description)
+        self.component_duplicate_blocks = [
+            (".ai-analysis__header", "pages/ai_analysis/*.css", "AI analysis header"),
+            (".meeting-records__header", "pages/meetings/*.css", "meeting records header"),
+            (".selected-student-avatar", "pages/meetings/*.css", "selected student avatar"),
+            (".quick-action-card::before", "pages/dashboard.css", "quick action card before"),
+            (".meeting-card::before", "pages/meetings/*.css", "meeting card before"),
+        ]
+        
+        # Unreferenced custom properties / keyframes are only reported unless this is set
+        self.prune_unreferenced = False
+        
+        # Source folders (JSX/JS/HTML) that may reference variables or animations by name
+        self.reference_source_dirs: List[Path] = []
+        self.reference_summary = None
+        
+        # Plan (dry-run) mode: phases read and write an in-memory overlay, nothing touches disk
+        self.plan_mode = False
+        self._overlay: Dict[str, str] = {}
+        self._originals: Dict[str, Optional[str]] = {}
+        self._input_digests: Dict[str, Optional[str]] = {}  # SHA-256 of every input read (None: absent)
+        self._current_phase = "setup"
+        self.phase_deltas: Dict[str, Dict[str, int]] = {}
+        
+        # Files bigger than stream_threshold are rewritten chunk by chunk (not in plan mode)
+        self.stream_threshold = 32 * 1024 * 1024
+        self.memory_budget = DEFAULT_BUDGET
+        
+        # Per-file phase work runs in this many worker processes (1 = in this process)
+        self.workers = 1
+
+    def _read(self, path: Path) -> str:
+        """Read a file, seeing pending plan-mode writes"""
+        key = str(path)
+        if key in self._overlay:
+            return self._overlay[key]
+        if not self.plan_mode:
+            with open(path, 'r') as f:
+                return f.read()
+        # Decode the same bytes that are hashed, so apply_plan can check the file is unchanged
+        with open(path, 'rb') as f:
+            raw = f.read()
+        content = io.TextIOWrapper(io.BytesIO(raw)).read()
+        if key not in self._originals:
+            self._originals[key] = content
+            self._input_digests[key] = hashlib.sha256(raw).hexdigest()
+        return content
+
+    def _write(self, path: Path, content: str):
+        """Write a file (or stage it in plan mode) and record the byte delta for the current phase"""
+        key = str(path)
+        old = self._read(path) if self._exists(path) else None
+        if self.plan_mode:
+            self._originals.setdefault(key, old)
+            self._overlay[key] = content
+        else:
+            # Write beside the file and swap it in, so an interrupted run never leaves half a file
+            tmp_path = path.with_name(path.name + ".tmp")
+            with open(tmp_path, 'w') as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+        delta = len(content.encode("utf-8")) - len((old or "").encode("utf-8"))
+        phase = self.phase_deltas.setdefault(self._current_phase, {})
+        phase[key] = phase.get(key, 0) + delta
+
+    def _exists(self, path: Path) -> bool:
+        if str(path) in self._overlay:
+            return True
+        exists = path.exists()
+        if self.plan_mode and not exists:
+            self._input_digests.setdefault(str(path), None)  # the plan relies on its absence too
+        return exists
+
+    def _read_external(self) -> List[str]:
+        """Texts of the reference source files, recording their digests in plan mode"""
+        texts = []
+        for path in external_source_paths(self.reference_source_dirs):
+            data = path.read_bytes()
+            if self.plan_mode:
+                self._input_digests.setdefault(str(path), hashlib.sha256(data).hexdigest())
+            texts.append(data.decode("utf-8", errors="ignore"))
+        return texts
+
+    def _streamed(self, path: Path) -> bool:
+        """Whether a file is too big to read whole (plan mode keeps every file in memory anyway)"""
+        return not self.plan_mode and str(path) not in self._overlay and path.exists() \
+            and path.stat().st_size > self.stream_threshold
+
+    def _bundle_pieces(self, files: List[Path]):
+        """Text of files joined by newlines, big files in memory_budget chunks"""
+        for i, f in enumerate(files):
+            if i:
+                yield "\n"
+            if self._streamed(f):
+                yield from iter_file_chunks(f, self.memory_budget)
+            else:
+                yield self._read(f)
+
+    def _css_files(self, folder: Path) -> List[Path]:
+        """CSS files under folder, including files only created in plan mode"""
+        files = list(folder.rglob("*.css"))
+        known = {str(f) for f in files}
+        files.extend(Path(k) for k in self._overlay if k not in known and Path(k).is_relative_to(folder))
+        return files
 
     def create_backup(self):
         """Create backup of CSS files before cleanup"""
+        import shutil
+        
         if self.backup_dir.exists():
             shutil.rmtree(self.backup_dir)
         
         print(f"Creating backup in {self.backup_dir}")
         shutil.copytree(self.styles_dir, self.backup_dir)
         
-        # Create backup manifest
-        manifest = {
-            "backup_date": datetime.now().isoformat(),
-            "original_structure": str(self.styles_dir),
-            "backup_location": str(self.backup_dir)
-        }
-        
-        with open(self.backup_dir / "backup_manifest.json", "w") as f:
-            json.dump(manifest, f, indent=2)
+        # Create backup manifest with per-file digests for restore_backup
+        manifest = write_manifest(self.backup_dir, self.styles_dir)
         
-        print("✅ Backup created successfully")
+        print(f"✅ Backup created successfully ({len(manifest['files'])} files)")
+
+    def restore_backup(self, remove_extra: bool = False) -> bool:
+        """Roll styles/ back to the backup, rewriting only files whose digest differs"""
+        if not self.backup_dir.exists():
+            print(f"❌ No backup found in {self.backup_dir}")
+            return False
+        
+        result = restore(self.backup_dir, self.styles_dir, remove_extra=remove_extra)
+        print(f"🔄 Restored {len(result.restored)} files from {self.backup_dir} ({result.unchanged} already matched)")
+        for rel in result.restored:
+            print(f"  📄 {rel}")
+        for rel in result.extra:
+            if rel in result.removed:
+                print(f"  🗑️  Removed {rel} (not in backup)")
+            else:
+                print(f"  ➕ {rel} is not in the backup (kept)")
+        for rel in result.failed:
+            print(f"  ❌ {rel}: digest mismatch, not restored")
+        return result.ok
 
     def get_file_priority(self, file_path: Path) -> int:
         """Determine priority level of a CSS file based on its path"""
@@ -98,9 +288,8 @@ class CSSCleanupTool:
         variables_file = self.styles_dir / "base" / "variables.css"
         
         # Read existing variables file
-        if variables_file.exists():
-            with open(variables_file, 'r') as f:
-                content = f.read()
+        if self._exists(variables_file):
+            content = self._read(variables_file)
         else:
             content = "/* Auto-generated CSS variables from cleanup */\n:root {\n"
         
@@ -118,8 +307,7 @@ class CSSCleanupTool:
             else:
                 content += ":root {\n  /* Extracted from duplicates */\n" + "\n".join(new_variables) + "\n}\n"
             
-            with open(variables_file, 'w') as f:
-                f.write(content)
+            self._write(variables_file, content)
             
             print(f"✅ Added {len(new_variables)} variables to {variables_file}")
         
@@ -131,11 +319,10 @@ class CSSCleanupTool:
         
         variables_file = self.styles_dir / "base" / "variables.css"
         
-        if not variables_file.exists():
+        if not self._exists(variables_file):
             return
         
-        with open(variables_file, 'r') as f:
-            content = f.read()
+        content = self._read(variables_file)
         
         consolidated = 0
         for color_value, var_name in self.colors_to_consolidate.items():
@@ -146,18 +333,106 @@ class CSSCleanupTool:
                 consolidated += 1
         
         if consolidated > 0:
-            with open(variables_file, 'w') as f:
-                f.write(content)
+            self._write(variables_file, content)
             print(f"✅ Consolidated {consolidated} color definitions")
 
-    def remove_exact_duplicates(self, file_path: Path, classes_to_remove: Set[str]) -> int:
-        """Remove exact duplicate classes from a CSS file"""
-        with open(file_path, 'r') as f:
-            content = f.read()
+    def _transform_file(self, file_path: Path, transform, collapse_blank_lines: bool = False) -> int:
+        """Apply a text transform returning (content, count) to a file, streaming big files"""
+        if self._streamed(file_path):
+            return self._transform_file_streaming(file_path, transform, collapse_blank_lines)
         
-        original_content = content
-        removed_count = 0
+        original_content = self._read(file_path)
+        content, count = transform(original_content)
+        if collapse_blank_lines:
+            content = BLANK_RUN_RE.sub('\n\n', content)
+        
+        if content != original_content:
+            self._write(file_path, content)
         
+        return count
+
+    def _transform_file_streaming(self, file_path: Path, transform, collapse_blank_lines: bool) -> int:
+        """Same result as _transform_file, holding about memory_budget characters at a time.
+        Chunks end after a '}', which no match of the cleanup patterns can straddle."""
+        tmp_path = file_path.with_name(file_path.name + ".tmp")
+        count = 0
+        changed = False
+        carry = ""  # trailing whitespace held back so blank-line runs are collapsed whole
+        old_size = file_path.stat().st_size
+        with open_text(file_path) as src, open(tmp_path, 'w') as dst:
+            for chunk in iter_chunks(src, self.memory_budget):
+                content, n = transform(chunk)
+                count += n
+                changed = changed or content != chunk
+                if collapse_blank_lines:
+                    content = carry + content
+                    kept = content.rstrip()
+                    carry = content[len(kept):]
+                    content, runs = BLANK_RUN_RE.subn('\n\n', kept)
+                    changed = changed or runs > 0
+                dst.write(content)
+            if carry:
+                content, runs = BLANK_RUN_RE.subn('\n\n', carry)
+                changed = changed or runs > 0
+                dst.write(content)
+        
+        if not changed:
+            tmp_path.unlink()
+            return count
+        os.replace(tmp_path, file_path)
+        phase = self.phase_deltas.setdefault(self._current_phase, {})
+        key = str(file_path)
+        phase[key] = phase.get(key, 0) + file_path.stat().st_size - old_size
+        return count
+
+    def _map_files(self, files: List[Path], steps: List[Tuple[str, tuple]]) -> List[List[int]]:
+        """Run steps (method name, extra args) on each file; returns each step's count per file.
+        With workers > 1 every file is read, transformed and written in a worker process.
+        Results and byte deltas are merged in file order whatever order workers finish in,
+        so output and reports match a serial run. Steps must only touch their own file;
+        shared files (variables.css) are edited by the phases themselves, in this process."""
+        files = list(dict.fromkeys(files))
+        if self.workers <= 1 or len(files) < 2:
+            return [[getattr(self, name)(f, *args) for name, args in steps] for f in files]
+        
+        from concurrent.futures import ProcessPoolExecutor
+        
+        settings = {name: getattr(self, name) for name in WORKER_SETTINGS}
+        jobs = [(self._current_phase, f, steps, self._overlay.get(str(f))) for f in files]
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                 initargs=(str(self.project_root), settings)) as pool:
+            results = list(pool.map(_run_worker_job, jobs, chunksize=max(1, len(jobs) // (self.workers * 4))))
+        
+        counts = []
+        for f, (file_counts, staged, original, digest, delta) in zip(files, results):
+            key = str(f)
+            if staged is not None:
+                if key not in self._originals:
+                    self._originals[key] = original
+                    if digest is not None:
+                        self._input_digests[key] = digest
+                self._overlay[key] = staged
+            if delta is not None:
+                phase = self.phase_deltas.setdefault(self._current_phase, {})
+                phase[key] = phase.get(key, 0) + delta
+            counts.append(file_counts)
+        return counts
+
+    def _run_file_job(self, phase: str, path: Path, steps: List[Tuple[str, tuple]], content: Optional[str]):
+        """One file's steps in a worker: (counts, staged plan-mode content, original, its digest, byte delta or None)"""
+        key = str(path)
+        self._current_phase = phase
+        self.phase_deltas = {}
+        self._overlay = {key: content} if content is not None else {}
+        self._originals = {}
+        self._input_digests = {}
+        counts = [getattr(self, name)(path, *args) for name, args in steps]
+        staged = self._overlay.get(key) if self.plan_mode and self._overlay.get(key) != content else None
+        return (counts, staged, self._originals.get(key), self._input_digests.get(key),
+                self.phase_deltas.get(phase, {}).get(key))
+
+    def _remove_rules(self, content: str, classes_to_remove: Set[str]) -> Tuple[str, int]:
+        removed_count = 0
         for class_name in classes_to_remove:
             # Pattern to match the full CSS rule
             pattern = rf'{re.escape(class_name)}\s*\{{[^}}]*\}}'
@@ -167,34 +442,26 @@ class CSSCleanupTool:
                 # Remove all occurrences
                 content = re.sub(pattern, '', content, flags=re.DOTALL)
                 removed_count += len(matches)
-        
-        # Clean up extra whitespace
-        content = re.sub(r'\n\s*\n\s*\n', '\n\n', content)
-        
-        if content != original_content:
-            with open(file_path, 'w') as f:
-                f.write(content)
-        
-        return removed_count
+        return content, removed_count
 
-    def replace_long_values_with_variables(self, file_path: Path) -> int:
-        """Replace duplicate long values with CSS variables"""
-        with open(file_path, 'r') as f:
-            content = f.read()
-        
+    def _replace_long_values(self, content: str) -> Tuple[str, int]:
         original_content = content
         replacements = 0
-        
         for long_value, var_name in self.variables_to_extract.items():
             if long_value in content:
                 content = content.replace(long_value, f"var({var_name})")
                 replacements += content.count(f"var({var_name})") - original_content.count(f"var({var_name})")
-        
-        if content != original_content:
-            with open(file_path, 'w') as f:
-                f.write(content)
-        
-        return replacements
+        return content, replacements
+
+    def remove_exact_duplicates(self, file_path: Path, classes_to_remove: Set[str]) -> int:
+        """Remove exact duplicate classes from a CSS file"""
+        # Extra whitespace left by removed rules is cleaned up as well
+        return self._transform_file(file_path, lambda content: self._remove_rules(content, classes_to_remove),
+                                    collapse_blank_lines=True)
+
+    def replace_long_values_with_variables(self, file_path: Path) -> int:
+        """Replace duplicate long values with CSS variables"""
+        return self._transform_file(file_path, self._replace_long_values)
 
     def cleanup_pages_folder(self):
         """Phase 1: Complete cleanup of pages folder duplicates"""
@@ -208,10 +475,10 @@ class CSSCleanupTool:
         total_removed = 0
         total_files = 0
         
-        for css_file in pages_dir.rglob("*.css"):
-            removed = self.remove_exact_duplicates(css_file, set(self.safe_removal_classes))
-            replaced = self.replace_long_values_with_variables(css_file)
-            
+        css_files = sorted(self._css_files(pages_dir))
+        steps = [("remove_exact_duplicates", (set(self.safe_removal_classes),)),
+                 ("replace_long_values_with_variables", ())]
+        for css_file, (removed, replaced) in zip(css_files, self._map_files(css_files, steps)):
             if removed > 0 or replaced > 0:
                 print(f"  📄 {css_file.name}: Removed {removed} duplicates, {replaced} variable replacements")
                 total_removed += removed
@@ -230,9 +497,9 @@ class CSSCleanupTool:
         
         total_files = 0
         
-        for css_file in features_dir.rglob("*.css"):
-            replaced = self.replace_long_values_with_variables(css_file)
-            
+        css_files = sorted(self._css_files(features_dir))
+        steps = [("replace_long_values_with_variables", ())]
+        for css_file, (replaced,) in zip(css_files, self._map_files(css_files, steps)):
             if replaced > 0:
                 print(f"  📄 {css_file.name}: {replaced} variable replacements")
                 total_files += 1
@@ -246,13 +513,10 @@ class CSSCleanupTool:
         total_files = 0
         total_replacements = 0
         
-        for css_file in self.styles_dir.rglob("*.css"):
-            # Skip variables file to avoid circular replacement
-            if css_file.name == "variables.css":
-                continue
-                
-            replaced = self.replace_long_values_with_variables(css_file)
-            
+        # Skip variables file to avoid circular replacement
+        css_files = sorted(f for f in self._css_files(self.styles_dir) if f.name != "variables.css")
+        steps = [("replace_long_values_with_variables", ())]
+        for css_file, (replaced,) in zip(css_files, self._map_files(css_files, steps)):
             if replaced > 0:
                 print(f"  📄 {css_file.relative_to(self.styles_dir)}: {replaced} replacements")
                 total_files += 1
@@ -260,6 +524,180 @@ class CSSCleanupTool:
         
         print(f"✅ Phase 3 complete: {total_replacements} replacements in {total_files} files")
 
+    def _selector_pattern(self, selector: str) -> str:
+        """Regex for a selector that stops at a class/tag boundary (.modal-close, not .modal-close--x)"""
+        return r'\s+'.join(re.escape(part) for part in selector.split()) + r'(?![\w-])'
+
+    def _consolidate_text(self, content: str, rel: str, counts: Dict[Tuple[str, str], int]) -> Tuple[str, int]:
+        """Every phase 2 edit to one file in a single pass per kind: duplicate blocks out,
+        old selectors renamed, repeated @imports dropped"""
+        import fnmatch
+        
+        total = 0
+        blocks = [(sel, desc) for sel, glob, desc in self.component_duplicate_blocks if fnmatch.fnmatch(rel, glob)]
+        if blocks:
+            # A block only counts when its selector starts the rule, not when it ends a selector list
+            pattern = re.compile(
+                r'(?:(?<=[{};])|(?<=\*/)|\A)\s*(' + '|'.join(self._selector_pattern(sel) for sel, _ in blocks)
+                + r')\s*\{[^{}]*\}'
+            )
+            names = {re.sub(r'\s+', ' ', sel): desc for sel, desc in blocks}
+            
+            def drop(match):
+                key = ("remove_duplicate", names[re.sub(r'\s+', ' ', match.group(1))])
+                counts[key] = counts.get(key, 0) + 1
+                return ""
+            
+            content, removed = pattern.subn(drop, content)
+            total += removed
+        
+        if self._replacement_re.search(content):
+            renamed = 0
+            
+            def rename(match):
+                nonlocal renamed
+                if match.group("old") is None:
+                    return match.group(0)  # a comment or string inside the selector
+                old = re.sub(r'\s+', ' ', match.group("old"))
+                key = ("pattern_replace", old)
+                counts[key] = counts.get(key, 0) + 1
+                renamed += 1
+                return self._replacements[old]
+            
+            # Only selectors are renamed; comments, declaration values and at-rule preludes keep the names
+            edits = []
+            for rule in iter_rules(parse_stylesheet(content).nodes):
+                start = rule.span[0]
+                end = content.index("{", start)
+                prelude = self._rename_re.sub(rename, content[start:end])
+                if prelude != content[start:end]:
+                    edits.append((start, end, prelude))
+            content = apply_edits(content, edits)
+            total += renamed
+        
+        if Path(rel).name == "index.css":
+            seen = set()
+            lines = []
+            for line in content.split("\n"):
+                key = line.strip()
+                if key.startswith("@import"):
+                    if key in seen:
+                        counts[("remove_import", key)] = counts.get(("remove_import", key), 0) + 1
+                        total += 1
+                        continue
+                    seen.add(key)
+                lines.append(line)
+            content = "\n".join(lines)
+        return content, total
+
+    def consolidate_components(self) -> Dict:
+        """Phase 2 consolidation in one scan per file, writing only files that change.
+        Returns the phase2_consolidation_report.json contents."""
+        print("\n🧩 Phase 2: Consolidating page patterns into components...")
+        
+        self._current_phase = "phase2_consolidation"
+        # Longest first so a selector is never shadowed by its own prefix
+        self._replacements = {
+            old: "".join(f".{cls}" for cls in classes.split())
+            for _, old, classes, _ in self.component_replacements
+        }
+        self._replacement_re = re.compile("|".join(
+            self._selector_pattern(old) for old in sorted(self._replacements, key=len, reverse=True)
+        ))
+        self._rename_re = re.compile(
+            r'/\*.*?\*/|"(?:[^"\\]|\\.)*"|\'(?:[^\'\\]|\\.)*\'|(?P<old>' + self._replacement_re.pattern + ')',
+            re.DOTALL,
+        )
+        descriptions = {old: desc for _, old, _, desc in self.component_replacements}
+        
+        actions = []
+        consolidations: Dict[str, Dict] = {}
+        files_modified = []
+        for css_file in sorted(self._css_files(self.styles_dir)):
+            rel = css_file.relative_to(self.styles_dir).as_posix()
+            counts: Dict[Tuple[str, str], int] = {}
+            self._transform_file(css_file, lambda content: self._consolidate_text(content, rel, counts),
+                                 collapse_blank_lines=True)
+            if str(css_file) in self.phase_deltas.get(self._current_phase, {}):
+                files_modified.append(rel)
+            for (action, key), count in sorted(counts.items()):
+                description = descriptions.get(key, key) if action == "pattern_replace" else key
+                actions.append({"action": action, "file": rel, "description": description, "count": count})
+                print(f"  📄 {rel}: {description} ({count})")
+                if action == "pattern_replace":
+                    entry = consolidations.setdefault(key, {
+                        "selector": key,
+                        "replacement": self._replacements[key],
+                        "description": description,
+                        "files": [],
+                        "count": 0,
+                    })
+                    entry["files"].append(rel)
+                    entry["count"] += count
+        
+        components = self.styles_dir / "components"
+        major: Dict[str, List[str]] = {}
+        for group, old, _, _ in self.component_replacements:
+            if old in consolidations:
+                major.setdefault(group, []).append(old.lstrip("."))
+        report = {
+            "phase": "2",
+            "timestamp": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "actions": actions,
+            "patterns_created": sum(1 for rel in self.phase2_components if self._exists(components / rel)),
+            "new_components": self.phase2_components,
+            "files_modified": files_modified,
+            "consolidations": list(consolidations.values()),
+            "consolidations_made": sum(c["count"] for c in consolidations.values()),
+            "major_replacements": major,
+        }
+        print(f"✅ Consolidation complete: {report['consolidations_made']} replacements, "
+              f"{len(files_modified)} files modified")
+        return report
+
+    def prune_unreferenced_definitions(self) -> Dict:
+        """Phase 5: Report (and optionally prune) unreferenced variables and keyframes"""
+        print("\n🕸️  Phase 5: Reference graph for variables and keyframes...")
+        
+        entry = self.styles_dir / "main.css"
+        
+        def load(f: Path) -> Stylesheet:
+            if self._streamed(f):
+                return parse_stylesheet(read_prelude(f, self.memory_budget), f)  # just its @imports
+            return parse_stylesheet(self._read(f), f)
+        
+        if self._exists(entry):
+            css_files = bundle_order(entry, loader=load)
+        else:
+            css_files = sorted(self._css_files(self.styles_dir))
+        # Big files are not parsed: every name they mention counts as a reference, like JSX does,
+        # and their own definitions are left alone
+        streamed = [f for f in css_files if self._streamed(f)]
+        css_files = [f for f in css_files if f not in streamed]
+        external = self._read_external()
+        external.extend(" ".join(sorted(scan_names(f, self.memory_budget))) for f in streamed)
+        graph = ReferenceGraph.build((load(f) for f in css_files), external)
+        summary = graph.report()
+        
+        if streamed:
+            print(f"  📦 {len(streamed)} files over {self.stream_threshold:,} bytes scanned for references only")
+        print(f"  🔍 {len(summary['unused_variables'])} unused variables ({summary['unused_variable_bytes']} bytes)")
+        print(f"  🔍 {len(summary['unused_keyframes'])} unused keyframes ({summary['unused_keyframe_bytes']} bytes)")
+        print(f"  🔍 {len(summary['shadowed_keyframes'])} shadowed keyframes ({summary['shadowed_keyframe_bytes']} bytes)")
+        print(f"  🔍 {len(summary['duplicate_keyframes'])} duplicate keyframe bodies ({summary['duplicate_keyframe_bytes']} bytes)")
+        
+        if self.prune_unreferenced:
+            sources = {str(f): self._read(f) for f in css_files}
+            pruned = graph.prune(sources)
+            for path, content in pruned.items():
+                self._write(Path(path), content)
+            print(f"✅ Phase 5 complete: pruned definitions in {len(pruned)} files")
+        else:
+            print("✅ Phase 5 complete: report only (set prune_unreferenced to remove)")
+        
+        self.reference_summary = summary
+        return summary
+
     def generate_report(self) -> Dict:
         """Generate cleanup report"""
         report = {
@@ -270,13 +708,17 @@ class CSSCleanupTool:
                 "Phase 1: Pages folder cleanup",
                 "Phase 2: Features folder optimization", 
                 "Phase 3: Global variable replacement",
-                "Phase 4: Color consolidation"
+                "Phase 4: Color consolidation",
+                "Phase 5: Reference graph pruning"
             ],
             "variables_extracted": len(self.variables_to_extract),
             "colors_consolidated": len(self.colors_to_consolidate),
             "safe_removal_classes": len(self.safe_removal_classes)
         }
         
+        if self.reference_summary is not None:
+            report["reference_graph"] = self.reference_summary
+        
         # Calculate file statistics
         css_files = list(self.styles_dir.rglob("*.css"))
         report["total_css_files"] = len(css_files)
@@ -294,9 +736,153 @@ class CSSCleanupTool:
                 "reduction_bytes": reduction,
                 "reduction_percent": round(reduction_percent, 2)
             }
+            
+            # What is actually transferred: the bundle compressed with gzip (and brotli if installed)
+            backup_files = sorted(self.backup_dir.rglob("*.css"))
+            original = stream_sizes(self._bundle_pieces(backup_files))
+            current = stream_sizes(self._bundle_pieces(sorted(css_files)))
+            report["size_reduction"]["compressed"] = {
+                codec: {"original_bytes": original[codec], "current_bytes": current[codec],
+                        "reduction_bytes": original[codec] - current[codec]}
+                for codec in original if codec != "raw"
+            }
+            
+            # Which rules were added, removed, moved or changed relative to the backup
+            # (a rule-level diff parses both trees whole, so it is skipped when either has a big file)
+            streamed = sum(1 for f in backup_files + css_files if self._streamed(f))
+            if streamed:
+                report["rule_changes"] = {"skipped": f"{streamed} files over {self.stream_threshold:,} bytes"}
+            else:
+                from cssscan.snapdiff import SnapshotDiffer
+                report["rule_changes"] = SnapshotDiffer().diff(self.backup_dir, self.styles_dir).counts()
         
         return report
 
+    def run_phases(self):
+        """Run every cleanup phase, attributing file changes to the phase that made them"""
+        phases = [
+            # Phase 1: Pages folder cleanup
+            ("phase1_pages", [self.cleanup_pages_folder]),
+            # Phase 2: Features folder optimization
+            ("phase2_features", [self.cleanup_features_folder]),
+            # Phase 3: Extract and replace variables
+            ("phase3_variables", [self.extract_css_variables, self.cleanup_all_files]),
+            # Phase 4: Color consolidation
+            ("phase4_colors", [self.consolidate_colors]),
+            # Phase 5: Unreferenced variables and keyframes
+            ("phase5_references", [self.prune_unreferenced_definitions]),
+        ]
+        for name, steps in phases:
+            self._current_phase = name
+            for step in steps:
+                step()
+        self._current_phase = "done"
+
+    def plan_cleanup(self, sources: Optional[Dict[str, str]] = None) -> Tuple[Dict, str]:
+        """Run all phases in memory without writing anything.
+        sources (path -> text) preloads files that were already read elsewhere.
+        Returns (plan, unified diff); the plan can be applied later with apply_plan."""
+        import difflib
+        
+        print("🧪 Planning CSS Duplicate Cleanup (dry run, nothing is written)")
+        print("=" * 50)
+        
+        self.plan_mode = True
+        self._overlay.clear()
+        self._originals.clear()
+        self._input_digests.clear()
+        if sources:
+            self._overlay.update(sources)
+            self._originals.update(sources)
+            for key in sources:
+                if Path(key).exists():
+                    self._input_digests[key] = file_digest(Path(key))
+        self.phase_deltas = {}
+        self.run_phases()
+        # Any stylesheet may decide what the phases do (reachability, variables), so the plan
+        # depends on all of them, including ones worker processes read or no phase needed
+        for path in self.styles_dir.rglob("*.css"):
+            if str(path) not in self._input_digests:
+                self._input_digests[str(path)] = file_digest(path)
+        
+        files = {}
+        diff_parts = []
+        for key in sorted(self._overlay):
+            original = self._originals.get(key)
+            content = self._overlay[key]
+            if content == original:
+                continue
+            rel = os.path.relpath(key, self.project_root)
+            diff_parts.extend(difflib.unified_diff(
+                (original or "").splitlines(keepends=True),
+                content.splitlines(keepends=True),
+                fromfile=f"a/{rel}" if original is not None else "/dev/null",
+                tofile=f"b/{rel}",
+            ))
+            files[rel] = {
+                "input_sha256": self._input_digests.get(key) if original is not None else None,
+                "output_sha256": hashlib.sha256(content.encode("utf-8")).hexdigest(),
+                "byte_delta": len(content.encode("utf-8")) - len((original or "").encode("utf-8")),
+                "content": content,
+            }
+        
+        plan = {
+            "plan_date": datetime.now().isoformat(),
+            "project_root": str(self.project_root),
+            "files": files,
+            "phase_byte_deltas": {
+                phase: {os.path.relpath(k, self.project_root): v for k, v in deltas.items() if v}
+                for phase, deltas in self.phase_deltas.items()
+            },
+            "total_byte_delta": sum(f["byte_delta"] for f in files.values()),
+            # every file the phases read (or found missing), whether or not it changes
+            "inputs": {os.path.relpath(k, self.project_root): v for k, v in sorted(self._input_digests.items())},
+        }
+        
+        self.plan_mode = False
+        self._overlay.clear()
+        self._originals.clear()
+        self._input_digests.clear()
+        
+        print("\n" + "=" * 50)
+        print(f"🧪 Plan: {len(files)} files would change, {plan['total_byte_delta']:+,} bytes")
+        return plan, "".join(diff_parts)
+
+    def apply_plan(self, plan: Dict) -> bool:
+        """Apply a plan from plan_cleanup if every file it read is unchanged since it was made
+        and no stylesheet has been added"""
+        inputs = dict(plan.get("inputs", {}))
+        for rel, entry in plan["files"].items():
+            inputs.setdefault(rel, entry["input_sha256"])
+        stale = []
+        for rel, digest in sorted(inputs.items()):
+            path = self.project_root / rel
+            current = file_digest(path) if path.exists() else None
+            if current != digest:
+                stale.append(rel)
+        if "inputs" in plan:
+            for path in sorted(self._css_files(self.styles_dir)):
+                rel = os.path.relpath(path, self.project_root)
+                if rel not in inputs:
+                    stale.append(rel)
+        
+        if stale:
+            print(f"❌ Plan is stale, {len(stale)} files changed since it was made:")
+            for rel in stale:
+                print(f"  📄 {rel}")
+            return False
+        
+        for rel, entry in plan["files"].items():
+            path = self.project_root / rel
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # Write beside the file and swap it in, as _write does
+            tmp_path = path.with_name(path.name + ".tmp")
+            with open(tmp_path, 'w') as f:
+                f.write(entry["content"])
+            os.replace(tmp_path, path)
+        print(f"✅ Applied plan to {len(plan['files'])} files ({plan['total_byte_delta']:+,} bytes)")
+        return True
+
     def run_cleanup(self):
         """Execute complete CSS cleanup process"""
         print("🚀 Starting CSS Duplicate Cleanup")
@@ -305,18 +891,8 @@ class CSSCleanupTool:
         # Create backup
         self.create_backup()
         
-        # Phase 1: Pages folder cleanup
-        self.cleanup_pages_folder()
-        
-        # Phase 2: Features folder optimization  
-        self.cleanup_features_folder()
-        
-        # Phase 3: Extract and replace variables
-        self.extract_css_variables()
-        self.cleanup_all_files()
-        
-        # Phase 4: Color consolidation
-        self.consolidate_colors()
+        # Phases 1-5
+        self.run_phases()
         
         # Generate report
         report = self.generate_report()
@@ -350,12 +926,29 @@ def main():
     """Main execution function"""
     import sys
     
-    if len(sys.argv) != 2:
-        print("Usage: python css_cleanup.py <project_root_path>")
+    args = sys.argv[1:]
+    workers = 1
+    if "--workers" in args:
+        i = args.index("--workers")
+        value = args[i + 1] if i + 1 < len(args) else ""
+        workers = (os.cpu_count() or 1) if value == "0" else int(value) if value.isdigit() else -1
+        args = args[:i] + args[i + 2:]
+    mode = "run"
+    if len(args) == 2 and args[0] in ("--plan", "--apply-plan", "--restore", "--consolidate"):
+        mode = args[0][2:]
+        args = args[1:]
+    
+    if len(args) != 1 or workers < 1:
+        print("Usage: python css_cleanup.py [--plan | --apply-plan | --restore | --consolidate] [--workers N] <project_root_path>")
         print("Example: python css_cleanup.py /path/to/your/project")
+        print("  --plan        run every phase in memory, write cleanup_plan.json + cleanup_plan.diff only")
+        print("  --apply-plan  apply cleanup_plan.json if its input files are unchanged")
+        print("  --restore     roll styles/ back to css_backup/, rewriting only changed files")
+        print("  --consolidate phase 2: rename page patterns to components, write phase2_consolidation_report.json")
+        print("  --workers N   process files in N worker processes (0 = one per CPU)")
         sys.exit(1)
     
-    project_root = sys.argv[1]
+    project_root = args[0]
     
     if not os.path.exists(project_root):
         print(f"❌ Project root '{project_root}' does not exist")
@@ -363,12 +956,43 @@ def main():
     
     # Initialize and run cleanup
     cleanup_tool = CSSCleanupTool(project_root)
+    cleanup_tool.workers = workers
+    plan_file = Path(project_root) / "cleanup_plan.json"
+    
+    if mode == "plan":
+        plan, diff = cleanup_tool.plan_cleanup()
+        with open(plan_file, "w") as f:
+            json.dump(plan, f, indent=2)
+        with open(plan_file.with_suffix(".diff"), "w") as f:
+            f.write(diff)
+        print(f"📋 Plan saved: {plan_file} (diff: {plan_file.with_suffix('.diff')})")
+        return
+    
+    if mode == "restore":
+        if not cleanup_tool.restore_backup():
+            sys.exit(1)
+        return
+    
+    if mode == "consolidate":
+        report = cleanup_tool.consolidate_components()
+        report_file = Path(project_root) / "phase2_consolidation_report.json"
+        with open(report_file, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"📋 Report saved: {report_file}")
+        return
+    
+    if mode == "apply-plan":
+        with open(plan_file) as f:
+            plan = json.load(f)
+        if not cleanup_tool.apply_plan(plan):
+            sys.exit(1)
+        return
     
     try:
         cleanup_tool.run_cleanup()
     except Exception as e:
         print(f"❌ Error during cleanup: {e}")
-        print("🔄 You can restore from backup if needed")
+        print(f"🔄 Roll back with: python {sys.argv[0]} --restore {project_root}")
         sys.exit(1)
 
 if __name__ == "__main__":
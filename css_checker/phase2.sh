@@ -27,33 +27,9 @@ if [ -d "$BACKUP_DIR" ]; then
     rm -rf "$BACKUP_DIR"
 fi
 cp -r "$CSS_DIR" "$BACKUP_DIR"
+python3 -m cssscan.backup manifest "$BACKUP_DIR" "$CSS_DIR" > /dev/null || echo -e "${YELLOW}⚠️  Could not write backup manifest${NC}"
 echo -e "${GREEN}✅ Backup created in $BACKUP_DIR${NC}"
 
-# Initialize report
-cat > "$REPORT_FILE" << 'EOF'
-{
-  "phase": "2",
-  "timestamp": "",
-  "actions": [],
-  "patterns_created": [],
-  "files_modified": [],
-  "consolidations": []
-}
-EOF
-
-# Update timestamp
-TIMESTAMP=$(date -u +"%Y-%m-%dT%H:%M:%SZ")
-sed -i "s/\"timestamp\": \"\"/\"timestamp\": \"$TIMESTAMP\"/" "$REPORT_FILE"
-
-# Function to log actions
-log_action() {
-    local action="$1"
-    local file="$2"
-    local description="$3"
-    echo "  📄 $file: $description"
-    # Add to report (simplified - in practice you'd use jq)
-}
-
 # Function to create component files
 create_component_file() {
     local filepath="$1"
@@ -486,150 +462,14 @@ EOF
 
 echo -e "${GREEN}✅ Updated components/index.css${NC}"
 
-echo -e "${BLUE}🔄 Step 3: Systematic Pattern Replacements${NC}"
+echo -e "${BLUE}🔄 Steps 3-6: Pattern replacements, duplicate blocks, cleanup and report${NC}"
 
-# Function to replace patterns in files
-replace_patterns() {
-    local search_pattern="$1"
-    local replacement="$2"
-    local file_pattern="$3"
-    local description="$4"
-    
-    echo "  🔄 Replacing $description..."
-    
-    # Find and replace in matching files
-    find "$CSS_DIR" -name "$file_pattern" -type f -exec grep -l "$search_pattern" {} \; | while read -r file; do
-        if [ -f "$file" ]; then
-            sed -i "s/$search_pattern/$replacement/g" "$file"
-            log_action "pattern_replace" "$file" "$description"
-        fi
-    done
-}
-
-# Replace page header patterns
-echo -e "${YELLOW}📄 Replacing Page Header Patterns${NC}"
-replace_patterns "\.ai-analysis__header" "page-header page-header--wrapped" "*.css" "AI analysis header"
-replace_patterns "\.meeting-records__header" "page-header page-header--large-gap" "*.css" "Meeting records header"
-replace_patterns "\.meeting-form__header" "page-header page-header--large-gap" "*.css" "Meeting form header"
-replace_patterns "\.year-summary__header" "page-header page-header--center" "*.css" "Year summary header"
-
-# Replace avatar patterns
-echo -e "${YELLOW}👤 Replacing Avatar Patterns${NC}"
-replace_patterns "\.selected-student-avatar" "avatar avatar--lg avatar--gradient avatar--circular avatar--special" "*.css" "Selected student avatar"
-replace_patterns "\.page-header__icon" "avatar avatar--lg avatar--gradient avatar--square" "*.css" "Page header icon"
-replace_patterns "\.ai-analysis__header-icon" "avatar avatar--lg avatar--gradient avatar--square" "*.css" "AI analysis header icon"
-replace_patterns "\.year-summary__icon" "avatar avatar--lg avatar--gradient avatar--square" "*.css" "Year summary icon"
-replace_patterns "\.header__user-avatar-large" "avatar avatar--md avatar--primary avatar--circular" "*.css" "Header user avatar large"
-replace_patterns "\.sidebar__user-avatar" "avatar avatar--md avatar--primary avatar--rounded" "*.css" "Sidebar user avatar"
-
-# Replace form input patterns
-echo -e "${YELLOW}📝 Replacing Form Input Patterns${NC}"
-replace_patterns "\.ai-analysis__select" "form-select--enhanced" "*.css" "AI analysis select"
-replace_patterns "\.create-school-form \.form-input" "form-input--enhanced" "*.css" "Create school form input"
-replace_patterns "\.create-student-form \.form-input" "form-input--enhanced" "*.css" "Create student form input"
-
-# Replace table header patterns
-echo -e "${YELLOW}📊 Replacing Table Header Patterns${NC}"
-replace_patterns "\.ai-analysis__table th" "table-header--enhanced table-header--base" "*.css" "AI analysis table header"
-replace_patterns "\.students-table th" "table-header--enhanced table-header--sm" "*.css" "Students table header"
-
-# Replace button utility patterns
-echo -e "${YELLOW}🔘 Replacing Button Utility Patterns${NC}"
-replace_patterns "\.search-bar__clear" "btn-utility--clear" "*.css" "Search bar clear button"
-replace_patterns "\.password-toggle" "btn-utility--toggle" "*.css" "Password toggle button"
-
-# Replace modal patterns
-echo -e "${YELLOW}🪟 Replacing Modal Patterns${NC}"
-replace_patterns "\.modal-overlay(?!--)" "modal-overlay--enhanced" "*.css" "Modal overlay"
-replace_patterns "\.modal-close(?!--)" "modal-close--enhanced" "*.css" "Modal close button"
-
-# Replace card patterns
-echo -e "${YELLOW}🃏 Replacing Card Patterns${NC}"
-replace_patterns "\.quick-action-card" "action-card--base card--left-accent" "*.css" "Quick action card"
-replace_patterns "\.meeting-type-card" "action-card--base action-card--column card--left-accent" "*.css" "Meeting type card"
-
-# Replace empty state patterns
-echo -e "${YELLOW}🗂️ Replacing Empty State Patterns${NC}"
-replace_patterns "\.students-management__loading" "empty-state--base" "*.css" "Students management loading"
-replace_patterns "\.students-management__error" "empty-state--base empty-state--error" "*.css" "Students management error"
-replace_patterns "\.students-management__empty" "empty-state--base empty-state--dashed" "*.css" "Students management empty"
-replace_patterns "\.students-management__no-selection" "empty-state--base" "*.css" "Students management no selection"
-replace_patterns "\.meeting-records__empty" "empty-state--base empty-state--dashed" "*.css" "Meeting records empty"
-replace_patterns "\.integration-error" "empty-state--base empty-state--error" "*.css" "Integration error"
-
-echo -e "${BLUE}🧹 Step 4: Remove Duplicate CSS Blocks${NC}"
-
-# Function to remove duplicate CSS blocks
-remove_duplicate_blocks() {
-    local selector="$1"
-    local file_pattern="$2"
-    local description="$3"
-    
-    echo "  🗑️ Removing duplicate $description blocks..."
-    
-    # Find files containing the selector
-    find "$CSS_DIR" -name "$file_pattern" -type f -exec grep -l "$selector" {} \; | while read -r file; do
-        if [ -f "$file" ]; then
-            # Remove the entire CSS block (simplified - in practice use more sophisticated tools)
-            sed -i "/$selector\s*{/,/^}/d" "$file"
-            log_action "remove_duplicate" "$file" "Removed duplicate $description"
-        fi
-    done
-}
-
-# Remove duplicate blocks that are now handled by components
-remove_duplicate_blocks "\.ai-analysis__header\s*{" "pages/ai_analysis/*.css" "AI analysis header"
-remove_duplicate_blocks "\.meeting-records__header\s*{" "pages/meetings/*.css" "meeting records header"
-remove_duplicate_blocks "\.selected-student-avatar\s*{" "pages/meetings/*.css" "selected student avatar"
-remove_duplicate_blocks "\.quick-action-card::before\s*{" "pages/dashboard.css" "quick action card before"
-remove_duplicate_blocks "\.meeting-card::before\s*{" "pages/meetings/*.css" "meeting card before"
-
-echo -e "${BLUE}🧪 Step 5: Clean Up and Optimize${NC}"
-
-# Remove empty CSS files or sections
-echo "  🧹 Cleaning up empty sections..."
-find "$CSS_DIR" -name "*.css" -type f -exec sed -i '/^[[:space:]]*$/d' {} \;
-
-# Remove duplicate import statements
-echo "  📦 Removing duplicate imports..."
-find "$CSS_DIR" -name "index.css" -type f -exec awk '!seen[$0]++' {} \; -exec mv {} {}.tmp \; -exec mv {}.tmp {} \;
-
-echo -e "${BLUE}📊 Step 6: Generate Report${NC}"
-
-# Count remaining patterns (simplified)
-echo "  📈 Analyzing results..."
-
-PATTERNS_CREATED=8
-FILES_MODIFIED=$(find "$CSS_DIR" -name "*.css" -newer "$BACKUP_DIR" | wc -l)
-CONSOLIDATIONS_MADE=25
-
-# Update report
-cat > "$REPORT_FILE" << EOF
-{
-  "phase": "2",
-  "timestamp": "$TIMESTAMP",
-  "patterns_created": $PATTERNS_CREATED,
-  "files_modified": $FILES_MODIFIED,
-  "consolidations_made": $CONSOLIDATIONS_MADE,
-  "new_components": [
-    "page-header/base.css",
-    "avatars/base.css", 
-    "forms/enhanced-inputs.css",
-    "tables/enhanced-headers.css",
-    "cards/decorative.css",
-    "modals/enhanced.css",
-    "buttons/utility.css",
-    "states/empty.css"
-  ],
-  "major_replacements": {
-    "page_headers": ["ai-analysis__header", "meeting-records__header", "meeting-form__header"],
-    "avatars": ["selected-student-avatar", "page-header__icon", "header__user-avatar-large"],
-    "forms": ["ai-analysis__select", "create-school-form .form-input"],
-    "cards": ["quick-action-card", "meeting-type-card"],
-    "empty_states": ["students-management__loading", "meeting-records__empty"]
-  }
-}
-EOF
+# One in-process pass over each file; only files that change are rewritten
+python3 phase1.py --consolidate .
+
+PATTERNS_CREATED=$(python3 -c "import json; print(json.load(open('$REPORT_FILE'))['patterns_created'])")
+FILES_MODIFIED=$(python3 -c "import json; print(len(json.load(open('$REPORT_FILE'))['files_modified']))")
+CONSOLIDATIONS_MADE=$(python3 -c "import json; print(json.load(open('$REPORT_FILE'))['consolidations_made'])")
 
 echo "=================================================="
 echo -e "${GREEN}🎉 Phase 2 CSS Consolidation Complete!${NC}"
@@ -0,0 +1,21 @@
+from cssscan.api import scan
+
+
+def test_duplicate_groups_respect_context_and_skip_keyframes(tmp_path):
+    (tmp_path / "a.css").write_text(
+        ".x { color: red; }\n@media print { .y { color: red; } }\n.z { color: #f00; }\n"
+        "@keyframes a { from { opacity: 0; } }\n@keyframes b { from { opacity: 0; } }\n")
+    groups = scan([tmp_path]).duplicate_groups()
+    assert [[rule.selector for _, rule in group] for group in groups] == [[".x", ".z"]]
+
+
+def test_digest_is_the_file_digest(tmp_path):
+    from cssscan.backup import file_digest
+
+    path = tmp_path / "a.css"
+    path.write_bytes(b".a {\r\n  content: \"\xff\";\r\n}\r\n")
+    model = scan([path])
+    assert model.digest(path) == file_digest(path)
+    model.update(path, ".a { color: red; }\n")
+    path.write_text(".a { color: red; }\n", encoding="utf-8")
+    assert model.digest(path) == file_digest(path)
@@ -0,0 +1,73 @@
+from pathlib import Path
+
+from cssscan.assets import AssetAnalyzer
+from cssscan.parser import Rule, parse_stylesheet
+
+STYLES = Path("styles")
+VARIABLES = STYLES / "base" / "variables.css"
+CARDS = STYLES / "components" / "cards.css"
+
+SVG = "data:image/svg+xml,%3Csvg xmlns='http://www.w3.org/2000/svg'%3E%3C/svg%3E"
+
+
+def _build(variables_text, cards_text, **options):
+    return AssetAnalyzer.build({VARIABLES: variables_text, CARDS: cards_text}, styles_dir=STYLES, **options)
+
+
+def test_repeated_asset_token_goes_in_top_level_root():
+    cards = (f'.card {{ background: url("{SVG}"); }}\n'
+             f'.tile {{ background: url("{SVG}"); }}\n'
+             f'.panel {{ background: url("{SVG}"); }}\n')
+    variables = ":root {\n  --gap: 8px;\n}\n\n@media (max-width: 480px) {\n  :root {\n    --gap: 4px;\n  }\n}\n"
+    analyzer = _build(variables, cards, externalize_bytes=10_000)
+    plans = analyzer.plan()
+    tokens = [p.name for p in plans if p.new_token]
+    assert len(tokens) == 1
+
+    changed, files = analyzer.rewrite(plans, VARIABLES)
+    assert not files
+    root = [n for n in parse_stylesheet(changed[VARIABLES]).nodes if isinstance(n, Rule) and n.selector == ":root"]
+    assert tokens[0] in {d.property for d in root[0].declarations}
+    assert tokens[0] not in changed[VARIABLES][changed[VARIABLES].index("@media"):]
+    assert changed[CARDS].count(f"var({tokens[0]})") == 3
+
+
+def test_large_data_uri_is_externalized_relative_to_its_stylesheet():
+    analyzer = _build(":root {}\n", f'.card {{ background: url("{SVG}"); }}\n', externalize_bytes=20)
+    plans = analyzer.plan()
+    assert [p.action for p in plans] == ["externalize"]
+
+    changed, files = analyzer.rewrite(plans, VARIABLES)
+    assert files == {STYLES / "assets" / "card.svg": b"<svg xmlns='http://www.w3.org/2000/svg'></svg>"}
+    assert 'url("../assets/card.svg")' in changed[CARDS]
+
+
+FONT = "https://example.com/fonts/inter.woff2"
+
+
+def test_font_face_descriptors_are_never_tokenized():
+    fonts = "".join(f'@font-face {{ font-family: "Inter"; font-weight: {w}; src: url("{FONT}") format("woff2"); }}\n'
+                    for w in (400, 500, 700))
+    analyzer = _build(":root {}\n", fonts)
+    plans = analyzer.plan()
+    assert [p.action for p in plans] == ["keep"]
+    changed, _ = analyzer.rewrite(plans, VARIABLES)
+    assert changed == {}
+
+
+def test_scoped_custom_properties_are_not_asset_tokens():
+    cards = (f'.card {{ --bg: url("{FONT}"); background: url("{FONT}"); }}\n'
+             f'.tile {{ background: url("{FONT}"); }}\n')
+    analyzer = _build(":root {}\n", cards)
+    plans = analyzer.plan()
+    assert plans[0].asset.tokens == []
+    changed, _ = analyzer.rewrite(plans, VARIABLES)
+    assert "var(--bg)" not in changed.get(CARDS, "")
+
+
+def test_new_asset_tokens_are_not_used_without_a_variables_file():
+    cards = "".join(f'.c{i} {{ background: url("{SVG}"); }}\n' for i in range(3))
+    analyzer = AssetAnalyzer.build({CARDS: cards}, styles_dir=STYLES, externalize_bytes=10_000)
+    plans = analyzer.plan()
+    assert [p.new_token for p in plans] == [True]
+    assert analyzer.rewrite(plans, VARIABLES) == ({}, {})
@@ -0,0 +1,48 @@
+from pathlib import Path
+
+from cssscan.atrules import AtRuleConsolidator, condition_key
+from cssscan.parser import parse_stylesheet
+
+
+def _run(*texts, scope="file"):
+    sheets = [parse_stylesheet(t, Path(f"{i}.css")) for i, t in enumerate(texts)]
+    stats = AtRuleConsolidator(sheets, scope=scope).run()
+    return stats, [s.text() for s in sheets]
+
+
+def test_condition_key_ignores_spacing_and_case():
+    a = parse_stylesheet("@media (max-width:768px) { .a { color: red; } }").nodes[0]
+    b = parse_stylesheet("@MEDIA ( MAX-WIDTH : 768px ) { .a { color: red; } }").nodes[0]
+    assert condition_key(a) == condition_key(b)
+
+
+def test_same_condition_blocks_fold_into_the_first():
+    stats, [text] = _run("@media (max-width: 768px) { .a { color: red; } }\n"
+                         ".x { margin: 0; }\n"
+                         "@media (max-width:768px) { .c { color: blue; } }\n")
+    assert stats.blocks_merged == 1
+    assert text.count("@media") == 1
+    assert text.index(".c") < text.index(".x")
+
+
+def test_rule_in_between_that_could_be_overridden_blocks_the_fold():
+    for between in (".b { color: blue; }", ".b { background: blue; }", ".b { overflow: auto; }"):
+        body = {"color": "color: red", "background": "background-color: red", "overflow": "overflow-x: hidden"}[
+            between.split("{")[1].split(":")[0].strip()]
+        stats, [text] = _run(f"@media X {{ .a {{ {body}; }} }}\n{between}\n@media X {{ .c {{ {body}; }} }}\n")
+        assert stats.blocks_merged == 0, between
+        assert text.index(".b") < text.index(".c")
+
+
+def test_bundle_scope_folds_across_files():
+    block = "@media print {{ .{0} {{ display: none; }} }}\n"
+    stats, texts = _run(block.format("a"), block.format("b"), scope="bundle")
+    assert stats.blocks_merged == 1
+    assert ".a" in texts[0] and ".b" in texts[0] and texts[1].strip() == ""
+
+
+def test_repeated_declarations_in_a_block_are_deduped():
+    stats, [text] = _run("@media print { .a { color: red; } .b { margin: 0; } .a { color: red; } }\n")
+    assert stats.declarations_deduped == 1
+    assert stats.rules_emptied == 1
+    assert text.count(".a") == 1
@@ -0,0 +1,34 @@
+from cssscan.backup import restore, write_manifest
+
+
+def test_restore_rewrites_only_changed_files(tmp_path):
+    backup, target = tmp_path / "backup", tmp_path / "target"
+    for root in (backup, target):
+        (root / "pages").mkdir(parents=True)
+        (root / "main.css").write_text(".a { color: red; }\n")
+        (root / "pages" / "b.css").write_text(".b { margin: 0; }\n")
+    write_manifest(backup, target)
+    (target / "pages" / "b.css").write_text(".b { margin: 1px; }\n")
+    (target / "new.css").write_text(".c {}\n")
+
+    result = restore(backup, target, remove_extra=True)
+    assert result.ok
+    assert result.restored == ["pages/b.css"]
+    assert result.unchanged == 1
+    assert result.removed == ["new.css"]
+    assert (target / "pages" / "b.css").read_text() == ".b { margin: 0; }\n"
+    assert not (target / "new.css").exists()
+
+
+def test_restore_refuses_a_backup_that_no_longer_matches_its_manifest(tmp_path):
+    backup, target = tmp_path / "backup", tmp_path / "target"
+    backup.mkdir()
+    target.mkdir()
+    (backup / "main.css").write_text(".a { color: red; }\n")
+    write_manifest(backup)
+    (backup / "main.css").write_text(".a { color: blue; }\n")
+
+    result = restore(backup, target)
+    assert not result.ok
+    assert result.failed == ["main.css"]
+    assert not (target / "main.css").exists()
@@ -0,0 +1,88 @@
+from pathlib import Path
+
+import pytest
+
+from cssscan.bem import CONTEXT, SUBJECT, BemName, BemTrie, compound_classes, parse_bem
+from cssscan.parser import parse_stylesheet
+
+STYLES = Path("styles")
+
+
+@pytest.mark.parametrize("name, expected", [
+    ("card", BemName("card")),
+    (".card__header", BemName("card", "header")),
+    ("card--small", BemName("card", None, "small")),
+    ("card__header--active", BemName("card", "header", "active")),
+    ("filter-step-number", BemName("filter-step-number")),
+])
+def test_parse_bem(name, expected):
+    assert parse_bem(name) == expected
+    assert str(expected) == name.lstrip(".")
+
+
+def test_compound_classes_skip_functional_pseudo_class_arguments():
+    assert compound_classes("li.card.card--small:not(.card--hidden)::before") == ["card", "card--small"]
+
+
+def _trie(**files):
+    return BemTrie.build((parse_stylesheet(text, STYLES / (name.replace("__", "/") + ".css"))
+                          for name, text in files.items()), styles_dir=STYLES)
+
+
+def test_rules_are_filed_under_the_subject_and_as_context_to_the_left():
+    trie = _trie(components__card=".card { padding: 0; }\n"
+                                  ".card--small .card__body { padding: 4px; }\n"
+                                  ".card h3 { margin: 0; }\n"
+                                  ".filter-step--disabled .filter-step-number { opacity: .5; }\n"
+                                  "@keyframes card { from { top: 0; } }\n")
+    assert [e.selector for e in trie.lookup("card__body")] == [".card--small .card__body"]
+    assert [(e.selector, e.role) for e in trie.lookup("card--small")] == [(".card--small .card__body", CONTEXT)]
+    assert [e.selector for e in trie.rules("card", roles=(SUBJECT,))] == [
+        ".card", ".card h3", ".card--small .card__body"]
+    assert [e.selector for e in trie.lookup("filter-step", roles=(CONTEXT,))] == [
+        ".filter-step--disabled .filter-step-number"]
+    assert trie.lookup("filter-step-number")[0].role == SUBJECT
+    assert trie.lookup("nope") == [] and trie.lookup("card__nope") == []
+
+
+def test_a_selector_is_listed_once_in_its_block():
+    trie = _trie(components__card=".card .card__title { color: red; }\n")
+    assert [(e.selector, e.role) for e in trie.rules("card")] == [(".card .card__title", SUBJECT)]
+
+
+def test_blocks_and_members():
+    trie = _trie(components__x=".card__header--active, .card--small, .cart, .btn { top: 0; }\n")
+    assert trie.blocks() == ["btn", "card", "cart"]
+    assert trie.blocks("car") == ["card", "cart"]
+    assert trie.members("card") == ["card--small", "card__header", "card__header--active"]
+
+
+def test_subtree_cache_is_refreshed_when_a_sheet_is_added():
+    trie = _trie(components__card=".card { top: 0; }\n")
+    assert len(trie.rules("card")) == 1
+    trie.add(parse_stylesheet(".card__body { top: 0; }\n", STYLES / "pages" / "home.css"))
+    assert len(trie.rules("card")) == 2
+
+
+def test_recommend_prefers_the_highest_priority_file():
+    trie = _trie(components__card=".card { top: 0; }\n", pages__home=".card__body { margin: 0; padding: 0; }\n")
+    row = trie.block_report("card")
+    assert (row["canonical_file"], row["files"]) == ("components/card.css", ["components/card.css", "pages/home.css"])
+
+
+def test_recommend_a_component_for_a_block_shared_by_several_pages():
+    trie = _trie(pages__home=".tile { top: 0; }\n", pages__reports__list=".tile__body { top: 0; }\n")
+    assert trie.block_report("tile")["canonical_file"] == "components/tile.css"
+    trie = _trie(pages__home=".tile { top: 0; }\n.tile__body { top: 0; }\n")
+    assert trie.block_report("tile")["canonical_file"] == "pages/home.css"
+
+
+def test_block_report_counts_copies_and_repeated_bodies():
+    trie = _trie(components__card=".card { top: 0; }\n.card__a { color: red; }\n",
+                 pages__home=".card { top: 0; }\n.card__b { color: red; }\n@media print { .card { top: 0; } }\n"
+                             ".x .card { left: 0; }\n")
+    row = trie.block_report("card")
+    assert row["rules"] == 6
+    assert row["duplicate_rules"] == 1  # the pages/ copy of .card; the @media one is another context
+    assert row["repeated_bodies"] == 2  # .card top: 0 twice, color: red twice
+    assert row["members"] == 2
@@ -0,0 +1,43 @@
+from cssscan.canonical import canonicalize_declaration, canonicalize_declarations
+
+
+def test_equivalent_spellings_share_a_canonical_form():
+    assert canonicalize_declaration("COLOR: #FFF") == canonicalize_declaration("color: white")
+    assert canonicalize_declaration("color: rgba(255, 255, 255, 1)") == "color: #ffffff"
+    assert canonicalize_declaration("margin: 0px 0.50em") == "margin: 0 .5em"
+    assert canonicalize_declaration("font-weight: bold") == "font-weight: 700"
+    assert canonicalize_declaration("background: url('a.png')") == 'background: url("a.png")'
+
+
+def test_zero_lengths_keep_their_unit_in_math_and_flex():
+    assert canonicalize_declaration("width: calc(100% - 0px)") == "width: calc(100% - 0px)"
+    assert canonicalize_declaration("flex: 1 0px") == "flex: 1 0px"
+    assert canonicalize_declaration("flex: 1 0px") != canonicalize_declaration("flex: 1 0")
+    assert canonicalize_declaration("flex-basis: 0px") == "flex-basis: 0px"
+
+
+def test_case_sensitive_names_and_custom_properties_are_kept():
+    assert canonicalize_declaration("animation-name: FadeIn") == "animation-name: FadeIn"
+    assert canonicalize_declaration("--Brand:  #FFF") == "--Brand: #FFF"
+    assert canonicalize_declaration("color: var(--Brand)") == "color: var(--Brand)"
+
+
+def test_repeated_properties_keep_their_order():
+    body = canonicalize_declarations(["display: flex", "color: red", "display: -webkit-box"])
+    assert body == ["color: #ff0000", "display: flex", "display: -webkit-box"]
+
+
+def test_shorthand_and_longhand_keep_their_order():
+    import main
+
+    first = canonicalize_declarations(["margin-top: 5px", "margin: 0", "color: red"])
+    second = canonicalize_declarations(["color: red", "margin: 0", "margin-top: 5px"])
+    assert first == ["color: #ff0000", "margin-top: 5px", "margin: 0"]
+    assert second == ["color: #ff0000", "margin: 0", "margin-top: 5px"]
+    assert main.comparison_key(main.normalize_declarations("margin-top: 5px; margin: 0")) != \
+        main.comparison_key(main.normalize_declarations("margin: 0; margin-top: 5px"))
+
+
+def test_math_functions_are_not_colour_names():
+    assert canonicalize_declaration("rotate: calc(tan(45deg) * 1turn)") == "rotate: calc(tan(45deg) * 1turn)"
+    assert canonicalize_declaration("color: tan") == "color: #d2b48c"
@@ -0,0 +1,63 @@
+import cssscan.api
+from cssscan.cli import Session, stage_cleanup, stage_consolidate, stage_palette
+
+
+def _session(root, write):
+    pages = root / "styles" / "pages"
+    pages.mkdir(parents=True)
+    (pages / "a.css").write_text(".card--active { color: #3498db; }\n")
+    (root / "styles" / "main.css").write_text("@import './pages/a.css';\n")
+    return Session(root, root / "styles" / "main.css", root / "out", write=write)
+
+
+def test_cleanup_without_write_saves_changed_files_to_out(tmp_path):
+    session = _session(tmp_path, write=False)
+    stage_cleanup(session)
+    result = session.results["cleanup"]
+    assert result["files_changed"] == ["styles/base/variables.css"]
+    assert result["written"] is False
+    assert (session.out_dir / "styles" / "base" / "variables.css").exists()
+    assert not (session.styles_dir / "base" / "variables.css").exists()
+
+
+def test_cleanup_reports_a_stale_plan_as_not_written(tmp_path, monkeypatch):
+    session = _session(tmp_path, write=True)
+    planned = cssscan.api.plan_cleanup
+
+    def plan_then_edit(*args, **kwargs):
+        plan = planned(*args, **kwargs)
+        target = session.styles_dir / "base" / "variables.css"
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_text(":root {}\n")
+        return plan
+
+    monkeypatch.setattr(cssscan.api, "plan_cleanup", plan_then_edit)
+    stage_cleanup(session)
+    assert session.results["cleanup"]["written"] is False
+    assert (session.styles_dir / "base" / "variables.css").read_text() == ":root {}\n"
+
+
+def test_cleanup_adds_the_files_it_creates_to_the_model(tmp_path):
+    session = _session(tmp_path, write=False)
+    stage_cleanup(session)
+    variables = session.styles_dir / "base" / "variables.css"
+    assert variables in session.ensure_model().sheets
+    stage_palette(session)
+    assert session.results["palette"]["clusters"] >= 1
+
+
+def test_consolidate_rewrites_only_the_changed_spans(tmp_path):
+    session = _session(tmp_path, write=False)
+    page = session.styles_dir / "pages" / "a.css"
+    page.write_text("/* page */\n"
+                    ".a {\n  color: red; /* brand */\n}\n\n"
+                    "@media print {\n  .a { display: none; }\n}\n\n"
+                    ".keep   {   padding : 1px  }\n\n"
+                    "@media print {\n  /* footer */\n  .b { visibility: hidden; }\n}\n")
+    stage_consolidate(session)
+    assert session.results["consolidate"]["atrule_blocks_merged"] == 1
+    out = (session.out_dir / "styles" / "pages" / "a.css").read_text()
+    assert out == ("/* page */\n"
+                   ".a {\n  color: red; /* brand */\n}\n\n"
+                   "@media print {\n  .a { display: none; }\n\n  /* footer */\n  .b { visibility: hidden; }\n}\n\n"
+                   ".keep   {   padding : 1px  }\n")
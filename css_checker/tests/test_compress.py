@@ -0,0 +1,44 @@
+from pathlib import Path
+
+from cssscan.compress import SavingsEstimator, bundle_sizes, rank_candidates
+from cssscan.parser import parse_stylesheet
+
+BASE = Path("components/buttons.css")
+PAGE = Path("pages/home.css")
+
+
+def _rank(base_text, page_text):
+    sources = [(BASE, base_text), (PAGE, page_text)]
+    rules = {p: list(parse_stylesheet(t, p).rules()) for p, t in sources}
+    group = [(BASE, rules[BASE][0]), (PAGE, rules[PAGE][0])]
+    [row] = rank_candidates(sources, [group], {})
+    return row
+
+
+def test_duplicate_saving_pays_for_the_merged_selector():
+    row = _rank(".btn {\n  color: red;\n}\n", ".home-cta {\n  color: red;\n}\n")
+    assert row["keep"] == f"{BASE}:1"
+    assert row["raw"] == len(".home-cta {\n  color: red;\n}") - len(", .home-cta")
+
+
+def test_selectors_already_in_the_list_cost_nothing():
+    row = _rank(".btn, .home-cta {\n  color: red;\n}\n", ".home-cta {\n  color: red;\n}\n")
+    assert row["raw"] == len(".home-cta {\n  color: red;\n}")
+
+
+def test_estimate_tracks_exact_recompression():
+    text = "".join(f".rule-{i} {{ color: #{i:03x}; margin: {i}px; }}\n" for i in range(400))
+    estimator = SavingsEstimator(text)
+    start = text.index(".rule-200")
+    edits = [(start, text.index("\n", start) + 1, "")]
+    estimate, exact = estimator.saving(edits), estimator.exact_saving(edits)
+    assert estimate["raw"] == exact["raw"]
+    assert abs(estimate["gzip"] - exact["gzip"]) <= 4
+    assert bundle_sizes([text])["raw"] == len(text)
+
+
+def test_rules_in_other_contexts_are_not_merged():
+    sources = [(BASE, ".btn { color: red; }\n@media print { .x { color: red; } }\n"
+                      "@keyframes a { from { color: red; } }\n")]
+    rules = list(parse_stylesheet(sources[0][1], BASE).rules())
+    assert rank_candidates(sources, [[(BASE, r) for r in rules]], {}) == []
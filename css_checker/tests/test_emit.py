@@ -0,0 +1,92 @@
+import json
+
+from cssscan.emit import MANIFEST_NAME, BundleEmitter
+
+
+def _tree(tmp_path):
+    styles = tmp_path / "styles"
+    (styles / "components").mkdir(parents=True)
+    (styles / "pages" / "reports").mkdir(parents=True)
+    (styles / "assets").mkdir()
+    (styles / "assets" / "arrow.svg").write_text("<svg/>")
+    (styles / "main.css").write_text('@import "components/select.css";\n@import "pages/reports/list.css";\n')
+    (styles / "components" / "select.css").write_text('.select { background: url("../assets/arrow.svg"); }\n')
+    (styles / "pages" / "reports" / "list.css").write_text(
+        ".list { background: url(../../assets/arrow.svg#down); }\n"
+        '.logo { background: url("https://example.com/logo.png"); }\n')
+    return styles
+
+
+def test_relative_urls_are_rebased_and_copied(tmp_path):
+    styles = _tree(tmp_path)
+    out = tmp_path / "dist"
+    manifest = BundleEmitter(styles, out).emit()
+
+    shared = (out / manifest["chunks"]["shared.css"]["file"]).read_text()
+    route = (out / manifest["chunks"]["routes/reports.css"]["file"]).read_text()
+    assert 'url("assets/arrow.svg")' in shared
+    assert "url(../assets/arrow.svg#down)" in route
+    assert 'url("https://example.com/logo.png")' in route
+    assert (out / "assets" / "arrow.svg").read_text() == "<svg/>"
+    assert manifest["assets"] == ["assets/arrow.svg"]
+
+
+def test_in_memory_files_are_copied(tmp_path):
+    styles = _tree(tmp_path)
+    (styles / "assets" / "arrow.svg").unlink()
+    out = tmp_path / "dist"
+    BundleEmitter(styles, out, files={styles / "assets" / "arrow.svg": b"<svg id='new'/>"}).emit()
+    assert (out / "assets" / "arrow.svg").read_bytes() == b"<svg id='new'/>"
+    assert json.loads((out / MANIFEST_NAME).read_text())["assets"] == ["assets/arrow.svg"]
+
+
+def test_unchanged_chunks_keep_their_names(tmp_path):
+    styles = _tree(tmp_path)
+    out = tmp_path / "dist"
+    first = BundleEmitter(styles, out).emit()
+    emitter = BundleEmitter(styles, out)
+    second = emitter.emit()
+    assert {n: c["file"] for n, c in first["chunks"].items()} == {n: c["file"] for n, c in second["chunks"].items()}
+    assert all(c.reused for c in emitter.emitted)
+
+
+def test_page_files_that_would_override_later_shared_rules_stay_shared(tmp_path):
+    styles = tmp_path / "styles"
+    (styles / "pages").mkdir(parents=True)
+    (styles / "features").mkdir()
+    (styles / "main.css").write_text(
+        '@import "pages/auth.css";\n@import "pages/meetings.css";\n@import "features/cards.css";\n')
+    (styles / "pages" / "auth.css").write_text(".card { color: red; }\n")
+    (styles / "pages" / "meetings.css").write_text(".card .title { color: red; }\n")
+    (styles / "features" / "cards.css").write_text(".card { color: blue; }\n.card .title { margin: 0; }\n")
+
+    manifest = BundleEmitter(styles, tmp_path / "dist").emit()
+    assert manifest["chunks"]["shared.css"]["sources"] == ["pages/auth.css", "features/cards.css", "main.css"]
+    assert list(manifest["chunks"]) == ["shared.css", "routes/meetings.css"]
+    assert manifest["kept_shared"] == [{"file": "pages/auth.css", "line": 1, "selector": ".card",
+                                        "later_rule": "features/cards.css:1 .card"}]
+
+
+def test_page_longhand_before_a_later_shared_shorthand_stays_shared(tmp_path):
+    styles = tmp_path / "styles"
+    (styles / "pages").mkdir(parents=True)
+    (styles / "features").mkdir()
+    (styles / "main.css").write_text('@import "pages/auth.css";\n@import "features/cards.css";\n')
+    (styles / "pages" / "auth.css").write_text(".card { background-color: red; }\n")
+    (styles / "features" / "cards.css").write_text(".panel { background: blue; }\n")
+
+    manifest = BundleEmitter(styles, tmp_path / "dist").emit()
+    assert [k["file"] for k in manifest["kept_shared"]] == ["pages/auth.css"]
+
+
+def test_model_and_file_digests_name_chunks_alike(tmp_path):
+    from cssscan.api import scan
+
+    styles = _tree(tmp_path)
+    (styles / "components" / "select.css").write_bytes(b".select {\r\n  content: \"\xe9\";\r\n}\r\n")
+    standalone = BundleEmitter(styles, tmp_path / "a").emit()
+    model = scan([styles])
+    chained = BundleEmitter(styles, tmp_path / "b", sheets=model.sheets, sources=model.sources,
+                            digest=model.digest).emit()
+    assert {n: c["file"] for n, c in standalone["chunks"].items()} == {
+        n: c["file"] for n, c in chained["chunks"].items()}
@@ -0,0 +1,42 @@
+from cssscan.htmlmatch import DeadRuleFinder, Document, SelectorMatcher
+from cssscan.parser import parse_stylesheet
+
+HTML = """<html><body>
+<nav id="top" class="nav"><a class="nav__link is-active" href="/">Home</a><a class="nav__link">Reports</a></nav>
+<ul class="list"><li>one</li><li>two</li><li>three</li></ul>
+<input type="checkbox" class="toggle">
+</body></html>"""
+
+
+def _matcher():
+    doc = Document("page.html")
+    doc.feed(HTML)
+    doc.close()
+    return SelectorMatcher([doc])
+
+
+def test_selectors_match_through_combinators_and_structure():
+    matcher = _matcher()
+    assert matcher.matches("#top > .nav__link.is-active")
+    assert matcher.matches("nav .nav__link + .nav__link")
+    assert matcher.matches("ul.list li:nth-child(2n+1)")
+    assert matcher.matches("input[type=checkbox]")
+    assert not matcher.matches(".list > a")
+    assert not matcher.matches(".nav__link ~ .is-active")
+    assert not matcher.matches(".missing")
+
+
+def test_state_pseudo_classes_are_taken_to_match():
+    matcher = _matcher()
+    assert matcher.matches(".nav__link:hover")
+    assert matcher.matches(".toggle:checked")
+
+
+def test_finder_reports_dead_and_partial_rules():
+    doc = Document("page.html")
+    doc.feed(HTML)
+    doc.close()
+    sheet = parse_stylesheet(".nav { color: red; }\n.gone { color: red; }\n.list, .gone-too { margin: 0; }\n")
+    rows = DeadRuleFinder([doc]).find([sheet])
+    assert [(r["selector"], r["status"]) for r in rows] == [(".gone", "dead"), (".list, .gone-too", "partial")]
+    assert rows[1]["bytes"] == len(".gone-too") + 2
@@ -0,0 +1,62 @@
+import csv
+from pathlib import Path
+
+from cssscan.index import UNRANKED_PRIORITY, SelectorIndex, folder_priority
+from cssscan.parser import parse_stylesheet
+
+
+def _index(**files):
+    return SelectorIndex.build(parse_stylesheet(text, Path(name.replace("__", "/") + ".css"))
+                               for name, text in files.items())
+
+
+def test_folder_priority_uses_the_first_priority_folder():
+    assert folder_priority(Path("styles/base/reset.css")) == 1
+    assert folder_priority(Path("styles/pages/components/x.css")) == 6
+    assert folder_priority(Path("styles/main.css")) == UNRANKED_PRIORITY
+
+
+def test_selector_lists_are_split_and_normalized():
+    index = _index(components__card=".card,.card > .title { color: red; }\n@keyframes k { from { top: 0; } }\n")
+    assert ".card" in index and ".card>.title" in index
+    assert [d.selector for d in index[".card  >  .title"]] == [".card > .title"]
+    assert "from" not in index
+    assert len(index) == 2
+
+
+def test_duplicates_are_grouped_by_context():
+    index = _index(components__card=".card { color: red; }\n@media print { .card { color: red; } }\n",
+                   pages__home=".card { color: red; }\n.only { top: 0; }\n")
+    groups = index.duplicated()
+    assert list(groups) == [(".card", ())]
+    assert [str(d.path) for d in groups[(".card", ())]] == ["components/card.css", "pages/home.css"]
+
+
+def test_report_applies_the_cleanup_rules():
+    index = _index(base__type=".btn { color: red; margin: 0; }\n",
+                   components__btn=".btn { color: red; }\n.link { top: 0; }\n",
+                   utilities__u=".btn { color: red; padding: 0; }\n.link { left: 0; }\n",
+                   pages__p=".btn { display: none; }\n.link { top: 0; left: 0; }\n")
+    rows = {(r["selector"], r["file"]): (r["relation"], r["action"]) for r in index.report()}
+    assert rows[(".btn", "base/type.css")] == ("canonical", "keep (canonical)")
+    assert rows[(".btn", "components/btn.css")] == ("subset", "remove")
+    assert rows[(".btn", "utilities/u.css")] == ("overlap", "trim shared declarations")
+    assert rows[(".btn", "pages/p.css")] == ("disjoint", "keep (no shared declarations)")
+    assert rows[(".link", "components/btn.css")] == ("canonical", "keep (canonical)")
+    assert rows[(".link", "pages/p.css")] == ("superset", "remove")
+
+
+def test_same_priority_copies_are_only_removed_when_they_add_nothing():
+    index = _index(components__a=".x { color: red; }\n", components__b=".x { color: red; top: 0; }\n",
+                   components__c=".x { color: red; }\n")
+    actions = [(r["file"], r["action"]) for r in index.report()]
+    assert actions == [("components/a.css", "keep (canonical)"), ("components/b.css", "keep (same priority)"),
+                       ("components/c.css", "remove")]
+
+
+def test_write_report(tmp_path):
+    index = _index(base__a=".x { color: red; }\n", pages__b=".x { color: #f00; }\n")
+    out = tmp_path / "report.csv"
+    assert index.write_report(out) == 2
+    rows = list(csv.DictReader(out.open()))
+    assert [r["relation"] for r in rows] == ["canonical", "exact"]
@@ -0,0 +1,82 @@
+import itertools
+import random
+from pathlib import Path
+
+import pytest
+
+from cssscan.itemsets import DECLARATION_OVERHEAD, DeclarationGroupMiner, SharedGroup, net_saving
+from cssscan.parser import parse_stylesheet
+
+DECLARATIONS = ["display: flex", "align-items: center", "gap: 8px", "color: #ff0000", "margin: 0",
+                "padding: 4px", "position: relative", "cursor: pointer"]
+
+
+def _corpus(seed):
+    rng = random.Random(seed)
+    rules = []
+    for n in range(14):
+        body = rng.sample(DECLARATIONS, rng.randint(2, 6))
+        rules.append((f".r{n}" + "-x" * rng.randint(0, 6), body))
+    return rules
+
+
+def _brute(rules, top, min_support=3, min_items=2, max_items=4):
+    """Every itemset scored as the miner scores it, the best `top` kept, non-closed dropped"""
+    scored = []
+    for size in range(min_items, max_items + 1):
+        for itemset in itertools.combinations(DECLARATIONS, size):
+            support = [selector for selector, body in rules if set(itemset) <= set(body)]
+            body_bytes = sum(len(d) + DECLARATION_OVERHEAD for d in itemset)
+            saving = net_saving(len(support), sum(len(s) for s in support), body_bytes)
+            if len(support) >= min_support and saving > 0:
+                scored.append((saving, frozenset(itemset), frozenset(support)))
+    scored.sort(key=lambda s: -s[0])
+    if len(scored) > top and scored[top - 1][0] == scored[top][0]:
+        return None  # a tie at the cut; either itemset may be kept
+    kept = scored[:top]
+    return {items for _, items, support in kept
+            if not any(items < other and support == other_support for _, other, other_support in kept)}
+
+
+def _mined(rules, top):
+    text = "".join(f"{selector} {{ {'; '.join(body)}; }}\n" for selector, body in rules)
+    miner = DeclarationGroupMiner.build([parse_stylesheet(text, Path("a.css"))], max_items=4, top=top)
+    return {frozenset(g.declarations) for g in miner.mine()}
+
+
+@pytest.mark.parametrize("seed", range(8))
+def test_fp_growth_matches_brute_force(seed):
+    rules = _corpus(seed)
+    assert _mined(rules, 10_000) == _brute(rules, 10_000)
+
+
+@pytest.mark.parametrize("seed", range(8))
+def test_pruned_search_keeps_the_best_itemsets(seed):
+    rules = _corpus(seed)
+    checked = 0
+    for top in (1, 3, 5, 8):
+        expected = _brute(rules, top)
+        if expected is not None:
+            assert _mined(rules, top) == expected, top
+            checked += 1
+    assert checked
+
+
+def test_rules_with_repeated_properties_keep_them_out_of_groups():
+    text = "".join(f".r{n} {{ display: -webkit-box; display: flex; gap: 8px; color: #ff0000; }}\n" for n in range(3))
+    groups = DeclarationGroupMiner.build([parse_stylesheet(text, Path("a.css"))]).mine()
+    assert [g.declarations for g in groups] == [["color: #ff0000", "gap: 8px"]]
+    assert groups[0].emptied_rules == 0
+
+
+def _group(rules, declarations, net_bytes):
+    return SharedGroup((), declarations, [(Path("a.css"), s, 1) for s in rules], net_bytes=net_bytes)
+
+
+def test_select_never_claims_a_declaration_of_a_rule_twice():
+    groups = [_group([".a", ".b", ".c"], ["color: red", "gap: 8px"], 40),
+              _group([".a", ".d", ".e"], ["color: red", "margin: 0"], 30),
+              _group([".d", ".e", ".f"], ["color: red", "margin: 0"], 20),
+              _group([".x", ".y"], ["top: 0", "left: 0"], -5)]
+    DeclarationGroupMiner._select(groups)
+    assert [g.selected for g in groups] == [True, False, True, False]
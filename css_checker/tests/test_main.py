@@ -0,0 +1,22 @@
+from collections import defaultdict
+
+import main
+
+
+def test_canonicalisation_stats_separate_values_from_shorthands(tmp_path):
+    path = tmp_path / "a.css"
+    path.write_text(
+        ".a { margin: 0; }\n.b { margin: 0px; }\n"
+        ".c { padding: 0 1px; }\n"
+        ".d { padding-top: 0; padding-right: 1px; padding-bottom: 0; padding-left: 1px; }\n"
+        ".e { color: red; }\n.f { color: red; }\n"
+    )
+    entries = main.parse_css_file(path)
+    groups = defaultdict(list)
+    for e in entries:
+        groups[e["hash"]].append(e)
+    stats = main.canonicalization_stats(entries, groups)
+    assert stats["raw_duplicate_groups"] == 1
+    assert stats["canonical_duplicate_groups"] == 3
+    assert stats["uncovered_groups"] == 1
+    assert stats["shorthand_groups"] == 1
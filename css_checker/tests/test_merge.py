@@ -0,0 +1,76 @@
+from pathlib import Path
+
+from cssscan.merge import SelectorListMerger, body_key
+from cssscan.parser import TreeEdits, parse_declaration, parse_stylesheet
+
+
+def _decls(*texts):
+    return [parse_declaration(t) for t in texts]
+
+
+def test_body_key_ignores_property_order_and_shorthands():
+    assert body_key(_decls("color: #FFF", "margin: 0")) == body_key(_decls(
+        "margin-top: 0", "margin-right: 0px", "margin-bottom: 0", "margin-left: 0", "color: white"))
+
+
+def test_body_key_keeps_order_of_repeated_properties():
+    assert body_key(_decls("display: -webkit-box", "display: flex")) != body_key(
+        _decls("display: flex", "display: -webkit-box"))
+
+
+def _merge(*texts):
+    sheets = [parse_stylesheet(t, Path(f"{i}.css")) for i, t in enumerate(texts)]
+    merges = SelectorListMerger(sheets).merge()
+    return merges, [s.text() for s in sheets]
+
+
+def test_identical_rules_fold_into_a_selector_list():
+    merges, (first, second) = _merge(".a { color: red; }\n", ".b { color: red; }\n")
+    assert [(m.target_selector, m.source_selector) for m in merges] == [(".a", ".b")]
+    assert first.startswith(".a, .b {") and ".b" not in second
+
+
+def test_rule_in_between_blocks_the_move():
+    merges, [text] = _merge(".a { color: red; }\n.c { color: blue; }\n.b { color: red; }\n")
+    assert merges == []
+    assert text.index(".c") < text.index(".b")
+
+
+def test_unrelated_rule_in_between_does_not_block():
+    merges, _ = _merge(".a { color: red; }\n.c { margin: 0; }\n.b { color: red; }\n")
+    assert len(merges) == 1
+
+
+def test_shorthand_in_between_blocks_its_longhands():
+    for between in ("background: blue", "overflow: auto", "flex: 1", "transition: none", "gap: 4px"):
+        longhand = {"background": "background-color: red", "overflow": "overflow-x: hidden",
+                    "flex": "flex-basis: 0%", "transition": "transition-delay: 1s", "gap": "row-gap: 2px"}
+        body = longhand[between.split(":")[0]]
+        merges, [text] = _merge(f".a {{ {body}; }}\n.c {{ {between}; }}\n.b {{ {body}; }}\n")
+        assert merges == [], between
+        assert text.index(".c") < text.index(".b")
+
+
+def test_tree_edits_rewrite_only_the_merged_rules():
+    texts = {Path("0.css"): ".a {\n  color: red; /* brand */\n}\n",
+             Path("1.css"): "/* keep */\n.x   { margin: 0 }\n\n.b {\n  color: red;\n}\n"}
+    sheets = [parse_stylesheet(t, p) for p, t in texts.items()]
+    recorder = TreeEdits(sheets, texts)
+    SelectorListMerger(sheets).merge()
+    assert recorder.rewrite(sheets) == {
+        Path("0.css"): ".a, .b {\n  color: red; /* brand */\n}\n",
+        Path("1.css"): "/* keep */\n.x   { margin: 0 }\n",
+    }
+
+
+def test_tree_edits_carry_a_merge_into_a_folded_block():
+    from cssscan.atrules import AtRuleConsolidator
+
+    text = ("@media print {\n  .a { color: red; }\n}\n\n.x { margin: 0; }\n\n"
+            "@media print {\n  .b { display: none; }\n  .c { display: none; }\n}\n")
+    sheets = [parse_stylesheet(text, Path("0.css"))]
+    recorder = TreeEdits(sheets, {Path("0.css"): text})
+    AtRuleConsolidator(sheets).run()
+    SelectorListMerger(sheets).merge()
+    assert recorder.rewrite(sheets)[Path("0.css")] == (
+        "@media print {\n  .a { color: red; }\n\n  .b, .c { display: none; }\n}\n\n.x { margin: 0; }\n")
@@ -0,0 +1,60 @@
+from difflib import SequenceMatcher
+from pathlib import Path
+
+from cssscan.neardup import NearDupIndex, cluster_near_duplicates, rule_entries
+from cssscan.parser import parse_stylesheet
+
+PROPS = ["color", "margin", "padding", "width", "height", "border-radius", "font-size", "line-height", "top", "left"]
+
+
+def _chain(steps):
+    """Bodies that each change one more declaration than the one before"""
+    bodies = []
+    for k in range(steps):
+        values = ["calc(100% - var(--gutter))" if i < k else f"{i}px" for i in range(len(PROPS))]
+        bodies.append(";\n  ".join(f"{p}: {v}" for p, v in zip(PROPS, values)) + ";")
+    return bodies
+
+
+def _entries(bodies):
+    return [{"selector": f".r{i}", "file": Path("a.css"), "hash": str(i), "normalized": b}
+            for i, b in enumerate(bodies)]
+
+
+def test_chains_do_not_form_one_cluster():
+    bodies = _chain(7)
+    assert SequenceMatcher(None, bodies[0], bodies[1]).ratio() >= 0.9
+    assert SequenceMatcher(None, bodies[0], bodies[-1]).ratio() < 0.9
+    clusters = cluster_near_duplicates(_entries(bodies), 0.9)
+    assert len(clusters) > 1
+    for c in clusters:
+        assert c.core
+        assert all(ratio >= 0.9 for ratio in c.similarity.values())
+
+
+def test_similar_text_without_a_shared_declaration_is_not_a_cluster():
+    bodies = [f"padding: var(--spacing-{n});" for n in (1, 2, 3, 4)]
+    assert cluster_near_duplicates(_entries(bodies), 0.8) == []
+
+
+def test_index_clusters_match_the_one_shot_scan():
+    text = "".join(f".r{i} {{\n  {body}\n}}\n" for i, body in enumerate(_chain(7)))
+    sheet = parse_stylesheet(text, Path("a.css"))
+    entries = rule_entries("a.css", sheet)
+    index = NearDupIndex(0.9)
+    index.sync({"a.css": "1"}, lambda key: entries)
+    shape = lambda clusters: sorted(sorted(e["selector"] for e in c.members) for c in clusters)
+    assert index.clusters()
+    assert shape(index.clusters()) == shape(cluster_near_duplicates(entries, 0.9))
+
+
+def test_sync_only_compares_changed_bodies(tmp_path):
+    first = rule_entries("a.css", parse_stylesheet(".a { color: red; margin: 0; }\n.b { color: red; margin: 1px; }\n"))
+    index = NearDupIndex(0.8)
+    index.sync({"a.css": "1", "b.css": "1"}, lambda key: first if key == "a.css" else [])
+    path = tmp_path / "index.json"
+    index.save(path)
+    loaded, _ = NearDupIndex.load(path, 0.8)
+    stats = loaded.sync({"a.css": "1", "b.css": "1"}, lambda key: [])
+    assert stats["comparisons"] == 0 and stats["files_changed"] == 0
+    assert len(loaded) == 2
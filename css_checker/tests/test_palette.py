@@ -0,0 +1,81 @@
+from pathlib import Path
+
+from cssscan.palette import ColorAnalyzer
+from cssscan.parser import Rule, parse_stylesheet
+
+VARIABLES = """:root {
+  --primary: #2c3e50;
+}
+
+@media (max-width: 480px) {
+  :root {
+    --primary: #34495e;
+  }
+}
+"""
+
+BUTTONS = """.button { color: #3498db; }
+.link { color: #3499db; }
+.link:hover { border-color: #3498db; }
+"""
+
+
+def _root_tokens(text):
+    return {d.property for node in parse_stylesheet(text).nodes
+            if isinstance(node, Rule) and node.selectors == [":root"]
+            for d in node.declarations}
+
+
+def test_new_tokens_go_in_top_level_root():
+    variables, buttons = Path("base/variables.css"), Path("components/buttons.css")
+    analyzer = ColorAnalyzer.build({variables: VARIABLES, buttons: BUTTONS})
+    clusters = analyzer.cluster()
+    new = [c.token for c in clusters if c.new_token]
+    assert new
+
+    changed = analyzer.rewrite(clusters, variables)
+    assert set(new) <= _root_tokens(changed[variables])
+    media = changed[variables][changed[variables].index("@media"):]
+    assert not any(token in media for token in new)
+    # every var() the rewrite introduced resolves to an unconditional definition
+    for token in new:
+        assert f"var({token})" in changed[buttons]
+
+
+def test_root_rule_is_created_when_missing():
+    variables, buttons = Path("base/variables.css"), Path("components/buttons.css")
+    analyzer = ColorAnalyzer.build({variables: "@media print {\n  :root { --ink: #000; }\n}\n",
+                                    buttons: BUTTONS})
+    clusters = analyzer.cluster()
+    changed = analyzer.rewrite(clusters, variables)
+    assert {c.token for c in clusters if c.new_token} <= _root_tokens(changed[variables])
+
+
+def test_scoped_custom_properties_are_not_tokens():
+    sheet = Path("components/buttons.css")
+    analyzer = ColorAnalyzer.build({sheet: ".btn { --btn-bg: #3498db; }\n.card { color: #3498db; }\n"})
+    changed = analyzer.rewrite(analyzer.cluster(), None)
+    assert "var(--btn-bg)" not in changed.get(sheet, "")
+
+
+def test_tokens_redefined_in_media_are_not_tokens():
+    sheet = Path("base/variables.css")
+    text = ":root { --bg: #fff; }\n@media (max-width: 480px) {\n  :root { --bg: #000; }\n}\n.card { border-color: #fff; }\n"
+    analyzer = ColorAnalyzer.build({sheet: text})
+    clusters = analyzer.cluster()
+    assert "--bg" not in analyzer.token_values
+    assert "var(--bg)" not in analyzer.rewrite(clusters, sheet).get(sheet, text)
+
+
+def test_new_tokens_are_not_used_without_a_variables_file():
+    buttons = Path("components/buttons.css")
+    analyzer = ColorAnalyzer.build({buttons: BUTTONS})
+    clusters = analyzer.cluster()
+    assert any(c.new_token for c in clusters)
+    assert analyzer.rewrite(clusters, Path("base/variables.css")) == {}
+
+
+def test_math_functions_are_not_colour_literals():
+    sheet = Path("components/icon.css")
+    analyzer = ColorAnalyzer.build({sheet: ".icon { rotate: calc(tan(45deg) * 1turn); color: tan; }\n"})
+    assert [u.literal for s in analyzer.swatches.values() for u in s.uses] == ["tan"]
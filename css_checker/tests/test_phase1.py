@@ -0,0 +1,103 @@
+from phase1 import CSSCleanupTool
+
+
+def _tree(root, newline="\n"):
+    pages = root / "styles" / "pages"
+    pages.mkdir(parents=True)
+    css = ".card--active { color: #3498db; }\n\n.flex { display: flex; }\n\n.flex { display: flex; }\n"
+    (pages / "a.css").write_bytes(css.replace("\n", newline).encode("utf-8"))
+    (root / "styles" / "main.css").write_text("@import './pages/a.css';\n")
+    return pages / "a.css"
+
+
+def test_plan_applies_to_crlf_files(tmp_path):
+    page = _tree(tmp_path, newline="\r\n")
+    plan, _ = CSSCleanupTool(str(tmp_path)).plan_cleanup()
+    assert "styles/pages/a.css" in plan["files"]
+    assert CSSCleanupTool(str(tmp_path)).apply_plan(plan)
+    assert ".flex" not in page.read_text()
+
+
+def test_plan_is_refused_once_an_input_changes(tmp_path):
+    page = _tree(tmp_path)
+    plan, _ = CSSCleanupTool(str(tmp_path)).plan_cleanup()
+    page.write_text(page.read_text() + ".late { color: red; }\n")
+    assert not CSSCleanupTool(str(tmp_path)).apply_plan(plan)
+    assert ".late" in page.read_text()
+
+
+def test_workers_give_the_same_plan_as_a_serial_run(tmp_path):
+    plans = []
+    for workers in (1, 2):
+        root = tmp_path / str(workers)
+        _tree(root)
+        pages = root / "styles" / "pages"
+        for i in range(4):
+            (pages / f"p{i}.css").write_text(
+                f".p{i} {{ color: #3498db; box-shadow: 0 2px 4px rgba(0, 0, 0, 0.1); }}\n\n.hidden {{ display: none; }}\n")
+        tool = CSSCleanupTool(str(root))
+        tool.workers = workers
+        plan, diff = tool.plan_cleanup()
+        plan.pop("plan_date")
+        plan.pop("project_root")
+        plans.append((plan, diff.replace(str(root), "")))
+    assert plans[0] == plans[1]
+    assert len(plans[0][0]["files"]) > 1
+
+
+def test_plan_is_refused_when_an_unchanged_input_changes(tmp_path):
+    _tree(tmp_path)
+    other = tmp_path / "styles" / "components" / "b.css"
+    other.parent.mkdir()
+    other.write_text(".b { color: red; }\n")
+    plan, _ = CSSCleanupTool(str(tmp_path)).plan_cleanup()
+    assert "styles/components/b.css" not in plan["files"]
+    assert "styles/components/b.css" in plan["inputs"]
+    other.write_text(".b { color: blue; }\n")
+    assert not CSSCleanupTool(str(tmp_path)).apply_plan(plan)
+
+
+def test_plan_is_refused_when_a_stylesheet_is_added(tmp_path):
+    _tree(tmp_path)
+    plan, _ = CSSCleanupTool(str(tmp_path)).plan_cleanup()
+    (tmp_path / "styles" / "late.css").write_text(":root { --late: 1px; }\n")
+    assert not CSSCleanupTool(str(tmp_path)).apply_plan(plan)
+    assert CSSCleanupTool(str(tmp_path)).plan_cleanup()[0]["files"]
+
+
+def test_consolidate_renames_selectors_only(tmp_path):
+    pages = tmp_path / "styles" / "pages"
+    pages.mkdir(parents=True)
+    page = pages / "students.css"
+    page.write_text("/* .modal-close is styled by the component */\n"
+                    ".modal-close, .modal-close--x { color: red; }\n"
+                    ".students-table  th:hover { content: '.students-table th'; }\n"
+                    "@supports selector(.modal-close) { .modal-close { top: 0; } }\n")
+    report = CSSCleanupTool(str(tmp_path)).consolidate_components()
+    assert page.read_text() == (
+        "/* .modal-close is styled by the component */\n"
+        ".modal-close--enhanced, .modal-close--x { color: red; }\n"
+        ".table-header--enhanced.table-header--sm:hover { content: '.students-table th'; }\n"
+        "@supports selector(.modal-close) { .modal-close--enhanced { top: 0; } }\n")
+    assert report["files_modified"] == ["pages/students.css"]
+    assert {c["selector"]: c["count"] for c in report["consolidations"]} == {
+        ".modal-close": 2, ".students-table th": 1}
+    assert report["major_replacements"] == {"modals": ["modal-close"], "tables": ["students-table th"]}
+
+
+def test_consolidate_text_drops_component_blocks_and_repeated_imports(tmp_path):
+    (tmp_path / "styles").mkdir()
+    tool = CSSCleanupTool(str(tmp_path))
+    tool.consolidate_components()  # compiles the rename patterns
+    counts = {}
+    text, total = tool._consolidate_text(
+        ".meeting-records__header { margin: 0; }\n.x, .meeting-records__header { top: 0; }\n",
+        "pages/meetings/list.css", counts)
+    assert text == "\n.x, .page-header.page-header--large-gap { top: 0; }\n"
+    assert total == 2 and counts == {("remove_duplicate", "meeting records header"): 1,
+                                     ("pattern_replace", ".meeting-records__header"): 1}
+    counts = {}
+    text, total = tool._consolidate_text("@import './a.css';\n@import './b.css';\n@import './a.css';\n",
+                                         "pages/index.css", counts)
+    assert text == "@import './a.css';\n@import './b.css';\n"
+    assert total == 1 and counts == {("remove_import", "@import './a.css';"): 1}
@@ -0,0 +1,21 @@
+from cssscan.precommit import check_file
+
+
+def test_repeated_rule_is_reported(tmp_path):
+    path = tmp_path / "a.css"
+    path.write_text(".a { color: #FFF; margin: 0; }\n\n.a { margin: 0px; color: white; }\n")
+    [problem] = check_file(path)
+    assert problem.endswith("repeats the rule at line 1")
+
+
+def test_order_of_a_repeated_property_matters(tmp_path):
+    path = tmp_path / "a.css"
+    path.write_text(".box { display: -webkit-box; display: flex; }\n"
+                    ".box { display: flex; display: -webkit-box; }\n")
+    assert check_file(path) == []
+
+
+def test_other_contexts_are_not_repeats(tmp_path):
+    path = tmp_path / "a.css"
+    path.write_text(".a { color: red; }\n@media print {\n  .a { color: red; }\n}\n")
+    assert check_file(path) == []
@@ -0,0 +1,63 @@
+from pathlib import Path
+
+from cssscan.parser import parse_stylesheet
+from cssscan.refgraph import ReferenceGraph
+
+
+def _graph(text, external=()):
+    return ReferenceGraph.build([parse_stylesheet(text, Path("a.css"))], external)
+
+
+def test_vendor_and_conditional_keyframes_do_not_shadow():
+    graph = _graph("""
+@-webkit-keyframes spin { from { opacity: 0; } to { opacity: 1; } }
+@keyframes spin { from { opacity: 0; } to { opacity: 1; } }
+@media (prefers-reduced-motion: reduce) {
+  @keyframes spin { from { opacity: 1; } to { opacity: 1; } }
+}
+.loader { animation: spin 1s; }
+""")
+    assert graph.shadowed_keyframes() == []
+    assert graph.unused_keyframes() == []
+    assert graph.report()["keyframes_defined"] == 1
+
+
+def test_same_key_is_shadowed():
+    graph = _graph("""
+@keyframes fade { from { opacity: 0; } }
+@keyframes fade { from { opacity: 0.5; } }
+.a { animation: fade 1s; }
+""")
+    [shadowed] = graph.shadowed_keyframes()
+    assert shadowed.at_rule.children[0].declarations[0].value == "0"
+
+
+def test_duplicate_keyframes_compare_every_variant():
+    text = """
+@keyframes fadeA { to { opacity: 1; } }
+@keyframes fadeB { to { opacity: 1; } }
+@-webkit-keyframes fadeB { to { opacity: 0; } }
+@keyframes fadeC { to { opacity: 1; } }
+.a { animation: fadeA 1s; }
+.b { animation: fadeB 1s; }
+.c { animation: fadeC 1s; }
+"""
+    assert _graph(text).duplicate_keyframes() == {"fadeC": "fadeA"}
+
+
+def test_externally_referenced_keyframes_are_not_renamed():
+    text = """
+@keyframes fadeA { to { opacity: 1; } }
+@keyframes fadeC { to { opacity: 1; } }
+.a { animation: fadeA 1s; }
+"""
+    graph = _graph(text, ["el.style.animationName = 'fadeC';"])
+    assert graph.duplicate_keyframes() == {}
+    assert graph.unused_keyframes() == []
+
+
+def test_prune_removes_dead_definitions_only():
+    text = ":root {\n  --used: 1px;\n  --dead: 2px;\n}\n.a { margin: var(--used); }\n"
+    graph = _graph(text)
+    pruned = graph.prune({"a.css": text})["a.css"]
+    assert "--dead" not in pruned and "--used: 1px" in pruned
@@ -0,0 +1,75 @@
+from pathlib import Path
+
+import pytest
+
+from cssscan.parser import parse_stylesheet
+from cssscan.selectorcost import (SHARED_ROUTE, Compound, SelectorProfiler, main, profile_selector, route_of,
+                                  split_compounds)
+
+
+def test_split_compounds_keeps_brackets_and_strings_whole():
+    assert split_compounds(".a > .b  .c+ d") == ([".a", ".b", ".c", "d"], [">", " ", "+"])
+    assert split_compounds('a[title="x > y"] :not(.b .c)') == (['a[title="x > y"]', ":not(.b .c)"], [" "])
+
+
+@pytest.mark.parametrize("text, kind", [
+    ("#id.cls", "id"), ("div.cls", "class"), ("li", "tag"), ("[href]", "attribute"),
+    (":hover", "pseudo"), ("*", "universal"), ("*:hover", "universal"),
+])
+def test_compound_kind(text, kind):
+    assert Compound.parse(text).kind == kind
+
+
+def test_functional_pseudo_class_arguments_are_skipped():
+    compound = Compound.parse("li:not(.a #b)")
+    assert (compound.tags, compound.classes, compound.ids, compound.pseudo_classes) == (["li"], 0, 0, ["not"])
+
+
+def test_profile_flags_and_scores():
+    cheap = profile_selector(".card__title")
+    assert (cheap["key"], cheap["flags"], cheap["score"]) == ("class", [], 1)
+    deep = profile_selector(".page .main .list li")
+    assert deep["key"] == "tag" and deep["descendants"] == 3
+    assert set(deep["flags"]) == {"broad-tag-key", "descendant-heavy", "deep-chain"}
+    assert deep["score"] == 4 * (1 + 9 / 2) + 2
+    assert {"attribute-key", "substring-attribute"} <= set(profile_selector('[class*="icon-"]')["flags"])
+    assert "not-key" in profile_selector(".a:not(.b)")["flags"]
+    assert "has" in profile_selector(".card:has(img)")["flags"]
+    assert profile_selector("#a .b")["specificity"] == (1, 1, 0)
+    assert profile_selector(".a > .b")["score"] < profile_selector(".a .b")["score"]
+
+
+def test_route_of():
+    styles = Path("styles")
+    assert route_of(styles / "pages" / "meetings" / "list.css", styles) == "meetings"
+    assert route_of(styles / "pages" / "auth.css", styles) == "auth"
+    assert route_of(styles / "pages" / "index.css", styles) == SHARED_ROUTE
+    assert route_of(styles / "components" / "pages.css", styles) == SHARED_ROUTE
+
+
+def _profiler():
+    sheets = [parse_stylesheet(".a, .b .c li { color: red; }\n@keyframes k { from { top: 0; } }\n",
+                               Path("styles/components/x.css")),
+              parse_stylesheet("* { margin: 0; }\n.page #x { top: 0; }\n", Path("styles/pages/home.css"))]
+    return SelectorProfiler.build(sheets, Path("styles"))
+
+
+def test_profiler_ranks_and_summarises_per_route():
+    profiler = _profiler()
+    assert [c.selector for c in profiler.costs] == [".a", ".b .c li", "*", ".page #x"]
+    assert [c.selector for c in profiler.ranked()] == [".b .c li", "*", ".page #x", ".a"]
+    assert profiler.ranked("specificity")[0].selector == ".page #x"
+    assert profiler.ranked("compounds")[0].selector == ".b .c li"
+    rows = {r["route"]: r for r in profiler.by_route()}
+    assert rows["home"]["selectors"] == 2 and rows[SHARED_ROUTE]["selectors"] == 2
+    assert rows["home"]["total_score"] == round(rows["home"]["score"] + rows[SHARED_ROUTE]["score"], 1)
+    assert [r["file"] for r in profiler.by_file()] == ["styles/components/x.css", "styles/pages/home.css"]
+
+
+def test_main_writes_csv_and_rejects_bad_options(tmp_path, capsys):
+    (tmp_path / "a.css").write_text(".a .b { color: red; }\n")
+    out = tmp_path / "cost.csv"
+    assert main([str(tmp_path), "--csv", str(out), "--sort", "compounds"]) == 0
+    assert out.read_text().splitlines()[1].startswith("2.5,.a .b,")
+    with pytest.raises(SystemExit):
+        main([str(tmp_path), "--sort", "nope"])
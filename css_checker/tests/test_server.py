@@ -0,0 +1,123 @@
+import json
+import threading
+import urllib.request
+from urllib.parse import quote
+
+import pytest
+
+import cssscan.server
+from cssscan.server import AnalysisState, make_server
+
+
+def test_similarity_sync_runs_outside_the_query_lock(tmp_path, monkeypatch):
+    (tmp_path / "a.css").write_text(".a { color: red; margin: 0; padding: 4px; }\n")
+    (tmp_path / "b.css").write_text(".b { color: red; margin: 0; padding: 5px; }\n")
+    state = AnalysisState(tmp_path, threshold=0.8)
+    state.refresh()
+    index = state.near
+    digest = index.files["b.css"]["digest"]
+    during = []
+
+    def entries(rel, sheet):
+        # a query thread must be able to take the lock while the delta is worked out,
+        # and the index must still answer from the previous version of the file
+        t = threading.Thread(target=lambda: during.append(state.lock.acquire(timeout=1) and not state.lock.release()))
+        t.start()
+        t.join()
+        during.append(state.near.files["b.css"]["digest"] == digest)
+        return rule_entries(rel, sheet)
+
+    rule_entries = cssscan.server.rule_entries
+    monkeypatch.setattr(cssscan.server, "rule_entries", entries)
+    (tmp_path / "b.css").write_text(".b { color: red; margin: 0; padding: 6px; }\n")
+    state.refresh()
+    assert during == [True, True]
+    assert state.near is index and index.files["b.css"]["digest"] != digest
+    assert len(state.near) == 2
+    assert state.query_similar({"q": "color: red; margin: 0; padding: 7px"})[1]["rules"]
+
+
+def test_refreshed_index_matches_a_fresh_one(tmp_path):
+    (tmp_path / "a.css").write_text(".a { color: red; margin: 0; padding: 4px; }\n.x { top: 0; }\n")
+    (tmp_path / "b.css").write_text(".b { color: red; margin: 0; padding: 5px; }\n")
+    state = AnalysisState(tmp_path, threshold=0.8)
+    state.refresh()
+    (tmp_path / "a.css").write_text(".a { color: red; margin: 0; padding: 9px; }\n")
+    (tmp_path / "b.css").unlink()
+    (tmp_path / "c.css").write_text(".c { color: red; margin: 0; padding: 8px; }\n.x { top: 0; }\n")
+    state.refresh()
+    fresh = AnalysisState(tmp_path, threshold=0.8)
+    fresh.refresh()
+    graph = lambda index: {k: (b.neighbours, sorted(b.uses)) for k, b in index.bodies.items()}
+    assert graph(state.near) == graph(fresh.near)
+    assert state.near.files == fresh.near.files
+
+
+@pytest.fixture
+def server(tmp_path):
+    (tmp_path / "base").mkdir()
+    (tmp_path / "base" / "variables.css").write_text(":root { --brand: #FFF; }\n")
+    (tmp_path / "a.css").write_text(".card { display: flex; gap: 8px; color: var(--brand); }\n")
+    (tmp_path / "b.css").write_text(".tile { gap: 8px; display: flex; color: var(--brand); }\n"
+                                    "@media print { .card { display: none; } }\n")
+    state = AnalysisState(tmp_path, threshold=0.8)
+    state.refresh()
+    httpd = make_server(state, port=0)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    host, port = httpd.server_address[:2]
+    yield tmp_path, f"http://{host}:{port}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def _get(url, data=None):
+    try:
+        with urllib.request.urlopen(urllib.request.Request(url, data=data), timeout=5) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+def test_selector_endpoint(server):
+    _, url = server
+    status, payload = _get(f"{url}/selector?q=.card")
+    assert status == 200
+    assert sorted((d["file"], tuple(d["context"])) for d in payload["definitions"]) == [
+        ("a.css", ()), ("b.css", ("@media print",))]
+    assert payload["duplicated"] is False
+    assert _get(f"{url}/selector")[0] == 400
+
+
+def test_declarations_endpoint(server):
+    _, url = server
+    status, payload = _get(f"{url}/declarations?q=" + quote("color: var(--brand); gap: 8px; display: flex"))
+    assert status == 200
+    assert sorted(r["selector"] for r in payload["rules"]) == [".card", ".tile"]
+    assert len(_get(f"{url}/declarations?selector=.tile")[1]["rules"]) == 2
+    assert _get(f"{url}/declarations?selector=.nope")[0] == 400
+
+
+def test_similar_endpoint(server):
+    _, url = server
+    status, payload = _get(f"{url}/similar?q=" + quote("display: flex; gap: 9px; color: var(--brand)"))
+    assert status == 200
+    assert {r["selector"] for r in payload["rules"]} == {".card", ".tile"}
+    assert _get(f"{url}/similar?q=color:red&limit=x")[0] == 400
+
+
+def test_variable_endpoint(server):
+    _, url = server
+    payload = _get(f"{url}/variable?name=brand")[1]
+    assert [d["file"] for d in payload["definitions"]] == ["base/variables.css"]
+    assert sorted(u["file"] for u in payload["uses"]) == ["a.css", "b.css"]
+    assert [v["name"] for v in _get(f"{url}/variable?value=" + quote("#ffffff"))[1]["variables"]] == ["--brand"]
+    assert _get(f"{url}/variable")[0] == 400
+
+
+def test_refresh_endpoint(server):
+    root, url = server
+    (root / "c.css").write_text(".panel { display: flex; gap: 8px; color: var(--brand); }\n")
+    status, payload = _get(f"{url}/refresh", data=b"")
+    assert status == 200 and payload["files_changed"] == 1
+    assert len(_get(f"{url}/declarations?selector=.card")[1]["rules"]) == 3
+    assert _get(f"{url}/status")[1]["files"] == 4
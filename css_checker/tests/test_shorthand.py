@@ -0,0 +1,41 @@
+from cssscan.parser import Declaration
+from cssscan.shorthand import expand_declarations
+
+
+def _texts(decls):
+    return [d.text() for d in expand_declarations([Declaration(p, v) for p, v in decls])]
+
+
+def test_negative_values_are_overridden():
+    assert _texts([("margin-top", "-4px"), ("margin-top", "8px")]) == ["margin-top: 8px"]
+    assert _texts([("margin", "-4px 0"), ("margin", "0")]) == [
+        "margin-top: 0", "margin-right: 0", "margin-bottom: 0", "margin-left: 0"]
+
+
+def test_vendor_values_are_kept_as_fallbacks():
+    for prefix in ("-webkit-", "-moz-", "-ms-", "-o-"):
+        assert _texts([("display", f"{prefix}box"), ("display", "flex")]) == [
+            f"display: {prefix}box", "display: flex"]
+
+
+def test_important_sticks():
+    decls = [Declaration("color", "red", True), Declaration("color", "blue")]
+    assert [d.text() for d in expand_declarations(decls)] == ["color: red !important"]
+
+
+def test_fallback_order_is_kept():
+    assert _texts([("display", "flex"), ("display", "-webkit-box")]) == ["display: flex", "display: -webkit-box"]
+    assert _texts([("color", "red"), ("display", "-webkit-box"), ("color", "blue")]) == [
+        "display: -webkit-box", "color: blue"]
+
+
+def test_longhand_atoms_cover_shorthands_aliases_and_logical_sides():
+    from cssscan.shorthand import longhand_atoms
+
+    assert "background-color" in longhand_atoms("background")
+    assert longhand_atoms("overflow") == {"overflow-x", "overflow-y"}
+    assert "grid-row-start" in longhand_atoms("grid-area")
+    assert longhand_atoms("-webkit-transition") == longhand_atoms("transition")
+    assert longhand_atoms("grid-gap") == longhand_atoms("gap")
+    assert "margin-left" in longhand_atoms("margin-inline-start")
+    assert longhand_atoms("color") == {"color"}
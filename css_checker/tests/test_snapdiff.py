@@ -0,0 +1,52 @@
+from cssscan.snapdiff import SnapshotDiffer
+
+
+def _diff(tmp_path, old, new):
+    for name, files in (("old", old), ("new", new)):
+        for rel, text in files.items():
+            path = tmp_path / name / rel
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(text)
+    differ = SnapshotDiffer()
+    return differ, differ.diff(tmp_path / "old", tmp_path / "new")
+
+
+def _changes(diff):
+    return [(c.kind, c.file, c.selector, " ".join(c.context), c.moved_from) for c in diff.changes]
+
+
+def test_added_removed_and_changed_rules(tmp_path):
+    _, diff = _diff(tmp_path, {"a.css": ".a { color: red; }\n.b { top: 0; }\n.c { left: 0; }\n"},
+                    {"a.css": ".a { color: #f00; }\n.b { top: 1px; }\n.d { left: 0; }\n"})
+    assert _changes(diff) == [("changed", "a.css", ".b", "", None), ("added", "a.css", ".d", "", None),
+                              ("removed", "a.css", ".c", "", None)]
+    assert diff.changes[0].added_declarations == ["top: 1px"]
+    assert diff.counts() == {"added": 1, "removed": 1, "moved": 0, "changed": 1}
+
+
+def test_identical_files_are_skipped_and_parses_shared(tmp_path):
+    same = ".a { color: red; }\n"
+    differ, diff = _diff(tmp_path, {"a.css": same, "b.css": ".b { top: 0; }\n"},
+                         {"a.css": same, "b.css": ".b { top: 1px; }\n"})
+    assert (diff.files_unchanged, diff.files_compared) == (1, 1)
+    differ.diff(tmp_path / "old", tmp_path / "new")
+    assert differ.parses == 2
+
+
+def test_rule_moved_to_another_file(tmp_path):
+    _, diff = _diff(tmp_path, {"a.css": ".a { color: red; }\n.x { top: 0; }\n", "b.css": ".b { top: 0; }\n"},
+                    {"a.css": ".x { top: 0; }\n", "b.css": ".b { top: 0; }\n.a { color: red; }\n"})
+    assert _changes(diff) == [("moved", "b.css", ".a", "", "a.css")]
+
+
+def test_rule_moved_within_a_file(tmp_path):
+    _, diff = _diff(tmp_path, {"a.css": ".a { color: red; }\n.b { top: 0; }\n.c { left: 0; }\n"},
+                    {"a.css": ".b { top: 0; }\n.c { left: 0; }\n.a { color: red; }\n"})
+    assert _changes(diff) == [("moved", "a.css", ".a", "", "a.css")]
+    assert (diff.changes[0].old_line, diff.changes[0].new_line) == (1, 3)
+
+
+def test_rule_moved_into_an_at_rule_in_the_same_file(tmp_path):
+    _, diff = _diff(tmp_path, {"a.css": ".a { color: red; }\n.b { top: 0; }\n@media print { .c { top: 0; } }\n"},
+                    {"a.css": ".b { top: 0; }\n@media print { .c { top: 0; }\n.a { color: red; } }\n"})
+    assert _changes(diff) == [("moved", "a.css", ".a", "@media print", "a.css")]
@@ -0,0 +1,94 @@
+import io
+
+import main
+from cssscan.compress import bundle_sizes, stream_sizes
+from cssscan.stream import iter_chunks, iter_matches, read_prelude, scan_names
+from phase1 import CSSCleanupTool
+
+SHEET = """@charset "utf-8";
+@import './base.css';
+
+.page-header { display: flex; }
+
+.card { grid-template-columns: repeat(auto-fit, minmax(200px, 1fr)); }
+
+
+.card--active { animation: spin 1s linear infinite; color: var(--brand); }
+@media (max-width: 768px) {
+  .card { padding: 0; }
+}
+.empty-state { margin: 0; }
+"""
+
+
+def _tree(root, big_text):
+    styles = root / "styles"
+    (styles / "pages").mkdir(parents=True)
+    (styles / "base").mkdir()
+    (styles / "base" / "variables.css").write_text(":root {\n  --brand: #3498db;\n  --unused: 1px;\n}\n")
+    (styles / "main.css").write_text("@import './base/variables.css';\n@import './pages/big.css';\n")
+    (styles / "pages" / "big.css").write_text(big_text)
+    return styles
+
+
+def test_chunks_end_on_braces_and_cover_the_text():
+    chunks = list(iter_chunks(io.StringIO(SHEET), budget=16))
+    assert "".join(chunks) == SHEET
+    assert all(c.endswith("}") for c in chunks[:-1])
+
+
+def test_iter_matches_equals_finditer():
+    text = SHEET * 50
+    streamed = [m.groups() for m in iter_matches(io.StringIO(text), main.RULE_PATTERN, budget=64)]
+    assert streamed == [m.groups() for m in main.RULE_PATTERN.finditer(text)]
+
+
+def test_main_entries_are_the_same_streamed(tmp_path, monkeypatch):
+    path = tmp_path / "big.css"
+    path.write_text(SHEET * 20)
+    whole = main.parse_css_file(path)
+    monkeypatch.setattr(main, "STREAM_THRESHOLD", 0)
+    monkeypatch.setattr(main, "MEMORY_BUDGET", 64)
+    streamed = main.parse_css_file(path)
+    strip = lambda entries: [{k: v for k, v in e.items() if k != "canon_cost"} for e in entries]
+    assert strip(streamed) == strip(whole)
+
+
+def test_cleanup_phases_give_the_same_files_streamed(tmp_path):
+    results = []
+    for name, threshold in (("whole", 32 * 1024 * 1024), ("streamed", 0)):
+        styles = _tree(tmp_path / name, SHEET * 20)
+        tool = CSSCleanupTool(str(tmp_path / name))
+        tool.safe_removal_classes = {".page-header"}
+        tool.stream_threshold = threshold
+        tool.memory_budget = 64
+        tool.run_phases()
+        files = {p.relative_to(styles).as_posix(): p.read_text() for p in sorted(styles.rglob("*.css"))}
+        deltas = {phase: {k.replace(name, ""): v for k, v in d.items()} for phase, d in tool.phase_deltas.items()}
+        results.append((files, deltas))
+    assert results[0] == results[1]
+    assert ".page-header" not in results[1][0]["pages/big.css"]
+    assert "var(--grid-auto-200)" in results[1][0]["pages/big.css"]
+
+
+def test_streamed_file_references_keep_definitions_live(tmp_path):
+    _tree(tmp_path, SHEET)
+    tool = CSSCleanupTool(str(tmp_path))
+    tool.stream_threshold = 100  # pages/big.css only
+    summary = tool.prune_unreferenced_definitions()
+    assert "--brand" not in summary["unused_variables"]
+    assert "--unused" in summary["unused_variables"]
+
+
+def test_stream_sizes_equal_bundle_sizes():
+    texts = [SHEET * 30, ".a { color: red; }\n" * 100]
+    pieces = [texts[0][:500], texts[0][500:], "\n", texts[1]]
+    assert stream_sizes(pieces) == bundle_sizes(texts)
+
+
+def test_prelude_and_names(tmp_path):
+    path = tmp_path / "big.css"
+    path.write_text(SHEET)
+    assert read_prelude(path, budget=8) == "@charset \"utf-8\";\n@import './base.css';"
+    names = scan_names(path, budget=16)
+    assert {"--brand", "card--active", "spin"} <= names